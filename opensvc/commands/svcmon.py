@@ -16,15 +16,44 @@
 from core.node import Node
 from foreign.six.moves import queue
 from utilities.journaled_data import JournaledData
-from utilities.render.cluster import format_cluster
+from utilities.render.cluster import RenderCache, format_cluster
+from utilities.render.term import term_height
 
 CLEAREOL = "\x1b[K"
 CLEAREOLNEW = "\x1b[K\n"
 CLEAREOS = "\x1b[J"
 CURSORHOME = "\x1b[H"
+CURSORPOS = "\x1b[%d;1H"
 
 PATCH_Q = queue.Queue()
 
+def format_screen(lines, prev_lines=None):
+    """
+    Return the terminal control sequence drawing <lines> over the
+    <prev_lines> already on screen. Only the changed lines are rewritten,
+    using cursor addressing.
+    """
+    if prev_lines is None:
+        return CURSORHOME + CLEAREOLNEW.join(lines) + CLEAREOS
+    buff = []
+    for idx, line in enumerate(lines):
+        if idx < len(prev_lines) and line == prev_lines[idx]:
+            continue
+        buff.append(CURSORPOS % (idx + 1) + line + CLEAREOL)
+    if len(lines) < len(prev_lines):
+        buff.append(CURSORPOS % (len(lines) + 1) + CLEAREOS)
+    buff.append(CURSORPOS % len(lines))
+    return "".join(buff)
+
+def screen_lines(preamble, outs, height=None):
+    """
+    Return the lines to display, clipped to the terminal <height>.
+    """
+    lines = [preamble, ""] + outs.split("\n")
+    if height:
+        lines = lines[:height]
+    return lines
+
 def setup_parser(node):
     __ver = prog + " version " + node.agent_version
     __usage = prog + \
@@ -198,10 +227,13 @@ def svcmon(node, options=None):
         preamble = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         stats_data = get_stats(options, node, expanded_svcs)
         prev_stats_data = None
+        cache = RenderCache()
+        screen = None
+        height = None
         outs = format_cluster(paths=expanded_svcs, node=nodes,
                               data=status_data, sections=options.sections,
                               selector=options.parm_svcs,
-                              namespace=namespace)
+                              namespace=namespace, cache=cache)
 
         if outs is not None:
             print(CURSORHOME+preamble+CLEAREOLNEW+CLEAREOL)
@@ -209,15 +241,14 @@ def svcmon(node, options=None):
 
         while True:
             now = time.time()
-            try:
-                patch = PATCH_Q.get(False, 0.5)
-                #for change in patch["data"]:
-                #    print(change)
-            except Exception as exc:
-                # queue empty
-                patch = None
-
-            if patch:
+            # apply all the queued patches before rendering, so the
+            # display does not lag behind the events
+            patch = None
+            while True:
+                try:
+                    patch = PATCH_Q.get(False)
+                except queue.Empty:
+                    break
                 if last_patch_id and patch["id"] != last_patch_id + 1:
                     try:
                         dataset.set([], node._daemon_status(server=options.server, selector=options.parm_svcs, namespace=namespace))
@@ -256,9 +287,12 @@ def svcmon(node, options=None):
             if stats_changed:
                 prev_stats_data = stats_data
                 stats_data = get_stats(options, node, expanded_svcs)
-            if chars == 0:
+            _height = term_height()
+            if chars == 0 or height != _height:
                 print(CURSORHOME+CLEAREOS)
                 chars = 1
+                height = _height
+                screen = None
             preamble = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             outs = format_cluster(
                 paths=expanded_svcs,
@@ -269,10 +303,13 @@ def svcmon(node, options=None):
                 sections=options.sections,
                 selector=options.parm_svcs,
                 namespace=namespace,
+                cache=cache,
             )
             if outs is not None:
-                print(CURSORHOME+preamble+CLEAREOLNEW+CLEAREOL)
-                print(CLEAREOLNEW.join(outs.split("\n"))+CLEAREOS)
+                lines = screen_lines(preamble, outs, height=height)
+                sys.stdout.write(format_screen(lines, screen))
+                sys.stdout.flush()
+                screen = lines
             # min delay
             last_refresh = now
             time.sleep(0.2)
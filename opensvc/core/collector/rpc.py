@@ -788,6 +788,11 @@ def push_daemon_status(self, data, changes=None, sync=True):
         args = [json.dumps(data), json.dumps(changes), (self.node.collector_env.uuid, Env.nodename)]
         self.proxy.push_daemon_status(*args)
 
+    def push_daemon_status_delta(self, data, changes=None, sync=True):
+        import json
+        args = [json.dumps(data), json.dumps(changes), (self.node.collector_env.uuid, Env.nodename)]
+        self.proxy.push_daemon_status_delta(*args)
+
     def push_brocade(self, objects=None, sync=True):
         if objects is None:
             objects = []
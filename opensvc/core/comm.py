@@ -11,6 +11,7 @@
 import zlib
 import time
 import select
+import struct
 import sys
 from errno import ECONNREFUSED, EPIPE, EBUSY, EALREADY, EAGAIN
 
@@ -66,6 +67,15 @@ def to_bytes(x):
 PAUSE = 0.2
 PING = ".".encode()
 
+# The compact binary message frame:
+#   magic (4 bytes), length of the rest of the frame (4 bytes, big endian),
+#   cluster name length (1 byte), cluster name, node name length (1 byte),
+#   node name, iv (16 bytes), ciphertext.
+# The magic starts with a NUL byte, so a binary frame can not be confused
+# with a json envelope.
+BINARY_FRAME_MAGIC = b"\x00OB1"
+BINARY_FRAME_HEADER = struct.Struct(">4sI")
+
 # Number of received misencrypted data messages by senders
 BLACKLIST = {}
 
@@ -345,25 +355,37 @@ def msg_decode(self, message):
     def decrypt(self, message, cluster_name=None, secret=None, sender_id=None, structured=True):
         """
         Validate the message meta, decrypt and return the data.
+
+        The message is either a json envelope or a binary frame.
         """
         if cluster_name is None:
             cluster_names = self.cluster_names
         else:
             cluster_names = [cluster_name]
-        message = bdecode(message).rstrip("\0\x00")
-        try:
-            message = json.loads(message)
-        except ValueError:
-            message_len = len(message)
-            if message_len > 40:
-                self.log.error("misformatted encrypted message from %s: %s",
-                               sender_id, message[:30]+"..."+message[-10:])
-            elif message_len > 0:
-                self.log.error("misformatted encrypted message from %s",
-                               sender_id)
-            return None, None, None
-        msg_clustername = message.get("clustername")
-        msg_nodename = message.get("nodename")
+        if isinstance(message, bytes) and message.startswith(BINARY_FRAME_MAGIC):
+            try:
+                msg_clustername, msg_nodename, iv, data = self.parse_binary_frame(message)
+            except ValueError as exc:
+                self.log.error("misformatted binary message from %s: %s",
+                               sender_id, exc)
+                return None, None, None
+        else:
+            message = bdecode(message).rstrip("\0\x00")
+            try:
+                message = json.loads(message)
+            except ValueError:
+                message_len = len(message)
+                if message_len > 40:
+                    self.log.error("misformatted encrypted message from %s: %s",
+                                   sender_id, message[:30]+"..."+message[-10:])
+                elif message_len > 0:
+                    self.log.error("misformatted encrypted message from %s",
+                                   sender_id)
+                return None, None, None
+            msg_clustername = message.get("clustername")
+            msg_nodename = message.get("nodename")
+            iv = message.get("iv")
+            data = message.get("data")
         if secret is None:
             if msg_nodename in self.cluster_drpnodes:
                 cluster_key = self.get_secret(Storage(server=msg_nodename), None)
@@ -380,13 +402,13 @@ def decrypt(self, message, cluster_name=None, secret=None, sender_id=None, struc
             return None, None, None
         if msg_nodename is None:
             return None, None, None
-        iv = message.get("iv")
         if iv is None:
             return None, None, None
         if self.blacklisted(sender_id):
             return None, None, None
-        iv = base64.urlsafe_b64decode(to_bytes(iv))
-        data = base64.urlsafe_b64decode(to_bytes(message["data"]))
+        if not isinstance(iv, bytes):
+            iv = base64.urlsafe_b64decode(to_bytes(iv))
+            data = base64.urlsafe_b64decode(to_bytes(data))
         try:
             data = self._decrypt(data, cluster_key, iv)
         except Exception as exc:
@@ -440,6 +462,68 @@ def encrypt(self, data, cluster_name=None, secret=None, encode=True):
             return (json.dumps(message)+'\0').encode()
         return json.dumps(message)
 
+    def encrypt_binary(self, data, cluster_name=None, secret=None):
+        """
+        Encrypt and return data in a binary frame, without the base64 and
+        json encodings of the wrapping structure.
+        """
+        if cluster_name is None:
+            cluster_name = self.cluster_name
+        if secret is None:
+            cluster_key = self.cluster_key
+        else:
+            cluster_key = secret
+        if cluster_key is None:
+            return
+        iv = self.gen_iv()
+        try:
+            data = json.dumps(data).encode()
+        except (UnicodeDecodeError, TypeError):
+            # already binary data
+            pass
+        cluster_name = cluster_name.encode("utf-8")
+        nodename = Env.nodename.encode("utf-8")
+        payload = b"".join([
+            struct.pack("B", len(cluster_name)), cluster_name,
+            struct.pack("B", len(nodename)), nodename,
+            iv,
+            self._encrypt(data, cluster_key, iv),
+        ])
+        return BINARY_FRAME_HEADER.pack(BINARY_FRAME_MAGIC, len(payload)) + payload
+
+    @staticmethod
+    def binary_frame_len(buff):
+        """
+        Return the length of the binary frame starting <buff>, or None if
+        <buff> is too short to contain the frame header.
+        """
+        if len(buff) < BINARY_FRAME_HEADER.size:
+            return
+        _, length = BINARY_FRAME_HEADER.unpack(buff[:BINARY_FRAME_HEADER.size])
+        return BINARY_FRAME_HEADER.size + length
+
+    @staticmethod
+    def parse_binary_frame(message):
+        """
+        Return the (cluster name, node name, iv, ciphertext) tuple of a
+        binary frame.
+        """
+        frame_len = Crypt.binary_frame_len(message)
+        if frame_len is None or len(message) < frame_len:
+            raise ValueError("truncated frame")
+        message = bytearray(message[BINARY_FRAME_HEADER.size:frame_len])
+        offset = 0
+        fields = []
+        for _ in range(2):
+            length = message[offset]
+            offset += 1
+            fields.append(bytes(message[offset:offset+length]).decode("utf-8"))
+            offset += length
+        iv = bytes(message[offset:offset+16])
+        if len(iv) != 16:
+            raise ValueError("truncated iv")
+        return fields[0], fields[1], iv, bytes(message[offset+16:])
+
     def blacklisted(self, sender_id):
         """
         Return True if the sender's problem count is above threshold.
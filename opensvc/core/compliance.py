@@ -4,13 +4,16 @@
 import sys
 import re
 import datetime
+import itertools
 import json
+import time
 from stat import *
 from subprocess import *
 
 import foreign.six as six
 import core.exceptions as ex
 from env import Env
+from utilities.concurrent_futures import get_concurrent_futures
 from utilities.storage import Storage
 from utilities.naming import ANSI_ESCAPE
 from utilities.fcache import fcache
@@ -35,6 +38,10 @@ def __init__(self, name, autofix=False, moduleset=None):
         self.ruleset = None
         self.context = None
         self.options = Storage()
+        # the output buffer of a module run in parallel with others,
+        # None for the stdout
+        self.out = None
+        self.action_log_vals = []
 
         dl = os.listdir(comp_dir)
         match = []
@@ -105,21 +112,31 @@ def log_action(self, out, ret, action):
             vals.append(self.context.svc.path)
         else:
             vals.append("")
-        self.context.action_log_vals.append(vals)
+        self.action_log_vals.append(vals)
+
+    def echo(self, *args, **kwargs):
+        """
+        Print to the module output buffer if set, else to stdout.
+        """
+        if self.out is not None:
+            kwargs["file"] = self.out
+        print(*args, **kwargs)
 
-    def set_env_path(self):
+    def env_path(self, path):
         if self.python_link_d == sys.path[0]:
-            return
+            return path
         if Env.sysname == "Windows":
-            return
-        if "PATH" in os.environ:
-            os.environ["PATH"] = self.python_link_d + ":" + os.environ["PATH"]
+            return path
+        if path:
+            path = self.python_link_d + ":" + path
         else:
-            os.environ["PATH"] = self.python_link_d
+            path = self.python_link_d
         if Env.paths.pathbin != "/usr/bin":
-            os.environ["PATH"] = os.environ["PATH"] + ":" + Env.paths.pathbin
+            path = path + ":" + Env.paths.pathbin
+        return path
 
-    def set_locale(self):
+    @staticmethod
+    def set_locale():
         """
         Switch to an utf-8 locale
         """
@@ -136,9 +153,18 @@ def reset_env(self):
         self.context.reset_env()
 
     def setup_env(self):
+        self.set_locale()
+        env = self.get_env()
         os.environ.clear()
-        os.environ.update(self.context.env_bkp)
-        os.environ.update({
+        os.environ.update(env)
+
+    def get_env(self):
+        """
+        Return the module execution environment. The process environment
+        is not modified, so modules can run in parallel threads.
+        """
+        env = dict(self.context.env_bkp)
+        env.update({
           "PYTHONIOENCODING": "utf-8",
           "OSVC_PYTHON": sys.executable,
           "OSVC_PATH_ETC": Env.paths.pathetc,
@@ -149,17 +175,18 @@ def setup_env(self):
           "OSVC_NODEMGR": Env.paths.nodemgr,
           "OSVC_SVCMGR": Env.paths.svcmgr,
         })
-        self.set_locale()
-        self.set_env_path()
+        path = self.env_path(env.get("PATH"))
+        if path is not None:
+            env["PATH"] = path
 
         # add services env section keys, with values eval'ed on this node
         if self.context.svc:
-            os.environ[self.context.format_rule_var("SVC_NAME")] = self.context.format_rule_val(self.context.svc.name)
-            os.environ[self.context.format_rule_var("SVC_PATH")] = self.context.format_rule_val(self.context.svc.path)
+            env[self.context.format_rule_var("SVC_NAME")] = self.context.format_rule_val(self.context.svc.name)
+            env[self.context.format_rule_var("SVC_PATH")] = self.context.format_rule_val(self.context.svc.path)
             if self.context.svc.namespace:
-                os.environ[self.context.format_rule_var("SVC_NAMESPACE")] = self.context.format_rule_val(self.context.svc.namespace)
+                env[self.context.format_rule_var("SVC_NAMESPACE")] = self.context.format_rule_val(self.context.svc.namespace)
             for key, val in self.context.svc.env_section_keys_evaluated().items():
-                os.environ[self.context.format_rule_var("SVC_CONF_ENV_"+key.upper())] = self.context.format_rule_val(val)
+                env[self.context.format_rule_var("SVC_CONF_ENV_"+key.upper())] = self.context.format_rule_val(val)
 
         for rset in self.ruleset.values():
             if (rset["filter"] != "explicit attachment via moduleset" and \
@@ -169,14 +196,14 @@ def setup_env(self):
                ):
                 for rule in rset['vars']:
                     var, val, var_class = self.context.parse_rule(rule)
-                    os.environ[self.context.format_rule_var(var)] = self.context.format_rule_val(val)
-
+                    env[self.context.format_rule_var(var)] = self.context.format_rule_val(val)
+        return env
 
     def action(self, action):
         self.print_bold(banner(self.name))
 
         if action not in ['check', 'fix', 'fixable', 'env']:
-            print('action %s not supported')
+            self.echo('action %s not supported')
             return 1
 
         if self.options.force:
@@ -185,10 +212,10 @@ def action(self, action):
 
         if action == 'fix':
             if self.do_action('check') == 0:
-                print('check passed, skip fix')
+                self.echo('check passed, skip fix')
                 return 0
             if self.do_action('fixable') not in (0, 2):
-                print('not fixable, skip fix')
+                self.echo('not fixable, skip fix')
                 return 1
             self.do_action('fix')
             r = self.do_action('check')
@@ -205,7 +232,7 @@ def action(self, action):
     def do_env(self):
         self.setup_env()
         for var in sorted(os.environ):
-            print(var, "=", os.environ[var], sep="")
+            self.echo(var, "=", os.environ[var], sep="")
         self.reset_env()
         return 0
 
@@ -223,7 +250,7 @@ def do_action_automodule(self, action):
         log = ''
         rets = set()
 
-        self.setup_env()
+        env = self.get_env()
         for rset in self.ruleset.values():
             if rset["name"] != self.moduleset:
                 continue
@@ -237,16 +264,18 @@ def do_action_automodule(self, action):
                 if obj is None:
                     err = color.RED + 'ERR: ' + color.END + "no compliance object found to handle class '%s' for rule '%s'" % (var_class, var)
                     log += err + "\n"
-                    print(err, file=sys.stderr)
+                    if self.out is None:
+                        print(err, file=sys.stderr)
+                    else:
+                        self.echo(err)
                     continue
-                _ret, _log = self.do_action_exe(action, Env.python_cmd + [obj, self.context.format_rule_var(var)])
+                _ret, _log = self.do_action_exe(action, Env.python_cmd + [obj, self.context.format_rule_var(var)], env=env)
                 rets.add(_ret)
                 log += _log
                 if action == "fix" and _ret not in (0, 2):
                     # stop at frist error in a 'fix' action
                     break
 
-        self.reset_env()
         if rets == set([0]) or rets == set():
             ret = 0
         elif rets == set([0, 2]):
@@ -264,12 +293,12 @@ def get_obj(self, var_class):
         except IndexError:
             return None
 
-    def do_action_exe(self, action, executable):
+    def do_action_exe(self, action, executable, env=None):
         cmd = executable + [action]
         log = ''
+        out = self.out if self.out is not None else sys.stdout
 
         import tempfile
-        import time
         fo = tempfile.NamedTemporaryFile()
         fe = tempfile.NamedTemporaryFile()
         _fo = None
@@ -281,8 +310,8 @@ def poll_out():
             if not line:
                 _fo.seek(fop)
                 return None
-            sys.stdout.write(line)
-            sys.stdout.flush()
+            out.write(line)
+            out.flush()
             return line
 
         def poll_err():
@@ -293,8 +322,8 @@ def poll_err():
                 return None
             _line = color.RED + 'ERR: ' + color.END + line
             line = 'ERR: '+line
-            sys.stdout.write(_line)
-            sys.stdout.flush()
+            out.write(_line)
+            out.flush()
             return line
 
         def poll_pipes(log):
@@ -310,9 +339,10 @@ def poll_pipes(log):
                     break
             return log
 
+        if env is None:
+            env = self.get_env()
         try:
-            self.setup_env()
-            p = Popen(cmd, stdout=fo, stderr=fe, env=os.environ)
+            p = Popen(cmd, stdout=fo, stderr=fe, env=env)
             _fo = open(fo.name, 'r')
             _fe = open(fe.name, 'r')
             while True:
@@ -338,11 +368,10 @@ def poll_pipes(log):
         fe.close()
         _fo.close()
         _fe.close()
-        self.reset_env()
         return p.returncode, log
 
     def print_bold(self, s):
-        print(colorize(s, color.BOLD))
+        self.echo(colorize(s, color.BOLD))
 
     def print_rcode(self, r):
         buff = "STATUS:   "
@@ -354,7 +383,7 @@ def print_rcode(self, r):
             buff += "n/a"
         else:
             buff += "%d" % r
-        print(buff)
+        self.echo(buff)
 
     def env(self):
         return self.action('env')
@@ -393,6 +422,7 @@ def __init__(self, o=None):
           'run_svcname']
         self.env_bkp = os.environ.copy()
         self.ordered_module = []
+        self.durations = {}
 
     def set_rset_md5(self):
         self.rset_md5 = ""
@@ -681,23 +711,83 @@ def compliance_show_ruleset(self):
         self.ruleset = self.get_ruleset()
         print(self.str_ruleset())
 
+    def module_action(self, module, action):
+        if action == "auto":
+            if self.module_o[module].autofix:
+                return "fix"
+            return "check"
+        return action
+
+    def max_parallel(self, actions):
+        """
+        Return the number of modules of a same ordering group allowed to
+        run in parallel. The 'check' and 'fixable' actions only read the
+        system state, the 'fix' action must be allowed by the
+        compliance.parallel_fix node keyword.
+        """
+        for _, action in actions:
+            if action in ("check", "fixable"):
+                continue
+            if action == "fix" and self.node.oget("compliance", "parallel_fix"):
+                continue
+            return 1
+        return self.node.oget("compliance", "max_parallel")
+
+    def run_module(self, module, action, buffered=False):
+        """
+        Run the <action> of <module>. Return the module return code, and
+        the module output if <buffered>.
+        """
+        o = self.module_o[module]
+        if buffered:
+            o.out = six.StringIO()
+        begin = time.time()
+        try:
+            ret = getattr(o, action)()
+        finally:
+            self.durations[module] = time.time() - begin
+        if buffered:
+            out = o.out.getvalue()
+            o.out = None
+            return ret, out
+        return ret, None
+
+    def run_group(self, modules, action, err):
+        """
+        Run the modules of a same ordering group. The next group starts
+        when all the modules of this group are done. The output and the
+        action logs of the modules are emitted in the modules order.
+        """
+        actions = [(module, self.module_action(module, action)) for module in modules]
+        max_parallel = self.max_parallel(actions)
+        if max_parallel < 2 or len(actions) < 2:
+            for module, _action in actions:
+                err[module], _ = self.run_module(module, _action)
+                self.action_log_vals += self.module_o[module].action_log_vals
+            return
+        concurrent_futures = get_concurrent_futures()
+        with concurrent_futures.ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            futures = [(module, executor.submit(self.run_module, module, _action, True)) for module, _action in actions]
+            for module, future in futures:
+                err[module], out = future.result()
+                sys.stdout.write(out)
+                sys.stdout.flush()
+                self.action_log_vals += self.module_o[module].action_log_vals
+
     def do_run(self, action):
         err = {}
         self.init()
         start = datetime.datetime.now()
-        for module in self.ordered_module:
-            _action = action
-            if action == "auto":
-                if self.module_o[module].autofix:
-                    _action = "fix"
-                else:
-                    _action = "check"
-            err[module] = getattr(self.module_o[module], _action)()
+        if action != "env":
+            Module.set_locale()
+        for _, modules in itertools.groupby(self.ordered_module, key=lambda x: self.module_o[x].ordering):
+            self.run_group(list(modules), action, err)
         if action == "env":
             return 0
         r = self.digest_errors(err)
         end = datetime.datetime.now()
         print("total duration: %s"%str(end-start))
+        print("cumulated modules duration: %s"%str(datetime.timedelta(seconds=sum(self.durations.values()))))
         self.node.collector.call('comp_log_actions', self.action_log_vars, self.action_log_vals)
         return r
 
@@ -1667,12 +1667,22 @@ def commit(self, cd=None, cf=None, validation=True):
         self.clear_ref_cache()
         self.post_commit()
 
+        if not self.is_volatile() and cf == self.paths.cf:
+            self.update_keyword_index()
+
     def post_commit(self):
         """
         Place holder for things to do on the child class instance after a commit.
         """
         pass
 
+    def update_keyword_index(self):
+        """
+        Place holder for the child class instance to update the selector
+        keywords index after a commit.
+        """
+        pass
+
     def dump_config_data(self, cd=None, cf=None):
         import tempfile
         import shutil
@@ -28,11 +28,12 @@
 from core.extconfig import ExtConfigMixin
 from core.freezer import Freezer
 from core.network import NetworksMixin
+from core.objects.keywordindex import KeywordIndex
 from core.scheduler import SchedOpts, Scheduler, sched_action
 from env import Env
 from utilities.loop_delay import delay
 from utilities.naming import (ANSI_ESCAPE, factory, fmt_path, glob_services_config,
-                              is_service, new_id, paths_data,
+                              is_service, list_services, new_id, paths_data,
                               resolve_path, split_path, strip_path, svc_pathetc,
                               validate_kind, validate_name, validate_ns_name,
                               object_path_glob)
@@ -695,23 +696,25 @@ def svcs_selector(self, selector, namespace=None, local=False):
     def _svcs_selector(self, selector, namespace=None):
         if want_context():
             raise ex.Error("daemon is unreachable")
-        self.build_services()
-        paths = [svc.path for svc in self.svcs]
+        paths = sorted(list_services())
         paths = self.filter_ns(paths, namespace)
         if "," in selector:
             ored_selectors = selector.split(",")
         else:
             ored_selectors = [selector]
         result = []
+        done = set()
+        built = {}
         for _selector in ored_selectors:
-            for path in self.__svcs_selector(_selector, paths, namespace=namespace):
-                if path not in result:
+            for path in self.__svcs_selector(_selector, paths, namespace=namespace, built=built):
+                if path not in done:
+                    done.add(path)
                     result.append(path)
         if len(result) == 0 and not re.findall(r"[,+*=^:~><]", selector):
             raise ex.Error("object not found")
         return result
 
-    def __svcs_selector(self, selector, paths, namespace=None):
+    def __svcs_selector(self, selector, paths, namespace=None, built=None):
         """
         Given a selector string, return a list of service names.
         This method only intersect the ANDed elements.
@@ -730,7 +733,7 @@ def __svcs_selector(self, selector, paths, namespace=None):
         else:
             result = None
             for _selector in anded_selectors:
-                _paths = self.___svcs_selector(_selector, paths, namespace)
+                _paths = self.___svcs_selector(_selector, paths, namespace, built=built)
                 if result is None:
                     result = _paths
                 else:
@@ -738,7 +741,7 @@ def __svcs_selector(self, selector, paths, namespace=None):
                     result = [name for name in result if name in common]
         return result
 
-    def ___svcs_selector(self, selector, paths, namespace):
+    def ___svcs_selector(self, selector, paths, namespace, built=None):
         """
         Given a basic selector string (no AND nor OR), return a list of service
         names.
@@ -759,14 +762,54 @@ def ___svcs_selector(self, selector, paths, namespace):
         except ValueError:
             return []
 
-        # config keyword match
-        result = []
-        for svc in self.svcs:
-            ret = selector_config_match(svc, param, op, value)
+        return self.config_selector(paths, param, op, value, negate, built=built)
+
+    def config_selector(self, paths, param, op, value, negate=False, built=None):
+        """
+        Return the <paths> having a <param> keyword value matching the <op>
+        <value> expression. The indexed keywords are evaluated from the
+        keyword index, so only the objects missing from the index or with
+        a changed config are built.
+
+        <built> is the dict of objects already built by the other fragments
+        of the selector, indexed by path.
+        """
+        selected = set()
+        unindexed = []
+        for path in paths:
+            try:
+                ret = self.keyword_index.match(path, param, op, value)
+            except KeyError:
+                unindexed.append(path)
+                continue
             if ret ^ negate:
-                result.append(svc.path)
+                selected.add(path)
+        if unindexed:
+            for svc in self.selector_svcs(unindexed, built):
+                self.keyword_index.update(svc)
+                if selector_config_match(svc, param, op, value) ^ negate:
+                    selected.add(svc.path)
+            self.keyword_index.save()
+        return [path for path in paths if path in selected]
+
+    def selector_svcs(self, paths, built=None):
+        """
+        Return the objects of <paths>, building those not already in the
+        <built> dict, and adding them to it. The node objects list is not
+        modified.
+        """
+        if built is None:
+            built = {}
+        missing = [path for path in paths if path not in built]
+        if missing:
+            svcs, _ = core.objects.builder.build_services(paths=missing, node=self)
+            for svc in svcs:
+                built[svc.path] = svc
+        return [built[path] for path in paths if path in built]
 
-        return result
+    @lazy
+    def keyword_index(self):
+        return KeywordIndex()
 
     def build_services(self, *args, **kwargs):
         """
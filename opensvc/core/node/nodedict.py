@@ -61,6 +61,20 @@
         "default_text": "<autogenerated>",
         "text": "The scsi3 persistent reservation key used by the pr resources."
     },
+    {
+        "section": "node",
+        "keyword": "shared_cache_size",
+        "convert": "size",
+        "default": "16m",
+        "text": "The maximum size of the command results cache hosted by the daemon and shared by all the sessions of the node. The least recently used results are evicted when the size is exceeded. Set to ``0`` to disable the shared cache, in which case each session uses its own cache."
+    },
+    {
+        "section": "node",
+        "keyword": "container_events",
+        "convert": "boolean",
+        "default": False,
+        "text": "If set to ``true``, the daemon subscribes to the events of the docker and podman engines listening on their default api socket, and keeps a cache of their containers state. The container resources status evaluation reads this cache instead of requesting the engine. The private docker daemons of the services are not watched."
+    },
     {
         "section": "node",
         "keyword": "connect_to",
@@ -322,6 +336,13 @@
         "convert": "integer",
         "text": "Allow a maximum of :kw:`max_parallel` subprocesses to run simultaneously on :cmd:`om <selector> --parallel <action>` commands."
     },
+    {
+        "section": "node",
+        "keyword": "status_workers",
+        "default": 4,
+        "convert": "integer",
+        "text": "The maximum number of threads evaluating the status of the resources of a resource set concurrently. The resource sets are still evaluated one after the other, and the drivers declaring a non thread-safe status method are evaluated serially. Set to ``1`` to disable concurrent status evaluations."
+    },
     {
         "section": "node",
         "keyword": "allowed_networks",
@@ -564,6 +585,20 @@
         "default": False,
         "text": "If set to ``true``, and if the execution context indicates a scheduled run, execute :cmd:`om node updatecomp` upon :cmd:`om node compliance check`. This toggle helps keep the compliance modules in sync with the reference repository. Beware of the security impact of this setting: you must be careful your module repository is kept secure."
     },
+    {
+        "section": "compliance",
+        "keyword": "max_parallel",
+        "convert": "integer",
+        "default": 4,
+        "text": "The maximum number of compliance modules with the same ordering number executed in parallel. The modules with a lower ordering number are all done before the next ordering number modules start. Set to ``1`` to run the modules sequentially."
+    },
+    {
+        "section": "compliance",
+        "keyword": "parallel_fix",
+        "convert": "boolean",
+        "default": False,
+        "text": "If set to ``true``, allow the :c-action:`compliance fix` and :c-action:`compliance auto` actions to execute the modules with the same ordering number in parallel. The check actions always run in parallel, as allowed by :kw:`compliance.max_parallel`."
+    },
     {
         "section": "stats",
         "keyword": "schedule",
@@ -577,6 +612,13 @@
         "example": "blockdev, mem_u",
         "text": "Disable push for a stats group (mem_u, cpu, proc, swap, netdev, netdev_err, block, blockdev, fs_u)."
     },
+    {
+        "section": "stats",
+        "keyword": "sample_interval",
+        "convert": "duration",
+        "default": 60,
+        "text": "A duration expression, like ``10s``, defining the interval between two samples of the node metrics by the daemon sampler thread. Set to ``0`` to disable the sampler, in which case :c-action:`pushstats` falls back to the sar data. The sampler is only implemented for Linux."
+    },
     {
         "section": "checks",
         "keyword": "schedule",
@@ -682,6 +724,20 @@
         "default": 1214,
         "text": """The port the daemon raw listener must listen on. In pull action mode, the collector sends a tcp packet to the server to notify there are actions to unqueue. The opensvc daemon executes the :c-action:`dequeue actions` node action upon receive. The :kw:`listener.port` parameter is sent to the collector upon :c-action:`pushasset`. The collector uses this port to notify the node."""
     },
+    {
+        "section": "listener",
+        "keyword": "max_workers",
+        "convert": "integer",
+        "default": 64,
+        "text": "The maximum number of threads executing the listener client requests. The idle client connections and the events subscriptions do not hold a thread. The requests that can wait for a long time, like the wait, sync, lock, unlock, node drain and daemon shutdown requests, are executed in dedicated threads not counted in this limit, so slow clients can not exhaust the pool."
+    },
+    {
+        "section": "listener",
+        "keyword": "multiplex_timeout",
+        "convert": "duration",
+        "default": 60,
+        "text": "A duration expression, like ``30s``, defining how long the listener waits for the peer nodes results of a multiplexed request. The peers not responding in time are reported with a timeout error, along with the results of the other nodes."
+    },
     {
         "section": "listener",
         "keyword": "openid_well_known",
@@ -880,6 +936,14 @@
         "default": 10000,
         "text": "The port for each node to send to or listen on."
     },
+    {
+        "section": "hb",
+        "keyword": "binary",
+        "rtype": "unicast",
+        "convert": "boolean",
+        "default": True,
+        "text": "If set to true, send the heartbeat messages to the peers supporting it as compact binary frames, instead of base64-encoded data in a json envelope. Peers running an agent not supporting binary frames are still sent json envelopes."
+    },
     {
         "section": "hb",
         "keyword": "timeout",
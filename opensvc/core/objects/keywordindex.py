@@ -0,0 +1,196 @@
+"""
+The per-node index of the object keywords most used in selector
+expressions, like "app=foo" or "nodes~=n1".
+
+The evaluated values of the indexed keywords of all the local objects are
+stored in a single json file, so these selectors are evaluated without
+building the objects. Each entry records the mtime of the object config
+file it was evaluated from, and is ignored once the file has changed. The
+whole index is ignored when the node or cluster config changes, as the
+evaluated values can reference them.
+
+The entries are updated on object config commit, and by the selector
+implementations when they have to build an object anyway.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from env import Env
+from utilities.files import makedirs
+from utilities.naming import svc_pathcf
+from utilities.selector import selector_value_match
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_VERSION = 1
+
+# the indexed DEFAULT section keywords
+KEYWORDS = ("app", "env", "topology", "nodes", "tags")
+
+
+def index_keyword(param):
+    """
+    Return the indexed keyword a selector <param> refers to, or None if
+    the param is not indexed.
+    """
+    if param.startswith("DEFAULT."):
+        param = param[8:]
+    if param in KEYWORDS:
+        return param
+    return None
+
+
+def mtime(fpath):
+    try:
+        return os.stat(fpath).st_mtime
+    except OSError:
+        return
+
+
+class KeywordIndex(object):
+    def __init__(self, var_d=None):
+        self.var_d = var_d or Env.paths.pathvar
+        self.fpath = os.path.join(self.var_d, "keyword_index.json")
+        self.fpath_lock = os.path.join(self.var_d, "keyword_index.lock")
+        self.lock = threading.RLock()
+        self.data = None
+        self.sig = None
+        self.deps = None
+        self.pending = {}
+
+    @staticmethod
+    def current_deps():
+        return [mtime(Env.paths.nodeconf), mtime(Env.paths.clusterconf)]
+
+    @staticmethod
+    def file_sig(fpath):
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            return
+        return st.st_ino, st.st_size, st.st_mtime
+
+    def load(self):
+        """
+        Load the index, unless the in-memory data is current.
+        """
+        deps = self.current_deps()
+        if self.data is not None and self.file_sig(self.fpath) == self.sig and deps == self.deps:
+            return
+        self.deps = deps
+        self.data = self.read()
+
+    def read(self):
+        self.sig = self.file_sig(self.fpath)
+        if self.sig is None:
+            return {}
+        try:
+            with open(self.fpath, "r") as ofile:
+                data = json.load(ofile)
+            if data["version"] != INDEX_VERSION or data["deps"] != self.deps:
+                return {}
+            return data["objects"]
+        except (ValueError, KeyError, TypeError, IOError, OSError):
+            return {}
+
+    def match(self, path, param, op, value):
+        """
+        Return True if the <param> keyword of the <path> object matches the
+        <op> <value> selector expression, like selector_config_match() does.
+        Raise KeyError if the keyword is not indexed, or the object entry
+        is missing or outdated.
+        """
+        keyword = index_keyword(param)
+        if keyword is None:
+            raise KeyError(param)
+        with self.lock:
+            self.load()
+            entry = self.data[path]
+        if entry["mtime"] != mtime(svc_pathcf(path)):
+            raise KeyError(path)
+        current = entry["values"].get(keyword)
+        if current is not None:
+            return bool(selector_value_match(current, op, value))
+        if keyword != param:
+            # DEFAULT.<keyword>
+            return False
+        # a keyword with no value matches the ":" operator if the object
+        # has sections of the same name, like app#1 for "app:"
+        return op == ":" and keyword in entry["groups"]
+
+    def update(self, svc):
+        """
+        Evaluate the indexed keywords of the <svc> object and queue its
+        index entry for the next save().
+        """
+        cf_mtime = mtime(svc.paths.cf)
+        if cf_mtime is None:
+            return
+        values = {}
+        for keyword in KEYWORDS:
+            try:
+                value = svc._get(keyword, evaluate=True)
+            except Exception:
+                value = None
+            if isinstance(value, (set, tuple)):
+                value = sorted(value)
+            values[keyword] = value
+        groups = sorted(set([section.split("#")[0] for section in svc.conf_sections()]))
+        entry = {"mtime": cf_mtime, "values": values, "groups": groups}
+        with self.lock:
+            self.load()
+            self.data[svc.path] = entry
+            self.pending[svc.path] = entry
+
+    def save(self):
+        """
+        Merge the queued entries into the on-disk index, and atomically
+        replace the index file.
+        """
+        with self.lock:
+            if not self.pending:
+                return
+            with self.flock():
+                self.deps = self.current_deps()
+                data = self.read()
+                data.update(self.pending)
+                self.pending = {}
+                self.write(data)
+                self.data = data
+
+    def write(self, data):
+        tmpfpath = self.fpath + ".%d.tmp" % os.getpid()
+        try:
+            makedirs(self.var_d)
+            with open(tmpfpath, "w") as ofile:
+                json.dump({"version": INDEX_VERSION, "deps": self.deps, "objects": data}, ofile)
+            os.rename(tmpfpath, self.fpath)
+        except (IOError, OSError):
+            return
+        self.sig = self.file_sig(self.fpath)
+
+    @contextmanager
+    def flock(self):
+        """
+        Serialize the read-modify-write sequences of the processes sharing
+        the index.
+        """
+        if fcntl is None:
+            yield
+            return
+        try:
+            makedirs(self.var_d)
+            fd = os.open(self.fpath_lock, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            yield
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
@@ -23,11 +23,14 @@
 from core.extconfig import ExtConfigMixin
 from core.freezer import Freezer
 from core.node import Node
+from core.objects.keywordindex import KeywordIndex
 from core.objects.pg import PgMixin
 from core.resource import Resource
 from core.resourceset import ResourceSet
+from core.resourcestatus import ResourceStatusStore
 from core.scheduler import SchedOpts, Scheduler, sched_action
 from env import Env, Paths
+from utilities.concurrent_futures import get_concurrent_futures
 from utilities.converters import *
 from utilities.drivers import driver_import
 from utilities.fcache import fcache
@@ -1022,16 +1025,15 @@ def purge_status_data_dump(self):
         except Exception:
             pass
 
+    @lazy
+    def status_store(self):
+        return ResourceStatusStore(self.var_d, log=self.log)
+
     def purge_status_last(self):
         """
-        Purge all service resources on-disk status caches.
+        Purge all service resources status caches.
         """
-        import glob
-        for fpath in glob.glob(os.path.join(self.var_d, "*#*", "status.last")):
-            try:
-                os.unlink(fpath)
-            except:
-                pass
+        self.status_store.purge()
 
     def published_action(self, action, options):
         if self.volatile:
@@ -2835,6 +2837,11 @@ def post_commit(self):
         self.unset_all_lazy()
         self.sched.reconfigure()
 
+    def update_keyword_index(self):
+        index = KeywordIndex()
+        index.update(self)
+        index.save()
+
     def configure_scheduler(self, *args, **kwargs):
         pass
 
@@ -3726,7 +3733,14 @@ def print_status_data_eval(self, refresh=False, write_data=True, clear_rstatus=F
         """
         Return a structure containing hierarchical status of
         the service.
+
+        The resources status changes are written to the resources status
+        store once, at the end of the evaluation.
         """
+        with self.status_store.batch():
+            return self._print_status_data_eval(refresh=refresh, write_data=write_data, clear_rstatus=clear_rstatus)
+
+    def _print_status_data_eval(self, refresh=False, write_data=True, clear_rstatus=False):
         now = time.time()
 
         if clear_rstatus:
@@ -3840,6 +3854,8 @@ def print_status_data_eval(self, refresh=False, write_data=True, clear_rstatus=F
                     _data["log"] = log
                 if len(info) > 0:
                     _data["info"] = info
+                if resource.last_status_duration is not None:
+                    _data["status_duration"] = resource.last_status_duration
                 if len(tags) > 0:
                     _data["tags"] = tags
                 if not disable and not resource.skip_unprovision and not resource.skip_provision:
@@ -3866,15 +3882,31 @@ def print_status_data_eval(self, refresh=False, write_data=True, clear_rstatus=F
             self.write_status_data(data)
         return data
 
+    @lazy
+    def status_workers(self):
+        return self.get_node().oget("node", "status_workers")
+
     def get_rset_status(self, groups, refresh=False):
         """
         Return the aggregated status of all resources of the specified resource
         sets, as a dict of status indexed by resourceset id.
+
+        The resource sets are evaluated one after the other. If the
+        node.status_workers keyword allows, the resources of a set are
+        evaluated concurrently.
         """
         self.setup_environ()
         rsets_status = {}
-        for rset in self.get_resourcesets(groups):
-            rsets_status[rset.rid] = rset.status(refresh=refresh)
+        rsets = self.get_resourcesets(groups)
+        with self.status_store.batch():
+            if self.status_workers < 2 or sum(len(rset.resources) for rset in rsets) < 2:
+                for rset in rsets:
+                    rsets_status[rset.rid] = rset.status(refresh=refresh)
+                return rsets_status
+            concurrent_futures = get_concurrent_futures()
+            with concurrent_futures.ThreadPoolExecutor(max_workers=self.status_workers) as executor:
+                for rset in rsets:
+                    rsets_status[rset.rid] = rset.status(executor=executor, refresh=refresh)
         return rsets_status
 
     def need_encap_resource_monitor(self):
@@ -3901,7 +3933,7 @@ def resource_monitor(self):
         data = self.print_status_data_eval(write_data=False)
         dataset.set([], data)
         diff = dataset.pop_diff()
-        significant_changes = [change for change in diff if change[0][-1] not in ("updated", "csum")]
+        significant_changes = [change for change in diff if change[0][-1] not in ("updated", "csum", "status_duration")]
         if significant_changes:
             self.log.debug("changes detected in monitored resources: %s", significant_changes)
             self.write_status_data(data)
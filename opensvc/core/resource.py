@@ -34,8 +34,6 @@
     "disk.radoslock",
 ]
 
-MAX_STATUS_HISTORY = 100
-
 class Resource(object):
     """
     Resource drivers parent class
@@ -44,6 +42,11 @@ class Resource(object):
     refresh_provisioned_on_provision = False
     refresh_provisioned_on_unprovision = False
 
+    # False for drivers whose status evaluation changes process-wide
+    # state (environment, cwd, ...), so it must not run concurrently
+    # with other resources status evaluations.
+    status_thread_safe = True
+
     def __init__(self,
                  rid=None,
                  type=None,
@@ -99,6 +102,7 @@ def __init__(self,
         self.driver_basename = self.format_driver_basename()
         self.rset_id = self.format_rset_id()
         self.last_status_info = {}
+        self.last_status_duration = None
 
     def on_add(self):
         """
@@ -548,9 +552,11 @@ def status(self, **kwargs):
         # now the rstatus can no longer be None
         if self.rstatus == core.status.UNDEF or refresh:
             self.status_logs = []
+            begin = time.time()
             self.rstatus = self.try_status(verbose)
             self.rstatus = self.status_stdby(self.rstatus)
             self.last_status_info = self.status_info()
+            self.last_status_duration = round(time.time() - begin, 3)
             self.log.debug("refresh status: %s => %s",
                            core.status.Status(last_status),
                            core.status.Status(self.rstatus))
@@ -564,33 +570,21 @@ def status(self, **kwargs):
 
     def write_status(self):
         """
-        Helper method to janitor resource status cache and history in files.
+        Helper method to janitor resource status cache and history in the
+        object resources status store.
         """
         self.write_status_last()
         self.write_status_history()
 
-    @lazy
-    def fpath_status_last(self):
-        """
-        Return the file path for the resource status cache.
-        """
-        return os.path.join(self.var_d, "status.last")
-
-    @lazy
-    def fpath_status_history(self):
-        """
-        Return the file path for the resource status history.
-        """
-        return os.path.join(self.var_d, "status.history")
+    @property
+    def status_store(self):
+        return self.svc.status_store
 
     def purge_status_last(self):
         """
-        Purge the on-disk resource status cache.
+        Purge the resource status cache.
         """
-        try:
-            os.unlink(self.fpath_status_last)
-        except:
-            pass
+        self.status_store.unset(self.rid)
 
     def purge_var_d(self, keep_provisioned=True):
         import glob
@@ -614,28 +608,22 @@ def purge_var_d(self, keep_provisioned=True):
             except OSError:
                 # errno 39: not empty (racing with a writer)
                 pass
+        self.status_store.forget(self.rid)
 
     def has_status_last(self):
-        return os.path.exists(self.fpath_status_last)
+        return self.status_store.get(self.rid) is not None
 
     def load_status_last(self, refresh=False):
         """
-        Fetch the resource status from the on-disk cache.
+        Fetch the resource status from the object resources status store.
         """
-        try:
-            with open(self.fpath_status_last, 'r') as ofile:
-                data = json.load(ofile)
-        except ValueError:
-            return core.status.UNDEF
-        except (OSError, IOError) as exc:
-            if exc.errno != 2:
-                # not EEXISTS
-                self.log.debug(exc)
+        data = self.status_store.get(self.rid)
+        if data is None:
             return core.status.UNDEF
 
         try:
             status = core.status.Status(data["status"])
-        except (IndexError, AttributeError, ValueError) as exc:
+        except (IndexError, KeyError, AttributeError, ValueError) as exc:
             self.log.debug(exc)
             return core.status.UNDEF
 
@@ -646,19 +634,22 @@ def load_status_last(self, refresh=False):
                 attr = "label"
             try:
                 setattr(self, attr, data["label"])
-            except (IndexError, AttributeError, ValueError):
+            except (IndexError, KeyError, AttributeError, ValueError):
                 pass
 
-        self.status_logs = data.get("log", [])
+        self.status_logs = list(data.get("log", []))
 
         if "info" in data:
             self.last_status_info = data["info"]
 
+        self.last_status_duration = data.get("duration")
+
         return status
 
     def write_status_last(self):
         """
-        Write the in-memory resource status to the on-disk cache.
+        Write the in-memory resource status to the object resources status
+        store.
         """
         data = {
             "status": str(core.status.Status(self.rstatus)),
@@ -666,57 +657,18 @@ def write_status_last(self):
             "log": self.status_logs,
             "info": self.last_status_info,
         }
-        dpath = os.path.dirname(self.fpath_status_last)
-        if not os.path.exists(dpath):
-            os.makedirs(dpath, 0o0755)
-        with open(self.fpath_status_last, 'w') as ofile:
-            json.dump(data, ofile)
-            ofile.flush()
+        if self.last_status_duration is not None:
+            data["duration"] = self.last_status_duration
+        self.status_store.set(self.rid, data)
 
     def load_status_history(self):
-        try:
-            with open(self.fpath_status_history, "r") as fp:
-                return json.load(fp)
-        except Exception:
-            return []
+        return self.status_store.get_history(self.rid)
 
     def write_status_history(self):
         """
-        Log a change to the resource status history file.
+        Log a change to the resource status history.
         """
-        tmpfpath = self.fpath_status_history + ".tmp"
-        data = self.load_status_history()
-        try:
-            last = data[-1]["status"]
-        except IndexError:
-            last = None
-        except KeyError:
-            # corrupted => reset
-            self.log.warning("reset corrupted status history. last entry: %s", data[-1])
-            data = []
-            last = None
-
-        current = core.status.Status(self.rstatus)
-        if current == last:
-            # no change
-            return
-
-        # purge history
-        trim = len(data) - MAX_STATUS_HISTORY - 1
-        if trim > 0:
-            data = data[trim:]
-
-        data.append({
-            "ts": time.time(),
-            "status": str(current),
-        })
-        try:
-            with open(tmpfpath, "w") as fp:
-                json.dump(data, fp)
-            import shutil
-            shutil.move(tmpfpath, self.fpath_status_history)
-        except Exception as exc:
-            self.log.error("write_status_history: %s", exc)
+        self.status_store.append_history(self.rid, str(core.status.Status(self.rstatus)))
 
     def status_log(self, text, level="warn"):
         """
@@ -1492,6 +1444,7 @@ def clear_status_cache(self):
         self.rstatus = None
         self.status_logs = []
         self.last_status_info = {}
+        self.last_status_duration = None
 
 class DataResource(Resource):
     def __init__(self, rid, type="data", **kwargs):
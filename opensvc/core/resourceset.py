@@ -139,29 +139,45 @@ def is_disabled(self):
             return self.svc.disabled
         return self.disabled
 
-    def status(self, **kwargs):
+    def status(self, executor=None, **kwargs):
         """
         Return the aggregate status a ResourceSet.
+
+        If an <executor> is passed, the status of the resources declaring a
+        thread-safe status method are evaluated concurrently by its
+        workers, then the other resources are evaluated serially.
         """
-        agg_status = core.status.Status()
+        resources = []
         for resource in self.resources:
             if resource.is_disabled():
                 continue
             if not self.svc.encap and resource.encap:
                 # don't evaluate encap service resources
                 continue
+            resources.append(resource)
 
-            try:
-                status = resource.status(**kwargs)
-            except:
-                import traceback
-                exc = sys.exc_info()
-                print(exc[0], exc[1], traceback.print_tb(exc[2]))
-                status = core.status.NA
-
-            agg_status += status
+        agg_status = core.status.Status()
+        if executor and len(resources) > 1:
+            futures = [executor.submit(self.resource_status, resource, **kwargs)
+                       for resource in resources if resource.status_thread_safe]
+            for future in futures:
+                agg_status += future.result()
+            resources = [resource for resource in resources if not resource.status_thread_safe]
+
+        for resource in resources:
+            agg_status += self.resource_status(resource, **kwargs)
         return agg_status.status
 
+    @staticmethod
+    def resource_status(resource, **kwargs):
+        try:
+            return resource.status(**kwargs)
+        except:
+            import traceback
+            exc = sys.exc_info()
+            print(exc[0], exc[1], traceback.print_tb(exc[2]))
+            return core.status.NA
+
     @staticmethod
     def tag_match(rtags, keeptags):
         """
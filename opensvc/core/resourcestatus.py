@@ -0,0 +1,379 @@
+"""
+The per-object resource status store.
+
+The last evaluated status of all the resources of an object are stored in
+a single json file, atomically replaced on change. The status changes
+history is stored in an append-only log of json lines, compacted to the
+last MAX_STATUS_HISTORY entries per resource when it grows too large.
+
+The store replaces the per-resource status.last and status.history files,
+which are imported and removed on first load.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utilities.files import makedirs
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAX_STATUS_HISTORY = 100
+STORE_VERSION = 1
+
+
+class ResourceStatusStore(object):
+    def __init__(self, var_d, log=None):
+        self.var_d = var_d
+        self.log = log
+        self.fpath = os.path.join(var_d, "resources_status.json")
+        self.fpath_history = os.path.join(var_d, "resources_status.history")
+        self.fpath_lock = os.path.join(var_d, "resources_status.lock")
+        self.lock = threading.RLock()
+        self.data = None
+        self.sig = None
+        self.pending = {}
+        self.batch_depth = 0
+        self.history = None
+        self.history_sig = None
+        self.history_lines = 0
+        self.history_pending = []
+
+    #
+    # last status
+    #
+    def get(self, rid):
+        """
+        Return the last status data of the <rid> resource, or None.
+        """
+        with self.lock:
+            self.load()
+            return self.data.get(rid)
+
+    def set(self, rid, data):
+        with self.lock:
+            self.load()
+            self.data[rid] = data
+            self.pending[rid] = data
+            self.flush_unless_batch()
+
+    def unset(self, rid):
+        with self.lock:
+            self.load()
+            if rid not in self.data and rid not in self.pending:
+                return
+            self.data.pop(rid, None)
+            self.pending[rid] = None
+            self.flush_unless_batch()
+
+    def purge(self):
+        """
+        Drop the last status of all resources, keeping the history.
+        """
+        with self.lock:
+            self.load()
+            for rid in self.data:
+                self.pending[rid] = None
+            self.data = {}
+            self.flush_unless_batch()
+
+    @contextmanager
+    def batch(self):
+        """
+        A context manager deferring the store writes to the exit of the
+        outermost batch, so a status pass writes the store once.
+        """
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                self.flush_unless_batch()
+
+    def flush_unless_batch(self):
+        if self.batch_depth > 0:
+            return
+        if self.pending:
+            self.flush()
+        if self.history_pending:
+            self.flush_history()
+
+    def file_sig(self, fpath):
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            return
+        return st.st_ino, st.st_size, st.st_mtime
+
+    def load(self):
+        """
+        Load the store, unless the in-memory data is current or has
+        changes not written yet.
+        """
+        if self.data is not None and (self.pending or self.file_sig(self.fpath) == self.sig):
+            return
+        first = self.data is None
+        data = self.read()
+        if data is not None:
+            self.data = data
+            return
+        self.sig = None
+        self.data = {}
+        if first:
+            self.migrate()
+
+    def read(self):
+        """
+        Return the resources status data read from the store file, or None
+        if the file does not exist.
+        """
+        sig = self.file_sig(self.fpath)
+        if sig is None:
+            return
+        try:
+            with open(self.fpath, "r") as ofile:
+                data = json.load(ofile)
+            data = data["resources"]
+        except (ValueError, KeyError, TypeError, IOError, OSError) as exc:
+            self.log_debug("reset unreadable resources status store: %s", exc)
+            data = {}
+        self.sig = sig
+        return data
+
+    def flush(self):
+        """
+        Merge the pending changes into the on-disk store and atomically
+        replace the store file.
+        """
+        with self.flock():
+            data = self.read()
+            if data is None:
+                data = {}
+            for rid, rdata in self.pending.items():
+                if rdata is None:
+                    data.pop(rid, None)
+                else:
+                    data[rid] = rdata
+            self.pending = {}
+            self.data = data
+            self.write(data)
+
+    def write(self, data):
+        tmpfpath = self.fpath + ".%d.tmp" % os.getpid()
+        try:
+            makedirs(self.var_d)
+            with open(tmpfpath, "w") as ofile:
+                json.dump({"version": STORE_VERSION, "resources": data}, ofile)
+            os.rename(tmpfpath, self.fpath)
+        except (IOError, OSError) as exc:
+            self.log_error("write resources status store: %s", exc)
+            return
+        self.sig = self.file_sig(self.fpath)
+
+    @contextmanager
+    def flock(self):
+        """
+        Serialize the read-modify-write sequences of the processes sharing
+        the store.
+        """
+        if fcntl is None:
+            yield
+            return
+        try:
+            makedirs(self.var_d)
+            fd = os.open(self.fpath_lock, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            yield
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    #
+    # history
+    #
+    def get_history(self, rid):
+        """
+        Return the status history entries of the <rid> resource, oldest
+        first.
+        """
+        with self.lock:
+            self.load_history()
+            return list(self.history.get(rid, []))
+
+    def append_history(self, rid, status, ts=None):
+        """
+        Log a status change of the <rid> resource, unless the status is
+        the same as the last logged one.
+        """
+        with self.lock:
+            self.load_history()
+            entries = self.history.setdefault(rid, [])
+            if entries and entries[-1]["status"] == status:
+                return
+            entry = {"ts": ts or time.time(), "status": status}
+            entries.append(entry)
+            if len(entries) > MAX_STATUS_HISTORY:
+                del entries[:-MAX_STATUS_HISTORY]
+            self.history_pending.append(dict(entry, rid=rid))
+            self.flush_unless_batch()
+
+    def flush_history(self):
+        """
+        Append the pending history entries to the history log, compacting
+        the log if it grew too large.
+        """
+        lines = self.history_pending
+        self.history_pending = []
+        # the compaction of another process must not rewrite the log
+        # between its read and our append
+        with self.flock():
+            try:
+                makedirs(self.var_d)
+                with open(self.fpath_history, "a") as ofile:
+                    ofile.write("".join(json.dumps(line) + "\n" for line in lines))
+            except (IOError, OSError) as exc:
+                self.log_error("append resources status history: %s", exc)
+                return
+            self.history_lines += len(lines)
+            self.history_sig = self.file_sig(self.fpath_history)
+        if self.history_lines > self.history_max_lines():
+            self.compact_history()
+
+    def forget(self, rid):
+        """
+        Drop the last status and the history of the <rid> resource.
+        """
+        with self.lock:
+            self.unset(rid)
+            self.history_pending = [line for line in self.history_pending if line["rid"] != rid]
+            if self.history_pending:
+                self.flush_history()
+            self.load_history()
+            if rid in self.history:
+                self.compact_history(exclude=[rid])
+
+    def history_max_lines(self):
+        return 2 * MAX_STATUS_HISTORY * max(len(self.history), 1)
+
+    def load_history(self):
+        sig = self.file_sig(self.fpath_history)
+        if self.history is not None and (self.history_pending or sig == self.history_sig):
+            return
+        history = {}
+        lines = 0
+        try:
+            with open(self.fpath_history, "r") as ofile:
+                for line in ofile:
+                    try:
+                        entry = json.loads(line)
+                        rid = entry.pop("rid")
+                    except (ValueError, KeyError, AttributeError, TypeError):
+                        # truncated line, or corrupted
+                        continue
+                    history.setdefault(rid, []).append(entry)
+                    lines += 1
+        except (IOError, OSError):
+            pass
+        for entries in history.values():
+            if len(entries) > MAX_STATUS_HISTORY:
+                del entries[:-MAX_STATUS_HISTORY]
+        self.history = history
+        self.history_lines = lines
+        self.history_sig = sig
+
+    def compact_history(self, exclude=None):
+        """
+        Rewrite the history log with only the last MAX_STATUS_HISTORY
+        entries of each resource, and without the entries of the <exclude>
+        resources.
+        """
+        with self.flock():
+            self.history = None
+            self.load_history()
+            for rid in exclude or []:
+                self.history.pop(rid, None)
+            entries = []
+            for rid, _entries in self.history.items():
+                entries += [dict(entry, rid=rid) for entry in _entries]
+            entries.sort(key=lambda entry: entry.get("ts", 0))
+            tmpfpath = self.fpath_history + ".%d.tmp" % os.getpid()
+            try:
+                with open(tmpfpath, "w") as ofile:
+                    for entry in entries:
+                        ofile.write(json.dumps(entry) + "\n")
+                os.rename(tmpfpath, self.fpath_history)
+            except (IOError, OSError) as exc:
+                self.log_error("compact resources status history: %s", exc)
+                return
+            self.history_lines = len(entries)
+            self.history_sig = self.file_sig(self.fpath_history)
+
+    #
+    # migration from the per-resource files
+    #
+    def migrate(self):
+        """
+        Import the legacy <var_d>/<rid>/status.last and status.history
+        files in the store, then remove them.
+        """
+        lasts = glob.glob(os.path.join(self.var_d, "*#*", "status.last"))
+        histories = glob.glob(os.path.join(self.var_d, "*#*", "status.history"))
+        if not lasts and not histories:
+            return
+        with self.flock():
+            data = self.read()
+            if data is not None:
+                # migrated by another process
+                self.data = data
+                return
+            data = {}
+            for fpath in lasts:
+                rid = os.path.basename(os.path.dirname(fpath))
+                try:
+                    with open(fpath, "r") as ofile:
+                        data[rid] = json.load(ofile)
+                except (ValueError, IOError, OSError):
+                    continue
+            entries = []
+            for fpath in histories:
+                rid = os.path.basename(os.path.dirname(fpath))
+                try:
+                    with open(fpath, "r") as ofile:
+                        _entries = json.load(ofile)
+                    entries += [dict(entry, rid=rid) for entry in _entries[-MAX_STATUS_HISTORY:]]
+                except (ValueError, IOError, OSError, TypeError):
+                    continue
+            entries.sort(key=lambda entry: entry.get("ts", 0))
+            try:
+                with open(self.fpath_history, "a") as ofile:
+                    for entry in entries:
+                        ofile.write(json.dumps(entry) + "\n")
+            except (IOError, OSError) as exc:
+                self.log_error("migrate resources status history: %s", exc)
+                return
+            self.data = data
+            self.write(data)
+            for fpath in lasts + histories:
+                try:
+                    os.unlink(fpath)
+                except OSError:
+                    pass
+        self.history = None
+
+    def log_debug(self, *args):
+        if self.log:
+            self.log.debug(*args)
+
+    def log_error(self, *args):
+        if self.log:
+            self.log.error(*args)
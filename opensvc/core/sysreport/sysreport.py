@@ -1,5 +1,6 @@
 from __future__ import print_function
 
+import codecs
 import hashlib
 import os
 import sys
@@ -7,18 +8,26 @@
 import shlex
 import glob
 import json
+import threading
+import time
 from stat import *
 from subprocess import *
 
 import foreign.six as six
 import core.exceptions as ex
 from env import Env
+from utilities.concurrent_futures import get_concurrent_futures
 from utilities.proc import which
 
 POSIX = os.name == "posix"
+CHUNK_SIZE = 1024 * 1024
 
 
 class BaseSysReport(object):
+    cmd_workers = 4
+    cmd_timeout = 60
+    timings_max_files = 10
+
     def __init__(self, node=None, collect_d=None, compress=False):
         self.todo = [
             ("INC", os.path.join(Env.paths.pathetc, "*.conf")),
@@ -37,6 +46,10 @@ def __init__(self, node=None, collect_d=None, compress=False):
             self.collect_d = collect_d
         self.collect_cmd_d = os.path.join(self.collect_d, "cmd")
         self.collect_file_d = os.path.join(self.collect_d, "file")
+        self.collect_index = os.path.join(self.collect_d, "index.json")
+        self.index = {}
+        self.new_index = {}
+        self.timings = []
 
         if collect_d is None:
             self.collect_stat = os.path.join(self.collect_file_d, "stat")
@@ -63,6 +76,7 @@ def init(self):
         self.init_dir(self.collect_file_d)
         self.init_dir(self.sysreport_conf_d)
         self.load_stat()
+        self.load_index()
         self.merge_todo()
 
     def init_dir(self, fpath):
@@ -106,6 +120,28 @@ def _load_stat(self):
                 pass
         return stat
 
+    def load_index(self):
+        """
+        Load the collected files index, a dict of source file path to
+        the source file stat signature, the content hash and the
+        collected copy size.
+        """
+        try:
+            with open(self.collect_index, "r") as f:
+                self.index = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.index = {}
+        self.new_index = {}
+
+    def write_index(self):
+        if self.new_index == self.index:
+            return
+        tmpf = self.collect_index + ".tmp"
+        with open(tmpf, "w") as f:
+            json.dump(self.new_index, f, sort_keys=True)
+        os.rename(tmpf, self.collect_index)
+        self.index = self.new_index
+
     def write_stat(self, force=False):
         if not force and not self.stat_changed:
             return
@@ -246,6 +282,7 @@ def write(self, fpath, buff):
             self.full.append(fpath)
         elif pbuff is not None:
             self.full.append(fpath)
+        return diff
 
     def get_exe(self, fpath):
         if not os.path.exists(fpath):
@@ -254,7 +291,11 @@ def get_exe(self, fpath):
             raise ValueError("not executable (%s)" % fpath)
         return fpath
 
-    def collect_cmd(self, cmd):
+    def cmd_argv(self, cmd):
+        """
+        Return the argv of the <cmd> command, or None if it can not be
+        executed.
+        """
         l = shlex.split(cmd, posix=POSIX)
         if len(l) == 0:
             print(" err: syntax error", file=sys.stderr)
@@ -266,16 +307,79 @@ def collect_cmd(self, cmd):
         except ValueError as exc:
             print(" err: %s" % str(exc), file=sys.stderr)
             return
-        fname = self.cmdlist2fname(l)
-        cmd_d = os.path.join(self.collect_cmd_d, fname)
+        return l
+
+    def run_cmd(self, l):
+        """
+        Run the <l> argv, killing it after <cmd_timeout> seconds.
+        Return the output, or None on timeout.
+        """
         p = Popen(l, stdout=PIPE, stderr=STDOUT, close_fds=POSIX)
-        out, err = p.communicate()
+        killed = []
+
+        def kill():
+            killed.append(True)
+            try:
+                p.kill()
+            except OSError:
+                pass
+
+        timer = threading.Timer(self.cmd_timeout, kill)
+        timer.start()
+        try:
+            out, err = p.communicate()
+        finally:
+            timer.cancel()
+        if killed:
+            return
         if six.PY3:
             out = out.decode("utf-8")
-        self.write(os.path.join(cmd_d), out)
+        return out
 
-    def get_stat(self, fpath):
-        st = os.stat(fpath)
+    def collect_cmd(self, cmd):
+        self.collect_cmds([cmd])
+
+    def collect_cmds(self, cmds):
+        """
+        Run the commands in a pool of <cmd_workers> threads, and store
+        their output in the commands order.
+        """
+        todo = []
+        for cmd in cmds:
+            l = self.cmd_argv(cmd)
+            if l is not None:
+                todo.append((cmd, l))
+        if not todo:
+            return
+
+        def run(l):
+            begin = time.time()
+            out = self.run_cmd(l)
+            return out, time.time() - begin
+
+        concurrent_futures = get_concurrent_futures()
+        with concurrent_futures.ThreadPoolExecutor(max_workers=self.cmd_workers) as executor:
+            futures = [(cmd, l, executor.submit(run, l)) for cmd, l in todo]
+            for cmd, l, future in futures:
+                try:
+                    out, duration = future.result()
+                except OSError as exc:
+                    print(" err: %s: %s" % (cmd, exc), file=sys.stderr)
+                    continue
+                cmd_d = os.path.join(self.collect_cmd_d, self.cmdlist2fname(l))
+                if out is None:
+                    print(" err: %s: timeout (%s seconds)" % (cmd, self.cmd_timeout), file=sys.stderr)
+                    self.timings.append(("cmd", cmd, duration, "timeout"))
+                    if os.path.exists(cmd_d):
+                        # keep the previous output
+                        self.full.append(cmd_d)
+                    continue
+                changed = self.write(cmd_d, out)
+                self.timings.append(("cmd", cmd, duration, "changed" if changed else "unchanged"))
+
+    def get_stat(self, fpath, st=None):
+        if st is None:
+            st = os.stat(fpath)
         stat = {
             "fpath": fpath,
             "realpath": os.path.realpath(fpath),
@@ -289,10 +393,10 @@ def get_stat(self, fpath):
         }
         return stat
 
-    def push_stat(self, fpath):
+    def push_stat(self, fpath, st=None):
         if self.collect_stat is None:
             return
-        stat = self.get_stat(fpath)
+        stat = self.get_stat(fpath, st=st)
         cached_stat = self.stat.get(fpath)
         if cached_stat is None:
             self.stat[fpath] = stat
@@ -337,7 +441,42 @@ def _digest_secret(self, name, data):
             data = data.replace(secret, secret_md5)
         return data
 
+    @staticmethod
+    def file_sig(st):
+        return [st.st_size, st.st_mtime, st.st_ctime, st.st_ino]
+
+    @staticmethod
+    def hash_file(fpath):
+        """
+        Return the md5 hexdigest of the <fpath> content, read by chunks,
+        and True if the content is not utf-8 text.
+        """
+        digest = hashlib.md5()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        binary = False
+        with open(fpath, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                if not binary:
+                    try:
+                        decoder.decode(chunk)
+                    except UnicodeDecodeError:
+                        binary = True
+        return digest.hexdigest(), binary
+
     def collect_file(self, fpath):
+        """
+        Copy <fpath> to the collect dir if its content changed since the
+        last collection.
+
+        The files with the same stat signature as indexed on the last
+        collection are not read. The others are hashed, and copied only
+        if their content hash changed.
+        """
+        begin = time.time()
         if not os.path.exists(fpath):
             return
         if os.path.islink(fpath):
@@ -351,30 +490,60 @@ def collect_file(self, fpath):
         if not os.path.exists(dst_d):
             os.makedirs(dst_d)
 
-        self.push_stat(fpath)
+        st = os.stat(fpath)
+        self.push_stat(fpath, st=st)
+        sig = self.file_sig(st)
+        try:
+            dst_size = os.stat(dst_f).st_size
+        except OSError:
+            dst_size = None
+        entry = self.index.get(fpath)
+        if entry and dst_size is not None and entry["sig"] == sig and entry["dst_size"] == dst_size:
+            self.new_index[fpath] = entry
+            self.full.append(dst_f)
+            self.timings.append(("file", fpath, time.time() - begin, "unchanged"))
+            return
 
+        buff = None
         try:
-            with open(fpath, 'r') as f:
-                buff = f.read()
-                if fpath.endswith('cluster.conf'):
-                    buff = self._digest_secret('cluster.conf', buff)
-            with open(dst_f, 'r') as f:
-                pbuff = f.read()
-            if buff != pbuff:
-                self.changed.append(dst_f)
+            if fpath.endswith('cluster.conf'):
+                with open(fpath, 'r') as f:
+                    buff = self._digest_secret('cluster.conf', f.read())
+                digest = hashlib.md5(buff.encode("utf-8")).hexdigest()
+                binary = False
+            else:
+                digest, binary = self.hash_file(fpath)
         except IOError:
-            # in doubt, send ... git will know better on the collector
-            self.changed.append(dst_f)
-        except UnicodeDecodeError:
-            # binary file: skip
-            pass
-        shutil.copy2(fpath, dst_f)
-        if dst_f.endswith('cluster.conf'):
-            with open(dst_f, 'r') as src:
-                cluster_conf = src.read()
-            with open(dst_f, 'w') as dst:
-                dst.write(self._digest_secret('cluster.conf', cluster_conf))
+            return
+        if dst_size is None:
+            prev_digest = None
+        elif entry and entry["dst_size"] == dst_size:
+            prev_digest = entry["hash"]
+        else:
+            # not indexed: compare to the collected copy content
+            try:
+                prev_digest = self.hash_file(dst_f)[0]
+            except IOError:
+                prev_digest = None
+
+        if digest != prev_digest:
+            if buff is None:
+                shutil.copy2(fpath, dst_f)
+            else:
+                with open(dst_f, 'w') as dst:
+                    dst.write(buff)
+            if not binary:
+                self.changed.append(dst_f)
+            state = "changed"
+        else:
+            state = "unchanged"
+        self.new_index[fpath] = {
+            "sig": sig,
+            "hash": digest,
+            "dst_size": os.stat(dst_f).st_size,
+        }
         self.full.append(dst_f)
+        self.timings.append(("file", fpath, time.time() - begin, state))
 
     def delete_collected(self, fpaths):
         for fpath in fpaths:
@@ -411,8 +580,25 @@ def collect(self):
         print("collect directory is", self.collect_d)
         for fpath in self.files:
             self.collect_file(fpath)
-        for cmd in self.cmds:
-            self.collect_cmd(cmd)
+        self.write_index()
+        self.collect_cmds(sorted(self.cmds))
+        self.timings_report()
+
+    def timings_report(self):
+        """
+        Print the commands durations and the slowest files collections.
+        """
+        files = [t for t in self.timings if t[0] == "file"]
+        cmds = [t for t in self.timings if t[0] == "cmd"]
+        if files:
+            changed = len([t for t in files if t[3] == "changed"])
+            print("files: %d collected, %d changed, %.2fs" % (len(files), changed, sum([t[2] for t in files])))
+            for _, fpath, duration, state in sorted(files, key=lambda x: -x[2])[:self.timings_max_files]:
+                print("  %8.3fs %-9s %s" % (duration, state, fpath))
+        if cmds:
+            print("commands: %d collected, %.2fs" % (len(cmds), sum([t[2] for t in cmds])))
+            for _, cmd, duration, state in sorted(cmds, key=lambda x: -x[2]):
+                print("  %8.3fs %-9s %s" % (duration, state, cmd))
 
     def deleted_report(self):
         print("files deleted:")
@@ -24,6 +24,10 @@ def reset(self):
         self.last_config = {}
         self.last_status = {}
         self.last_status_changed = set()
+        self.last_status_refs = {}
+        self.resync_needed = False
+        self.slaves = {}
+        self.parents = {}
 
     def run(self):
         self.set_tid()
@@ -43,29 +47,27 @@ def run(self):
 
     def get_last_status(self, data):
         """
-        Identify changes in data
+        Identify changes in data.
+
+        The instances status structures are shared with the daemon status
+        data, which replaces them on change, so the instances with the same
+        structure as the previous pass are skipped.
         """
         last_status = {}
         last_status_changed = set()
+        last_status_refs = {}
 
-        def add_parents(_path, done=None):
+        def add_parents(_path):
             """
             Propagate change to the service parents
             """
-            if done is None:
-                done = []
-            if _path in done:
-                # break recursion loop
-                return
-            for nodename, ndata in data["nodes"].items():
-                for path, sdata in ndata.get("services", {}).get("status", {}).items():
-                    slaves = sdata.get("slaves", []) + sdata.get("scaler_slaves", [])
-                    if _path not in slaves:
-                        continue
+            todo = [_path]
+            while todo:
+                for path in self.parents.get(todo.pop(), {}):
                     if path in last_status_changed:
                         continue
                     last_status_changed.add(path)
-                    add_parents(path, done=done+[_path])
+                    todo.append(path)
 
         for path, nodename in self.last_status:
             if path is None:
@@ -76,6 +78,7 @@ def add_parents(_path, done=None):
                 # instance disappeared
                 if data["nodes"].get(nodename, {}).get("services", {}).get("status", {}).get(path) is None:
                     last_status_changed |= set([path, path+"@"+nodename])
+                    self.set_slaves(path, nodename, None)
 
         for nodename, ndata in data["nodes"].items():
             # detect node frozen changes
@@ -87,19 +90,51 @@ def add_parents(_path, done=None):
 
             # detect instances status changes
             for path, sdata in ndata.get("services", {}).get("status", {}).items():
+                key = (path, nodename)
+                last_status_refs[key] = sdata
+                if sdata is self.last_status_refs.get(key) and key in self.last_status:
+                    last_status[key] = self.last_status[key]
+                    continue
                 status_csum = sdata.get("csum", "") + \
                     str(sdata.get("monitor", {}).get("status_updated")) + \
                     str(sdata.get("monitor", {}).get("global_status_updated"))
-                prev_status_csum = self.last_status.get((path, nodename))
+                self.set_slaves(path, nodename, sdata.get("slaves", []) + sdata.get("scaler_slaves", []))
+                prev_status_csum = self.last_status.get(key)
                 if status_csum != prev_status_csum:
                     last_status_changed.add(path+"@"+nodename)
                     if path not in last_status_changed:
                         last_status_changed.add(path)
                         add_parents(path)
-                last_status[(path, nodename)] = status_csum
+                last_status[key] = status_csum
 
+        self.last_status_refs = last_status_refs
         return last_status, last_status_changed
 
+    def set_slaves(self, path, nodename, slaves):
+        """
+        Update the slave to parents index with the <slaves> of the <path>
+        instance on <nodename>. A None <slaves> drops the instance from the
+        index.
+        """
+        key = (path, nodename)
+        slaves = set(slaves or [])
+        prev = self.slaves.get(key, set())
+        if slaves == prev:
+            return
+        for slave in prev - slaves:
+            nodenames = self.parents[slave][path]
+            nodenames.discard(nodename)
+            if not nodenames:
+                del self.parents[slave][path]
+            if not self.parents[slave]:
+                del self.parents[slave]
+        for slave in slaves - prev:
+            self.parents.setdefault(slave, {}).setdefault(path, set()).add(nodename)
+        if slaves:
+            self.slaves[key] = slaves
+        else:
+            self.slaves.pop(key, None)
+
     def config_sent_file(self, path):
         return os.path.join(svc_pathvar(path), "config_sent.json")
 
@@ -206,17 +241,86 @@ def send_service_config(self, path, csum):
             except Exception as exc:
                 self.log.warning("writing config sent persistent cache file: %s", exc)
 
-    def send_daemon_status(self, data):
-        if self.last_status_changed:
-            self.log.info("send daemon status, %d changes", len(self.last_status_changed))
-        else:
+    def send_daemon_status(self, data, resync=False):
+        """
+        Send the daemon status to the collector.
+
+        If the collector supports it, only the data of the changed nodes
+        and objects is sent, unless a <resync> is requested, nothing was
+        sent yet or the last send failed.
+
+        Return True if the collector received the data.
+        """
+        if resync or self.resync_needed or self.last_comm is None or not self.last_status_changed:
+            fn = "push_daemon_status"
             self.log.info("send daemon status, resync")
+        elif "push_daemon_status_delta" in shared.NODE.collector.proxy_methods:
+            fn = "push_daemon_status_delta"
+            data = self.get_delta(data, self.last_status_changed)
+            self.log.info("send daemon status delta, %d changes", len(self.last_status_changed))
+        else:
+            fn = "push_daemon_status"
+            self.log.info("send daemon status, %d changes", len(self.last_status_changed))
         try:
-            shared.NODE.collector.call("push_daemon_status", data, list(self.last_status_changed))
+            shared.NODE.collector.call(fn, data, list(self.last_status_changed))
+            sent = True
         except Exception as exc:
-            self.log.error("call push_daemon_status: %s", exc)
+            self.log.error("call %s: %s", fn, exc)
             shared.NODE.collector.disable()
+            sent = False
+        # the collector may have missed changes, send the full data next
+        self.resync_needed = not sent
         self.last_comm = time.time()
+        return sent
+
+    @staticmethod
+    def get_delta(data, changes):
+        """
+        Return the subset of the collector daemon status <data> relevant to
+        the <changes>, a set of "<path>", "<path>@<nodename>" and
+        "@<nodename>" change identifiers. The removed instances, nodes and
+        objects are absent from the delta, like they are absent from the
+        full data.
+        """
+        delta = {}
+        for key in data:
+            if key not in ("nodes", "services"):
+                delta[key] = data[key]
+        delta["nodes"] = {}
+        delta["services"] = {}
+
+        def node_delta(nodename):
+            try:
+                return delta["nodes"][nodename]
+            except KeyError:
+                pass
+            ndata = {
+                "frozen": data["nodes"][nodename].get("frozen"),
+                "services": {
+                    "config": {},
+                    "status": {},
+                },
+            }
+            delta["nodes"][nodename] = ndata
+            return ndata
+
+        for change in changes:
+            path, _, nodename = change.partition("@")
+            if not nodename:
+                if path in data["services"]:
+                    delta["services"][path] = data["services"][path]
+                continue
+            if nodename not in data["nodes"]:
+                continue
+            ndata = node_delta(nodename)
+            if not path:
+                continue
+            services = data["nodes"][nodename]["services"]
+            if path not in services["status"]:
+                continue
+            ndata["services"]["status"][path] = services["status"][path]
+            ndata["services"]["config"][path] = services["config"][path]
+        return delta
 
     def ping(self, data):
         self.log.debug("ping the collector")
@@ -224,7 +328,7 @@ def ping(self, data):
             result = shared.NODE.collector.call("daemon_ping")
             if result and result.get("info") == "resync":
                 self.log.info("ping rejected, collector ask for resync")
-                self.send_daemon_status(data)
+                self.send_daemon_status(data, resync=True)
         except Exception as exc:
             self.log.error("call daemon_ping: %s", exc)
             shared.NODE.collector.disable()
@@ -232,13 +336,15 @@ def ping(self, data):
 
     def get_data(self):
         """
-        Get a copy of the monitor thread, expunged from encap services,
-        to avoid missing changes happening during our work
+        Get a snapshot of the monitor thread data, expunged from encap
+        services, to avoid missing changes happening during our work.
+        The returned data shares its structure with the daemon status data,
+        so it must not be modified.
         """
         if "monitor" not in shared.THREADS:
             # the monitor thread is not started
             return
-        data = self.daemon_status_data.get_copy(["monitor"])
+        data = self.daemon_status_data.get_snapshot(["monitor"])
         _data = {
             "cluster_id": self.cluster_id,
             "cluster_name": self.cluster_name,
@@ -301,12 +407,14 @@ def run_collector(self):
             last_status, last_status_changed = self.get_last_status(data)
             now = time.time()
             self.last_status_changed |= last_status_changed
+            # the changes are kept until the collector receives them
             if self.last_comm is None:
-                self.send_daemon_status(data)
+                if self.send_daemon_status(data):
+                    self.last_status_changed = set()
             elif self.last_status_changed:
                 if self.last_comm <= now - self.min_update_interval:
-                    self.send_daemon_status(data)
-                    self.last_status_changed = set()
+                    if self.send_daemon_status(data):
+                        self.last_status_changed = set()
                 else:
                     # avoid storming the collector with daemon status updates
                     #self.log.debug("last daemon status too soon: %d", self.last_comm)
@@ -0,0 +1,116 @@
+"""
+Containers Thread
+
+Keep in memory the containers state of the docker and podman engines,
+refreshed by the engines events, for the container resources status
+evaluations.
+"""
+import logging
+import sys
+import threading
+
+import daemon.shared as shared
+from env import Env
+from utilities.subsystems.docker_api import (DEFAULT_SOCKS, ContainerStates,
+                                             EngineClient, EngineError,
+                                             default_sock, is_sock)
+
+# the delay before watching a new engine socket or resubscribing to the
+# events of a restarted engine
+WATCH_RETRY = 10
+
+
+class Containers(shared.OsvcThread):
+    name = "containers"
+
+    def run(self):
+        self.set_tid()
+        self.log = logging.LoggerAdapter(logging.getLogger(Env.nodename+".osvcd.containers"), {"node": Env.nodename, "component": self.name})
+        self.log.info("containers started")
+        self.enabled = None
+        self.watchers = {}
+        self.reconfigure()
+
+        while True:
+            if self.stopped():
+                self.close()
+                sys.exit(0)
+            try:
+                self.do()
+            except Exception as exc:
+                self.log.exception(exc)
+                self._stop_event.wait(1)
+
+    def status(self, **kwargs):
+        data = shared.OsvcThread.status(self, **kwargs)
+        data["engines"] = {}
+        for sock, (states, _) in self.watchers.items():
+            data["engines"][sock] = {
+                "ready": states.ready,
+                "containers": len(states.data),
+                "events": states.events,
+                "updated": states.updated,
+            }
+        return data
+
+    def reconfigure(self):
+        enabled = shared.NODE.oget("node", "container_events")
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if enabled:
+            self.log.info("watch the container engines events")
+        else:
+            self.log.info("container engines events watch disabled")
+            self.close()
+
+    def do(self):
+        self.reload_config()
+        if self.enabled:
+            for sock in self.engine_socks():
+                self.watch(sock)
+        self.update_status()
+        self._stop_event.wait(WATCH_RETRY)
+
+    @staticmethod
+    def engine_socks():
+        socks = []
+        for sock in [default_sock()] + DEFAULT_SOCKS:
+            if sock not in socks and is_sock(sock):
+                socks.append(sock)
+        return socks
+
+    def watch(self, sock):
+        """
+        Start a thread watching the <sock> engine events, unless already
+        running.
+        """
+        try:
+            _, thr = self.watchers[sock]
+            if thr.is_alive():
+                return
+        except KeyError:
+            pass
+        states = ContainerStates(EngineClient(sock))
+        thr = threading.Thread(target=self.watcher, args=(sock, states))
+        thr.daemon = True
+        self.watchers[sock] = (states, thr)
+        shared.CONTAINER_STATES[sock] = states
+        thr.start()
+
+    def watcher(self, sock, states):
+        try:
+            states.watch()
+            if not states.closed:
+                self.log.info("%s events stream closed", sock)
+        except EngineError as exc:
+            self.log.warning("%s events watch error: %s", sock, exc)
+        finally:
+            if shared.CONTAINER_STATES.get(sock) is states:
+                del shared.CONTAINER_STATES[sock]
+            states.client.close()
+
+    def close(self):
+        for states, _ in self.watchers.values():
+            states.close()
+        self.watchers = {}
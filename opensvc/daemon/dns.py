@@ -1,9 +1,11 @@
 """
 Listener Thread
 """
+import copy
 import errno
 import os
 import sys
+import select
 import socket
 import logging
 import threading
@@ -12,8 +14,9 @@
 import re
 import time
 
-import foreign.six as six
 import daemon.shared as shared
+from daemon.eventloop import Waker, default_selector
+from foreign.six.moves import queue
 from env import Env
 from utilities.net.ipaddress import ip_address
 from utilities.storage import Storage
@@ -24,20 +27,230 @@
 PTR_SUFFIX = ".in-addr.arpa."
 PTR6_SUFFIX = ".ip6.arpa."
 
-if six.PY2:
-    MAKEFILE_KWARGS = {"bufsize": 0}
-else:
-    MAKEFILE_KWARGS = {"buffering": None}
+# the upper bounds, in milliseconds, of the requests latency histograms buckets
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 10, 50, 100, 500)
+
+# the max size of a request line
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+class RecordsIndex(object):
+    """
+    The A, SRV and PTR records contributed by each instance, merged per
+    qname on demand, and a tree of the qnames reversed labels for the
+    suffix matches.
+    """
+    KINDS = ("a", "srv", "ptr")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.refs = {}
+        self.scores = {}
+        self.instances = {}
+        self.contents = dict((kind, {}) for kind in self.KINDS)
+        self.merged = dict((kind, {}) for kind in self.KINDS)
+        self.names = {}
+        self.tree = {}
+        self.addrs = {}
+        self.zones_rev = None
+
+    def set_instance(self, key, ref, records):
+        """
+        Replace the records contributed by the <key> instance. <ref> is the
+        instance status structure the records were computed from.
+        """
+        with self.lock:
+            self.del_instance(key)
+            self.refs[key] = ref
+            self.instances[key] = records
+            for kind in self.KINDS:
+                for qname, contents in records.get(kind, {}).items():
+                    qnames = self.contents[kind]
+                    if qname not in qnames:
+                        qnames[qname] = {}
+                        self.add_name(qname)
+                    qnames[qname][key] = contents
+                    self.merged[kind].pop(qname, None)
+            for addr in records.get("addrs", []):
+                self.addrs[addr] = self.addrs.get(addr, 0) + 1
+                if self.addrs[addr] == 1:
+                    self.zones_rev = None
+
+    def del_instance(self, key):
+        with self.lock:
+            self.refs.pop(key, None)
+            records = self.instances.pop(key, None)
+            if records is None:
+                return
+            for kind in self.KINDS:
+                for qname in records.get(kind, {}):
+                    qnames = self.contents[kind]
+                    del qnames[qname][key]
+                    self.merged[kind].pop(qname, None)
+                    if not qnames[qname]:
+                        del qnames[qname]
+                        self.del_name(qname)
+            for addr in records.get("addrs", []):
+                self.addrs[addr] -= 1
+                if self.addrs[addr] == 0:
+                    del self.addrs[addr]
+                    self.zones_rev = None
+
+    def get(self, kind, qname):
+        """
+        Return the <kind> records of <qname>, merged from the contributing
+        instances.
+        """
+        with self.lock:
+            try:
+                return self.merged[kind][qname]
+            except KeyError:
+                pass
+            contributions = self.contents[kind].get(qname)
+            if contributions is None:
+                return []
+            data = getattr(self, "merge_" + kind)(contributions.values())
+            self.merged[kind][qname] = data
+            return data
+
+    @staticmethod
+    def merge_a(contributions):
+        data = set()
+        for addrs in contributions:
+            data |= addrs
+        return data
+
+    @staticmethod
+    def merge_srv(contributions):
+        data = set()
+        uends = set()
+        for contents in contributions:
+            for uend, content in contents:
+                if uend in uends:
+                    # avoid multiple SRV entries pointing to the same ip:port
+                    continue
+                uends.add(uend)
+                data.add(content)
+        return data
+
+    @staticmethod
+    def merge_ptr(contributions):
+        data = []
+        for targets in contributions:
+            for target in targets:
+                if target in data:
+                    continue
+                data.append(target)
+        return data
+
+    def add_name(self, qname):
+        self.names[qname] = self.names.get(qname, 0) + 1
+        if self.names[qname] > 1:
+            return
+        node = self.tree
+        for label in reversed(qname.split(".")):
+            node = node.setdefault(label, {})
+        node[None] = qname
+
+    def del_name(self, qname):
+        self.names[qname] -= 1
+        if self.names[qname] > 0:
+            return
+        del self.names[qname]
+        node = self.tree
+        branch = []
+        for label in reversed(qname.split(".")):
+            branch.append((node, label))
+            node = node[label]
+        del node[None]
+        for parent, label in reversed(branch):
+            if parent[label]:
+                break
+            del parent[label]
+
+    def match(self, suffix):
+        """
+        Return the qnames ending with <suffix>.
+
+        The tree is walked down the complete labels of <suffix>, and the
+        subtrees of the labels ending with its leading partial label are
+        collected.
+        """
+        labels = suffix.split(".")
+        qnames = []
+        with self.lock:
+            node = self.tree
+            for label in reversed(labels[1:]):
+                node = node.get(label)
+                if node is None:
+                    return qnames
+            todo = [child for label, child in node.items() if label is not None and label.endswith(labels[0])]
+            while todo:
+                node = todo.pop()
+                for label, child in node.items():
+                    if label is None:
+                        qnames.append(child)
+                    else:
+                        todo.append(child)
+        return qnames
+
+    def ptr_zones(self):
+        with self.lock:
+            if self.zones_rev is not None:
+                return self.zones_rev
+            zones = set([PTR_SUFFIX[1:]])
+            for addr in self.addrs:
+                z1 = ".".join(reversed(addr.split(".")[:-1]))+PTR_SUFFIX
+                z2 = ".".join(reversed(addr.split(".")[:-2]))+PTR_SUFFIX
+                z3 = ".".join(reversed(addr.split(".")[:-3]))+PTR_SUFFIX
+                zones.add(z1)
+                zones.add(z2)
+                zones.add(z3)
+            self.zones_rev = zones
+            return zones
+
+
+class Conn(object):
+    """
+    A client connection and its partial request line.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.buff = b""
+        self.last = time.time()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
 
 class Dns(shared.OsvcThread):
+    """
+    The PowerDNS remote backend.
+
+    The connections are persistent. The thread waits for requests on the
+    idle connections and hands the readable ones to a fixed pool of
+    workers, which reply to all the pipelined requests received before
+    giving the connection back. New connections are not accepted while
+    the workers have a backlog, or while max_conns connections are open.
+    """
     name = "dns"
     sock_tmo = 1.0
+    conn_tmo = 60
+    max_workers = 8
+    max_conns = 512
 
     def run(self):
         self.set_tid()
         self.log = logging.LoggerAdapter(logging.getLogger(Env.nodename+".osvcd.dns"), {"node": Env.nodename, "component": self.name})
         self.wait_monitor()
-        self.cache = {}
+        self.index = RecordsIndex()
+        self.index_key = None
         if not os.path.exists(Env.paths.dnsuxsockd):
             os.makedirs(Env.paths.dnsuxsockd)
         try:
@@ -50,7 +263,7 @@ def run(self):
         try:
             self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
             self.sock.bind(Env.paths.dnsuxsock)
-            self.sock.listen(1)
+            self.sock.listen(128)
             self.sock.settimeout(self.sock_tmo)
         except socket.error as exc:
             self.alert("error", "bind %s error: %s", Env.paths.dnsuxsock, exc)
@@ -73,13 +286,7 @@ def run(self):
         self.soa_content = "%(origin)s %(contact)s %(serial)d %(refresh)d " \
                            "%(retry)d %(expire)d %(minimum)d" % self.soa_data
 
-        self.stats = Storage({
-            "sessions": Storage({
-                "accepted": 0,
-                "tx": 0,
-                "rx": 0,
-            }),
-        })
+        self.setup_pool()
 
         while True:
             try:
@@ -88,11 +295,33 @@ def run(self):
             except Exception as exc:
                 self.log.exception(exc)
             if self.stopped():
-                self.log.debug("stop event received (%d handler threads to join)", len(self.threads))
+                self.log.debug("stop event received (%d worker threads to join)", len(self.threads))
                 self.join_threads()
+                self.close_conns()
+                self.selector.close()
+                self.waker.close()
                 self.sock.close()
                 sys.exit(0)
 
+    def setup_pool(self):
+        self.stats = Storage({
+            "sessions": Storage({
+                "accepted": 0,
+                "tx": 0,
+                "rx": 0,
+            }),
+            "requests": Storage(),
+        })
+        self.stats_lock = threading.Lock()
+        self.conns = {}
+        self.work_q = queue.Queue()
+        self.returned_q = queue.Queue()
+        self.busy = 0
+        self.accepting = False
+        self.selector = default_selector()
+        self.waker = Waker()
+        self.selector.register(self.waker, 1, self.waker)
+
     def wait_monitor(self):
         while True:
             nmon_status = self.node_data.get(["monitor", "status"], default="init")
@@ -113,103 +342,240 @@ def cache_key(self):
         return tuple(key)
 
     def status(self, **kwargs):
+        """
+        The "stats.requests" data is a latency histogram per lookup qtype,
+        or per method for the other requests. The buckets are keyed by
+        their upper bound in milliseconds.
+        """
         data = shared.OsvcThread.status(self, **kwargs)
         if hasattr(self, "stats"):
-            data["stats"] = self.stats
+            with self.stats_lock:
+                data["stats"] = copy.deepcopy(self.stats)
+            data["workers"] = {
+                "size": self.max_workers,
+                "busy": self.busy,
+                "queued": self.work_q.qsize(),
+            }
+            data["connections"] = len(self.conns)
         return data
 
     def do(self):
         self.reload_config()
         self.janitor_procs()
         self.janitor_threads()
+        self.start_workers()
+        self.janitor_conns()
+        self.register_returned()
+        self.watch_listener()
+        try:
+            events = self.selector.select(self.sock_tmo)
+        except (select.error, ValueError) as exc:
+            self.log.debug("select: %s", exc)
+            return
+        for key, _ in events:
+            if key.data is self.waker:
+                self.waker.drain()
+            elif key.data is self.sock:
+                self.accept()
+            elif self.conns.pop(key.data.fileno(), None):
+                self.selector.unregister(key.data)
+                self.work_q.put(key.data)
+        self.register_returned()
+
+    def n_conns(self):
+        """
+        Return the number of open connections, idle or handed to the
+        workers.
+        """
+        return len(self.conns) + self.work_q.qsize() + self.returned_q.qsize() + self.busy
 
+    def watch_listener(self):
+        """
+        Watch the listening socket only while new connections can be
+        accepted.
+        """
+        accepting = self.work_q.qsize() < self.max_workers and self.n_conns() < self.max_conns
+        if accepting == self.accepting:
+            return
+        if accepting:
+            self.selector.register(self.sock, 1, self.sock)
+        else:
+            self.selector.unregister(self.sock)
+        self.accepting = accepting
+
+    def accept(self):
         try:
-            conn, addr = self.sock.accept()
-            #self.log.info("accept connection")
-            self.stats.sessions.accepted += 1
+            sock, addr = self.sock.accept()
         except socket.timeout:
             return
-        try:
-            thr = threading.Thread(target=self.handle_client, args=(conn,))
-            thr.start()
-            self.threads.append(thr)
-        except RuntimeError as exc:
-            self.log.warning(exc)
-            conn.close()
+        self.stats.sessions.accepted += 1
+        sock.settimeout(self.sock_tmo)
+        self.watch_conn(Conn(sock))
 
-    def handle_client(self, conn):
-        # todo: change implementation to avoid socket.makefile with non blocking mode
-        conn.settimeout(self.sock_tmo)
-        cr = conn.makefile("r", **MAKEFILE_KWARGS)
-        cw = conn.makefile("w", **MAKEFILE_KWARGS)
-        try:
-            self._handle_client(conn, cr, cw)
-        except Exception as exc:
-            self.log.exception(exc)
-        finally:
-            try:
-                cr.close()
-            except socket.error:
-                pass
-            try:
-                cw.close()
-            except socket.error:
-                pass
-            try:
-                conn.close()
-            except socket.error:
-                pass
-            sys.exit(0)
+    def watch_conn(self, conn):
+        """
+        Wait for requests on the <conn> idle connection.
+        """
+        self.conns[conn.fileno()] = conn
+        self.selector.register(conn, 1, conn)
 
-    def _handle_client(self, conn, cr, cw):
-        chunks = []
-        buff_size = 4096
+    def register_returned(self):
+        """
+        Wait for requests on the connections the workers are done with.
+        """
         while True:
             try:
-                data = cr.readline()
-            except socket.timeout as exc:
-                break
-            except socket.error as exc:
-                self.log.info("%s", exc)
-                break
-            if len(data) == 0:
-                #self.log.info("no more data")
+                conn = self.returned_q.get_nowait()
+            except queue.Empty:
                 break
+            self.watch_conn(conn)
+
+    def janitor_conns(self):
+        limit = time.time() - self.conn_tmo
+        for fd, conn in list(self.conns.items()):
+            if conn.last < limit:
+                del self.conns[fd]
+                self.selector.unregister(conn)
+                conn.close()
 
-            self.log.debug("received %s", data)
+    def close_conns(self):
+        """
+        Close the idle connections, and the connections queued for or
+        returned by the workers.
+        """
+        for conn in self.conns.values():
+            self.selector.unregister(conn)
+            conn.close()
+        self.conns = {}
+        for q in (self.work_q, self.returned_q):
+            while True:
+                try:
+                    conn = q.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
 
-            try:
-                data = bdecode(data)
-                data = json.loads(data)
-            except Exception as exc:
-                self.log.error(exc)
-                data = None
+    def start_workers(self):
+        while len(self.threads) < self.max_workers:
+            thr = threading.Thread(target=self.worker)
+            thr.start()
+            self.threads.append(thr)
 
-            if self.stopped():
-                self.log.info("stop event received (handler thread)")
-                break
+    def wake(self):
+        self.waker.wake()
 
-            if data is None or not isinstance(data, dict):
+    def worker(self):
+        while not self.stopped():
+            try:
+                conn = self.work_q.get(timeout=self.sock_tmo)
+            except queue.Empty:
                 continue
-
+            with self.stats_lock:
+                self.busy += 1
             try:
-                result = self.router(data)
+                keep = self.handle_conn(conn)
             except Exception as exc:
-                self.log.error("dns request: %s => handler error: %s", data, exc)
-                return {"error": "unexpected backend error", "result": False}
+                self.log.exception(exc)
+                keep = False
+            finally:
+                with self.stats_lock:
+                    self.busy -= 1
+            if keep and not self.stopped():
+                self.returned_q.put(conn)
+                self.wake()
+            else:
+                conn.close()
+
+    def handle_conn(self, conn):
+        """
+        Reply to the complete request lines available on the readable
+        <conn>, in order. Return False if the connection must be closed.
+        """
+        try:
+            data = conn.sock.recv(65536)
+        except socket.timeout:
+            return True
+        except socket.error as exc:
+            self.log.info("%s", exc)
+            return False
+        if len(data) == 0:
+            return False
+        conn.last = time.time()
+        with self.stats_lock:
+            self.stats.sessions.rx += len(data)
+        lines = (conn.buff + data).split(b"\n")
+        conn.buff = lines.pop()
+        if len(conn.buff) > MAX_REQUEST_SIZE:
+            self.log.warning("request exceeds %d bytes", MAX_REQUEST_SIZE)
+            return False
+        messages = []
+        for line in lines:
+            result = self.handle_request(line)
             if result is not None:
-                message = json.dumps(result) + "\n"
-                try:
-                    cw.write(message)
-                    cw.flush()
-                except socket.error as exc:
-                    if exc.errno != errno.EPIPE:
-                        raise
-                    self.log.info("client died (broken pipe)")
-                    break
-                self.log.debug("replied %s", message)
-                message_len = len(message)
-                self.stats.sessions.tx += message_len
+                messages.append(json.dumps(result) + "\n")
+        if not messages:
+            return True
+        message = "".join(messages).encode()
+        try:
+            conn.sock.sendall(message)
+        except socket.error as exc:
+            if exc.errno != errno.EPIPE:
+                raise
+            self.log.info("client died (broken pipe)")
+            return False
+        self.log.debug("replied %s", message)
+        with self.stats_lock:
+            self.stats.sessions.tx += len(message)
+        return True
+
+    def handle_request(self, line):
+        self.log.debug("received %s", line)
+        try:
+            data = bdecode(line)
+            data = json.loads(data)
+        except Exception as exc:
+            self.log.error(exc)
+            return
+
+        if data is None or not isinstance(data, dict):
+            return
+
+        begin = time.time()
+        try:
+            result = self.router(data)
+        except Exception as exc:
+            self.log.error("dns request: %s => handler error: %s", data, exc)
+            result = {"error": "unexpected backend error", "result": False}
+        self.observe(data, time.time() - begin)
+        return result
+
+    def observe(self, data, duration):
+        """
+        Account the <duration> of the <data> request in the latency
+        histogram of its lookup qtype or method.
+        """
+        try:
+            name = data["parameters"]["qtype"].upper()
+        except (KeyError, TypeError, AttributeError):
+            name = str(data.get("method"))
+        duration *= 1000
+        for bound in LATENCY_BUCKETS:
+            if duration <= bound:
+                bucket = "%g" % bound
+                break
+        else:
+            bucket = "inf"
+        with self.stats_lock:
+            if name not in self.stats.requests:
+                self.stats.requests[name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "buckets": dict(("%g" % bound, 0) for bound in LATENCY_BUCKETS + (float("inf"),)),
+                }
+            hist = self.stats.requests[name]
+            hist["count"] += 1
+            hist["total"] += duration
+            hist["buckets"][bucket] += 1
 
     #########################################################################
     #
@@ -298,10 +664,8 @@ def action_list(self, parameters):
 
     def lookup_pattern(self, suffix):
         data = []
-        for qname, contents in self.a_records().items():
-            if not qname.endswith(suffix):
-                continue
-            for content in contents:
+        for qname in self.match(suffix):
+            for content in self.records("a", qname):
                 data.append({
                     "qtype": "A",
                     "qname": qname,
@@ -323,10 +687,9 @@ def _action_list(self, suffix):
             data += self.zone_ns_records(suffix)
         else:
             data += self.zone_ns_records(self.zone)
-        for qname, contents in self.a_records().items():
-            if suffix and not qname.endswith(suffix):
-                continue
-            for content in contents:
+        qnames = self.match(suffix)
+        for qname in qnames:
+            for content in self.records("a", qname):
                 qtype = "AAAA" if ":" in content else "A"
                 data.append({
                     "qtype": qtype,
@@ -334,21 +697,16 @@ def _action_list(self, suffix):
                     "content": content,
                     "ttl": 60
                 })
-        for qname, contents in self.srv_records().items():
-            if suffix and not qname.endswith(suffix):
-                continue
-            for content in contents:
+        for qname in qnames:
+            for content in self.records("srv", qname):
                 data.append({
                     "qtype": "SRV",
                     "qname": qname,
                     "content": content,
                     "ttl": 60
                 })
-        for qname, contents in self.ptr_records().items():
-            if suffix and not qname.endswith(suffix):
-                continue
-            for content in contents:
-                qtype = "PTR6" if ":" in qname else "PTR"
+        for qname in qnames:
+            for content in self.records("ptr", qname):
                 data.append({
                     "qtype": "PTR",
                     "qname": qname,
@@ -390,15 +748,8 @@ def soa_records(self):
         return [self.zone]
 
     def soa_records_rev(self):
-        addrs = set([PTR_SUFFIX[1:]])
-        for addr in set(self.svc_ips()):
-            z1 = ".".join(reversed(addr.split(".")[:-1]))+PTR_SUFFIX
-            z2 = ".".join(reversed(addr.split(".")[:-2]))+PTR_SUFFIX
-            z3 = ".".join(reversed(addr.split(".")[:-3]))+PTR_SUFFIX
-            addrs.add(z1)
-            addrs.add(z2)
-            addrs.add(z3)
-        return addrs
+        self.update_index()
+        return self.index.ptr_zones()
 
     def soa_record(self, parameters):
         qname = parameters.get("qname").lower()
@@ -434,7 +785,7 @@ def srv_record(self, parameters):
             "qname": qname,
             "content": content,
             "ttl": 60
-        } for content in self.srv_records().get(qname, [])]
+        } for content in self.records("srv", qname)]
 
     def ptr_record(self, parameters):
         qname = parameters.get("qname").lower()
@@ -443,7 +794,7 @@ def ptr_record(self, parameters):
             "qname": qname,
             "content": name,
             "ttl": 60
-        } for name in self.ptr_records().get(qname, []) if "." in name]
+        } for name in self.records("ptr", qname) if "." in name]
 
     def ptr6_record(self, parameters):
         qname = parameters.get("qname").lower()
@@ -452,7 +803,7 @@ def ptr6_record(self, parameters):
             "qname": qname,
             "content": name,
             "ttl": 60
-        } for name in self.ptr_records().get(qname, []) if ":" in name]
+        } for name in self.records("ptr", qname) if ":" in name]
 
     def a_record(self, parameters):
         qname = parameters.get("qname").lower()
@@ -463,7 +814,7 @@ def a_record(self, parameters):
             "qname": qname,
             "content": addr,
             "ttl": 60
-        } for addr in self.a_records().get(qname, []) if "." in addr]
+        } for addr in self.records("a", qname) if "." in addr]
 
     def aaaa_record(self, parameters):
         qname = parameters.get("qname").lower()
@@ -474,110 +825,172 @@ def aaaa_record(self, parameters):
             "qname": qname,
             "content": addr,
             "ttl": 60
-        } for addr in self.a_records().get(qname, []) if ":" in addr]
-
-    def ptr_records(self):
-        data = self.get_cache("ptr")
-        if data is not None:
-            return data
-        names = {}
-        key = self.cache_key()
-        for path, nodename, status in self.iter_services_instances():
-            name, namespace, kind = split_path(path)
-            if kind != "svc":
-                continue
-            if not namespace:
-                namespace = "root"
-            for rid, resource in status.get("resources", {}).items():
-                addr = resource.get("info", {}).get("ipaddr")
-                if addr is None:
-                    continue
-                qname = ip_address(addr).reverse_pointer
-                if qname not in names:
-                    names[qname] = []
-                try:
-                    hostname = resource.get("info", {}).get("hostname").split(".")[0].lower()
-                except Exception:
-                    hostname = None
-                gen_name = "%s.%s.%s.%s." % (name, namespace, kind, self.cluster_name)
-                gen_name = gen_name.lower()
-                if hostname and hostname != name:
-                    target = "%s.%s" % (hostname, gen_name)
-                else:
-                    target = "%s" % gen_name
-                if target in names[qname]:
-                    continue
-                names[qname].append(target)
-        self.set_cache(key, "ptr", names)
-        return names
-
-    def set_cache(self, key, kind, data):
-        if key not in self.cache:
-            self.cache = {}
-        self.cache[key] = {kind: data}
+        } for addr in self.records("a", qname) if ":" in addr]
 
-    def get_cache(self, kind):
+    def update_index(self):
+        """
+        Update the records index with the instances status structures
+        replaced since the last update, or with all the instances of the
+        nodes whose score changed, as the score is the SRV records weight.
+        """
         key = self.cache_key()
-        if key not in self.cache:
-            self.cache = {}
-            return
-        if kind not in self.cache[key]:
+        if key == self.index_key:
             return
-        return self.cache[key].get(kind)
+        with self.index.lock:
+            seen = set()
+            for nodename in self.cluster_nodes:
+                score = self.daemon_status_data.get(["monitor", "nodes", nodename, "stats", "score"], default=10)
+                rescore = self.index.scores.get(nodename) != score
+                self.index.scores[nodename] = score
+                instances = self.daemon_status_data.get(["monitor", "nodes", nodename, "services", "status"], default={})
+                for path, status in instances.items():
+                    ikey = (path, nodename)
+                    seen.add(ikey)
+                    if not rescore and self.index.refs.get(ikey) is status:
+                        continue
+                    self.index.set_instance(ikey, status, self.instance_records(path, nodename, status, score))
+            dns = list(shared.NODE.dns)
+            if self.index.refs.get((None, None)) != dns:
+                self.index.set_instance((None, None), dns, {"a": self.dns_a_records()})
+            seen.add((None, None))
+            for ikey in [ikey for ikey in self.index.refs if ikey not in seen]:
+                self.index.del_instance(ikey)
+            self.index_key = key
+
+    def records(self, kind, qname):
+        self.update_index()
+        return self.index.get(kind, qname)
+
+    def match(self, suffix):
+        self.update_index()
+        return self.index.match(suffix)
 
     @staticmethod
     def unique_name(addr):
         return addr.replace(".", "-").replace(":", "-")
 
-    def a_records(self):
-        data = self.get_cache("a")
-        if data is not None:
-            return data
-        names = {}
-        key = self.cache_key()
-        for path, nodename, status in self.iter_services_instances():
-            name, namespace, kind = split_path(path)
-            if kind != "svc":
+    def instance_records(self, path, nodename, status, weight):
+        """
+        Return the records contributed by the <path> instance on <nodename>,
+        as a dict of A, SRV and PTR contents indexed by qname, and the list
+        of the instance ip addresses.
+        """
+        records = {
+            "a": {},
+            "srv": {},
+            "ptr": {},
+            "addrs": [],
+        }
+        resources = []
+        for rid, resource in status.get("resources", {}).items():
+            addr = resource.get("info", {}).get("ipaddr")
+            if addr is None:
                 continue
-            if namespace:
-                namespace = namespace.lower()
-            else:
-                namespace = "root"
-            scaler_slave = status.get("scaler_slave")
-            if scaler_slave:
-                _name = name[name.index(".")+1:]
-            else:
-                _name = name
+            records["addrs"].append(addr)
+            resources.append((addr, resource))
+        name, namespace, kind = split_path(path)
+        if kind != "svc":
+            return records
+        if namespace:
+            namespace = namespace.lower()
+        else:
+            namespace = "root"
+        scaler_slave = status.get("scaler_slave")
+        if scaler_slave:
+            _name = name[name.index(".")+1:]
+        else:
+            _name = name
+        self.instance_a_records(records["a"], _name, namespace, kind, nodename, resources)
+        self.instance_srv_records(records["srv"], _name, namespace, kind, status, weight, resources)
+        self.instance_ptr_records(records["ptr"], name, namespace, kind, resources)
+        return records
+
+    def instance_a_records(self, names, _name, namespace, kind, nodename, resources):
+        zone = "%s.%s.%s." % (namespace, kind, self.cluster_name)
+        qname = "%s.%s" % (_name, zone)
+        names[qname] = set()
+
+        local_zone = "%s.%s.%s.node.%s." % (namespace, kind, nodename, self.cluster_name)
+        local_qname = "%s.%s" % (_name, local_zone)
+        names[local_qname] = set()
+
+        for addr, resource in resources:
+            hostname = resource.get("info", {}).get("hostname")
+            names[qname].add(addr)
+            names[local_qname].add(addr)
+            rname = self.unique_name(addr) + "." + qname
+            if rname not in names:
+                names[rname] = set()
+            names[rname].add(addr)
+            if hostname:
+                name = hostname.split(".")[0] + "." + qname
+                if name not in names:
+                    names[name] = set()
+                names[name].add(addr)
+
+    def instance_srv_records(self, names, _name, namespace, kind, status, weight, resources):
+        for addr, resource in resources:
+            for expose in resource.get("info", {}).get("expose", []):
+                if "#" in expose:
+                    # expose data by reference
+                    expose_data = status.get("resources", {}).get(expose, {}).get("info")
 
-            zone = "%s.%s.%s." % (namespace, kind, self.cluster_name)
-            qname = "%s.%s" % (_name, zone)
+                    try:
+                        port = expose_data["port"]
+                        proto = expose_data["protocol"]
+                    except (KeyError, TypeError):
+                        continue
+                else:
+                    # expose data inline
+                    try:
+                        port, proto = re.split("[/-]", expose.split(":")[0])
+                        port = int(port)
+                    except Exception as exc:
+                        continue
+                qnames = set()
+                qnames.add("_%s._%s.%s.%s.%s.%s." % (str(port), proto, _name, namespace, kind, self.cluster_name))
+                try:
+                    serv = socket.getservbyport(port)
+                    qnames.add("_%s._%s.%s.%s.%s.%s." % (serv, proto, _name, namespace, kind, self.cluster_name))
+                except (socket.error, OSError) as exc:
+                    # port/proto not found
+                    pass
+                except Exception as exc:
+                    self.log.warning("port %d resolution failed: %s", port, exc)
+                target = "%s.%s.%s.%s.%s." % (self.unique_name(addr), _name, namespace, kind, self.cluster_name)
+                content = "%(prio)d %(weight)d %(port)d %(target)s" % {
+                    "prio": 0,
+                    "weight": weight,
+                    "port": port,
+                    "target": target,
+                }
+                uend = " %d %s" % (port, target)
+                for qname in qnames:
+                    if qname not in names:
+                        names[qname] = []
+                    if any([True for _uend, _ in names[qname] if _uend == uend]):
+                        # avoid multiple SRV entries pointing to the same ip:port
+                        continue
+                    names[qname].append((uend, content))
+
+    def instance_ptr_records(self, names, name, namespace, kind, resources):
+        for addr, resource in resources:
+            qname = ip_address(addr).reverse_pointer
             if qname not in names:
-                names[qname] = set()
-
-            local_zone = "%s.%s.%s.node.%s." % (namespace, kind, nodename, self.cluster_name)
-            local_qname = "%s.%s" % (_name, local_zone)
-            if local_qname not in names:
-                names[local_qname] = set()
-
-            for rid, resource in status.get("resources", {}).items():
-                addr = resource.get("info", {}).get("ipaddr")
-                if addr is None:
-                    continue
-                hostname = resource.get("info", {}).get("hostname")
-                names[qname].add(addr)
-                names[local_qname].add(addr)
-                rname = self.unique_name(addr) + "." + qname
-                if rname not in names:
-                    names[rname] = set()
-                names[rname].add(addr)
-                if hostname:
-                    name = hostname.split(".")[0] + "." + qname
-                    if name not in names:
-                        names[name] = set()
-                    names[name].add(addr)
-        names.update(self.dns_a_records())
-        self.set_cache(key, "a", names)
-        return names
+                names[qname] = []
+            try:
+                hostname = resource.get("info", {}).get("hostname").split(".")[0].lower()
+            except Exception:
+                hostname = None
+            gen_name = "%s.%s.%s.%s." % (name, namespace, kind, self.cluster_name)
+            gen_name = gen_name.lower()
+            if hostname and hostname != name:
+                target = "%s.%s" % (hostname, gen_name)
+            else:
+                target = "%s" % gen_name
+            if target in names[qname]:
+                continue
+            names[qname].append(target)
 
     def dns_a_records(self):
         names = {}
@@ -585,84 +998,3 @@ def dns_a_records(self):
             dns = "ns%d.%s." % (i, self.cluster_name)
             names[dns] = set([ip])
         return names
-
-    def srv_records(self):
-        data = self.get_cache("srv")
-        if data is not None:
-            return data
-        names = {}
-        key = self.cache_key()
-        for path, nodename, status in self.iter_services_instances():
-            weight = self.daemon_status_data.get(["monitor", "nodes", nodename, "stats", "score"], default=10)
-            name, namespace, kind = split_path(path)
-            if kind != "svc":
-                continue
-            if namespace:
-                namespace = namespace.lower()
-            else:
-                namespace = "root"
-            scaler_slave = status.get("scaler_slave")
-            if scaler_slave:
-                _name = name[name.index(".")+1:]
-            else:
-                _name = name
-            for rid, resource in status.get("resources", {}).items():
-                addr = resource.get("info", {}).get("ipaddr")
-                if addr is None:
-                    continue
-                for expose in resource.get("info", {}).get("expose", []):
-                    if "#" in expose:
-                        # expose data by reference
-                        expose_data = status.get("resources", {}).get(expose, {}).get("info")
-
-                        try:
-                            port = expose_data["port"]
-                            proto = expose_data["protocol"]
-                        except (KeyError, TypeError):
-                            continue
-                    else:
-                        # expose data inline
-                        try:
-                            port, proto = re.split("[/-]", expose.split(":")[0])
-                            port = int(port)
-                        except Exception as exc:
-                            continue
-                    qnames = set()
-                    qnames.add("_%s._%s.%s.%s.%s.%s." % (str(port), proto, _name, namespace, kind, self.cluster_name))
-                    try:
-                        serv = socket.getservbyport(port)
-                        qnames.add("_%s._%s.%s.%s.%s.%s." % (serv, proto, _name, namespace, kind, self.cluster_name))
-                    except (socket.error, OSError) as exc:
-                        # port/proto not found
-                        pass
-                    except Exception as exc:
-                        self.log.warning("port %d resolution failed: %s", port, exc)
-                    target = "%s.%s.%s.%s.%s." % (self.unique_name(addr), _name, namespace, kind, self.cluster_name)
-                    content = "%(prio)d %(weight)d %(port)d %(target)s" % {
-                        "prio": 0,
-                        "weight": weight,
-                        "port": port,
-                        "target": target,
-                    }
-                    for qname in qnames:
-                        if qname not in names:
-                            names[qname] = set()
-                        uend = " %d %s" % (port, target)
-                        if any([True for c in names[qname] if c.endswith(uend)]):
-                            # avoid multiple SRV entries pointing to the same ip:port
-                            continue
-                        names[qname].add(content)
-        self.set_cache(key, "srv", names)
-        return names
-
-    def svc_ips(self):
-        addrs = []
-        for path, nodename, status in self.iter_services_instances():
-            for rid, resource in status.get("resources", {}).items():
-                addr = resource.get("info", {}).get("ipaddr")
-                if addr is None:
-                    continue
-                addrs.append(addr)
-        return addrs
-
-
@@ -0,0 +1,159 @@
+"""
+The listener event loop.
+
+A single thread waits for the readiness of the registered sockets, and for
+the wake-up requests of the other threads. The loop registrations are only
+modified by the loop thread, the other threads schedule their changes with
+call_soon().
+"""
+import socket
+import threading
+from collections import deque
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
+
+import select
+
+
+class Waker(object):
+    """
+    A socket pair, whose read end is readable when another thread
+    requested a wake-up of the loop.
+    """
+    def __init__(self):
+        self.rsock, self.wsock = socket.socketpair()
+        self.rsock.setblocking(False)
+        self.wsock.setblocking(False)
+        self.lock = threading.Lock()
+        self.pending = False
+
+    def fileno(self):
+        return self.rsock.fileno()
+
+    def wake(self):
+        with self.lock:
+            if self.pending:
+                return
+            self.pending = True
+        try:
+            self.wsock.send(b"\0")
+        except socket.error:
+            # the socket buffer is full, so a wake-up is already pending
+            pass
+
+    def drain(self):
+        with self.lock:
+            self.pending = False
+        try:
+            while self.rsock.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def close(self):
+        self.rsock.close()
+        self.wsock.close()
+
+
+class SelectKey(object):
+    def __init__(self, fileobj, data):
+        self.fileobj = fileobj
+        self.data = data
+
+
+class SelectSelector(object):
+    """
+    The subset of the selectors module interface used by the loop, for
+    the python versions without selectors.
+    """
+    def __init__(self):
+        self.keys = {}
+
+    def register(self, fileobj, events, data=None):
+        self.keys[fileobj.fileno()] = SelectKey(fileobj, data)
+
+    def unregister(self, fileobj):
+        for fd, key in list(self.keys.items()):
+            if key.fileobj is fileobj:
+                del self.keys[fd]
+                return key
+        raise KeyError(fileobj)
+
+    def select(self, timeout=None):
+        fds = select.select(list(self.keys), [], [], timeout)[0]
+        return [(self.keys[fd], 1) for fd in fds if fd in self.keys]
+
+    def close(self):
+        self.keys = {}
+
+
+def default_selector():
+    """
+    Return the best selector available, not limited to the fds lower
+    than FD_SETSIZE unless the python version has no selectors module.
+    """
+    if selectors:
+        return selectors.DefaultSelector()
+    return SelectSelector()
+
+
+class EventLoop(object):
+    def __init__(self):
+        self.selector = default_selector()
+        self.waker = Waker()
+        self.selector.register(self.waker, 1, self.waker)
+        self.calls = deque()
+
+    def register(self, sock, data):
+        """
+        Watch <sock> for readability. <data> is returned by poll() when
+        <sock> is readable.
+        """
+        self.selector.register(sock, 1, data)
+
+    def unregister(self, sock):
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+
+    def wake(self):
+        """
+        Interrupt the current or next poll(). Thread safe.
+        """
+        self.waker.wake()
+
+    def call_soon(self, fn, *args):
+        """
+        Execute <fn> in the loop thread, during the current or next poll().
+        Thread safe.
+        """
+        self.calls.append((fn, args))
+        self.waker.wake()
+
+    def poll(self, timeout=None):
+        """
+        Wait up to <timeout> seconds for a registered socket readability
+        or a wake-up, execute the scheduled calls, and return the data of
+        the readable sockets.
+        """
+        ready = []
+        for key, _ in self.selector.select(timeout):
+            if key.data is self.waker:
+                self.waker.drain()
+                continue
+            ready.append(key.data)
+        while True:
+            try:
+                fn, args = self.calls.popleft()
+            except IndexError:
+                break
+            fn(*args)
+        return ready
+
+    def close(self):
+        self.selector.close()
+        self.waker.close()
@@ -15,6 +15,10 @@ class BaseHandler(object):
     prototype = []
     stream = False
     multiplex = "on-demand"
+    # True if the action can wait for a long time, for a condition, a lock
+    # or the peers. Such actions are executed in a dedicated thread rather
+    # than in the listener workers pool.
+    blocking = False
 
     def rbac(self, nodename, thr=None, **kwargs):
         options = self.parse_options(kwargs)
@@ -0,0 +1,26 @@
+import daemon.handler
+import daemon.shared as shared
+
+class Handler(daemon.handler.BaseHandler):
+    """
+    Drop the command results cached by the local daemon for <sigs>.
+    Used by the drivers after a change of the state the commands report.
+    """
+    routes = (
+        ("POST", "cache_clear"),
+        (None, "cache_clear"),
+    )
+    prototype = [
+        {
+            "name": "sigs",
+            "desc": "The list of command result signatures to drop.",
+            "required": True,
+            "format": "list",
+        },
+    ]
+    multiplex = "never"
+
+    def action(self, nodename, thr=None, **kwargs):
+        options = self.parse_options(kwargs)
+        shared.CMD_CACHE.clear(options.sigs)
+        return {"status": 0}
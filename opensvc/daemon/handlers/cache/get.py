@@ -0,0 +1,30 @@
+import daemon.handler
+import daemon.shared as shared
+
+class Handler(daemon.handler.BaseHandler):
+    """
+    Return the command result cached by the local daemon for <sig>.
+    Return a 404 status if the result is not cached or expired.
+    """
+    routes = (
+        ("GET", "cache"),
+        (None, "cache_get"),
+    )
+    prototype = [
+        {
+            "name": "sig",
+            "desc": "The cached command result signature.",
+            "required": True,
+            "format": "string",
+        },
+    ]
+    multiplex = "never"
+
+    def action(self, nodename, thr=None, **kwargs):
+        options = self.parse_options(kwargs)
+        if not shared.CMD_CACHE.max_size:
+            return {"status": 1, "error": "the shared cache is disabled"}
+        try:
+            return {"status": 0, "data": shared.CMD_CACHE.get(options.sig)}
+        except KeyError:
+            return {"status": 404, "error": "%s is not cached" % options.sig}
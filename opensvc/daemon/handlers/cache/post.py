@@ -0,0 +1,39 @@
+import daemon.handler
+import daemon.shared as shared
+
+class Handler(daemon.handler.BaseHandler):
+    """
+    Store a command result in the local daemon cache, shared by all the
+    sessions of the node.
+    """
+    routes = (
+        ("POST", "cache"),
+        (None, "cache_put"),
+    )
+    prototype = [
+        {
+            "name": "sig",
+            "desc": "The command result signature.",
+            "required": True,
+            "format": "string",
+        },
+        {
+            "name": "data",
+            "desc": "The json-serializable command result.",
+            "required": False,
+        },
+        {
+            "name": "ttl",
+            "desc": "The number of seconds the result stays valid.",
+            "required": False,
+            "format": "duration",
+        },
+    ]
+    multiplex = "never"
+
+    def action(self, nodename, thr=None, **kwargs):
+        options = self.parse_options(kwargs)
+        if not shared.CMD_CACHE.max_size:
+            return {"status": 1, "error": "the shared cache is disabled"}
+        shared.CMD_CACHE.put(options.sig, options.data, ttl=options.ttl)
+        return {"status": 0}
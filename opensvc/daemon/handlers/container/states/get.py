@@ -0,0 +1,35 @@
+import daemon.handler
+import daemon.shared as shared
+
+class Handler(daemon.handler.BaseHandler):
+    """
+    Return the containers state cached by the local daemon for the engine
+    listening on <sock>, as "docker ps" lines and inspect data.
+    Return a 404 status if the daemon does not watch the engine events.
+    """
+    routes = (
+        ("GET", "container_states"),
+        (None, "container_states"),
+    )
+    prototype = [
+        {
+            "name": "sock",
+            "desc": "The engine api unix socket path.",
+            "required": True,
+            "format": "string",
+        },
+        {
+            "name": "ids",
+            "desc": "The list of container ids to return the inspect data of. Default to all containers.",
+            "required": False,
+            "format": "list",
+        },
+    ]
+    multiplex = "never"
+
+    def action(self, nodename, thr=None, **kwargs):
+        options = self.parse_options(kwargs)
+        states = shared.CONTAINER_STATES.get(options.sock)
+        if states is None or not states.ready:
+            return {"status": 404, "error": "the %s engine events are not watched" % options.sock}
+        return {"status": 0, "data": states.dump(options.ids)}
@@ -18,6 +18,7 @@ class Handler(daemon.handler.BaseHandler):
         ("POST", "daemon_shutdown"),
         (None, "daemon_shutdown"),
     )
+    blocking = True
     prototype = []
 
     def action(self, nodename, thr=None, **kwargs):
@@ -40,6 +40,7 @@ def action(self, nodename, thr=None, **kwargs):
                  },
             },
             "services": {},
+            "cache": shared.CMD_CACHE.stats(),
         }
         options = self.parse_options(kwargs)
         namespaces = thr.get_namespaces()
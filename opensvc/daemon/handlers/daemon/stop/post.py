@@ -14,6 +14,7 @@ class Handler(daemon.handler.BaseHandler):
         ("POST", "daemon_stop"),
         (None, "daemon_stop"),
     )
+    blocking = True
     prototype = [
         {
             "name": "thr_id",
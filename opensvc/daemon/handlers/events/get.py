@@ -2,6 +2,7 @@
 
 from foreign.six.moves import queue
 import daemon.handler
+from daemon.listener import EventMessage
 from env import Env
 from utilities.string import bdecode
 
@@ -61,13 +62,7 @@ def action(self, nodename, thr=None, stream_id=None, **kwargs):
                     selector=options.selector
                 ),
             }
-            if thr.h2conn:
-                _msg = fevent
-            elif thr.encrypted:
-                _msg = thr.encrypt(fevent)
-            else:
-                _msg = thr.msg_encode(fevent)
-            thr.event_queue.put(_msg)
+            thr.event_queue.put(EventMessage(fevent))
         if not thr in thr.parent.events_clients:
             thr.parent.events_clients.append(thr)
         if not stream_id in thr.events_stream_ids:
@@ -10,6 +10,7 @@ class Handler(daemon.handler.BaseHandler, daemon.clusterlock.LockMixin):
         ("POST", "lock"),
         (None, "lock"),
     )
+    blocking = True
     prototype = [
         {
             "name": "name",
@@ -14,6 +14,7 @@ class Handler(daemon.handler.BaseHandler):
         ("POST", "node_drain"),
         (None, "node_drain"),
     )
+    blocking = True
     prototype = [
         {
             "name": "wait",
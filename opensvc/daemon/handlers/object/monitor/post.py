@@ -18,6 +18,7 @@ class Handler(daemon.handler.BaseHandler):
         ("POST", "object_monitor"),
         (None, "set_service_monitor"),
     )
+    blocking = True
     prototype = [
         {
             "name": "path",
@@ -12,6 +12,7 @@ class Handler(daemon.handler.BaseHandler):
     routes = (
         ("GET", "sync"),
     )
+    blocking = True
     prototype = [
         {
             "name": "timeout",
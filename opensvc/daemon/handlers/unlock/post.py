@@ -10,6 +10,7 @@ class Handler(daemon.handler.BaseHandler, daemon.clusterlock.LockMixin):
         ("POST", "unlock"),
         (None, "unlock"),
     )
+    blocking = True
     prototype = [
         {
             "name": "name",
@@ -24,6 +24,7 @@ class Handler(daemon.handler.BaseHandler):
     routes = (
         ("GET", "wait"),
     )
+    blocking = True
     prototype = [
         {
             "name": "condition",
@@ -64,7 +65,7 @@ def action(self, nodename, thr=None, stream_id=None, **kwargs):
             if left < 0:
                 left = 0
             try:
-                msg = thr.event_queue.get(True, left if left < 3 else 3)
+                msg = thr.event_queue.get(True, left if left < 3 else 3).data
             except queue.Empty:
                 msg = {"kind": "patch"}
                 if left < 3:
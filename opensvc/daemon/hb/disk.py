@@ -3,16 +3,19 @@
 """
 import sys
 import os
+import ctypes
 import mmap
 import stat
 import errno
 import contextlib
 import json
+import struct
 import time
 
 import daemon.shared as shared
 import core.exceptions as ex
 from env import Env
+import foreign.six as six
 from .hb import Hb
 from utilities.string import bdecode
 
@@ -29,6 +32,21 @@ class HbDisk(Hb):
 
     MAX_SLOTS = METASIZE // mmap.PAGESIZE
 
+    # The slot header is stored in the node meta slot page, after the
+    # nodename, so the peers not aware of the header are not disturbed.
+    # It holds a magic, a sequence number incremented on each slot write,
+    # the slot data length and the write timestamp.
+    HEADER_OFFSET = 1024
+    HEADER_MAGIC = b"osvchdr1"
+    HEADER_FMT = "<8sQQd"
+
+    fo = None
+
+    def reset_stats(self):
+        Hb.reset_stats(self)
+        self.stats.reads = 0
+        self.stats.writes = 0
+
     def status(self, **kwargs):
         data = Hb.status(self, **kwargs)
         data["stats"] = self.stats
@@ -57,10 +75,7 @@ def _configure(self):
         self.get_hb_nodes()
         self.peer_config = {}
 
-        if not hasattr(self, "meta_slot_buff"):
-            self.meta_slot_buff = mmap.mmap(-1, 2*mmap.PAGESIZE)
-        if not hasattr(self, "slot_buff"):
-            self.slot_buff = mmap.mmap(-1, self.SLOTSIZE)
+        self.init_buffers()
 
         self.timeout = shared.NODE.oget(self.name, "timeout")
         self.interval = shared.NODE.oget(self.name, "interval")
@@ -86,6 +101,7 @@ def _configure(self):
                 raise ex.AbortAction("%s must be a char device" % new_dev)
 
         if new_dev != self.dev:
+            self.close_dev()
             self.dev = new_dev
             self.flags = new_flags
             self.peer_config = {}
@@ -94,11 +110,25 @@ def _configure(self):
         with self.hb_fo() as fo:
             self.load_peer_config(fo=fo)
 
-    @contextlib.contextmanager
-    def hb_fo(self):
+    def init_buffers(self):
+        """
+        Allocate the page-aligned io buffers, reused for the thread
+        lifetime.
+        """
+        if not hasattr(self, "meta_slot_buff"):
+            self.meta_slot_buff = mmap.mmap(-1, 2*mmap.PAGESIZE)
+        if not hasattr(self, "slot_buff"):
+            self.slot_buff = mmap.mmap(-1, self.SLOTSIZE)
+        if not hasattr(self, "header_buff"):
+            self.header_buff = mmap.mmap(-1, mmap.PAGESIZE)
+        if not hasattr(self, "headers_buff"):
+            self.headers_buff = mmap.mmap(-1, mmap.PAGESIZE)
+
+    def open_dev(self):
         try:
             fd = os.open(self.dev, self.flags)
-            fo = os.fdopen(fd, 'rb+')
+            # unbuffered, so the reads and writes use our aligned buffers
+            return os.fdopen(fd, 'rb+', 0)
         except OSError as exc:
             if exc.errno == errno.EINVAL:
                 raise ex.AbortAction("%s directio is not supported" % self.dev)
@@ -106,17 +136,61 @@ def hb_fo(self):
                 raise ex.AbortAction("error opening %s: %s" % (self.dev, str(exc)))
         except Exception as exc:
             raise ex.AbortAction("error opening %s: %s" % (self.dev, str(exc)))
+
+    def close_dev(self):
+        if self.fo is None:
+            return
+        try:
+            self.fo.close()
+        except Exception:
+            pass
+        self.fo = None
+
+    @contextlib.contextmanager
+    def hb_fo(self):
+        """
+        Yield the device file object, opened once and kept open until an
+        error happens or the device changes.
+        """
+        if self.fo is None:
+            self.fo = self.open_dev()
         try:
-            yield fo
+            yield self.fo
         except Exception as exc:
             self.log.error("%s: %s", self.dev, exc)
-        finally:
-            # closing fo also closes fd
-            try:
-                os.fsync(fd)
-            except OSError as exc:
-                self.duplog("error", "%(exc)s", exc=str(exc), nodename="")
-            fo.close()
+            self.close_dev()
+
+    def dev_read(self, offset, buff, fo=None):
+        fo.seek(offset, os.SEEK_SET)
+        fo.readinto(buff)
+        self.stats.reads += 1
+
+    def dev_write(self, offset, buff, fo=None):
+        fo.seek(offset, os.SEEK_SET)
+        fo.write(buff)
+        fo.flush()
+        self.stats.writes += 1
+
+    def dev_sync(self, fo=None):
+        try:
+            os.fsync(fo.fileno())
+        except OSError as exc:
+            self.duplog("error", "%(exc)s", exc=str(exc), nodename="")
+
+    @staticmethod
+    def aligned_size(size):
+        return (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+
+    @staticmethod
+    def buff_view(buff, size):
+        """
+        Return a writable view of the <size> first bytes of the mmap <buff>,
+        keeping the page alignment required by the direct io. The py2 mmap
+        does not support memoryview, use a ctypes array mapped on the mmap.
+        """
+        if six.PY2:
+            return (ctypes.c_char * size).from_buffer(buff)
+        return memoryview(buff)[:size]
 
     @staticmethod
     def meta_slot_offset(slot):
@@ -124,8 +198,7 @@ def meta_slot_offset(slot):
 
     def meta_read_slot(self, slot, fo=None):
         offset = self.meta_slot_offset(slot)
-        fo.seek(offset, os.SEEK_SET)
-        fo.readinto(self.meta_slot_buff)
+        self.dev_read(offset, self.meta_slot_buff, fo=fo)
         try:
             return bdecode(self.meta_slot_buff[:mmap.PAGESIZE])
         except Exception as exc:
@@ -138,31 +211,76 @@ def meta_write_slot(self, slot, data, fo=None):
         self.meta_slot_buff.seek(0)
         self.meta_slot_buff.write(data)
         offset = self.meta_slot_offset(slot)
-        fo.seek(offset, os.SEEK_SET)
-        fo.write(self.meta_slot_buff)
-        fo.flush()
+        self.dev_write(offset, self.meta_slot_buff, fo=fo)
+
+    def write_header(self, slot, seq, length, updated, fo=None):
+        """
+        Write the meta slot page of the local node, with the slot header
+        after the nodename.
+        """
+        try:
+            nodename = bytes(Env.nodename, "utf-8")
+        except TypeError:
+            nodename = Env.nodename
+        buff = self.header_buff
+        buff.seek(0)
+        buff.write(nodename + b"\0" * (self.HEADER_OFFSET - len(nodename)))
+        buff.write(struct.pack(self.HEADER_FMT, self.HEADER_MAGIC, seq, length, updated))
+        self.dev_write(self.meta_slot_offset(slot), buff, fo=fo)
+
+    def read_headers(self, slots, fo=None):
+        """
+        Read the meta slot pages of the <slots> with a single read, and
+        return the (seq, length, updated) slot headers indexed by slot.
+        The slots without header are absent from the returned dict.
+        """
+        headers = {}
+        if not slots:
+            return headers
+        first = min(slots)
+        size = (max(slots) - first + 1) * mmap.PAGESIZE
+        if len(self.headers_buff) < size:
+            self.headers_buff = mmap.mmap(-1, size)
+        self.dev_read(self.meta_slot_offset(first), self.buff_view(self.headers_buff, size), fo=fo)
+        for slot in slots:
+            offset = (slot - first) * mmap.PAGESIZE + self.HEADER_OFFSET
+            magic, seq, length, updated = struct.unpack_from(self.HEADER_FMT, self.headers_buff, offset)
+            if magic != self.HEADER_MAGIC:
+                continue
+            headers[slot] = (seq, length, updated)
+        return headers
 
     def slot_offset(self, slot):
         return self.METASIZE + slot * self.SLOTSIZE
 
-    def read_slot(self, slot, fo=None):
+    def read_slot(self, slot, fo=None, length=None):
+        """
+        Return the data of the <slot>. If the data <length> is known, only
+        the pages holding the data are read.
+        """
         offset = self.slot_offset(slot)
-        fo.seek(offset, os.SEEK_SET)
-        fo.readinto(self.slot_buff)
-        data = bdecode(self.slot_buff[:])
-        end = data.index("\0")
-        return data[:end]
+        if length is None or length > self.SLOTSIZE:
+            self.dev_read(offset, self.slot_buff, fo=fo)
+            data = bdecode(self.slot_buff[:])
+            end = data.index("\0")
+            return data[:end]
+        self.dev_read(offset, self.buff_view(self.slot_buff, self.aligned_size(length)), fo=fo)
+        data = bdecode(self.slot_buff[:length])
+        return data.rstrip("\0")
 
     def write_slot(self, slot, data, fo=None):
+        """
+        Write <data> in the <slot>. Only the pages holding the data are
+        written, the data is terminated by a nul byte for the readers unaware
+        of the slot header.
+        """
         if len(data) > self.SLOTSIZE:
             self.log.error("attempt to write too long data in slot %d", slot)
             raise ex.AbortAction()
         self.slot_buff.seek(0)
         self.slot_buff.write(data)
         offset = self.slot_offset(slot)
-        fo.seek(offset, os.SEEK_SET)
-        fo.write(self.slot_buff)
-        fo.flush()
+        self.dev_write(offset, self.buff_view(self.slot_buff, self.aligned_size(len(data))), fo=fo)
 
     def load_peer_config(self, fo=None, verbose=True):
         for nodename in self.hb_nodes:
@@ -203,6 +321,7 @@ def allocate_slot(self):
                 except TypeError:
                     nodename = Env.nodename
                 self.meta_write_slot(slot, nodename, fo=fo)
+                self.dev_sync(fo=fo)
                 self.log.info("allocated slot %d", slot)
             break
 
@@ -213,6 +332,9 @@ class HbDiskTx(HbDisk):
     """
     def __init__(self, name):
         HbDisk.__init__(self, name, role="tx")
+        # a restarted tx must not reuse the sequence numbers of its
+        # previous run
+        self.seq = int(time.time() * 1000000)
 
     def _configure(self):
         HbDisk._configure(self)
@@ -232,6 +354,7 @@ def run(self):
             while True:
                 self.do()
                 if self.stopped():
+                    self.close_dev()
                     sys.exit(0)
                 with shared.HB_TX_TICKER:
                     shared.HB_TX_TICKER.wait(self.interval)
@@ -254,12 +377,16 @@ def _do(self, fo):
         if message is None:
             return
 
+        updated = time.time()
         data = (json.dumps({
             "msg": message,
-            "updated": time.time(),
+            "updated": updated,
         })+'\0').encode()
         try:
             self.write_slot(slot, data, fo=fo)
+            self.seq += 1
+            self.write_header(slot, self.seq, len(data), updated, fo=fo)
+            self.dev_sync(fo=fo)
             self.set_last()
             self.push_stats(message_bytes)
             #self.log.info("written to %s slot %s", self.dev, slot)
@@ -279,6 +406,7 @@ class HbDiskRx(HbDisk):
     def __init__(self, name):
         HbDisk.__init__(self, name, role="rx")
         self.last_updated = {}
+        self.last_seq = {}
 
     def run(self):
         self.set_tid()
@@ -301,6 +429,7 @@ def run(self):
                         self.load_peer_config(fo=fo)
             self.do()
             if self.stopped():
+                self.close_dev()
                 sys.exit(0)
             with shared.HB_TX_TICKER:
                 shared.HB_TX_TICKER.wait(self.interval)
@@ -323,14 +452,49 @@ def do(self):
             self._do(fo)
 
     def _do(self, fo):
+        """
+        Read the slot headers of all peers with a single read, and read,
+        parse and decrypt only the slots rewritten since the last pass.
+        The slots of the peers not writing headers are read every pass.
+        """
         self.reload_config()
+        now = time.time()
+        slots = [data["slot"] for nodename, data in self.peer_config.items()
+                 if nodename != Env.nodename and data["slot"] >= 0]
+        try:
+            headers = self.read_headers(slots, fo=fo)
+        except Exception as exc:
+            self.log.error("read from %s slot headers error: %s", self.dev, exc)
+            headers = {}
         for nodename, data in self.peer_config.items():
             if nodename == Env.nodename:
                 continue
             if data["slot"] < 0:
                 continue
             try:
-                slot_data = json.loads(self.read_slot(data["slot"], fo=fo))
+                header = headers.get(data["slot"])
+                if header is not None and header[2] < now - self.timeout:
+                    # stale header, the slot may be written by a tx
+                    # unaware of the headers
+                    header = None
+                if header is not None:
+                    seq, length, _ = header
+                    if self.last_seq.get(nodename) == seq:
+                        # remote tx has not rewritten its slot
+                        continue
+                    slot_data = json.loads(self.read_slot(data["slot"], fo=fo, length=length))
+                    self.last_seq[nodename] = seq
+                else:
+                    slot_data = json.loads(self.read_slot(data["slot"], fo=fo))
+                    updated = slot_data["updated"]
+                    last_updated = self.last_updated.get(nodename)
+                    if last_updated is not None and last_updated == updated:
+                        # remote tx has not rewritten its slot
+                        #self.log.info("node %s has not updated its slot", nodename)
+                        continue
+                    if updated < now - self.timeout:
+                        # discard too old dataset
+                        continue
                 _clustername, _nodename, _data = self.decrypt(slot_data["msg"])
                 if _clustername != self.cluster_name:
                     continue
@@ -343,16 +507,7 @@ def _do(self, fo):
                     self.log.warning("node %s has written its data in node %s "
                                      "reserved slot", _nodename, nodename)
                     nodename = _nodename
-                updated = slot_data["updated"]
-                last_updated = self.last_updated.get(nodename)
-                if last_updated is not None and last_updated == updated:
-                    # remote tx has not rewritten its slot
-                    #self.log.info("node %s has not updated its slot", nodename)
-                    continue
-                if updated < time.time() - self.timeout:
-                    # discard too old dataset
-                    continue
-                self.last_updated[nodename] = updated
+                self.last_updated[nodename] = slot_data["updated"]
                 self.queue_rx_data(_data, nodename)
                 self.push_stats(len(slot_data))
                 self.set_last(nodename)
@@ -364,6 +519,3 @@ def _do(self, fo):
                 self.set_last(nodename, success=False)
             finally:
                 self.set_beating(nodename)
-
-
-
@@ -156,22 +156,29 @@ def get_ip_address(ifname):
             addr = intf.ipaddr
         return addr
 
-    def get_message(self, nodename=None):
+    def get_message(self, nodename=None, binary=False):
+        """
+        Return the (message, message length) tuple to send to <nodename>,
+        or to all peers if <nodename> is not set.
+
+        The full and patch messages are cached in shared.HB_MSG_CACHE, so
+        they are serialized and encrypted once for all the heartbeat links.
+        If <binary> is True, the message is a binary frame instead of a
+        json envelope.
+        """
         begin, num = self.get_oldest_gen(nodename)
         if num == 0:
             # we're alone for now. don't send a full status payload.
             # sent a presence announce payload instead.
             self.log.debug("ping node %s", nodename if nodename else "*")
-            if self.msg_type != 'ping':
-                self.msg_type = 'ping'
-                self.log.info('change message type to %s', self.msg_type)
-            message = self.encrypt({
+            self.set_msg_type("ping")
+            message = self.encrypt_message({
                 "kind": "ping",
                 "compat": shared.COMPAT_VERSION,
                 "gen": self.get_gen(),
                 "monitor": self.get_node_monitor(),
                 "updated": time.time(), # for hb and relay readers
-            }, encode=False)
+            }, binary=binary)
             return message, len(message) if message else 0
         if begin == 0 or begin > shared.GEN:
             self.log.debug("send full node data to %s", nodename if nodename else "*")
@@ -179,36 +186,60 @@ def get_message(self, nodename=None):
                 # no pertinent data to send yet (pre-init)
                 self.log.debug("no pertinent data to send yet (pre-init)")
                 return None, 0
-            if self.msg_type != 'full':
-                self.msg_type = 'full'
-                self.log.info('change message type to %s', self.msg_type)
-            with shared.HB_MSG_LOCK:
-                if shared.HB_MSG is not None:
-                    return shared.HB_MSG, shared.HB_MSG_LEN
-                data = self.node_data.get_full()
-                shared.HB_MSG = self.encrypt(data, encode=False)
-                if shared.HB_MSG is None:
-                    shared.HB_MSG_LEN = 0
-                else:
-                    shared.HB_MSG_LEN = len(shared.HB_MSG)
-                return shared.HB_MSG, shared.HB_MSG_LEN
+            self.set_msg_type("full")
+            key = ("full", binary)
+            get_data = self.node_data.get_full
         else:
             self.log.debug("send gen %d-%d deltas to %s", begin, shared.GEN, nodename if nodename else "*") # COMMENT
-            if self.msg_type != 'patch':
-                self.msg_type = 'patch'
-                self.log.info('change message type to %s', self.msg_type)
-            data = {}
-            for gen, delta in shared.GEN_DIFF.items():
-                if gen <= begin:
-                    continue
-                data[gen] = delta
-            message = self.encrypt({
-                "kind": "patch",
-                "deltas": data,
-                "gen": self.get_gen(),
-                "updated": time.time(), # for hb and relay readers
-            }, encode=False)
-            return message, len(message) if message else 0
+            self.set_msg_type("patch")
+            gen = self.get_gen()
+            key = ("patch", begin, tuple(sorted(gen.items())), binary)
+
+            def get_data():
+                deltas = {}
+                for _gen, delta in list(shared.GEN_DIFF.items()):
+                    if _gen <= begin:
+                        continue
+                    deltas[_gen] = delta
+                return {
+                    "kind": "patch",
+                    "deltas": deltas,
+                    "gen": gen,
+                    "updated": time.time(), # for hb and relay readers
+                }
+        with shared.HB_MSG_LOCK:
+            try:
+                return shared.HB_MSG_CACHE[key]
+            except KeyError:
+                pass
+            message = self.encrypt_message(get_data(), binary=binary)
+            if message is None:
+                return None, 0
+            if len(shared.HB_MSG_CACHE) >= shared.HB_MSG_CACHE_SIZE:
+                shared.HB_MSG_CACHE.clear()
+            shared.HB_MSG_CACHE[key] = message, len(message)
+            return shared.HB_MSG_CACHE[key]
+
+    def encrypt_message(self, data, binary=False):
+        if binary:
+            return self.encrypt_binary(data)
+        return self.encrypt(data, encode=False)
+
+    def set_msg_type(self, msg_type):
+        if self.msg_type != msg_type:
+            self.msg_type = msg_type
+            self.log.info('change message type to %s', self.msg_type)
+
+    def peer_supports_binary(self, nodename):
+        """
+        Return True if the peer announced a compat version able to decode
+        the binary heartbeat frames.
+        """
+        compat = self.nodes_data.get([nodename, "compat"], default=0)
+        try:
+            return compat >= shared.HB_BINARY_COMPAT
+        except TypeError:
+            return False
 
     def queue_rx_data(self, data, nodename):
         shared.RX.put((nodename, data, self.name))
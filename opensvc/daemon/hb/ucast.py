@@ -1,17 +1,22 @@
 """
 Unicast Heartbeat module
 """
+import errno
+import select
 import sys
 import socket
-import threading
 import time
 
-import foreign.six as six
 import core.exceptions as ex
 import daemon.shared as shared
+from core.comm import BINARY_FRAME_HEADER, BINARY_FRAME_MAGIC, Crypt
 from env import Env
 from .hb import Hb
 from utilities.render.listener import fmt_listener
+from utilities.storage import Storage
+
+# errno of a non-blocking connect() in progress
+CONNECT_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EALREADY, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", errno.EWOULDBLOCK))
 
 
 class HbUcast(Hb):
@@ -24,6 +29,7 @@ def __init__(self, name, role=None):
         self.peer_config = {}
         self.config_change = False
         self.timeout = None
+        self.binary = False
 
     def status(self, **kwargs):
         data = Hb.status(self, **kwargs)
@@ -84,17 +90,31 @@ def _configure(self):
             self.config_change = True
             self.interval = interval
 
+        binary = shared.NODE.oget(self.name, "binary")
+        if binary != self.binary:
+            self.config_change = True
+            self.binary = binary
+
         self.max_handlers = len(self.hb_nodes) * 4
 
 
 class HbUcastTx(HbUcast):
     """
     The unicast heartbeat tx class.
+
+    A long-lived connection is kept to each peer, and the message of a
+    beat is sent to all peers in parallel, through non-blocking sockets
+    multiplexed by a select() loop. A peer connection failing too many
+    times in a row is retried with an exponential backoff.
     """
     sock_tmo = 1.0
+    max_backoff = 60
+    retries_before_backoff = 3
 
     def __init__(self, name, role="tx"):
         super(HbUcastTx, self).__init__(name, role=role)
+        self.conns = {}
+        self.peer_stats = {}
 
     def run(self):
         self.set_tid()
@@ -108,6 +128,7 @@ def run(self):
             while True:
                 self.do()
                 if self.stopped():
+                    self.close_conns()
                     self.log.info('sys.exit()')
                     sys.exit(0)
                 with shared.HB_TX_TICKER:
@@ -118,59 +139,269 @@ def run(self):
     def status(self, **kwargs):
         data = HbUcast.status(self, **kwargs)
         data["config"] = {}
+        data["stats"] = Storage(self.stats)
+        data["stats"]["peers"] = dict((nodename, dict(stats)) for nodename, stats in self.peer_stats.items())
         return data
 
+    def get_peer_stats(self, nodename):
+        if nodename not in self.peer_stats:
+            self.peer_stats[nodename] = Storage({
+                "connects": 0,
+                "fails": 0,
+                "latency": None,
+                "latency_avg": None,
+                "latency_max": None,
+                "backoff_until": 0,
+            })
+        return self.peer_stats[nodename]
+
+    def push_latency(self, nodename, latency):
+        stats = self.get_peer_stats(nodename)
+        stats.latency = latency
+        if stats.latency_avg is None:
+            stats.latency_avg = latency
+        else:
+            stats.latency_avg = 0.8 * stats.latency_avg + 0.2 * latency
+        if stats.latency_max is None or latency > stats.latency_max:
+            stats.latency_max = latency
+
     def do(self):
         self.janitor_procs()
         self.reload_config()
-        message, message_bytes = self.get_message()
-        if message is None:
-            return
-
-        for nodename, config in self.peer_config.items():
-            if nodename == Env.nodename:
+        self.janitor_conns()
+        payloads = {}
+
+        def get_payload(binary):
+            """
+            Return the (payload, message length) tuple of the format
+            requested, serializing at most once per format and beat.
+            """
+            if binary not in payloads:
+                message, message_bytes = self.get_message(binary=binary)
+                if message is not None and not binary:
+                    message = (message+"\0").encode()  # pylint: disable=no-member
+                payloads[binary] = message, message_bytes
+            return payloads[binary]
+
+        nodenames = [nodename for nodename in self.peer_config if nodename != Env.nodename]
+        pending = {}
+        for nodename in nodenames:
+            binary = self.binary and self.peer_supports_binary(nodename)
+            payload, message_bytes = get_payload(binary)
+            if payload is None:
                 continue
-            self._do(message, message_bytes, nodename, config)
-
-    def _do(self, message, message_bytes, nodename, config):
-        sock = None
+            conn = self.prepare(nodename, payload, message_bytes)
+            if conn is not None:
+                pending[nodename] = conn
         try:
-            # self.log.info("sending to %s:%s", config["addr"], config["port"])
-            sock = socket.create_connection((config["addr"], config["port"]), self.sock_tmo)
-            sock.sendall((message+"\0").encode())  # pylint: disable=no-member
-            self.set_last(nodename)
-            self.push_stats(message_bytes)
-        except socket.timeout:
-            self.push_stats()
-            if self.get_last(nodename).success:
-                self.log.warning("send to %s (%s:%d) timeout", nodename,
-                                 config["addr"], config["port"])
-            self.set_last(nodename, success=False)
+            self.send(pending)
+        finally:
+            for nodename in nodenames:
+                self.set_beating(nodename)
+
+    def prepare(self, nodename, payload, message_bytes):
+        """
+        Return the peer connection, with <payload> queued for sending, or
+        None if the peer is in backoff or the connection can not be
+        initiated.
+        """
+        if time.time() < self.get_peer_stats(nodename).backoff_until:
+            return
+        config = self.peer_config[nodename]
+        conn = self.conns.get(nodename)
+        if conn is not None and conn.buff:
+            # the previous message is not fully sent: the peer is too slow
+            # to consume our messages, reset the connection
+            self.close_conn(nodename)
+            conn = None
+        if conn is None:
+            try:
+                conn = self.connect(nodename, config)
+            except Exception as exc:
+                self.fail(nodename, "error: %s" % exc)
+                return
+        conn.buff = payload
+        conn.message_bytes = message_bytes
+        conn.begin = time.time()
+        return conn
+
+    def connect(self, nodename, config):
+        """
+        Initiate a non-blocking connection to the peer. The connection
+        completes in the send() loop.
+        """
+        family, socktype, proto, _, sockaddr = socket.getaddrinfo(config["addr"], config["port"], 0, socket.SOCK_STREAM)[0]
+        sock = socket.socket(family, socktype, proto)
+        sock.setblocking(0)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (AttributeError, socket.error):
+            pass
+        err = sock.connect_ex(sockaddr)
+        if err not in CONNECT_IN_PROGRESS:
+            sock.close()
+            raise socket.error(err, errno.errorcode.get(err, str(err)))
+        conn = Storage({
+            "sock": sock,
+            "addr": config["addr"],
+            "port": config["port"],
+            "connected": err == 0,
+            "buff": b"",
+            "begin": 0,
+        })
+        self.conns[nodename] = conn
+        if conn.connected:
+            self.get_peer_stats(nodename).connects += 1
+        return conn
+
+    def send(self, pending):
+        """
+        Send the queued payloads to the <pending> peers in parallel,
+        until they are all sent or the sock_tmo deadline is reached.
+        """
+        deadline = time.time() + self.sock_tmo
+        reconnected = set()
+        while pending:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            fds = dict((conn.sock.fileno(), nodename) for nodename, conn in pending.items())
+            try:
+                rlist, wlist, _ = select.select(list(fds), list(fds), [], timeout)
+            except (select.error, ValueError) as exc:
+                self.log.error("select: %s", exc)
+                break
+            changed = set()
+            for fd in rlist:
+                nodename = fds[fd]
+                conn = pending[nodename]
+                if not conn.connected or not self.check_closed(nodename, conn):
+                    continue
+                changed.add(nodename)
+                if nodename in reconnected:
+                    del pending[nodename]
+                    self.fail(nodename, "error: connection closed by peer")
+                    continue
+                # the peer closed the connection we kept, for example on
+                # daemon restart: reconnect and retry in the same beat.
+                reconnected.add(nodename)
+                conn = self.prepare(nodename, conn.buff, conn.message_bytes)
+                if conn is None:
+                    del pending[nodename]
+                else:
+                    pending[nodename] = conn
+            for fd in wlist:
+                nodename = fds[fd]
+                if nodename in changed:
+                    continue
+                if self.write(nodename, pending[nodename]):
+                    del pending[nodename]
+        for nodename in pending:
+            self.close_conn(nodename)
+            self.fail(nodename, "timeout")
+
+    def check_closed(self, nodename, conn):
+        """
+        The rx end never sends data, so a readable connection is a
+        connection closed by the peer. Return True if the connection
+        was closed.
+        """
+        try:
+            data = conn.sock.recv(4096)
         except socket.error as exc:
-            self.push_stats()
-            if self.get_last(nodename).success:
-                self.log.warning("send to %s (%s:%d) error: %s", nodename,
-                                 config["addr"], config["port"], str(exc))
-            self.set_last(nodename, success=False)
+            if exc.args and exc.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return False
+            data = b""
+        if data:
+            return False
+        self.close_conn(nodename)
+        return True
+
+    def write(self, nodename, conn):
+        """
+        Send what the socket accepts of the queued payload. Return True
+        when the peer is done, sent or failed.
+        """
+        try:
+            if not conn.connected:
+                err = conn.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err:
+                    raise socket.error(err, errno.errorcode.get(err, str(err)))
+                conn.connected = True
+                self.get_peer_stats(nodename).connects += 1
+            sent = conn.sock.send(conn.buff)
+            conn.buff = conn.buff[sent:]
+        except socket.error as exc:
+            if exc.args and exc.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return False
+            self.close_conn(nodename)
+            self.fail(nodename, "error: %s" % exc)
+            return True
         except Exception as exc:
-            self.push_stats()
-            if self.get_last(nodename).success:
-                self.log.error("send to %s (%s:%d) unexpected error: %s", nodename,
-                                 config["addr"], config["port"], str(exc))
-            self.set_last(nodename, success=False)
-        finally:
-            self.set_beating(nodename)
-            if sock is not None:
-                sock.close()
+            self.close_conn(nodename)
+            self.fail(nodename, "unexpected error: %s" % exc, level="error")
+            return True
+        if conn.buff:
+            return False
+        self.push_latency(nodename, time.time() - conn.begin)
+        self.get_peer_stats(nodename).fails = 0
+        self.set_last(nodename)
+        self.push_stats(conn.message_bytes)
+        return True
+
+    def fail(self, nodename, reason, level="warning"):
+        self.push_stats()
+        config = self.peer_config.get(nodename, {})
+        if self.get_last(nodename).success:
+            getattr(self.log, level)("send to %s (%s:%s) %s", nodename,
+                                     config.get("addr"), config.get("port"), reason)
+        self.set_last(nodename, success=False)
+        stats = self.get_peer_stats(nodename)
+        stats.fails += 1
+        if stats.fails >= self.retries_before_backoff:
+            delay = min(self.interval * 2 ** (stats.fails - self.retries_before_backoff), self.max_backoff)
+            stats.backoff_until = time.time() + delay
+
+    def janitor_conns(self):
+        """
+        Close the connections to peers no longer configured, or configured
+        with a different address.
+        """
+        for nodename, conn in list(self.conns.items()):
+            config = self.peer_config.get(nodename)
+            if config is None or config["addr"] != conn.addr or config["port"] != conn.port:
+                self.close_conn(nodename)
+                self.peer_stats.pop(nodename, None)
+
+    def close_conn(self, nodename):
+        conn = self.conns.pop(nodename, None)
+        if conn is None:
+            return
+        try:
+            conn.sock.close()
+        except socket.error:
+            pass
+
+    def close_conns(self):
+        for nodename in list(self.conns):
+            self.close_conn(nodename)
 
 
 class HbUcastRx(HbUcast):
     """
     The unicast heartbeat rx class.
+
+    The listener and the peer connections are multiplexed by a select()
+    loop. A connection can carry many messages, NUL-terminated json
+    envelopes or length-prefixed binary frames, and is closed when idle
+    for too long.
     """
+    buff_size = 65536
+
     def __init__(self, name, role="rx"):
         super(HbUcastRx, self).__init__(name, role=role)
         self.sock = None
+        self.conns = {}
         self.sock_accept_tmo = 2.0
         self.sock_recv_tmo = 5.0
 
@@ -200,7 +431,7 @@ def configure_listener(self):
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.sock.bind((addr, port))
         self.sock.listen(5)
-        self.sock.settimeout(self.sock_accept_tmo)
+        self.sock.setblocking(0)
         self.log.info("listening on %s", fmt_listener(addr, port))
 
     def run(self):
@@ -222,54 +453,148 @@ def run(self):
                 self.log.exception(exc)
                 raise exc
             if self.stopped():
-                self.join_threads()
+                self.close_conns()
                 self.sock.close()
                 self.log.info('sys.exit()')
                 sys.exit(0)
 
+    def idle_tmo(self):
+        return max(self.timeout or 0, self.sock_recv_tmo) * 2
+
     def do(self):
         self.reload_config()
         self.janitor_procs()
-        self.janitor_threads()
+        self.janitor_conns()
 
+        fds = [self.sock] + [conn.sock for conn in self.conns.values()]
         try:
-            conn, addr = self.sock.accept()
-            self.sock.settimeout(self.sock_recv_tmo)
-        except socket.timeout:
+            rlist, _, _ = select.select(fds, [], [], self.sock_accept_tmo)
+        except (select.error, ValueError) as exc:
+            self.log.error("select: %s", exc)
             return
         finally:
             self.set_peers_beating()
-        if len(self.threads) >= self.max_handlers:
-            self.log.warning("drop message received from %s: too many running handlers (%d)",
+        for sock in rlist:
+            if sock is self.sock:
+                self.accept()
+            else:
+                self.read(sock)
+
+    def accept(self):
+        try:
+            sock, addr = self.sock.accept()
+        except socket.error:
+            return
+        if len(self.conns) >= self.max_handlers:
+            self.log.warning("drop connection from %s: too many connections (%d)",
                              addr, self.max_handlers)
+            sock.close()
+            return
+        sock.setblocking(0)
+        self.conns[sock.fileno()] = Storage({
+            "sock": sock,
+            "addr": addr,
+            "chunks": [],
+            "size": 0,
+            "expect": 1,
+            "last": time.time(),
+        })
+
+    def read(self, sock):
+        conn = self.conns.get(sock.fileno())
+        if conn is None:
             return
         try:
-            thr = threading.Thread(target=self.handle_client, args=(conn, addr))
-            thr.start()
-            self.threads.append(thr)
-        except RuntimeError as exc:
-            self.log.warning(exc)
-            conn.close()
-
-    def handle_client(self, conn, addr):
+            chunk = sock.recv(self.buff_size)
+        except socket.error as exc:
+            if exc.args and exc.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            chunk = b""
+        if not chunk:
+            # connection closed by the peer. handle the pending data as
+            # a message, for peers not terminating their message.
+            data = b"".join(conn.chunks)
+            self.close_conn(conn)
+            if data and not data.startswith(BINARY_FRAME_MAGIC):
+                self.handle_message(data, conn.addr)
+            return
+        conn.last = time.time()
+        conn.chunks.append(chunk)
+        conn.size += len(chunk)
+        if conn.expect is None:
+            if b"\x00" not in chunk:
+                # json envelope not terminated yet
+                return
+        elif conn.size < conn.expect:
+            return
+        messages, remainder, conn.expect = self.split_messages(b"".join(conn.chunks))
+        conn.chunks = [remainder] if remainder else []
+        conn.size = len(remainder)
+        for data in messages:
+            self.handle_message(data, conn.addr)
+
+    @staticmethod
+    def split_messages(buff):
+        """
+        Split the complete messages from the head of <buff>.
+
+        Return the list of messages, the remaining data, and the buffer size
+        to reach before a new split can make progress, or None if a NUL
+        byte is needed.
+        """
+        messages = []
+        magic_len = len(BINARY_FRAME_MAGIC)
+        while buff:
+            if buff[:1] == b"\x00":
+                if len(buff) < magic_len and BINARY_FRAME_MAGIC.startswith(buff):
+                    return messages, buff, magic_len
+                if buff[:magic_len] != BINARY_FRAME_MAGIC:
+                    # empty json envelope
+                    buff = buff[1:]
+                    continue
+                frame_len = Crypt.binary_frame_len(buff)
+                if frame_len is None:
+                    return messages, buff, BINARY_FRAME_HEADER.size
+                if len(buff) < frame_len:
+                    return messages, buff, frame_len
+                messages.append(buff[:frame_len])
+                buff = buff[frame_len:]
+                continue
+            idx = buff.find(b"\x00")
+            if idx < 0:
+                return messages, buff, None
+            messages.append(buff[:idx])
+            buff = buff[idx+1:]
+        return messages, buff, 1
+
+    def janitor_conns(self):
+        now = time.time()
+        idle_tmo = self.idle_tmo()
+        for conn in list(self.conns.values()):
+            if now - conn.last > idle_tmo:
+                self.close_conn(conn)
+
+    def close_conn(self, conn):
+        for fd, _conn in list(self.conns.items()):
+            if _conn is conn:
+                del self.conns[fd]
         try:
-            self._handle_client(conn, addr)
-        finally:
-            conn.close()
+            conn.sock.close()
+        except socket.error:
+            pass
 
-    def _handle_client(self, conn, addr):
-        chunks = []
-        buff_size = 4096
-        while True:
-            chunk = conn.recv(buff_size)
-            if chunk:
-                chunks.append(chunk)
-            if not chunk or chunk.endswith(b"\x00"):
-                break
-        data = six.b("").join(chunks)
+    def close_conns(self):
+        for conn in list(self.conns.values()):
+            self.close_conn(conn)
+
+    def handle_message(self, data, addr):
         self.push_stats(len(data))
-        del chunks
+        try:
+            self._handle_message(data, addr)
+        except Exception as exc:
+            self.log.error("handle message from %s: %s", addr[0], exc)
 
+    def _handle_message(self, data, addr):
         clustername, nodename, data = self.decrypt(data, sender_id=addr[0])
         if clustername != self.cluster_name:
             return
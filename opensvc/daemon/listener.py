@@ -10,8 +10,8 @@
 import socket
 import logging
 import time
-import select
 import shutil
+import threading
 import traceback
 import uuid
 import fnmatch
@@ -19,7 +19,7 @@
 import datetime
 from foreign.six.moves.urllib.parse import urlparse, parse_qs # pylint: disable=import-error
 from subprocess import Popen
-from errno import EADDRINUSE, ECONNRESET, EPIPE, EBADF
+from errno import EADDRINUSE, ECONNRESET, EPIPE, EBADF, EAGAIN, EWOULDBLOCK
 
 try:
     import ssl
@@ -54,6 +54,10 @@
 from utilities.string import bencode, bdecode
 from utilities.uri import Uri
 from utilities.render.listener import fmt_listener
+from utilities.selector import selector_parse_fragment
+from utilities.concurrent_futures import get_concurrent_futures
+from daemon.eventloop import EventLoop
+from daemon.peers import PeerPool
 
 if six.PY2:
     class _ConnectionResetError(Exception):
@@ -65,6 +69,18 @@ class _ConnectionAbortedError(Exception):
 
 RE_LOG_LINE = re.compile(r"^[0-9]{4}-[0-9]{2}-[0-9]{2} [0-2][0-9]:[0-6][0-9]:[0-6][0-9],[0-9]{3} .* \| ")
 JANITORS_INTERVAL = 0.5
+
+# the interval of the polling pushers execution, like the logs follow and
+# the peer streams relays
+PUSHERS_INTERVAL = 1.0
+
+# the maximum number of queued messages of an events subscriber, before it
+# is disconnected
+EVENTS_QUEUE_MAX = 1000
+
+# the maximum data queued on a h2 connection, waiting for the client
+# flow control window, before the events pushers stop dequeueing
+OUTBOUND_MAX = 1024 * 1024
 ICON = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAABAAAAAQCAYAAAAf8/9hAAAABHNCSVQICAgIfAhkiAAAAAlwSFlzAAABigAAAYoBM5cwWAAAABl0RVh0U29mdHdhcmUAd3d3Lmlua3NjYXBlLm9yZ5vuPBoAAAJKSURBVDiNbZJLSNRRFMZ/5/5HbUidRSVSuGhMzUKiB9SihYaJQlRSm3ZBuxY9JDRb1NSi7KGGELRtIfTcJBjlItsohT0hjcpQSsM0CMfXzP9xWszM35mpA/dy7+Wc7/vOd67wn9gcuZ8bisa3xG271LXthTdNL/rZ0B0VQbNzA+mX2ra+kL04d86NxY86QpEI8catv0+SIyOMNnr6aa4ba/aylL2cTdVI6tBwrbfUXvKeOXY87Ng2jm3H91dNnWrd++U89kIx7jw48+DMf0bcOtk0MA5gABq6egs91+pRCKc01lXOnG2tn4yAKUYkmWpATDlqevRjdb4PYMWDrSiVqIKCosMX932vAYoQQ8bCgGoVajcDmIau3jxP9bj6/igoFqiTuCeLkDQQQOSEDm3PMQEnfxeqhYlSH6Si6WF4EJjIZE+1AqiGCAZ3GoT1yYcEuSqqMDBacOXMo5JORDJBRJa9V0qMqkiGfHwt1vORlW3ND9ZdB/mZNDANJNmgUXcsnTmx+WCBvuH8G6/GC276BpLmA95XMxvVQdC5NOYkkC8ocG9odRCRzEkI0yzF3pn+SM2SKrfJiCRQYp9uqf9l/p2E3pIdr20DkCvBS6o64tMvtzLTfmTiQlGh05w1iSFyQ23+R3rcsjsqrlPr4X3Q5f6nOw7/iOwpX+wEsyLNwLcIB6TsSQzASon+1n83unbboTtiaczz3FVXD451VG+cawfyEAHPGcdzruPOHpOKp39SdcvzyAqdOh3GsyoBsLxJ1hS+F4l42Xl/Abn0Ctwc5dldAAAAAElFTkSuQmCC")
 
 ROUTED_ACTIONS = {
@@ -87,6 +103,102 @@ class DontClose(Exception):
     pass
 
 
+class Detach(Exception):
+    """
+    Raised by the router when the request handler is blocking, to execute
+    the request in a dedicated thread instead of the workers pool.
+    """
+    pass
+
+
+class EventMessage(object):
+    """
+    An event as filtered for the subscribers sharing a selector and
+    grants. The message is queued to all these subscribers, so its data
+    must be considered read-only, and it is serialized at most once.
+    """
+    def __init__(self, data, created=None):
+        self.data = data
+        self.created = created or time.time()
+        self._json = None
+        self._encoded = None
+        self._encrypted = None
+
+    def dumps(self):
+        if self._json is None:
+            self._json = json.dumps(self.data)
+        return self._json
+
+    def encoded(self):
+        """
+        Return the message formatted for the raw clear-text sockets.
+        """
+        if self._encoded is None:
+            self._encoded = (self.dumps() + "\0").encode()
+        return self._encoded
+
+    def encrypted(self, crypt):
+        """
+        Return the message formatted for the raw encrypted sockets. All
+        these clients share the cluster key, so encrypt only once.
+        """
+        if self._encrypted is None:
+            self._encrypted = crypt.encrypt(self.data)
+        return self._encrypted
+
+
+class EventsFilter(object):
+    """
+    A subscriber selector compiled into the set of matching object paths,
+    so filtering an event change is a set lookup.
+
+    The selectors using only path expressions are maintained incrementally
+    as objects are added to or removed from the cluster. The selectors
+    using status or config expressions are refreshed once per events batch.
+
+    <namespaces> is None for subscribers allowed to see all namespaces.
+    """
+    def __init__(self, thr, selector, namespaces=None, paths=None):
+        self.thr = thr
+        self.selector = selector
+        self.namespaces = namespaces
+        self.static = self.is_static(selector)
+        self.paths = self.select(paths or [])
+
+    @staticmethod
+    def is_static(selector):
+        """
+        Return True if the selector matching depends only on the object
+        paths.
+        """
+        for fragment in re.split(r"[,+]", selector or ""):
+            if not fragment:
+                continue
+            _, _, elts = selector_parse_fragment(fragment)
+            if len(elts) > 1:
+                return False
+        return True
+
+    def select(self, paths):
+        if not paths:
+            return set()
+        if self.namespaces is None:
+            namespaces = set(split_path(path)[1] or "root" for path in paths)
+        else:
+            namespaces = set(self.namespaces)
+        return set(self.thr.object_selector(selector=self.selector, namespaces=namespaces, paths=list(paths)))
+
+    def update(self, paths, added, removed):
+        if not self.static:
+            self.paths = self.select(paths)
+            return
+        self.paths -= removed
+        self.paths |= self.select(added)
+
+    def match(self, path):
+        return path in self.paths
+
+
 class Listener(shared.OsvcThread):
     name = "listener"
     stage = "init"
@@ -106,6 +218,8 @@ class Listener(shared.OsvcThread):
     port = -1
     addr = ""
     handlers = {}
+    parked = {}
+    n_workers = None
 
     @lazy
     def certfs(self):
@@ -282,47 +396,81 @@ def get_http2_ssl_context(self):
     def run(self):
         shared.NODE.listener = self
         self.set_tid()
-        self.last_relay_janitor = 0
         self.log = logging.LoggerAdapter(logging.getLogger(Env.nodename+".osvcd.listener"), {"node": Env.nodename, "component": self.name})
-        self.events_clients = []
-        self.stats = Storage({
-            "sessions": Storage({
-                "accepted": 0,
-                "auth_validated": 0,
-                "tx": 0,
-                "rx": 0,
-                "alive": Storage({}),
-                "clients": Storage({})
-            }),
-        })
-
+        self.init_stats()
         self.register_handlers()
+        self.init_loop()
         self.setup_socks()
         self.stage = "ready"
 
         while True:
             try:
                 self.do()
-                self.update_status()
             except socket.error as exc:
                 self.log.warning(exc)
                 self.setup_socks()
             except Exception as exc:
                 self.log.exception(exc)
             if self.stopped():
+                self.close_sessions()
                 for sock in self.sockmap.values():
                     sock.close()
                 self.join_threads()
+                self.workers.shutdown(wait=False)
+                self.peers.close()
+                shared.EVENT_Q.waker = None
                 if Env.sysname == "Linux":
                     self.certfs.stop()
                 sys.exit(0)
 
+    def init_stats(self):
+        self.last_relay_janitor = 0
+        self.events_clients = []
+        self.events_filters = {}
+        self.events_paths = set()
+        self.events_paths_gen = None
+        self.stats = Storage({
+            "sessions": Storage({
+                "accepted": 0,
+                "auth_validated": 0,
+                "tx": 0,
+                "rx": 0,
+                "alive": Storage({}),
+                "detached": 0,
+                "clients": Storage({})
+            }),
+            "events": Storage({
+                "dispatched": 0,
+                "filters": 0,
+                "subscribers": Storage({}),
+            }),
+        })
+
+    def init_loop(self):
+        """
+        Prepare the event loop, watching the listening sockets and the idle
+        client sessions connections, the pool of workers executing the
+        client sessions steps, and the pool of peer requests.
+        """
+        self.loop = EventLoop()
+        self.listening = {}
+        self.parked = {}
+        self.woken = set()
+        self.n_workers = shared.NODE.oget("listener", "max_workers")
+        self.workers = get_concurrent_futures().ThreadPoolExecutor(max_workers=self.n_workers)
+        shared.EVENT_Q.waker = self.loop.wake
+        self.peers = PeerPool(self, timeout=shared.NODE.oget("listener", "multiplex_timeout"))
+
     def status(self, **kwargs):
         data = shared.OsvcThread.status(self, **kwargs)
+        self.stats.sessions.parked = len(self.parked)
+        self.stats.peers = self.peers.stats
         data["stats"] = self.stats
         data["config"] = {
             "port": self.port,
             "addr": self.addr,
+            "max_workers": self.n_workers,
+            "multiplex_timeout": self.peers.timeout,
         }
         return data
 
@@ -332,6 +480,19 @@ def reconfigure(self):
         unset_lazy(self, "cert")
         unset_lazy(self, "certfs")
         self.setup_socks()
+        self.setup_workers()
+        self.peers.timeout = shared.NODE.oget("listener", "multiplex_timeout")
+
+    def setup_workers(self):
+        n_workers = shared.NODE.oget("listener", "max_workers")
+        if n_workers == self.n_workers:
+            return
+        self.log.info("resize the workers pool from %d to %d", self.n_workers, n_workers)
+        workers = self.workers
+        self.n_workers = n_workers
+        self.workers = get_concurrent_futures().ThreadPoolExecutor(max_workers=n_workers)
+        # the running steps complete in the old pool
+        workers.shutdown(wait=False)
 
     def register_handlers(self):
         self.register_core_handlers()
@@ -387,71 +548,170 @@ def do(self):
             self.janitor_crl()
             self.janitor_procs()
             self.janitor_threads()
-            self.janitor_events()
             self.janitor_relay()
-        self.last_janitors = ts
+            self.peers.janitor()
+            self.update_status()
+            self.last_janitors = ts
 
-        fds = select.select([fno for fno in self.sockmap], [], [], self.sock_tmo)
-        if self.sock_tmo and fds == ([], [], []):
+        for thr in self.janitor_events():
+            self.resume(thr)
+
+        self.register_listening_socks()
+        for data in self.loop.poll(self.loop_timeout()):
+            if isinstance(data, ClientHandler):
+                self.resume(data, readable=True)
+            else:
+                self.accept(data)
+        self.janitor_parked()
+
+    def register_listening_socks(self):
+        """
+        Update the loop registrations after a listening sockets change.
+        """
+        for fd, sock in list(self.listening.items()):
+            if self.sockmap.get(fd) is not sock:
+                self.loop.unregister(sock)
+                del self.listening[fd]
+        for fd, sock in list(self.sockmap.items()):
+            if fd not in self.listening:
+                self.loop.register(sock, sock)
+                self.listening[fd] = sock
+
+    def loop_timeout(self):
+        """
+        Return the time to wait for a socket readability or a wake-up, so
+        the janitors and the parked sessions deadlines are honored.
+        """
+        timeout = self.sock_tmo
+        deadlines = [deadline for deadline in self.parked.values() if deadline is not None]
+        if deadlines:
+            timeout = min(timeout, max(0, min(deadlines) - time.time()))
+        return timeout
+
+    def accept(self, sock):
+        try:
+            conn = None
+            conn, addr = sock.accept()
+            self.stats.sessions.accepted += 1
+            if sock is self.sockux:
+                tls = False
+                addr = ["local"]
+                scheme = "raw"
+                encrypted = False
+            elif sock is self.sockuxh2:
+                tls = False
+                addr = ["local"]
+                scheme = "h2"
+                encrypted = False
+            elif sock is self.sock:
+                scheme = "raw"
+                tls = False
+                encrypted = True
+            elif sock is self.tls_sock:
+                scheme = "h2"
+                tls = True
+                encrypted = False
+            else:
+                print("bug")
+                conn.close()
+                return
+            if addr[0] not in self.stats.sessions.clients:
+                self.stats.sessions.clients[addr[0]] = Storage({
+                    "accepted": 0,
+                    "auth_validated": 0,
+                    "tx": 0,
+                    "rx": 0,
+                })
+            self.stats.sessions.clients[addr[0]].accepted += 1
+            #self.log.info("accept %s", str(addr))
+        except socket.timeout:
             return
-        for fd in fds[0]:
-            sock = self.sockmap[fd]
-            try:
-                conn = None
-                conn, addr = sock.accept()
-                self.stats.sessions.accepted += 1
-                if fd == self.sockux.fileno():
-                    tls = False
-                    addr = ["local"]
-                    scheme = "raw"
-                    encrypted = False
-                elif fd == self.sockuxh2.fileno():
-                    tls = False
-                    addr = ["local"]
-                    scheme = "h2"
-                    encrypted = False
-                elif fd == self.sock.fileno():
-                    scheme = "raw"
-                    tls = False
-                    encrypted = True
-                elif fd == self.tls_sock.fileno():
-                    scheme = "h2"
-                    tls = True
-                    encrypted = False
-                else:
-                    print("bug")
-                    continue
-                if addr[0] not in self.stats.sessions.clients:
-                    self.stats.sessions.clients[addr[0]] = Storage({
-                        "accepted": 0,
-                        "auth_validated": 0,
-                        "tx": 0,
-                        "rx": 0,
-                    })
-                self.stats.sessions.clients[addr[0]].accepted += 1
-                #self.log.info("accept %s", str(addr))
-            except socket.timeout:
-                continue
-            except OSError as exc:
-                if conn and exc.errno == EBADF:
-                    conn.close()
-                continue
-            except ConnectionAbortedError:
-                if conn:
-                    conn.close()
-                continue
-            except Exception as exc:
-                self.log.exception(exc)
-                if conn:
-                    conn.close()
-                continue
-            try:
-                thr = ClientHandler(self, conn, addr, encrypted, scheme, tls, self.tls_context)
-                thr.start()
-                self.threads.append(thr)
-            except RuntimeError as exc:
-                self.log.warning(exc)
+        except OSError as exc:
+            if conn and exc.errno == EBADF:
                 conn.close()
+            return
+        except ConnectionAbortedError:
+            if conn:
+                conn.close()
+            return
+        except Exception as exc:
+            self.log.exception(exc)
+            if conn:
+                conn.close()
+            return
+        thr = ClientHandler(self, conn, addr, encrypted, scheme, tls, self.tls_context)
+        self.threads.append(thr)
+        if scheme == "raw":
+            # wait for the request in the loop
+            self.park(thr)
+        else:
+            # tls handshake and h2 connection preamble
+            self.submit(thr)
+
+    def submit(self, thr):
+        """
+        Execute the next step of the <thr> session in a worker.
+        """
+        try:
+            self.workers.submit(thr.run)
+        except RuntimeError as exc:
+            # workers pool shut down
+            self.log.warning(exc)
+            thr.close()
+
+    def park(self, thr):
+        """
+        Watch the <thr> session connection in the loop, until it is
+        readable, notified, or its deadline is reached. Executed in the
+        loop thread.
+        """
+        if thr.closed:
+            return
+        if thr in self.woken:
+            # notified during its last step
+            self.woken.discard(thr)
+            self.submit(thr)
+            return
+        try:
+            self.loop.register(thr.sock, thr)
+        except (ValueError, OSError) as exc:
+            self.log.warning("park %s: %s", thr, exc)
+            thr.close()
+            return
+        self.parked[thr] = thr.deadline()
+
+    def resume(self, thr, readable=False):
+        """
+        Submit the next step of the parked <thr> session, or remember the
+        notification of a running session for its next park. Executed in
+        the loop thread.
+        """
+        if thr not in self.parked:
+            if isinstance(thr, ClientHandler) and not thr.closed:
+                self.woken.add(thr)
+            return
+        del self.parked[thr]
+        self.loop.unregister(thr.sock)
+        thr.readable = readable
+        self.submit(thr)
+
+    def forget(self, thr):
+        self.woken.discard(thr)
+
+    def janitor_parked(self):
+        """
+        Resume the parked sessions whose deadline is reached.
+        """
+        now = time.time()
+        for thr, deadline in list(self.parked.items()):
+            if deadline is not None and deadline <= now:
+                self.resume(thr)
+
+    def close_sessions(self):
+        for thr in list(self.parked):
+            del self.parked[thr]
+            self.loop.unregister(thr.sock)
+            thr.close()
 
     def janitor_crl(self):
         if not self.tls_sock:
@@ -515,67 +775,173 @@ def janitor_events(self):
         Don't dequeue messages during the first 2 seconds of the listener lifetime,
         so clients have a chance to reconnect after a daemon restart and loose an
         event.
+
+        Each event is filtered once per distinct subscriber selector and
+        grants, and the resulting message is shared by the subscribers
+        queues.
+
+        Return the set of subscribers with new queued messages.
         """
+        woken = set()
         if self.events_grace_period:
             if time.time() > self.created + 2:
                 self.events_grace_period = False
             else:
-                return
-        done = []
+                return woken
+        events = []
         while True:
             try:
-                event = shared.EVENT_Q.get(False, 0)
+                events.append(shared.EVENT_Q.get(False, 0))
             except queue.Empty:
                 break
-            to_remove = []
-            for idx, thr in enumerate(self.events_clients):
-                if thr not in self.threads:
-                    to_remove.append(idx)
-                    continue
-                # make a copy, filter_event may change data, avoid being replaced while queued
-                fevent = self.filter_event(json.loads(json.dumps(event)), thr)
-                if fevent is None:
-                    continue
-                if thr.h2conn:
-                    if not thr.events_stream_ids:
-                        to_remove.append(idx)
-                        continue
-                thr.event_queue.put(fevent)
-            for idx in to_remove:
-                try:
-                    del self.events_clients[idx]
-                except IndexError:
-                    pass
+        subscribers = self.events_subscribers()
+        if not events or not subscribers:
+            return woken
+        self.update_events_filters(subscribers)
+        for event in events:
+            self.dispatch_event(event, subscribers, woken)
+        return woken
 
-    def filter_event(self, event, thr):
+    def events_subscribers(self):
+        """
+        Purge the events_clients list of the gone clients, update the
+        subscribers stats and return the (thr, filter key) list of the
+        valid subscribers.
+        """
+        subscribers = []
+        clients = []
+        for thr in self.events_clients:
+            if thr not in self.threads:
+                continue
+            if thr.h2conn and not thr.events_stream_ids:
+                continue
+            clients.append(thr)
+            if thr.events_stats is None:
+                thr.events_stats = Storage({
+                    "addr": thr.addr[0],
+                    "usr": thr.usr.name if thr.usr else thr.usr,
+                    "selector": None,
+                    "queued": 0,
+                    "queued_max": 0,
+                    "sent": 0,
+                    "latency_avg": 0.0,
+                    "latency_max": 0.0,
+                })
+            thr.events_stats.selector = thr.selector
+            thr.events_stats.queued = thr.event_queue.qsize()
+            if thr.events_stats.queued > thr.events_stats.queued_max:
+                thr.events_stats.queued_max = thr.events_stats.queued
+            subscribers.append((thr, self.events_filter_key(thr)))
+        self.events_clients = clients
+        self.stats.events.subscribers = Storage((thr.sid, thr.events_stats) for thr in clients)
+        return subscribers
+
+    @staticmethod
+    def events_filter_key(thr):
+        """
+        Return the key of the filter to apply to the events sent to <thr>,
+        or None if the client is allowed to see all events unfiltered.
+        """
+        if thr.usr is False or "root" in thr.usr_grants:
+            if thr.selector in (None, "**"):
+                # root and no selector => fast path
+                return
+            return (thr.selector, None)
+        return (thr.selector, frozenset(thr.get_namespaces()))
+
+    def events_cluster_paths(self):
+        """
+        Return the cluster object paths, the paths added and the paths
+        removed since the last call.
+        """
+        index = self.paths_index()
+        if index.gen == self.events_paths_gen:
+            return self.events_paths, set(), set()
+        paths = set(index.paths)
+        added = paths - self.events_paths
+        removed = self.events_paths - paths
+        self.events_paths = paths
+        self.events_paths_gen = index.gen
+        return paths, added, removed
+
+    def update_events_filters(self, subscribers):
+        """
+        Create the filters of the new selectors, drop the unused ones and
+        update the others for the changes of the cluster object paths.
+        """
+        paths, added, removed = self.events_cluster_paths()
+        keys = set(key for _, key in subscribers if key is not None)
+        for key in [key for key in self.events_filters if key not in keys]:
+            del self.events_filters[key]
+        for key in keys:
+            efilter = self.events_filters.get(key)
+            if efilter is None:
+                selector, namespaces = key
+                self.events_filters[key] = EventsFilter(self, selector, namespaces=namespaces, paths=paths)
+            else:
+                efilter.update(paths, added, removed)
+        self.stats.events.filters = len(self.events_filters)
+
+    def dispatch_event(self, event, subscribers, woken):
+        messages = {}
+        created = event.get("ts") if isinstance(event, dict) else None
+        for thr, key in subscribers:
+            try:
+                msg = messages[key]
+            except KeyError:
+                data = self.filter_event(event, self.events_filters.get(key))
+                if data is None:
+                    msg = None
+                else:
+                    msg = EventMessage(data, created=created)
+                messages[key] = msg
+            if msg is None:
+                continue
+            if thr.event_queue.qsize() >= EVENTS_QUEUE_MAX:
+                # the subscriber does not consume its messages: disconnect
+                # it rather than letting its queue grow
+                if not thr.stopped():
+                    self.log.warning("disconnect events subscriber %s: %d messages queued", thr.addr[0], EVENTS_QUEUE_MAX)
+                    thr.stop()
+            else:
+                thr.event_queue.put(msg)
+            woken.add(thr)
+        self.stats.events.dispatched += 1
+
+    def filter_event(self, event, efilter):
+        """
+        Return the event data filtered by the <efilter> EventsFilter.
+        The event is not modified, as it is shared by all subscribers.
+        """
         if event is None:
             return
-        if thr.selector in (None, "**") and (thr.usr is False or "root" in thr.usr_grants):
-            # root and no selector => fast path
+        if efilter is None:
             return event
-        namespaces = thr.get_namespaces()
         kind = event.get("kind")
         if kind == "full":
             return event
         elif kind == "patch":
-            return self.filter_patch_event(event, thr, namespaces)
+            return self.filter_patch_event(event, efilter)
         elif kind == "event":
-            return self.filter_event_event(event, thr, namespaces)
+            return self.filter_event_event(event, efilter)
 
-    def filter_event_event(self, event, thr, namespaces):
-        def valid(change):
-            try:
-                path = event["data"]["path"]
-            except KeyError:
-                return True
-            if thr.selector and not self.match_object_selector(thr.selector, namespaces=namespaces, path=path):
-                return False
-            return False
-        if valid(event):
+    @staticmethod
+    def filter_event_event(event, efilter):
+        try:
+            path = event["data"]["path"]
+        except (KeyError, TypeError):
+            return event
+        if efilter.match(path):
             return event
         return None
 
-    def filter_patch_event(self, event, thr, namespaces):
+    def filter_patch_event(self, event, efilter):
+        def filter_status(value):
+            return self.filter_daemon_status_paths(value, efilter.paths)
+
+        def filter_paths(value):
+            return dict((k, v) for k, v in value.items() if efilter.match(k))
+
         def filter_change(change):
             try:
                 key, value = change
@@ -589,21 +955,21 @@ def filter_change(change):
             if key_len == 0:
                 if value is None:
                     return change
-                value = self.filter_daemon_status(value, namespaces=namespaces, selector=thr.selector)
+                value = filter_status(value)
                 return [key, value]
             elif key[0] == "monitor":
                 if key_len == 1:
                     if value is None:
                         return change
-                    value = self.filter_daemon_status({"monitor": value}, namespaces=namespaces, selector=thr.selector)["monitor"]
+                    value = filter_status({"monitor": value})["monitor"]
                     return [key, value]
                 if key[1] == "services":
                     if key_len == 2:
                         if value is None:
                             return change
-                        value = dict((k, v) for k, v in value.items() if self.match_object_selector(thr.selector, namespaces=namespaces, path=k))
+                        value = filter_paths(value)
                         return [key, value]
-                    if self.match_object_selector(thr.selector, namespaces=namespaces, path=key[2]):
+                    if efilter.match(key[2]):
                         return change
                     else:
                         return
@@ -611,36 +977,26 @@ def filter_change(change):
                     if key_len == 2:
                         if value is None:
                             return change
-                        value = self.filter_daemon_status({"monitor": {"nodes": value}}, namespaces=namespaces, selector=thr.selector)["monitor"]["nodes"]
+                        value = filter_status({"monitor": {"nodes": value}})["monitor"]["nodes"]
                         return [key, value]
                     if key_len == 3:
                         if value is None:
                             return change
-                        value = self.filter_daemon_status({"monitor": {"nodes": {key[2]: value}}}, namespaces=namespaces, selector=thr.selector)["monitor"]["nodes"][key[2]]
+                        value = filter_status({"monitor": {"nodes": {key[2]: value}}})["monitor"]["nodes"][key[2]]
                         return [key, value]
                     if key[3] == "services":
                         if key_len == 4:
                             if value is None:
                                 return change
-                            value = self.filter_daemon_status({"monitor": {"nodes": {key[2]: {"services": value}}}}, namespaces=namespaces, selector=thr.selector)["monitor"]["nodes"][key[2]]["services"]
+                            value = filter_status({"monitor": {"nodes": {key[2]: {"services": value}}}})["monitor"]["nodes"][key[2]]["services"]
                             return [key, value]
-                        if key[4] == "status":
-                            if key_len == 5:
-                                if value is None:
-                                    return change
-                                value = dict((k, v) for k, v in value.items() if self.match_object_selector(thr.selector, namespaces=namespaces, path=k))
-                                return [key, value]
-                            if self.match_object_selector(thr.selector, namespaces=namespaces, path=key[5]):
-                                return change
-                            else:
-                                return
-                        if key[4] == "config":
+                        if key[4] in ("status", "config"):
                             if key_len == 5:
                                 if value is None:
                                     return change
-                                value = dict((k, v) for k, v in value.items() if self.match_object_selector(thr.selector, namespaces=namespaces, path=k))
+                                value = filter_paths(value)
                                 return [key, value]
-                            if self.match_object_selector(thr.selector, namespaces=namespaces, path=key[5]):
+                            if efilter.match(key[5]):
                                 return change
                             else:
                                 return
@@ -651,9 +1007,7 @@ def filter_change(change):
             filtered_change = filter_change(change)
             if filtered_change:
                 changes.append(filtered_change)
-            #    print("ACCEPT", thr.usr.name if thr.usr else "", filtered_change)
-            #else:
-            #    print("DROP  ", thr.usr.name if thr.usr else "", change)
+        event = dict(event)
         event["data"] = changes
         return event
 
@@ -822,6 +1176,14 @@ def setup_socks(self):
 
 
 class ClientHandler(shared.OsvcThread):
+    """
+    A client session.
+
+    The session is not started as a thread. Its steps are executed by the
+    listener workers, and its connection is parked in the listener loop
+    between the steps, until readable, notified of new events, or its
+    deadline is reached.
+    """
     sock_tmo = 5.0
     name = "listener client"
 
@@ -830,6 +1192,11 @@ def __init__(self, parent, conn, addr, encrypted, scheme, tls, tls_context):
         self.parent = parent
         self.event_queue = None
         self.conn = conn
+        self.tls_conn = None
+        self.closed = False
+        self.readable = False
+        self.chunks = []
+        self.raw_events = False
         self.addr = addr
         self.encrypted = encrypted
         self.scheme = scheme
@@ -839,6 +1206,7 @@ def __init__(self, parent, conn, addr, encrypted, scheme, tls, tls_context):
         self.streams = {}
         self.h2conn = None
         self.events_stream_ids = []
+        self.events_stats = None
         self.usr_cf_sum = None
         self.same_auth = lambda h: False
         if scheme == "raw":
@@ -850,6 +1218,15 @@ def __init__(self, parent, conn, addr, encrypted, scheme, tls, tls_context):
             self.usr_auth = None
             self.usr_grants = {}
         self.events_counter = 0
+        self.sid = str(uuid.uuid4())
+        self.parent.stats.sessions.alive[self.sid] = Storage({
+            "created": time.time(),
+            "addr": self.addr[0],
+            "encrypted": self.encrypted,
+            "progress": "init",
+        })
+        if scheme == "raw":
+            self.conn.setblocking(False)
 
     def __str__(self):
         try:
@@ -864,16 +1241,40 @@ def __str__(self):
             progress,
         )
 
+    def is_alive(self):
+        return not self.closed
+
+    def join(self, timeout=None):
+        pass
+
+    @property
+    def sock(self):
+        return self.tls_conn or self.conn
+
+    def deadline(self):
+        """
+        Return the time the parked session must be resumed at, even if not
+        readable nor notified, or None.
+        """
+        if self.scheme == "raw":
+            if self.raw_events:
+                return
+            return time.time() + self.sock_tmo
+        for stream in self.streams.values():
+            for pusher in stream.get("pushers", []):
+                if pusher.get("fn") != "h2_push_action_events":
+                    return time.time() + PUSHERS_INTERVAL
+
     def run(self):
+        """
+        Execute a session step. Raising DontClose parks the session in the
+        listener loop until its next step.
+        """
+        close = True
+        park = True
         try:
-            close = True
-            self.sid = str(uuid.uuid4())
-            self.parent.stats.sessions.alive[self.sid] = Storage({
-                "created": time.time(),
-                "addr": self.addr[0],
-                "encrypted": self.encrypted,
-                "progress": "init",
-            })
+            if self.stopped():
+                return
             if self.scheme == "h2":
                 self.handle_h2_client()
             else:
@@ -881,7 +1282,11 @@ def run(self):
         except Close:
             pass
         except DontClose:
+            close = self.stopped()
+        except Detach:
+            # the detached thread ends the session
             close = False
+            park = False
         except (OSError, socket.error) as exc:
             if exc.errno in (0, ECONNRESET):
                 pass
@@ -897,10 +1302,41 @@ def run(self):
                 traceback.print_exc()
         finally:
             if close:
-                del self.parent.stats.sessions.alive[self.sid]
-                if self.h2conn:
-                    self.h2conn.close_connection()
-                self.conn.close()
+                self.close()
+            elif park:
+                self.parent.loop.call_soon(self.parent.park, self)
+
+    def detach(self, fn, *args):
+        """
+        Execute fn(*args) in a dedicated thread, so a blocking request
+        does not hold a slot of the workers pool.
+        """
+        def run():
+            self.parent.stats.sessions.detached += 1
+            try:
+                fn(*args)
+            except Exception as exc:
+                self.log.exception(exc)
+            finally:
+                self.parent.stats.sessions.detached -= 1
+        thr = threading.Thread(target=run, name="listener detached")
+        thr.daemon = True
+        thr.start()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            del self.parent.stats.sessions.alive[self.sid]
+        except KeyError:
+            pass
+        if self.h2conn:
+            self.h2conn.close_connection()
+        if self.tls_conn:
+            self.tls_conn.close()
+        self.conn.close()
+        self.parent.loop.call_soon(self.parent.forget, self)
 
     def negotiate_tls(self):
         """
@@ -1093,7 +1529,9 @@ def prepare_response(self, stream_id, status, data, content_type="application/js
                 ('Connection', 'keep-alive'),
                 ('Transfer-Encoding', 'chunked'),
             ]
-        if "json" in content_type:
+        if isinstance(data, EventMessage):
+            data = data.dumps().encode()
+        elif "json" in content_type:
             if data is None:
                 data = {}
             data = json.dumps(data).encode()
@@ -1214,9 +1652,17 @@ def h2_router(self, stream_id):
                 return status, content_type, result
 
         try:
-            result = self.router(None, data, stream_id=stream_id, handler=handler)
+            return self.h2_route(data, stream_id, handler)
+        except Detach:
+            self.detach(self.h2_detached_step, data, stream_id, handler)
+            return
+
+    def h2_route(self, data, stream_id, handler, detached=False):
+        content_type = "application/json"
+        try:
+            result = self.router(None, data, stream_id=stream_id, handler=handler, detached=detached)
             status = 200
-        except DontClose:
+        except (DontClose, Detach):
             raise
         except ex.HTTP as exc:
             status = exc.status
@@ -1235,6 +1681,27 @@ def h2_router(self, stream_id):
         self.parent.stats.sessions.alive[self.sid].progress = "sending %s result" % self.parent.stats.sessions.alive[self.sid].progress
         return status, content_type, result
 
+    def h2_detached_step(self, data, stream_id, handler):
+        """
+        Execute a blocking request, and notify the session its response is
+        ready to send. The h2 connection is only used by the session steps.
+        """
+        response = self.h2_route(data, stream_id, handler, detached=True)
+        try:
+            self.streams[stream_id]["response"] = response
+        except KeyError:
+            # stream reset
+            return
+        self.parent.loop.call_soon(self.parent.resume, self)
+
+    def h2_send_detached_responses(self):
+        for stream_id, stream in list(self.streams.items()):
+            response = stream.pop("response", None)
+            if response is None:
+                continue
+            status, content_type, data = response
+            self.prepare_response(stream_id, status, data, content_type)
+
     def h2_window_updated(self, event):
         if event.stream_id:
             try:
@@ -1266,8 +1733,7 @@ def h2_request_received(self, event):
             "outbound": b'',
         }
         if event.stream_ended:
-            status, content_type, data = self.h2_router(stream_id)
-            self.prepare_response(stream_id, status, data, content_type)
+            self.h2_respond(stream_id)
 
     def h2_data_received(self, event):
         self.streams[event.stream_id]["data"] += event.data
@@ -1275,8 +1741,15 @@ def h2_data_received(self, event):
         self.streams[event.stream_id]["stream_ended"] = event.stream_ended
         if not event.stream_ended:
             return
-        status, content_type, data = self.h2_router(event.stream_id)
-        self.prepare_response(event.stream_id, status, data, content_type)
+        self.h2_respond(event.stream_id)
+
+    def h2_respond(self, stream_id):
+        response = self.h2_router(stream_id)
+        if response is None:
+            # the response is sent when the detached request completes
+            return
+        status, content_type, data = response
+        self.prepare_response(stream_id, status, data, content_type)
 
     def h2_stream_ended(self, event):
         pass
@@ -1322,28 +1795,45 @@ def h2_received(self, data):
                 self.stop()
 
     def handle_h2_client(self):
-        self.negotiate_tls()
-        self.tls_conn.settimeout(self.sock_tmo)
+        if self.h2conn is None:
+            self.negotiate_tls()
+            self.tls_conn.settimeout(self.sock_tmo)
+
+            # init h2 connection
+            h2config = H2Configuration(client_side=False)
+            self.h2conn = H2Connection(config=h2config)
+            self.h2conn.initiate_connection()
+            try:
+                self.tls_conn.sendall(self.h2conn.data_to_send())
+            except socket.error as exc:
+                if exc.errno == EPIPE:
+                    # daemon restart with connected clients
+                    return
+                raise
+        elif self.readable and not self.h2_recv():
+            return
 
-        # init h2 connection
-        h2config = H2Configuration(client_side=False)
-        self.h2conn = H2Connection(config=h2config)
-        self.h2conn.initiate_connection()
-        try:
-            self.tls_conn.sendall(self.h2conn.data_to_send())
-        except socket.error as exc:
-            if exc.errno == EPIPE:
-                # daemon restart with connected clients
-                return
-            raise
+        if self.stopped():
+            return
+
+        self.h2_send_detached_responses()
+        self.h2_run_pushers()
+
+        data_to_send = self.h2conn.data_to_send()
+        if data_to_send:
+            self.tls_conn.sendall(data_to_send)
+        raise DontClose
 
+    def h2_recv(self):
+        """
+        Receive and process the data available on the connection. Return
+        False if the session must end.
+        """
         while True:
-            if self.stopped():
-                break
             try:
                 data = self.tls_conn.recv(65535)
                 if not data:
-                    break
+                    return False
                 self.parent.stats.sessions.rx += len(data)
                 self.parent.stats.sessions.clients[self.addr[0]].rx += len(data)
                 self.h2_received(data)
@@ -1353,64 +1843,75 @@ def handle_h2_client(self):
                 pass
             except socket.error as exc:
                 if exc.errno in (0, ECONNRESET):
-                    continue
+                    return False
                 self.log.error("%s", exc)
-                return
+                return False
             except h2.exceptions.StreamClosedError:
-                return
+                return False
             except ConnectionResetError:
-                return
+                return False
             except Exception as exc:
                 self.log.error("exit on %s %s", type(exc), exc)
                 traceback.print_exc()
-                return
-
-            # execute all registered pushers
-            pushers_per_stream = [(stream_id, stream.get("pushers", [])) for stream_id, stream in self.streams.items() if stream.get("pushers")]
-            for stream_id, pushers in pushers_per_stream:
-                for pusher in pushers:
-                    fn = pusher.get("fn")
-                    args = pusher.get("args", [])
-                    kwargs = pusher.get("kwargs", {})
-                    if not fn:
-                        continue
-                    try:
-                        getattr(self, fn)(stream_id, *args, **kwargs)
-                    except Exception as exc:
-                        print(exc)
+                return False
+            if not self.tls or not self.tls_conn.pending():
+                # the tls layer may hold decrypted data the loop can not
+                # see as readable
+                return True
 
-            data_to_send = self.h2conn.data_to_send()
-            if data_to_send:
-                self.tls_conn.sendall(data_to_send)
+    def h2_run_pushers(self):
+        """
+        Execute all registered pushers.
+        """
+        pushers_per_stream = [(stream_id, stream.get("pushers", [])) for stream_id, stream in self.streams.items() if stream.get("pushers")]
+        for stream_id, pushers in pushers_per_stream:
+            for pusher in pushers:
+                fn = pusher.get("fn")
+                args = pusher.get("args", [])
+                kwargs = pusher.get("kwargs", {})
+                if not fn:
+                    continue
+                try:
+                    getattr(self, fn)(stream_id, *args, **kwargs)
+                except Exception as exc:
+                    print(exc)
 
     def handle_raw_client(self):
-        chunks = []
+        if self.raw_events:
+            self.raw_events_step()
+            return
+        if not self.readable:
+            self.log.warning("timeout waiting for data")
+            return
+        if not self.raw_recv():
+            # incomplete request
+            raise DontClose
+        if six.PY3:
+            data = b"".join(self.chunks)
+        else:
+            data = "".join(self.chunks)
+        self.chunks = []
+        self.handle_raw_client_data(data)
+
+    def raw_recv(self):
+        """
+        Receive the request data available on the connection. Return True
+        when the request is complete.
+        """
         buff_size = 4096
-        self.conn.setblocking(False)
         while True:
-            if self.stopped():
-                break
-            ready = select.select([self.conn], [], [self.conn], self.sock_tmo)
-            if ready[0]:
+            try:
                 chunk = self.sock_recv(self.conn, buff_size)
-            else:
-                self.log.warning("timeout waiting for data")
-                return
-            if ready[2]:
-                self.log.debug("exceptional condition on socket")
-                return
+            except socket.error as exc:
+                if exc.errno in (EAGAIN, EWOULDBLOCK):
+                    return False
+                raise
             self.parent.stats.sessions.rx += len(chunk)
             self.parent.stats.sessions.clients[self.addr[0]].rx += len(chunk)
             if chunk:
-                chunks.append(chunk)
+                self.chunks.append(chunk)
             if not chunk or chunk.endswith(b"\x00"):
-                break
-        if six.PY3:
-            data = b"".join(chunks)
-        else:
-            data = "".join(chunks)
-        del chunks
-        self.handle_raw_client_data(data)
+                return True
 
     def handle_raw_client_data(self, data):
         if six.PY3:
@@ -1447,23 +1948,36 @@ def handle_raw_client_data(self, data):
         if data is None:
             return
         try:
-            result = self.router(nodename, data)
-        except DontClose:
+            result = self.raw_route(nodename, data)
+        except Detach:
+            self.detach(self.raw_detached_step, nodename, data)
+            raise
+        self.raw_send_result(result)
+
+    def raw_route(self, nodename, data, detached=False):
+        try:
+            return self.router(nodename, data, detached=detached)
+        except (DontClose, Detach):
             raise
         except ex.Error as exc:
-            result = {"status": 400, "error": str(exc)}
+            return {"status": 400, "error": str(exc)}
         except ex.HTTP as exc:
-            result = {"status": exc.status, "error": exc.msg}
+            return {"status": exc.status, "error": exc.msg}
         except Exception as exc:
-            result = {"status": 500, "error": str(exc), "traceback": traceback.format_exc()}
             self.log.exception(exc)
-        self.raw_send_result(result)
+            return {"status": 500, "error": str(exc), "traceback": traceback.format_exc()}
+
+    def raw_detached_step(self, nodename, data):
+        try:
+            self.raw_send_result(self.raw_route(nodename, data, detached=True))
+        finally:
+            self.close()
 
     def raw_send_result(self, result):
         if result is None:
             return
         self.parent.stats.sessions.alive[self.sid].progress = "sending %s result" % self.parent.stats.sessions.alive[self.sid].progress
-        self.conn.setblocking(True)
+        self.conn.settimeout(self.sock_tmo)
         if self.encrypted:
             message = self.encrypt(result)
         else:
@@ -1668,49 +2182,61 @@ def multiplex(self, node, handler, options, data, original_nodename, action, str
                 svcnodes = self.get_service_nodes(path)
                 nodenames = [n for n in nodenames if n in svcnodes]
 
-        def do_node(nodename):
-            if nodename == Env.nodename:
-                try:
-                    _result = handler.action(nodename, action=action, options=options, stream_id=stream_id, thr=self)
-                except ex.HTTP as exc:
-                    status = exc.status
-                    _result = {"status": exc.status, "error": exc.msg}
-                except ex.Error as exc:
-                    status = 400
-                    _result = {"status": status, "error": str(exc)}
-                except Exception as exc:
-                    status = 500
-                    _result = {"status": status, "error": str(exc), "traceback": traceback.format_exc()}
-                    self.log.exception(exc)
-                result["nodes"][nodename] = _result
-                try:
-                    result["status"] += 1 if _result.get("status") else 0
-                except AttributeError:
-                    # result is not a dict
-                    pass
-            else:
+        def do_local(nodename):
+            try:
+                return handler.action(nodename, action=action, options=options, stream_id=stream_id, thr=self)
+            except ex.HTTP as exc:
+                return {"status": exc.status, "error": exc.msg}
+            except ex.Error as exc:
+                return {"status": 400, "error": str(exc)}
+            except Exception as exc:
+                self.log.exception(exc)
+                return {"status": 500, "error": str(exc), "traceback": traceback.format_exc()}
+
+        def do_peer(nodename):
+            try:
                 if handler.stream:
                     sp = self.socket_parms("https://"+nodename)
                     client_stream_id, conn, resp = self.h2_daemon_stream_conn(data, sp=sp)
-                    self.streams[stream_id]["pushers"].append({
+                    return {
                         "fn": "push_peer_stream",
                         "args": [nodename, client_stream_id, conn, resp],
-                    })
-                    _result = {}
-                else:
-                    _result = self.daemon_request(data, server=nodename, silent=True, method=method)
-                result["nodes"][nodename] = _result
-                try:
-                    result["status"] += _result.get("status", 0)
-                except AttributeError:
-                    # result is not a dict
-                    pass
-
-        for nodename in nodenames:
+                    }
+                return self.parent.peers.request(nodename, data, method=method)
+            except Exception as exc:
+                return {"status": 1, "error": str(exc)}
+
+        # the peer requests are sent concurrently, before the local handler
+        # execution
+        peers = [nodename for nodename in nodenames if nodename != Env.nodename]
+        pending = self.parent.peers.submit(do_peer, peers)
+        if Env.nodename in nodenames:
+            _result = do_local(Env.nodename)
+            result["nodes"][Env.nodename] = _result
             try:
-                do_node(nodename)
-            except Exception:
+                result["status"] += 1 if _result.get("status") else 0
+            except AttributeError:
+                # result is not a dict
+                pass
+        results, timed_out = self.parent.peers.wait(pending)
+
+        for nodename in peers:
+            if nodename in timed_out:
+                self.log.warning("multiplexed %s %s request to %s timed out", method, action, nodename)
+                result["nodes"][nodename] = {"status": 1, "error": "timeout"}
+                result["status"] += 1
                 continue
+            _result = results[nodename]
+            if handler.stream:
+                if "fn" in _result:
+                    self.streams[stream_id]["pushers"].append(_result)
+                    _result = {}
+            result["nodes"][nodename] = _result
+            try:
+                result["status"] += _result.get("status", 0)
+            except AttributeError:
+                # result is not a dict
+                pass
 
         if handler.stream:
             return
@@ -1753,23 +2279,38 @@ def create_multiplex(self, handler, options, data, original_nodename, action, st
                 h[node] = {}
             h[node][path] = svcdata
         result = {"nodes": {}, "status": 0}
-        for nodename, optdata in h.items():
+
+        def do_peer(nodename):
             _options = {}
             _options.update(options)
-            _options["data"] = optdata
-            if nodename == Env.nodename:
-                _result = handler.action(nodename, action=action, options=_options, stream_id=stream_id, thr=self)
-                result["nodes"][nodename] = _result
-                result["status"] += _result.get("status", 0)
-            else:
-                _data = {}
-                _data.update(data)
-                _data["options"] = _options
-                _data["multiplexed"] = True # prevent multiplex at the peer endpoint
-                self.log_request("relay create/update %s to %s" % (",".join([p for p in optdata]), nodename), original_nodename)
-                _result = self.daemon_post(_data, server=nodename, silent=True)
-                result["nodes"][nodename] = _result
-                result["status"] += _result.get("status", 0)
+            _options["data"] = h[nodename]
+            _data = {}
+            _data.update(data)
+            _data["options"] = _options
+            _data["multiplexed"] = True # prevent multiplex at the peer endpoint
+            try:
+                return self.parent.peers.request(nodename, _data, method="POST")
+            except Exception as exc:
+                return {"status": 1, "error": str(exc)}
+
+        peers = [nodename for nodename in h if nodename != Env.nodename]
+        for nodename in peers:
+            self.log_request("relay create/update %s to %s" % (",".join([p for p in h[nodename]]), nodename), original_nodename)
+        pending = self.parent.peers.submit(do_peer, peers)
+        if Env.nodename in h:
+            _options = {}
+            _options.update(options)
+            _options["data"] = h[Env.nodename]
+            _result = handler.action(Env.nodename, action=action, options=_options, stream_id=stream_id, thr=self)
+            result["nodes"][Env.nodename] = _result
+            result["status"] += _result.get("status", 0)
+        results, timed_out = self.parent.peers.wait(pending)
+        for nodename in timed_out:
+            results[nodename] = {"status": 1, "error": "timeout"}
+        for nodename in peers:
+            _result = results[nodename]
+            result["nodes"][nodename] = _result
+            result["status"] += _result.get("status", 0)
         return result
 
     @staticmethod
@@ -1831,11 +2372,14 @@ def update_data_from_path(self, data):
                 data["options"] = {"path": path}
         return data
 
-    def router(self, nodename, data, stream_id=None, handler=None):
+    def router(self, nodename, data, stream_id=None, handler=None, detached=False):
         """
         For a request data, extract the requested action and options,
         translate into a method name, and execute this method with options
         passed as keyword args.
+
+        Raise Detach if the handler is blocking and the request is not
+        <detached> yet.
         """
         self.parent.stats.sessions.alive[self.sid]['tid'] = shared.NODE.get_tid()
         if not isinstance(data, dict):
@@ -1850,6 +2394,8 @@ def router(self, nodename, data, stream_id=None, handler=None):
         else:
             method = handler.routes[0][0]
             action = handler.routes[0][1]
+        if handler.blocking and not detached:
+            raise Detach
 
         # prepare options, sanitized for use as keywords
         options = {}
@@ -1880,18 +2426,46 @@ def router(self, nodename, data, stream_id=None, handler=None):
     #
     #########################################################################
 
+    def events_delivered(self, msg):
+        """
+        Account a message delivery in the subscriber stats.
+        """
+        stats = self.events_stats
+        if stats is None:
+            return
+        latency = time.time() - msg.created
+        stats.sent += 1
+        stats.latency_avg += (latency - stats.latency_avg) / stats.sent
+        if latency > stats.latency_max:
+            stats.latency_max = latency
+
+    def outbound_size(self):
+        return sum(len(stream["outbound"]) for stream in self.streams.values())
+
     def h2_push_action_events(self, stream_id):
-        while True:
+        # leave the messages queued while the client does not consume the
+        # data already sent
+        while self.outbound_size() < OUTBOUND_MAX:
             try:
                 msg = self.event_queue.get(False, 0)
             except queue.Empty:
                 break
             self.h2_stream_send(stream_id, msg)
+            self.events_delivered(msg)
 
     def raw_push_action_events(self):
-        while True:
-            if self.stopped():
-                break
+        """
+        Switch the session to the events streaming mode. The listener
+        resumes the parked session when new events are queued.
+        """
+        self.raw_events = True
+        self.raw_send_events()
+        raise DontClose
+
+    def raw_events_step(self):
+        if self.readable:
+            # the client is not expected to send data, detect the close
+            self.conn.setblocking(False)
             while True:
                 try:
                     buff = self.conn.recv(4096)
@@ -1899,17 +2473,24 @@ def raw_push_action_events(self):
                     break
                 if not buff:
                     return
+        self.raw_send_events()
+        raise DontClose
+
+    def raw_send_events(self):
+        self.conn.settimeout(self.sock_tmo)
+        while True:
             try:
-                msg = self.event_queue.get(True, 1)
+                msg = self.event_queue.get(False, 0)
             except queue.Empty:
-                continue
+                break
 
             if self.encrypted:
-                msg = self.encrypt(msg)
+                buff = msg.encrypted(self)
             else:
-                msg = self.msg_encode(msg)
+                buff = msg.encoded()
 
-            self.conn.sendall(msg)
+            self.conn.sendall(buff)
+            self.events_delivered(msg)
 
     def logskip(self, backlog, logfile):
         skip = 0
@@ -1997,7 +2578,10 @@ def h2_push_logs(self, stream_id, ofile, follow):
     def h2_sse_stream_send(self, stream_id, data):
         self.events_counter += 1
         msg = "id: %d\n" % self.events_counter
-        msg += "data: %s\n\n" % json.dumps(data)
+        if isinstance(data, EventMessage):
+            msg += "data: %s\n\n" % data.dumps()
+        else:
+            msg += "data: %s\n\n" % json.dumps(data)
         self.streams[stream_id]["outbound"] += msg.encode()
         self.send_outbound(stream_id)
 
@@ -15,6 +15,7 @@
 import core.logger
 from core.capabilities import capabilities
 from core.comm import CRYPTO_MODULE
+from utilities.cache import set_cache_tier
 from utilities.lock import LockTimeout, cmlock
 from env import Env
 from utilities.proc import daemon_process_running, process_args
@@ -23,9 +24,11 @@
 from .hb.relay import HbRelayRx, HbRelayTx
 from .hb.ucast import HbUcastRx, HbUcastTx
 from .collector import Collector
+from .containers import Containers
 from .dns import Dns
 from .listener import Listener
 from .monitor import Monitor
+from .sampler import Sampler, StatsSampler
 from .scheduler import Scheduler
 from core.node import Node
 from utilities.lazy import lazy, unset_lazy
@@ -245,6 +248,8 @@ def write_pid(self):
 
     def init(self):
         shared.NODE = Node(log_handlers=self.handlers)
+        # the daemon process uses its own cache tier directly
+        set_cache_tier(shared.CMD_CACHE)
         self.log.info("daemon started")
         self.log.info("versions:")
         self.log.info(" opensvc agent: %s", shared.NODE.agent_version)
@@ -383,6 +388,10 @@ def start_threads(self):
             changed |= self.start_thread("monitor", Monitor)
         if self.need_start("scheduler"):
             changed |= self.start_thread("scheduler", Scheduler)
+        if StatsSampler and self.need_start("sampler"):
+            changed |= self.start_thread("sampler", Sampler)
+        if self.need_start("containers"):
+            changed |= self.start_thread("containers", Containers)
 
         for hb_type, txc, rxc in HEARTBEATS:
             for name in self.get_config_hb(hb_type):
@@ -475,6 +484,7 @@ def _read_config(self):
                 shared.NODE = Node()
                 shared.NODE.set_rlimit()
                 shared.NODE.network_setup()
+            shared.CMD_CACHE.resize(shared.NODE.oget("node", "shared_cache_size"))
             unset_lazy(self, "config_hbs")
             if self.last_config_mtime:
                 self.log.info("node config reloaded (changed)")
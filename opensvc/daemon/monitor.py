@@ -617,9 +617,11 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
     monitor_period = 0.5
     arbitrators_check_period = 60
     max_shortloops = 30
+    sweep_period = 60
     default_stdby_nb_restart = 2
     arbitrators_data = None
     last_arbitrator_ping = 0
+    last_sweep = 0
 
     def __init__(self):
         shared.OsvcThread.__init__(self)
@@ -627,6 +629,10 @@ def __init__(self):
         self.compat = True
         self.last_node_data = None
         self.init_steps = set()
+        # path -> set of related paths, both ways
+        self.relations = {}
+        # the paths to orchestrate on the next pass, None for all
+        self.orchestrate_paths = None
 
     def init(self):
         self.set_tid()
@@ -720,11 +726,7 @@ def run(self):
             self.log.exception(exc)
 
     def transition_count(self):
-        count = 0
-        for path, smon in self.iter_local_services_monitors():
-            if smon.status and smon.status != "scaling" and smon.status.endswith("ing"):
-                count += 1
-        return count
+        return self.daemon_status_data.index.transition_count(Env.nodename)
 
     def set_next(self, timeout):
         """
@@ -789,6 +791,9 @@ def do(self):
                 self.stop()
         else:
             self.update_cluster_data()
+            # refresh the object paths index here, so the api and events
+            # threads rarely pay for its update
+            self.paths_index()
             self.orchestrator()
         self.update_hb_data()
         shared.wake_collector()
@@ -798,12 +803,14 @@ def do(self):
     # Service config exchange
     #
     #########################################################################
-    def sync_services_conf(self):
+    def sync_services_conf(self, paths=None):
         """
-        For each service, decide if we have an outdated configuration file
-        and fetch the most recent one if needed.
+        For each service, or each of <paths> if set, decide if we have an
+        outdated configuration file and fetch the most recent one if needed.
         """
-        confs = self.get_services_configs()
+        if paths is not None and not paths:
+            return
+        confs = self.get_services_configs(paths)
         for path, data in confs.items():
             try:
                 shared.SERVICES[path]
@@ -1412,10 +1419,17 @@ def orchestrator(self):
         self.node_orchestrator()
 
         # services (iterate over deleting services too)
-        paths = self.prioritized_paths()
-        for path in paths:
+        paths = self.orchestrate_paths
+        self.orchestrate_paths = set()
+        if paths is not None:
+            # the non-idle instances can progress without a status change
+            paths |= self.daemon_status_data.index.active_paths(Env.nodename)
+        prioritized_paths = self.prioritized_paths(paths)
+        for idx, path in enumerate(prioritized_paths):
             self.clear_start_failed(path)
             if self.transitions_maxed():
+                # evaluate the delayed paths on the next pass
+                self.orchestrate_paths |= set(prioritized_paths[idx:])
                 break
             if self.status_older_than_cf(path):
                 # self.log.info("%s status dump is older than its config file",
@@ -1427,15 +1441,18 @@ def orchestrator(self):
             svc = self.get_service(path)
             self.resources_orchestrator(path, svc)
             self.object_orchestrator(path, svc)
-        self.sync_services_conf()
+        self.sync_services_conf(paths)
 
-    def prioritized_paths(self):
+    def prioritized_paths(self, paths=None):
         def prio(path):
             try:
                 return self.instances_status_data.get([path, "priority"])
             except KeyError:
                 return Env.default_priority
-        paths = self.instances_status_data.keys()
+        if paths is None:
+            paths = self.instances_status_data.keys()
+        else:
+            paths = [path for path in paths if self.instances_status_data.exists([path])]
         data = [(path, prio(path)) for path in paths]
         return [d[0] for d in sorted(data, key=lambda x: x[1])]
 
@@ -3171,13 +3188,13 @@ def get_local_paths(self):
                 paths.append(path)
         return paths
 
-    def get_services_configs(self):
+    def get_services_configs(self, paths=None):
         """
         Return a hash indexed by path and nodename, containing the services
         configuration mtime and checksum.
         """
         data = {}
-        for path, nodename, config in self.iter_services_configs():
+        for path, nodename, config in self.iter_services_configs(paths=paths):
             if path not in data:
                 data[path] = {}
             data[path][nodename] = config
@@ -3576,9 +3593,74 @@ def update_cluster_data(self):
         self.update_node_data()
         self.purge_left_nodes()
         self.merge_hb_data()
-        self.update_agg_services()
+        self.update_agg_services(self.changed_paths())
         self.update_status()
 
+    def changed_paths(self):
+        """
+        Return the set of paths whose instance status or config changed
+        since the last call, extended to their related objects, or None if
+        all objects need a refresh.
+
+        The changed paths are also scheduled for the next orchestrator
+        pass. A full refresh is forced every <sweep_period> seconds.
+        """
+        now = time.time()
+        paths = self.daemon_status_data.pop_changed()
+        if paths is None or now - self.last_sweep > self.sweep_period:
+            self.last_sweep = now
+            self.relations = {}
+            self.update_relations(self.list_cluster_paths())
+            self.orchestrate_paths = None
+            return None
+        self.update_relations(paths)
+        paths = self.related_paths(paths)
+        if self.orchestrate_paths is not None:
+            self.orchestrate_paths |= paths
+        return paths
+
+    def object_relations(self, path):
+        """
+        Return the set of paths whose status the <path> object status or
+        orchestration depends on, or the other way around: the parents, the
+        children, the slaves and the affinity peers.
+        """
+        _, namespace, _ = split_path(path)
+        relations = set()
+        svc = shared.SERVICES.get(path)
+        if svc is not None:
+            for parent in svc.parents:
+                relations.add(resolve_path(parent.split("@")[0], namespace))
+            relations.update(svc.children_and_slaves)
+            for keyword in ("hard_affinity", "hard_anti_affinity", "soft_affinity", "soft_anti_affinity"):
+                for peer in getattr(svc, keyword, None) or []:
+                    relations.add(resolve_path(peer, namespace))
+        for instance in self.daemon_status_data.index.get(path).values():
+            for slave in (instance.get("slaves") or []) + (instance.get("scaler_slaves") or []):
+                relations.add(resolve_path(slave, namespace))
+        relations.discard(path)
+        return relations
+
+    def update_relations(self, paths):
+        """
+        Add the relations of <paths> to the relations map. The stale
+        relations are dropped by the periodic full refresh.
+        """
+        for path in paths:
+            try:
+                relations = self.object_relations(path)
+            except Exception:
+                continue
+            self.relations.setdefault(path, set()).update(relations)
+            for related in relations:
+                self.relations.setdefault(related, set()).add(path)
+
+    def related_paths(self, paths):
+        related = set(paths)
+        for path in paths:
+            related.update(self.relations.get(path, ()))
+        return related
+
     def _update_cluster_data(self):
         self.daemon_status_data.set(["cluster"], {
             "name": self.cluster_name,
@@ -3657,10 +3739,9 @@ def update_hb_data(self):
         shared.GEN_DIFF[shared.GEN] = diff
         self.purge_log()
         with shared.HB_MSG_LOCK:
-            # reset the full status cache. get_message() will refill if
+            # reset the messages cache. get_message() will refill if
             # needed.
-            shared.HB_MSG = None
-            shared.HB_MSG_LEN = 0
+            shared.HB_MSG_CACHE.clear()
         shared.wake_heartbeat_tx()
 
     def _update_hb_data_locked(self):
@@ -3965,9 +4046,36 @@ def get_agg(self, path):
         data.provisioned = self.get_agg_provisioned(path)
         return data
 
-    def update_agg_services(self):
+    def update_agg_services(self, paths=None):
+        """
+        Refresh the aggregated status of all objects, or only of <paths>
+        if set.
+        """
+        if paths is None:
+            data = self.get_aggs(self.list_cluster_paths())
+            self.daemon_status_data.set(["monitor", "services"], data)
+            return data
+        cluster_paths = self.list_cluster_paths()
+        for path in paths - cluster_paths:
+            self.daemon_status_data.unset_safe(["monitor", "services", path])
+        data = self.get_aggs(paths & cluster_paths)
+        changed = [path for path, agg in data.items() if agg != self.get_service_agg(path)]
+        self.daemon_status_data.merge(["monitor", "services"], data)
+        # the aggregated status of the masters depends on their slaves
+        # aggregated status, refresh them with the new slaves status.
+        masters = set()
+        for path in changed:
+            masters |= self.relations.get(path, set())
+        masters &= cluster_paths
+        if masters:
+            masters_data = self.get_aggs(masters)
+            self.daemon_status_data.merge(["monitor", "services"], masters_data)
+            data.update(masters_data)
+        return data
+
+    def get_aggs(self, paths):
         data = {}
-        for path in self.list_cluster_paths():
+        for path in paths:
             try:
                 if self.get_service(path).topology == "span":
                     data[path] = Storage()
@@ -3976,7 +4084,6 @@ def update_agg_services(self):
                 data[path] = Storage()
                 pass
             data[path] = self.get_agg(path)
-        self.daemon_status_data.set(["monitor", "services"], data)
         return data
 
     def update_completions(self):
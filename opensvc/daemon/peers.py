@@ -0,0 +1,246 @@
+"""
+The listener peer requests.
+
+The requests multiplexed to the peer nodes are executed concurrently by a
+pool of threads, over persistent h2 connections, one per peer. A h2
+connection carries the concurrent requests to a peer as distinct streams.
+
+The idle connections are health checked before reuse and evicted after
+PEER_IDLE_TIMEOUT seconds. A peer whose tls listener is not reachable is
+sent raw requests for PEER_H2_RETRY seconds.
+"""
+import json
+import socket
+import threading
+import time
+
+try:
+    import ssl
+    import foreign.hyper as hyper
+    has_ssl = True
+except Exception:
+    has_ssl = False
+
+from utilities.concurrent_futures import get_concurrent_futures
+from utilities.storage import Storage
+from utilities.string import bdecode
+
+PEER_WORKERS = 32
+PEER_IDLE_TIMEOUT = 60
+PEER_H2_RETRY = 60
+
+if has_ssl:
+    H2_ERRORS = (socket.error, ssl.SSLError, hyper.common.exceptions.ConnectionResetError, AssertionError)
+else:
+    H2_ERRORS = (socket.error,)
+
+
+class PeerConnection(object):
+    def __init__(self, nodename, sp, conn):
+        self.nodename = nodename
+        self.sp = sp
+        self.conn = conn
+        self.inflight = 0
+        self.requests = 0
+        self.last_used = time.time()
+
+    def healthy(self):
+        """
+        Return False if an idle connection has data to read, which is a
+        goaway frame or the connection close.
+        """
+        if self.inflight:
+            return True
+        sock = self.conn._sock
+        if sock is None:
+            return False
+        try:
+            return not sock.can_read
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class PeerPool(object):
+    def __init__(self, crypt, timeout=60):
+        """
+        <crypt> is the Crypt instance building the requests, and <timeout>
+        the number of seconds a peer request can last.
+        """
+        self.crypt = crypt
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.conns = {}
+        self.no_h2 = {}
+        self.stats = Storage()
+        self.executor = get_concurrent_futures().ThreadPoolExecutor(max_workers=PEER_WORKERS)
+
+    def submit(self, fn, nodenames):
+        """
+        Schedule the concurrent execution of fn(nodename) for each
+        nodename, and return the pending requests to pass to wait().
+        """
+        futures = dict((self.executor.submit(fn, nodename), nodename) for nodename in nodenames)
+        return time.time() + self.timeout, futures
+
+    def wait(self, pending):
+        """
+        Return a dict of the <pending> requests results indexed by
+        nodename, and the list of nodenames whose result was not available
+        before the requests deadline.
+        """
+        deadline, futures = pending
+        if not futures:
+            return {}, []
+        timeout = max(0, deadline - time.time())
+        done, not_done = get_concurrent_futures().wait(futures, timeout=timeout)
+        results = {}
+        for future in done:
+            results[futures[future]] = future.result()
+        timed_out = [futures[future] for future in not_done]
+        for nodename in timed_out:
+            self.peer_stats(nodename).timeouts += 1
+        return results, timed_out
+
+    def request(self, nodename, data, method="GET"):
+        """
+        Send the <data> request to the <nodename> peer daemon, and return
+        the result.
+        """
+        begin = time.time()
+        if not has_ssl or self.no_h2.get(nodename, 0) > begin:
+            result = self.crypt.daemon_request(data, server=nodename, silent=True, method=method, timeout=self.timeout)
+        else:
+            result = self.h2_request(nodename, data, method)
+        self.account(nodename, begin, result)
+        return result
+
+    def h2_request(self, nodename, data, method):
+        while True:
+            pconn, reused = self.checkout(nodename)
+            try:
+                stream_id = self.h2_send(pconn, data, method)
+            except H2_ERRORS as exc:
+                self.discard(pconn)
+                if reused:
+                    # the peer closed the connection since the health
+                    # check, retry on a new connection
+                    continue
+                if getattr(exc, "errno", None) is not None:
+                    # the peer tls listener is not reachable
+                    self.no_h2[nodename] = time.time() + PEER_H2_RETRY
+                    return self.crypt.daemon_request(data, server=nodename, silent=True, method=method, timeout=self.timeout)
+                return {"status": 1, "error": "%s" % exc}
+            try:
+                return self.h2_response(pconn, stream_id)
+            except H2_ERRORS as exc:
+                # the request is sent, and may be executed by the peer,
+                # so it must not be sent again
+                self.discard(pconn)
+                return {"status": 1, "error": "%s" % exc}
+
+    def h2_send(self, pconn, data, method):
+        """
+        Send the <data> request on the <pconn> connection, connecting if
+        needed, and return the stream id.
+        """
+        secret = self.crypt.get_secret(pconn.sp, None)
+        path = self.crypt.h2_path_from_data(data)
+        headers = self.crypt.h2_headers(secret=secret, multiplexed=data.get("multiplexed"), af=pconn.sp.af)
+        body = self.crypt.h2_body_from_data(data)
+        headers.update({"Content-Length": str(len(body))})
+        return pconn.conn.request(method, path, headers=headers, body=body)
+
+    def h2_response(self, pconn, stream_id):
+        resp = pconn.conn.get_response(stream_id)
+        result = json.loads(bdecode(resp.read()))
+        self.checkin(pconn)
+        return result
+
+    def checkout(self, nodename):
+        """
+        Return a healthy connection to <nodename>, new or reused, and
+        True if reused.
+        """
+        with self.lock:
+            pconn = self.conns.get(nodename)
+            if pconn is not None and not pconn.healthy():
+                del self.conns[nodename]
+                pconn.close()
+                pconn = None
+            if pconn is None:
+                sp = self.crypt.socket_parms("https://" + nodename)
+                pconn = PeerConnection(nodename, sp, self.crypt.h2c(sp=sp, timeout=self.timeout))
+                self.conns[nodename] = pconn
+            reused = pconn.requests > 0
+            pconn.inflight += 1
+            pconn.requests += 1
+            return pconn, reused
+
+    def checkin(self, pconn):
+        with self.lock:
+            pconn.inflight -= 1
+            pconn.last_used = time.time()
+
+    def discard(self, pconn):
+        with self.lock:
+            pconn.inflight -= 1
+            if self.conns.get(pconn.nodename) is pconn:
+                del self.conns[pconn.nodename]
+        pconn.close()
+
+    def account(self, nodename, begin, result):
+        stats = self.peer_stats(nodename)
+        latency = time.time() - begin
+        stats.requests += 1
+        try:
+            if result.get("status") and (result.get("error") or result.get("err")):
+                stats.errors += 1
+        except AttributeError:
+            # result is not a dict
+            pass
+        stats.latency_last = latency
+        stats.latency_avg = (stats.latency_avg * (stats.requests - 1) + latency) / stats.requests
+        if latency > stats.latency_max:
+            stats.latency_max = latency
+
+    def peer_stats(self, nodename):
+        stats = self.stats.get(nodename)
+        if stats is None:
+            stats = Storage({
+                "requests": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "latency_last": 0.0,
+                "latency_avg": 0.0,
+                "latency_max": 0.0,
+            })
+            self.stats[nodename] = stats
+        return stats
+
+    def janitor(self):
+        """
+        Close the connections idle for more than PEER_IDLE_TIMEOUT seconds
+        and the unhealthy idle connections.
+        """
+        limit = time.time() - PEER_IDLE_TIMEOUT
+        with self.lock:
+            for nodename, pconn in list(self.conns.items()):
+                if pconn.inflight:
+                    continue
+                if pconn.last_used < limit or not pconn.healthy():
+                    del self.conns[nodename]
+                    pconn.close()
+
+    def close(self):
+        with self.lock:
+            for pconn in self.conns.values():
+                pconn.close()
+            self.conns = {}
+        self.executor.shutdown(wait=False)
+
@@ -0,0 +1,83 @@
+"""
+Sampler Thread
+
+Store the node metrics in the ring files read by pushstats.
+"""
+import logging
+import sys
+import time
+
+import daemon.shared as shared
+from env import Env
+
+try:
+    from utilities.stats.sampler import Sampler as StatsSampler
+except ImportError:
+    StatsSampler = None
+
+
+class Sampler(shared.OsvcThread):
+    name = "sampler"
+
+    def run(self):
+        self.set_tid()
+        self.log = logging.LoggerAdapter(logging.getLogger(Env.nodename+".osvcd.sampler"), {"node": Env.nodename, "component": self.name})
+        self.log.info("sampler started")
+        self.sampler = None
+        self.interval = None
+        self.next = 0
+        self.samples = 0
+        self.last = None
+        self.reconfigure()
+
+        while True:
+            if self.stopped():
+                self.close()
+                sys.exit(0)
+            try:
+                self.do()
+            except Exception as exc:
+                self.log.exception(exc)
+                self._stop_event.wait(1)
+
+    def status(self, **kwargs):
+        data = shared.OsvcThread.status(self, **kwargs)
+        data["interval"] = self.interval
+        data["samples"] = self.samples
+        data["last"] = self.last
+        return data
+
+    def close(self):
+        if self.sampler is None:
+            return
+        self.sampler.close()
+        self.sampler = None
+
+    def reconfigure(self):
+        interval = shared.NODE.oget("stats", "sample_interval")
+        if interval == self.interval:
+            return
+        self.close()
+        self.interval = interval
+        if interval:
+            self.log.info("sample the node metrics every %ss", interval)
+            self.sampler = StatsSampler(interval=interval)
+        else:
+            self.log.info("node metrics sampling disabled")
+        self.next = 0
+
+    def do(self):
+        self.reload_config()
+        now = time.time()
+        if self.sampler and now >= self.next:
+            self.sampler.sample(now)
+            self.samples += 1
+            self.last = now
+            # align the samples on the interval boundaries
+            self.next = (now // self.interval + 1) * self.interval
+            self.update_status()
+        if self.sampler:
+            timeout = max(self.next - time.time(), 0)
+        else:
+            timeout = 60
+        self._stop_event.wait(timeout)
@@ -1,6 +1,8 @@
 """
 Scheduler Thread
 """
+import heapq
+import itertools
 import logging
 import os
 import sys
@@ -39,6 +41,10 @@
 class Scheduler(shared.OsvcThread):
     name = "scheduler"
     delayed = {}
+    delayed_heap = []
+    delayed_seq = itertools.count()
+    plans = {}
+    dirty = set()
     blacklist = {}
     lasts = {}
     session_ids = {}
@@ -77,6 +83,14 @@ def status(self, **kwargs):
                 "expire": entry["expire"],
                 "csum": entry["csum"],
             })
+        data["queue"] = [{
+            "action": action,
+            "path": path,
+            "rid": rid,
+            "expire": expire,
+        } for expire, _, (action, path, rid) in sorted(self.delayed_heap) if self.is_queued(expire, (action, path, rid))]
+        data["planned"] = len(self.plans)
+        data["dirty"] = len(self.dirty)
         return data
 
     def run(self):
@@ -185,6 +199,7 @@ def janitor_run_done(self):
             return
         self.log.debug("run done notifications: %s", inter)
         self.running -= inter
+        self.set_dirty(inter)
         self.dropped_via_notify |= inter
         #self.log.debug("dropped_via_notify: %s", self.dropped_via_notify)
         return
@@ -198,6 +213,7 @@ def drop_running(self, sigs):
         not_dropped_yet = sigs - self.dropped_via_notify
         self.running -= not_dropped_yet
         self.dropped_via_notify -= sigs
+        self.set_dirty(sigs)
         self.purge_cache()
 
     def purge_cache(self):
@@ -264,14 +280,51 @@ def promote_queued_action(self, sig, delay, now):
             self.log.debug("promote queued action '%s' to run asap", sig)
             self.delayed[sig]["delay"] = 0
             self.delayed[sig]["expire"] = now
+            self.push_delayed(now, sig)
         else:
             self.log.debug("skip already queued action '%s'", sig)
 
-    def next_expire(self, now):
+    def is_queued(self, expire, sig):
+        """
+        Return True if the <expire>, <sig> heap entry is current, False if
+        the action was dequeued, dropped or promoted since.
+        """
         try:
-            return min([t["expire"] for t in self.delayed.values()])
-        except ValueError:
-            return now + DEQUEUE_INTERVAL
+            return self.delayed[sig]["expire"] == expire
+        except KeyError:
+            return False
+
+    def next_expire(self, now):
+        """
+        Return the expire time of the first queued action, discarding the
+        heap entries of the dequeued, dropped and promoted actions.
+        """
+        while self.delayed_heap:
+            expire, _, sig = self.delayed_heap[0]
+            if self.is_queued(expire, sig):
+                return expire
+            heapq.heappop(self.delayed_heap)
+        return now + DEQUEUE_INTERVAL
+
+    def due_sigs(self, now):
+        """
+        Return the signatures of the queued actions expired at <now>.
+        The actions stay queued.
+        """
+        due = []
+        while self.delayed_heap and self.delayed_heap[0][0] <= now:
+            expire, _, sig = heapq.heappop(self.delayed_heap)
+            if sig in due or not self.is_queued(expire, sig):
+                continue
+            due.append(sig)
+        for sig in due:
+            self.push_delayed(self.delayed[sig]["expire"], sig)
+        return due
+
+    def push_delayed(self, expire, sig):
+        # the sequence number avoids comparing signatures, which can
+        # contain None
+        heapq.heappush(self.delayed_heap, (expire, next(self.delayed_seq), sig))
 
     def queue_action(self, action, delay=0, path=None, rid=None, now=None, csum=None):
         sig = (action, path, rid)
@@ -290,6 +343,7 @@ def queue_action(self, action, delay=0, path=None, rid=None, now=None, csum=None
             "delay": delay,
             "csum": csum,
         }
+        self.push_delayed(exp, sig)
         if not delay:
             self.log.debug("queued action '%s' for run in %s", sig, print_duration(exp-now))
         else:
@@ -307,10 +361,14 @@ def get_todo(self, now):
         open_slots = max(self.max_tasks() - len(self.procs), 0)
         if not open_slots:
             return []
-        self.janitor_delayed()
+        due = self.due_sigs(now)
+        self.janitor_delayed(due)
 
-        for sig, task in self.delayed.items():
-            if task["expire"] > now:
+        for sig in due:
+            try:
+                task = self.delayed[sig]
+            except KeyError:
+                # dropped by the janitor
                 continue
             action, path, rid = sig
             merge_key = (action, path)
@@ -350,11 +408,24 @@ def janitor_blacklist(self):
                 if _csum != ocsum:
                     self.log.info("remove from blacklist: %s %s %s", path, action, rid or None)
                     del self.blacklist[sig]
+                    self.dirty.add(path)
 
-    def janitor_delayed(self):
+    def janitor_delayed(self, sigs=None):
+        """
+        Drop the <sigs> queued actions, or all queued actions if <sigs> is
+        not set, if their object was deleted, their object or node
+        configuration changed, or their resource requirements are no longer
+        met.
+        """
         drop = []
         csum = self.csum()
-        for sig, task in self.delayed.items():
+        if sigs is None:
+            sigs = list(self.delayed)
+        for sig in sigs:
+            try:
+                task = self.delayed[sig]
+            except KeyError:
+                continue
             action, path, rid = sig
             if not path:
                 if csum and csum != task["csum"]:
@@ -413,6 +484,15 @@ def delete_queued(self, sigs):
             except KeyError:
                 #print(sig, self.delayed)
                 pass
+        self.set_dirty(sigs)
+
+    def set_dirty(self, sigs):
+        """
+        Schedule the objects of the <sigs> actions for a next run time
+        evaluation by the next run_scheduler() pass.
+        """
+        for _, path, _ in sigs:
+            self.dirty.add(path)
 
     def get_lasts(self, svc):
         data = {}
@@ -466,24 +546,31 @@ def local_last(self, sig, fname, obj):
     def run_cluster_data(self):
         return self.nodes_data.get()
 
-    def run_scheduler(self, now):
-        #self.log.info("run scheduler")
-        nonprov = []
-
-        if not shared.NODE:
-            return
-
-        shared.NODE.options.cron = True
-
-        csum = self.csum()
-        if not csum:
-            return
-
+    def plan(self, path, key, fn):
+        """
+        Return the scheduling plan of the <path> object, or of the node if
+        <path> is None, evaluated by <fn> if the plan <key> changed or the
+        object is dirty.
+        """
+        plan = self.plans.get(path)
+        if plan and plan["key"] == key and path not in self.dirty:
+            return plan
+        if plan and plan["key"] != key:
+            self.janitor_delayed(plan["sigs"])
+        self.dirty.discard(path)
+        plan = fn()
+        plan["key"] = key
+        self.plans[path] = plan
+        return plan
+
+    def plan_node(self, now, csum):
+        sigs = set()
         for action, parms in shared.NODE.sched.actions.items():
             for p in parms:
                 if p.req_collector and not shared.NODE.collector_env.dbopensvc:
                     continue
                 sig = (action, None, None)
+                sigs.add(sig)
                 if sig in self.delayed:
                     continue
                 if sig in self.blacklist:
@@ -503,6 +590,91 @@ def run_scheduler(self, now):
                 _next = time.mktime(_next.timetuple())
                 delay = _next - now
                 self.queue_action(action, delay, None, None, now=now, csum=csum)
+        return {"sigs": sigs, "nonprov": []}
+
+    def plan_object(self, now, svc, csum, agg):
+        path = svc.path
+        sigs = set()
+        nonprov = []
+        svc.options.cron = True
+        svc.sched.configure()
+        lasts = self.get_lasts(svc)
+        for action, parms in svc.sched.actions.items():
+            if agg.provisioned in ("mixed", False) and action in ACTIONS_SKIP_ON_UNPROV:
+                nonprov.append(action+"@"+path)
+                continue
+            for p in parms:
+                if p.req_collector and not shared.NODE.collector_env.dbopensvc:
+                    continue
+                rid = p.section if p.section != "DEFAULT" else None
+                sig = (action, path, rid)
+                sigs.add(sig)
+                if sig in self.delayed:
+                    continue
+                if sig in self.blacklist:
+                    continue
+                if sig in self.running:
+                    continue
+                last = self.local_last(sig, p.fname, svc)
+                try:
+                    cluster_last = lasts[p.section][action]["last"]
+                    if not last or cluster_last > last:
+                        # local last may be more up-to-date due to CRM task runs notifications
+                        last = cluster_last
+                except KeyError:
+                    pass
+                try:
+                    _next, _interval = svc.sched.get_schedule(p.section, p.schedule_option).get_next(now, last)
+                except Exception as exc:
+                    self.log.warning("%s %s %s: %s", path, p.section, action, exc)
+                    self.log.exception(exc)
+                    self.blacklist[sig] = csum
+                    continue
+                if not _next:
+                    self.blacklist[sig] = csum
+                    continue
+                if rid:
+                    try:
+                        svc.get_resource(rid).check_requires(action, cluster_data=self.run_cluster_data)
+                    except (KeyError, AttributeError):
+                        continue
+                    except (ex.Error, ex.ContinueAction) as exc:
+                        # run_requires not satisfied, retry on next pass
+                        self.dirty.add(path)
+                        continue
+                _next = time.mktime(_next.timetuple())
+                delay = _next - now
+                self.queue_action(action, delay, path, rid, now=now, csum=csum)
+        return {"sigs": sigs, "nonprov": nonprov}
+
+    def run_scheduler(self, now):
+        """
+        Queue the scheduled actions of the node and of the objects.
+
+        The next run time of the actions of an object is evaluated only
+        if the object is new, its configuration checksum, the node
+        configuration checksum or its provisioned state changed, or one of
+        its actions was dequeued, dropped or completed since the last
+        evaluation.
+        """
+        #self.log.info("run scheduler")
+        nonprov = []
+
+        if not shared.NODE:
+            return
+
+        shared.NODE.options.cron = True
+
+        csum = self.csum()
+        if not csum:
+            return
+
+        self.plan(None, csum, lambda: self.plan_node(now, csum))
+
+        for path in [path for path in self.plans if path is not None and path not in shared.SERVICES]:
+            self.janitor_delayed(self.plans[path]["sigs"])
+            del self.plans[path]
+            self.dirty.discard(path)
 
         for path in list(shared.SERVICES):
             try:
@@ -510,57 +682,12 @@ def run_scheduler(self, now):
             except KeyError:
                 # deleted during previous iterations
                 continue
-            svc.options.cron = True
-            svc.sched.configure()
-            csum = self.node_data.get(["services", "config", path, "csum"], None)
+            ocsum = self.node_data.get(["services", "config", path, "csum"], None)
             agg = self.get_service_agg(path)
             if not agg:
                 continue
-            lasts = self.get_lasts(svc)
-            for action, parms in svc.sched.actions.items():
-                if agg.provisioned in ("mixed", False) and action in ACTIONS_SKIP_ON_UNPROV:
-                    nonprov.append(action+"@"+path)
-                    continue
-                for p in parms:
-                    if p.req_collector and not shared.NODE.collector_env.dbopensvc:
-                        continue
-                    rid = p.section if p.section != "DEFAULT" else None
-                    sig = (action, path, rid)
-                    if sig in self.delayed:
-                        continue
-                    if sig in self.blacklist:
-                        continue
-                    if sig in self.running:
-                        continue
-                    last = self.local_last(sig, p.fname, svc)
-                    try:
-                        cluster_last = lasts[p.section][action]["last"]
-                        if not last or cluster_last > last:
-                            # local last may be more up-to-date due to CRM task runs notifications
-                            last = cluster_last
-                    except KeyError:
-                        pass
-                    try:
-                        _next, _interval = svc.sched.get_schedule(p.section, p.schedule_option).get_next(now, last)
-                    except Exception as exc:
-                        self.log.warning("%s %s %s: %s", path, p.section, action, exc)
-                        self.log.exception(exc)
-                        self.blacklist[sig] = csum
-                        continue
-                    if not _next:
-                        self.blacklist[sig] = csum
-                        continue
-                    if rid:
-                        try:
-                            svc.get_resource(rid).check_requires(action, cluster_data=self.run_cluster_data)
-                        except (KeyError, AttributeError):
-                            continue
-                        except (ex.Error, ex.ContinueAction) as exc:
-                            # run_requires not satisfied
-                            continue
-                    _next = time.mktime(_next.timetuple())
-                    delay = _next - now
-                    self.queue_action(action, delay, path, rid, now=now, csum=csum)
+            plan = self.plan(path, (csum, ocsum, agg.provisioned), lambda: self.plan_object(now, svc, ocsum, agg))
+            nonprov += plan["nonprov"]
 
         # log a scheduler loop digest
         msg = []
@@ -0,0 +1,285 @@
+"""
+Compiled object selector expressions, and the index of the cluster object
+paths they are evaluated against.
+"""
+import fnmatch
+import re
+import threading
+
+from foreign.jsonpath_ng.ext import parse
+from utilities.naming import path_data
+from utilities.selector import selector_parse_fragment, selector_parse_op_fragment
+
+# the max number of compiled selectors and cached selections
+CACHE_SIZE = 1024
+
+RE_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+class PathsIndex(object):
+    """
+    The cluster object paths, indexed by namespace and by kind.
+
+    The index is refreshed from the services config of the cluster nodes,
+    compared by identity to the previous refresh ones, so the refresh cost
+    is negligible when no object was added or removed. The generation
+    number is incremented on each path set change.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.gen = 0
+        self.paths = set()
+        self.pds = {}
+        self.namespaces = {}
+        self.kinds = {}
+        self.refs = {}
+
+    def refresh(self, nodes, nodenames):
+        """
+        Refresh the index from <nodes>, a read-only snapshot of the
+        monitor.nodes daemon status data, considering only the <nodenames>
+        cluster nodes.
+        """
+        refs = {}
+        for nodename in nodenames:
+            try:
+                refs[nodename] = nodes[nodename]["services"]["config"]
+            except (KeyError, TypeError):
+                continue
+        with self.lock:
+            if len(refs) == len(self.refs) and \
+               all(ref is self.refs.get(nodename) for nodename, ref in refs.items()):
+                return False
+            paths = set()
+            for ref in refs.values():
+                paths.update(ref)
+            self.refs = refs
+            if paths == self.paths:
+                return False
+            for path in self.paths - paths:
+                self.remove(path)
+            for path in paths - self.paths:
+                self.add(path)
+            self.gen += 1
+            return True
+
+    def add(self, path):
+        try:
+            pd = path_data(path)
+        except ValueError:
+            return
+        self.paths.add(path)
+        self.pds[path] = pd
+        self.namespaces.setdefault(pd["namespace"], set()).add(path)
+        self.kinds.setdefault(pd["kind"], set()).add(path)
+
+    def remove(self, path):
+        self.paths.discard(path)
+        pd = self.pds.pop(path, None)
+        if pd is None:
+            return
+        for idx, key in ((self.namespaces, pd["namespace"]), (self.kinds, pd["kind"])):
+            idx[key].discard(path)
+            if not idx[key]:
+                del idx[key]
+
+    def universe(self, namespaces, kind=None, paths=None):
+        """
+        Return the path data of the candidate objects, grouped by
+        namespace, restricted to the <namespaces> and <kind> if set.
+
+        If <paths> is set, the candidates are these paths instead of the
+        indexed paths.
+        """
+        data = {}
+        if paths is None:
+            with self.lock:
+                for namespace in self.namespaces:
+                    if namespace not in namespaces:
+                        continue
+                    pds = [self.pds[path] for path in self.namespaces[namespace]]
+                    if kind:
+                        pds = [pd for pd in pds if pd["kind"] == kind]
+                    if pds:
+                        data[namespace] = pds
+            return data
+        for path in paths:
+            pd = self.pds.get(path)
+            if pd is None:
+                try:
+                    pd = path_data(path)
+                except ValueError:
+                    continue
+            if pd["namespace"] not in namespaces:
+                continue
+            if kind and pd["kind"] != kind:
+                continue
+            data.setdefault(pd["namespace"], []).append(pd)
+        return data
+
+
+class GlobFragment(object):
+    """
+    A path expression selector fragment, like "prod/svc/web*" or "!db*".
+    An explicit path of an existing object is also handled by this
+    fragment.
+    """
+    static = True
+
+    def __init__(self, raw, negate, pattern):
+        self.raw = raw
+        self.negate = negate
+        self.pattern = pattern
+        self.compiled = {}
+
+    def normalized_pattern(self, namespace=None, kind=None):
+        """
+        Return the namespace/kind/name pattern equivalent to the fragment
+        pattern, as done by utilities.naming.object_path_glob.
+        """
+        l = self.pattern.split("/")
+        n = len(l)
+        if n == 3:
+            if l[1] == "nscfg":
+                return "%s/nscfg/namespace" % l[0]
+            elif not l[2]:
+                return "%s/%s/*" % (l[0], l[1])
+            return self.pattern
+        elif n == 2:
+            if not l[1]:
+                return "%s/nscfg/namespace" % l[0]
+            elif l[1] == "**":
+                return "%s/*/*" % l[0]
+            elif l[0] == "**":
+                return "*/*/%s" % l[1]
+            return "%s/%s/%s" % (namespace or "root", l[0], l[1])
+        elif n == 1:
+            if l[0] == "**":
+                return "*/*/*"
+            return "%s/%s/%s" % (namespace or "root", kind or "svc", l[0])
+
+    def compile(self, namespace=None, kind=None):
+        key = (namespace, kind)
+        try:
+            return self.compiled[key]
+        except KeyError:
+            pass
+        pattern = self.normalized_pattern(namespace, kind)
+        if pattern is None:
+            regex = None
+            pattern_ns = None
+        else:
+            regex = re.compile(fnmatch.translate(pattern))
+            pattern_ns = pattern.split("/", 1)[0]
+            if RE_GLOB_CHARS.search(pattern_ns):
+                pattern_ns = None
+        self.compiled[key] = (regex, pattern_ns)
+        return regex, pattern_ns
+
+    def select(self, index, universe, paths, namespace=None, kind=None):
+        if self.raw in index.paths:
+            if paths is not None and self.raw not in paths:
+                return []
+            return [self.raw]
+        regex, pattern_ns = self.compile(namespace, kind)
+        if regex is None:
+            return []
+        if pattern_ns is not None and not self.negate:
+            # a literal namespace, only its objects can match
+            groups = [universe.get(pattern_ns, [])]
+        else:
+            groups = universe.values()
+        negate = self.negate
+        match = regex.match
+        return [pd["display"] for pds in groups for pd in pds if negate ^ bool(match(pd["normalized"]))]
+
+
+class OpFragment(object):
+    """
+    A status or config expression selector fragment, like "avail=up" or
+    "$.monitor.status~idle". The jsonpath expression is parsed once.
+    """
+    static = False
+
+    def __init__(self, negate, param, op, value):
+        self.negate = negate
+        self.param = param
+        self.op = op
+        self.value = value
+        if param.startswith("."):
+            param = "$" + param
+        if param.startswith("$."):
+            self.jsonpath_expr = parse(param)
+        else:
+            self.jsonpath_expr = None
+
+
+class EmptyFragment(object):
+    static = True
+
+
+class CompiledSelector(object):
+    """
+    An object selector expression parsed into a list of "or" terms, each
+    a list of "and" fragments.
+    """
+    def __init__(self, selector):
+        self.selector = selector
+        self.terms = [
+            [self.parse_fragment(s) for s in term.split("+")]
+            for term in selector.split(",")
+        ]
+        self.static = all(fragment.static for term in self.terms for fragment in term)
+
+    @staticmethod
+    def parse_fragment(s):
+        if not s:
+            return EmptyFragment()
+        negate, pattern, elts = selector_parse_fragment(s)
+        if len(elts) == 1:
+            return GlobFragment(s, negate, pattern)
+        try:
+            param, op, value = selector_parse_op_fragment(elts)
+        except ValueError:
+            return EmptyFragment()
+        return OpFragment(negate, param, op, value)
+
+
+class SelectorCache(object):
+    """
+    The compiled selectors, cached by expression, and the static selectors
+    selections, cached until the paths index generation changes.
+    """
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.lock = threading.RLock()
+        self.compiled = {}
+        self.selections = {}
+        self.gen = None
+
+    def compile(self, selector):
+        try:
+            return self.compiled[selector]
+        except KeyError:
+            pass
+        compiled = CompiledSelector(selector)
+        with self.lock:
+            if len(self.compiled) >= self.size:
+                self.compiled.clear()
+            self.compiled[selector] = compiled
+        return compiled
+
+    def get_selection(self, gen, key):
+        with self.lock:
+            if gen != self.gen:
+                return
+            return self.selections.get(key)
+
+    def set_selection(self, gen, key, selection):
+        with self.lock:
+            if gen != self.gen:
+                self.selections = {}
+                self.gen = gen
+            elif len(self.selections) >= self.size:
+                self.selections.clear()
+            self.selections[key] = selection
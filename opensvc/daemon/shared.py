@@ -16,18 +16,238 @@
 from foreign.six.moves import queue
 
 import core.exceptions as ex
-from foreign.jsonpath_ng.ext import parse
 from env import Env
+from utilities.cache.tier import ResultCache
 from utilities.journaled_data import JournaledData
 from utilities.lazy import lazy, unset_lazy
-from utilities.naming import split_path, paths_data, factory, object_path_glob
-from utilities.selector import selector_config_match, selector_value_match, selector_parse_fragment, selector_parse_op_fragment
+from utilities.naming import split_path, factory
+from utilities.selector import selector_config_match, selector_value_match
 from utilities.storage import Storage
 from core.freezer import Freezer
+from core.objects.keywordindex import KeywordIndex
 from core.comm import Crypt
 from .events import EVENTS
+from .selector import GlobFragment, OpFragment, PathsIndex, SelectorCache
 
 
+class EventQueue(queue.Queue):
+    """
+    The events queue, calling the <waker> callable on put, so the listener
+    dispatches the events to the subscribers without delay.
+    """
+    waker = None
+
+    def put(self, item, block=True, timeout=None):
+        queue.Queue.put(self, item, block, timeout)
+        waker = self.waker
+        if waker is not None:
+            waker()
+
+
+class InstancesIndex(object):
+    """
+    The object instances status of the monitor.nodes daemon status data,
+    indexed by path and by node.
+
+    The index is updated by the dataset writers, under the dataset lock.
+    The indexed instance data are references to the dataset values, which
+    are never modified in-place. The per-path and per-node containers are
+    replaced instead of modified, so the readers can iterate them without
+    locking.
+    """
+    def __init__(self):
+        # path -> {nodename: instance data}
+        self.instances = {}
+        # nodename -> frozenset of paths
+        self.paths = {}
+        # nodename -> set of paths with a transitioning monitor status
+        self.transitions = {}
+        # nodename -> set of paths with a non-idle monitor status or a
+        # global expect
+        self.active = {}
+
+    def update(self, data, path):
+        """
+        Update the index after the dataset <data> changed at <path>.
+        """
+        depth = len(path)
+        if depth < 3:
+            if path == ["monitor", "nodes"][:depth]:
+                self.rebuild(data)
+            return
+        if path[:2] != ["monitor", "nodes"]:
+            return
+        nodename = path[2]
+        if depth < 6:
+            if path[3:] == ["services", "status"][:depth-3]:
+                self.update_node(data, nodename)
+            return
+        if path[3:5] != ["services", "status"]:
+            return
+        try:
+            instance = data["monitor"]["nodes"][nodename]["services"]["status"][path[5]]
+        except (KeyError, TypeError):
+            self.remove(path[5], nodename)
+            return
+        self.add(path[5], nodename, instance)
+
+    def rebuild(self, data):
+        try:
+            nodenames = list(data["monitor"]["nodes"])
+        except (KeyError, TypeError):
+            nodenames = []
+        for nodename in set(self.paths) - set(nodenames):
+            self.update_node(data, nodename)
+        for nodename in nodenames:
+            self.update_node(data, nodename)
+
+    def update_node(self, data, nodename):
+        try:
+            instances = data["monitor"]["nodes"][nodename]["services"]["status"]
+            paths = frozenset(instances)
+        except (KeyError, TypeError, AttributeError):
+            instances = {}
+            paths = frozenset()
+        for path in self.paths.get(nodename, frozenset()) - paths:
+            self.remove(path, nodename)
+        for path in paths:
+            self.add(path, nodename, instances[path])
+
+    def add(self, path, nodename, instance):
+        current = self.instances.get(path, {})
+        if current.get(nodename) is instance and nodename in current:
+            return
+        instances = dict(current)
+        instances[nodename] = instance
+        self.instances[path] = instances
+        paths = self.paths.get(nodename, frozenset())
+        if path not in paths:
+            self.paths[nodename] = paths | frozenset([path])
+        if self.in_transition(instance):
+            self.transitions.setdefault(nodename, set()).add(path)
+        elif nodename in self.transitions:
+            self.transitions[nodename].discard(path)
+        if self.is_active(instance):
+            self.active.setdefault(nodename, set()).add(path)
+        elif nodename in self.active:
+            self.active[nodename].discard(path)
+
+    @staticmethod
+    def in_transition(instance):
+        try:
+            status = instance["monitor"]["status"]
+        except (KeyError, TypeError):
+            return False
+        return bool(status) and status != "scaling" and status.endswith("ing")
+
+    @staticmethod
+    def is_active(instance):
+        try:
+            smon = instance["monitor"]
+            return smon.get("status") not in (None, "idle") or smon.get("global_expect") is not None
+        except (KeyError, TypeError, AttributeError):
+            return False
+
+    def remove(self, path, nodename):
+        current = self.instances.get(path, {})
+        if nodename in current:
+            instances = dict(current)
+            del instances[nodename]
+            if instances:
+                self.instances[path] = instances
+            else:
+                del self.instances[path]
+        if nodename in self.transitions:
+            self.transitions[nodename].discard(path)
+        if nodename in self.active:
+            self.active[nodename].discard(path)
+        paths = self.paths.get(nodename)
+        if paths is None:
+            return
+        if path in paths:
+            paths = paths - frozenset([path])
+        if paths:
+            self.paths[nodename] = paths
+        else:
+            del self.paths[nodename]
+
+    def get(self, path):
+        """
+        Return the {nodename: instance data} dict of <path>. The caller
+        must not modify it.
+        """
+        return self.instances.get(path, {})
+
+    def transition_count(self, nodename):
+        """
+        Return the number of instances of <nodename> with a transitioning
+        monitor status, like "starting".
+        """
+        return len(self.transitions.get(nodename, ()))
+
+    def active_paths(self, nodename):
+        """
+        Return the set of paths of the <nodename> instances with a non-idle
+        monitor status or a global expect, whose orchestration can progress
+        without a status change.
+        """
+        return set(self.active.get(nodename, ()))
+
+
+class ChangedPaths(object):
+    """
+    The object paths whose instance status or config changed in the
+    monitor.nodes daemon status data, on any node, since the last pop().
+
+    The changes of the node-level data altering the orchestration of all
+    objects, like the node frozen state or monitor status, are recorded
+    as a change of all paths. The changes of the node data unrelated to
+    the orchestration, like the stats, are ignored.
+    """
+    # the node data keys whose change can alter any object orchestration
+    node_keys = ("monitor", "frozen", "labels", "targets", "env", "arbitrators")
+
+    def __init__(self):
+        self.paths = set()
+        # start with a full pass
+        self.all = True
+
+    def update(self, path):
+        """
+        Record the change of the dataset at <path>.
+        """
+        depth = len(path)
+        if path[:1] == ["cluster"]:
+            self.all = True
+            return
+        if path[:2] != ["monitor", "nodes"][:depth]:
+            return
+        if depth < 4:
+            # the whole dataset, the nodes or a node
+            self.all = True
+            return
+        if path[3] in self.node_keys:
+            self.all = True
+        elif path[3] != "services":
+            return
+        elif depth < 6:
+            self.all = True
+        elif path[4] in ("status", "config"):
+            self.paths.add(path[5])
+
+    def pop(self):
+        """
+        Return the set of changed paths, or None if all paths changed, and
+        reset the recorded changes.
+        """
+        if self.all:
+            paths = None
+        else:
+            paths = self.paths
+        self.paths = set()
+        self.all = False
+        return paths
+
 class OsvcJournaledData(JournaledData):
     def __init__(self):
         super(OsvcJournaledData, self).__init__(
@@ -40,6 +260,26 @@ def __init__(self):
             # disable journaling if we have no peer, as nothing purges the journal
             journal_condition=lambda: bool(LOCAL_GEN),
         )
+        self.index = InstancesIndex()
+        self.changed = ChangedPaths()
+
+    def _set(self, path, value):
+        super(OsvcJournaledData, self)._set(path, value)
+        self.index.update(self.data, path or [])
+        self.changed.update(path or [])
+
+    def _unset(self, path):
+        super(OsvcJournaledData, self)._unset(path)
+        self.index.update(self.data, path)
+        self.changed.update(path)
+
+    def pop_changed(self):
+        """
+        Return the set of object paths whose instance status or config
+        changed since the last call, or None if all objects are affected.
+        """
+        with self.lock:
+            return self.changed.pop()
 
 
 # import utilities.dbglock
@@ -50,14 +290,40 @@ def __init__(self):
 DAEMON = None
 
 # the event queue to feed to clients listening for changes
-EVENT_Q = queue.Queue()
+EVENT_Q = EventQueue()
 
 # daemon_status data
 DAEMON_STATUS = OsvcJournaledData()
 
+# the cluster object paths index, and the object selector cache
+PATHS_INDEX = PathsIndex()
+SELECTOR_CACHE = SelectorCache()
+
+# the command results cache shared by all the sessions of the node, sized
+# by the node.shared_cache_size keyword
+CMD_CACHE = ResultCache()
+
+# the container engines states kept fresh by the containers thread,
+# indexed by engine api socket path
+CONTAINER_STATES = {}
+
+# the local objects keyword index, used by the config keyword selectors
+KEYWORD_INDEX = None
+
+
+def keyword_index():
+    global KEYWORD_INDEX
+    if KEYWORD_INDEX is None or KEYWORD_INDEX.var_d != Env.paths.pathvar:
+        KEYWORD_INDEX = KeywordIndex()
+    return KEYWORD_INDEX
+
+
 # disable orchestration if a peer announces a different compat version than
 # ours
-COMPAT_VERSION = 10
+COMPAT_VERSION = 11
+
+# the minimum compat version of a peer able to decode binary heartbeat frames
+HB_BINARY_COMPAT = 11
 
 # expose api handlers version
 API_VERSION = 6
@@ -96,10 +362,12 @@ def __init__(self):
 SERVICES = {}
 SERVICES_LOCK = RLock()
 
-# The encrypted message all the heartbeat tx threads send.
-# It is refreshed in the monitor thread loop.
-HB_MSG = None
-HB_MSG_LEN = 0
+# The encrypted messages the heartbeat tx threads send, indexed by
+# (kind, gen range, format), so each message is encrypted once for all the
+# heartbeat links. It is reset in the monitor thread loop when the local
+# dataset changes.
+HB_MSG_CACHE = {}
+HB_MSG_CACHE_SIZE = 32
 HB_MSG_LOCK = RLock()
 
 # the node monitor states evicting a node from ranking algorithms
@@ -723,26 +991,41 @@ def iter_local_services_instances(self):
             yield (path, data)
 
     def iter_service_instances(self, path, nodenames=None):
-        for _, nodename, data in self.iter_services_instances(paths=[path], nodenames=nodenames):
-            yield (nodename, data)
+        instances = self.daemon_status_data.index.get(path)
+        if not instances:
+            return
+        for nodename in nodenames or self.cluster_nodes:
+            try:
+                yield (nodename, Storage(instances[nodename]))
+            except KeyError:
+                continue
 
     def iter_services_instances(self, paths=None, nodenames=None):
         nodenames = nodenames or self.cluster_nodes
+        if paths:
+            for nodename in nodenames:
+                for path in paths:
+                    try:
+                        yield (path, nodename, Storage(self.daemon_status_data.index.get(path)[nodename]))
+                    except KeyError:
+                        continue
+            return
         for nodename in nodenames:
-            for path in self.daemon_status_data.keys_safe(["monitor", "nodes", nodename, "services", "status"]):
-                if paths and path not in paths:
-                    continue
-                try:
-                    yield (path, nodename, Storage(self.daemon_status_data.get(["monitor", "nodes", nodename, "services", "status", path])))
-                except KeyError:
-                    continue
+            try:
+                instances = self.daemon_status_data.get_snapshot(["monitor", "nodes", nodename, "services", "status"])
+            except (KeyError, TypeError):
+                continue
+            for path, data in instances.items():
+                yield (path, nodename, Storage(data))
 
     def iter_services_configs(self, paths=None, nodenames=None):
         nodenames = nodenames or self.cluster_nodes
         for nodename in nodenames:
-            for path in self.daemon_status_data.keys_safe(["monitor", "nodes", nodename, "services", "config"]):
-                if paths and path not in paths:
-                    continue
+            if paths:
+                candidates = paths
+            else:
+                candidates = self.daemon_status_data.keys_safe(["monitor", "nodes", nodename, "services", "config"])
+            for path in candidates:
                 try:
                     yield (path, nodename, Storage(self.daemon_status_data.get(["monitor", "nodes", nodename, "services", "config", path])))
                 except KeyError:
@@ -1039,7 +1322,7 @@ def get_service_instance(self, path, nodename):
         """
         Return the specified object status structure on the specified node.
         """
-        data = self.daemon_status_data.get(["monitor", "nodes", nodename, "services", "status", path], None)
+        data = self.daemon_status_data.index.get(path).get(nodename)
         if data is None:
             return
         return Storage(data)
@@ -1059,16 +1342,26 @@ def get_service_instances(self, path, discard_empty=False):
         return instances
 
     def get_service_nodes(self, path):
-        return [n for (n, _) in self.iter_service_instances(path)]
+        instances = self.daemon_status_data.index.get(path)
+        return [nodename for nodename in self.cluster_nodes if nodename in instances]
 
     def list_nodes(self):
         return self.daemon_status_data.keys_safe(["monitor", "nodes"])
 
     def list_cluster_paths(self):
-        paths = set()
-        for path, _, _ in self.iter_services_configs():
-            paths.add(path)
-        return paths
+        return set(self.paths_index().paths)
+
+    def paths_index(self):
+        """
+        Return the cluster object paths index, refreshed if an object was
+        added or removed since the last call.
+        """
+        try:
+            nodes = self.daemon_status_data.get_snapshot(["monitor", "nodes"])
+        except KeyError:
+            nodes = {}
+        PATHS_INDEX.refresh(nodes, self.cluster_nodes)
+        return PATHS_INDEX
 
     def get_service_agg(self, path):
         """
@@ -1658,34 +1951,77 @@ def update_status(self):
         self.thread_data.set([], data)
 
     def daemon_status(self):
-        data = self.daemon_status_data.get_copy()
-        return data
+        """
+        Return a read-only snapshot of the daemon status data.
+        """
+        return self.daemon_status_data.get_snapshot()
 
     def filter_daemon_status(self, data, namespace=None, namespaces=None, selector=None, relatives=False):
+        """
+        Return <data> without the objects not matching the selector.
+
+        <data> is not modified, as it is usually a snapshot shared with the
+        daemon status dataset. Only the containers holding object paths are
+        copied, the other subtrees are shared with <data>.
+        """
         if selector is None:
             selector = "**"
-        keep = self.object_selector(selector=selector, namespace=namespace, namespaces=namespaces, relatives=relatives)
-        for node in [n for n in data.get("monitor", {}).get("nodes", {})]:
-            for path in [p for p in data["monitor"]["nodes"][node].get("services", {}).get("status", {})]:
-                if path not in keep:
-                    del data["monitor"]["nodes"][node]["services"]["status"][path]
-            for path in [p for p in data["monitor"]["nodes"][node].get("services", {}).get("config", {})]:
-                if path not in keep:
-                    del data["monitor"]["nodes"][node]["services"]["config"][path]
-        for path in [p for p in data.get("monitor", {}).get("services", {})]:
-            if path not in keep:
-                del data["monitor"]["services"][path]
+        keep = set(self.object_selector(selector=selector, namespace=namespace, namespaces=namespaces, relatives=relatives))
+        return self.filter_daemon_status_paths(data, keep)
+
+    @staticmethod
+    def filter_daemon_status_paths(data, keep):
+        """
+        Return <data> without the objects whose path is not in the <keep>
+        set. Like filter_daemon_status(), <data> is not modified.
+        """
+        def filtered(d):
+            return dict((path, v) for path, v in d.items() if path in keep)
+
+        if "monitor" not in data:
+            return data
+        data = dict(data)
+        data["monitor"] = dict(data["monitor"])
+        if "nodes" in data["monitor"]:
+            nodes = {}
+            for node, ndata in data["monitor"]["nodes"].items():
+                services = ndata.get("services", {})
+                if "status" in services or "config" in services:
+                    services = dict(services)
+                    for key in ("status", "config"):
+                        if key in services:
+                            services[key] = filtered(services[key])
+                    ndata = dict(ndata)
+                    ndata["services"] = services
+                nodes[node] = ndata
+            data["monitor"]["nodes"] = nodes
+        if "services" in data["monitor"]:
+            data["monitor"]["services"] = filtered(data["monitor"]["services"])
         return data
 
     @staticmethod
     def data_without_non_updated_gens(data):
-        """Return data without non updated gen"""
+        """
+        Return data without non updated gen.
+
+        <data> is not modified, the changed containers are copied.
+        """
         local_node = Env.nodename
-        for other_node in [n for n in data.get("monitor", {"nodes": {}})["nodes"].keys() if n != local_node]:
-            if "gen" in data["monitor"]["nodes"][other_node]:
-                data["monitor"]["nodes"][other_node]["gen"] = {
-                    local_node: data["monitor"]["nodes"][other_node]["gen"][local_node]
+        nodes = data.get("monitor", {"nodes": {}})["nodes"]
+        changed = {}
+        for other_node in [n for n in nodes.keys() if n != local_node]:
+            if "gen" in nodes[other_node]:
+                ndata = dict(nodes[other_node])
+                ndata["gen"] = {
+                    local_node: nodes[other_node]["gen"][local_node]
                 }
+                changed[other_node] = ndata
+        if not changed:
+            return data
+        data = dict(data)
+        data["monitor"] = dict(data["monitor"])
+        data["monitor"]["nodes"] = dict(nodes)
+        data["monitor"]["nodes"].update(changed)
         return data
 
     def match_object_selector(self, selector=None, namespace=None, namespaces=None, path=None):
@@ -1694,6 +2030,14 @@ def match_object_selector(self, selector=None, namespace=None, namespaces=None,
         return path in self.object_selector(selector=selector, namespace=namespace, namespaces=namespaces, paths=[path])
 
     def object_selector(self, selector=None, namespace=None, namespaces=None, kind=None, paths=None, relatives=False):
+        """
+        Return the list of object paths matching <selector>.
+
+        The selector expression is compiled once and cached. The
+        selections of the expressions depending only on the object paths
+        are cached until an object is added to or removed from the
+        cluster.
+        """
         if not selector:
             return []
         if namespace:
@@ -1704,81 +2048,43 @@ def object_selector(self, selector=None, namespace=None, namespaces=None, kind=N
         if "root" in namespaces:
             namespaces.add(None)
 
-        if paths is None:
-            # all objects
-            paths = self.list_cluster_paths()
-        pds = paths_data(paths)
-        pds = [pd for pd in pds if pd["namespace"] in namespaces]
-        if kind:
-            pds = [pd for pd in pds if pd["kind"] == kind]
-        if selector == "**":
-            return [pd["display"] for pd in pds]
+        index = self.paths_index()
+        compiled = SELECTOR_CACHE.compile(selector)
+        if paths is None and not relatives and compiled.static:
+            key = (selector, namespace, frozenset(namespaces), kind)
+            gen = index.gen
+            selected = SELECTOR_CACHE.get_selection(gen, key)
+            if selected is None:
+                selected = self._object_selector(compiled, index, namespace, namespaces, kind, None)
+                SELECTOR_CACHE.set_selection(gen, key, selected)
+            return list(selected)
+
+        expanded = self._object_selector(compiled, index, namespace, namespaces, kind, paths)
+        if relatives:
+            expanded = self.add_relatives(expanded)
+        return expanded
+
+    def _object_selector(self, compiled, index, namespace, namespaces, kind, paths):
+        universe = index.universe(namespaces, kind=kind, paths=paths)
+        if compiled.selector == "**":
+            return [pd["display"] for pds in universe.values() for pd in pds]
 
         # all services
-        if selector == "*":
+        if compiled.selector == "*":
             kind = kind or "svc"
-            return [pd["display"] for pd in pds if pd["kind"] == kind]
-
-        def or_fragment_selector(s):
-            expanded = []
-            for _selector in s.split(","):
-                for p in and_fragment_selector(_selector):
-                    if p in expanded:
-                        continue
-                    expanded.append(p)
-            return expanded
-
-        def and_fragment_selector(s):
-            expanded = None
-            for _selector in s.split("+"):
-                _expanded = fragment_selector(_selector)
-                if expanded is None:
-                    expanded = _expanded
-                else:
-                    expanded = [p for p in expanded if p in _expanded]
-            return expanded
-
-        def selector_parse_jsonpath_expr(param):
-            if param.startswith("."):
-                param = "$"+param
-
-            if param.startswith("$."):
-                jsonpath_expr = parse(param)
-            else:
-                jsonpath_expr = None
-            return jsonpath_expr
-
-        def fragment_selector(s):
-            # empty
-            if not s:
-                return []
-
-            # explicit object path
-            if s in self.list_cluster_paths():
-                if s not in paths:
-                    return []
-                return [s]
-
-            # fnmatch expression
-            negate, s, elts = selector_parse_fragment(s)
-
-            if len(elts) == 1:
-                return object_path_glob(s, pds=pds, namespace=namespace, kind=kind, negate=negate)
-
-            try:
-                param, op, value = selector_parse_op_fragment(elts)
-            except ValueError:
-                return []
+            return [pd["display"] for pds in universe.values() for pd in pds if pd["kind"] == kind]
 
-            expanded = []
-            jsonpath_expr = selector_parse_jsonpath_expr(param)
-
-            for path in paths:
-                ret = svc_matching(path, param, op, value, jsonpath_expr)
-                if ret ^ negate:
-                    expanded.append(path)
-
-            return expanded
+        if paths is None:
+            paths = index.paths
+        elif not isinstance(paths, (set, frozenset, dict)):
+            paths = set(paths)
+
+        def fragment_selector(fragment):
+            if isinstance(fragment, GlobFragment):
+                return fragment.select(index, universe, paths, namespace=namespace, kind=kind)
+            if isinstance(fragment, OpFragment):
+                return [path for path in paths if svc_matching(path, fragment) ^ fragment.negate]
+            return []
 
         def selector_status_matching(path, jsonpath_expr, op, value):
             try:
@@ -1792,32 +2098,52 @@ def selector_status_matching(path, jsonpath_expr, op, value):
                 return False
             return False
 
-        def svc_matching(path, param, op, value, jsonpath_expr):
-            if jsonpath_expr:
-                return selector_status_matching(path, jsonpath_expr, op, value)
+        def svc_matching(path, fragment):
+            if fragment.jsonpath_expr:
+                return selector_status_matching(path, fragment.jsonpath_expr, fragment.op, fragment.value)
             else:
+                try:
+                    return kwindex.match(path, fragment.param, fragment.op, fragment.value)
+                except KeyError:
+                    pass
                 try:
                     svc = SERVICES[path]
                 except KeyError:
                     return False
-                return selector_config_match(svc, param, op, value)
-
-        def add_relatives(selected):
-            l = set()
+                return selector_config_match(svc, fragment.param, fragment.op, fragment.value)
+
+        kwindex = keyword_index()
+
+        expanded = []
+        done = set()
+        for term in compiled.terms:
+            selected = None
+            for fragment in term:
+                _selected = fragment_selector(fragment)
+                if selected is None:
+                    selected = _selected
+                else:
+                    _selected = set(_selected)
+                    selected = [p for p in selected if p in _selected]
             for p in selected:
-                l.add(p)
-                try:
-                    l |= set(SERVICES[p].children_and_slaves)
-                    l |= set(SERVICES[p].parents)
-                except Exception:
-                    pass
-            return list(l)
-
-        expanded = or_fragment_selector(selector)
-        if relatives:
-            expanded = add_relatives(expanded)
+                if p in done:
+                    continue
+                done.add(p)
+                expanded.append(p)
         return expanded
 
+    @staticmethod
+    def add_relatives(selected):
+        l = set()
+        for p in selected:
+            l.add(p)
+            try:
+                l |= set(SERVICES[p].children_and_slaves)
+                l |= set(SERVICES[p].parents)
+            except Exception:
+                pass
+        return list(l)
+
     def object_data(self, path):
         """
         Extract from the cluster data the structures refering to a
@@ -10,6 +10,8 @@ class BaseDiskScsireserv(Resource):
     """Define method to acquire and release scsi SPC-3 persistent reservations
     on devs held by a service
     """
+    # the sg driver toggles the sg_persist read-only mode environment variables
+    status_thread_safe = False
 
     def __init__(self,
                  rid=None,
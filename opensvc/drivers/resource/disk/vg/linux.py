@@ -201,6 +201,8 @@ def activate_vg(self):
         self.clear_cache("vg.lvs")
         self.clear_cache("lvs.attr")
         self.clear_cache("vg.tags")
+        self.clear_cache("dmsetup.table")
+        self.clear_cache("dmsetup.status")
         if ret != 0:
             raise ex.Error
 
@@ -210,6 +212,8 @@ def _deactivate_vg(self):
         self.clear_cache("vg.lvs")
         self.clear_cache("lvs.attr")
         self.clear_cache("vg.tags")
+        self.clear_cache("dmsetup.table")
+        self.clear_cache("dmsetup.status")
         if ret == 0:
             return True
         if not self.is_up():
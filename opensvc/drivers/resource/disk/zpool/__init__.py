@@ -258,6 +258,7 @@ def do_start(self):
         self.can_rollback = True
         self.set_multihost()
         self.unset_lazy("zpool_status")
+        self.clear_cache("zpool.devs.%s" % self.name)
 
     def do_stop(self):
         if not self.is_up():
@@ -269,6 +270,7 @@ def do_stop(self):
             cmd = ["zpool", "export", "-f", self.name]
             ret, out, err = self.vcall(cmd)
         self.unset_lazy("zpool_status")
+        self.clear_cache("zpool.devs.%s" % self.name)
         if ret != 0:
             raise ex.Error
 
@@ -128,7 +128,9 @@ def is_up(self):
             self.status_log("mnt is not defined", "info")
             return False
         self.mounts = Mounts()
-        for dev in [self.device] + utilities.devices.linux.udevadm_query_symlink(self.device):
+        if self.mounts.has_mount(self.device, self.mount_point):
+            return True
+        for dev in utilities.devices.linux.udevadm_query_symlink(self.device):
             ret = self.mounts.has_mount(dev, self.mount_point)
             if ret:
                 return True
@@ -46,6 +46,9 @@
 
 
 class SyncEvasnap(Sync):
+    # sssu commands change the process working directory
+    status_thread_safe = False
+
     def __init__(self,
                  pairs=None,
                  eva_name="",
@@ -66,6 +66,9 @@ def driver_capabilities(node=None):
 
 
 class SyncS3(Sync):
+    # the aws credentials are passed through the process environment
+    status_thread_safe = False
+
     def __init__(self,
                  src=None,
                  options=None,
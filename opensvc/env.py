@@ -10,7 +10,12 @@
 
 def create_or_update_dir(d):
     if not os.path.exists(d):
-        os.makedirs(d)
+        try:
+            os.makedirs(d)
+        except OSError:
+            # created by a concurrent thread
+            if not os.path.isdir(d):
+                raise
     else:
         # update tmpdir timestamp to avoid tmpwatch kicking-in while we run
         now = time.time()
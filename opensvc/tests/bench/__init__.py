@@ -0,0 +1,161 @@
+"""
+Micro-benchmarks and their synthetic datasets.
+
+The benchmark modules are not collected by pytest. Run them from the
+opensvc directory, for example:
+
+    python -m tests.bench.journaled_data
+"""
+from __future__ import print_function
+
+import time
+
+RESOURCE_TYPES = (
+    ("fs", "fs.flag"),
+    ("ip", "ip.host"),
+    ("disk", "disk.vg"),
+    ("app", "app.forking"),
+    ("container", "container.docker"),
+)
+
+
+def object_paths(n_objects=500, n_namespaces=10):
+    """
+    Return a list of <n_objects> svc paths spread over <n_namespaces>
+    namespaces.
+    """
+    paths = []
+    for i in range(n_objects):
+        namespace = "ns%d" % (i % n_namespaces)
+        paths.append("%s/svc/svc%d" % (namespace, i))
+    return paths
+
+
+def nodenames(n_nodes=16):
+    return ["node%d" % i for i in range(1, n_nodes + 1)]
+
+
+def instance_status(path, n_resources=5, avail="up", ts=None):
+    ts = ts or time.time()
+    resources = {}
+    for i in range(n_resources):
+        group, rtype = RESOURCE_TYPES[i % len(RESOURCE_TYPES)]
+        rid = "%s#%d" % (group, i)
+        resources[rid] = {
+            "label": "%s %s" % (rtype, path),
+            "log": [],
+            "provisioned": {"mtime": ts, "state": True},
+            "status": avail,
+            "type": rtype,
+        }
+    return {
+        "app": "default",
+        "avail": avail,
+        "csum": "%032x" % hash((path, avail, ts)),
+        "env": "PRD",
+        "frozen": 0,
+        "kind": "svc",
+        "monitor": {
+            "global_expect": None,
+            "global_expect_updated": ts,
+            "placement": "leader",
+            "status": "idle",
+            "status_updated": ts,
+        },
+        "optional": "n/a",
+        "orchestrate": "ha",
+        "overall": avail,
+        "placement": "nodes order",
+        "provisioned": True,
+        "resources": resources,
+        "status_group": dict((group, avail) for group, _ in RESOURCE_TYPES),
+        "subsets": {},
+        "topology": "flex",
+        "updated": ts,
+    }
+
+
+def instance_config(nodes, ts=None):
+    return {
+        "csum": "4446e020698e58edcff4b026598f985a",
+        "scope": list(nodes),
+        "updated": ts or time.time(),
+    }
+
+
+def cluster_status(n_objects=500, n_nodes=16, n_namespaces=10, n_resources=5):
+    """
+    Return a synthetic daemon status dataset, structured like the
+    DAEMON_STATUS data, with <n_objects> objects having an instance on
+    each of the <n_nodes> nodes.
+    """
+    ts = time.time()
+    nodes = nodenames(n_nodes)
+    paths = object_paths(n_objects, n_namespaces)
+    data = {
+        "cluster": {
+            "id": "a8b2c2ba-0d6e-11eb-9c5d-525400d3e5dd",
+            "name": "bench",
+            "nodes": nodes,
+        },
+        "monitor": {
+            "nodes": {},
+            "services": {},
+        },
+    }
+    for nodename in nodes:
+        data["monitor"]["nodes"][nodename] = {
+            "compat": 10,
+            "frozen": 0,
+            "gen": dict((n, 1) for n in nodes),
+            "labels": {},
+            "monitor": {"status": "idle", "status_updated": ts},
+            "services": {
+                "config": dict((p, instance_config(nodes, ts)) for p in paths),
+                "status": dict((p, instance_status(p, n_resources, ts=ts)) for p in paths),
+            },
+            "stats": {"load_15m": 0.2, "mem_avail": 70, "swap_avail": 90, "score": 80},
+            "updated": ts,
+        }
+    for path in paths:
+        data["monitor"]["services"][path] = {
+            "avail": "up",
+            "frozen": "thawed",
+            "overall": "up",
+            "placement": "optimal",
+            "provisioned": True,
+        }
+    return data
+
+
+def bench(fn, number=None, duration=1.0):
+    """
+    Call <fn> <number> times, or as many times as possible during
+    <duration> seconds if <number> is not set. Return the mean duration
+    of a call, in seconds.
+    """
+    count = 0
+    begin = time.time()
+    while True:
+        fn()
+        count += 1
+        elapsed = time.time() - begin
+        if number is not None:
+            if count >= number:
+                break
+        elif elapsed >= duration:
+            break
+    return elapsed / count
+
+
+def report(title, rows):
+    """
+    Print a table of (label, baseline seconds, optimized seconds) rows.
+    """
+    print(title)
+    print("-" * len(title))
+    print("%-32s %14s %14s %10s" % ("operation", "baseline", "optimized", "speedup"))
+    for label, before, after in rows:
+        speedup = before / after if after else float("inf")
+        print("%-32s %12.3fms %12.3fms %9.1fx" % (label, before * 1000, after * 1000, speedup))
+    print()
@@ -0,0 +1,73 @@
+"""
+Compare the per-session file cache to the daemon shared cache tier, on
+sessions each calling 5 cached commands 3 times, like successive actions
+spawned by the daemon.
+
+The daemon side is the cache handlers served on a temporary unix socket.
+
+    python -m tests.bench.cache
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import uuid
+
+import utilities.cache
+from env import Env
+from tests.bench import bench, report
+from tests.daemon.handlers.test_cache import serve
+from utilities.cache import cache, purge_cache, set_cache_tier
+from utilities.cache.tier import DaemonTier
+from utilities.proc import justcall
+
+N_COMMANDS = 5
+N_CALLS = 3
+
+
+class Commands(object):
+    @cache("bench.ps.{args[1]}")
+    def ps(self, i):
+        return justcall(["ps", "-e", "-o", "pid,comm"])[0]
+
+
+def session():
+    os.environ["OSVC_CACHE_UUID"] = str(uuid.uuid4())
+    commands = Commands()
+    for _ in range(N_CALLS):
+        for i in range(N_COMMANDS):
+            commands.ps(i)
+    purge_cache()
+
+
+def main():
+    tmp_d = tempfile.mkdtemp()
+    Env.paths.pathvar = tmp_d
+    path = os.path.join(tmp_d, "lsnr.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(8)
+    thr = threading.Thread(target=serve, args=(sock,))
+    thr.daemon = True
+    thr.start()
+    try:
+        set_cache_tier(None)
+        legacy = bench(session, number=20)
+        set_cache_tier(DaemonTier(path=path))
+        session()
+        shared = bench(session, number=20)
+        assert utilities.cache.TIER is not None
+        rows = [
+            ("session, %d commands" % N_COMMANDS, legacy, shared),
+        ]
+        report("command results cache, session files vs daemon tier", rows)
+    finally:
+        sock.close()
+        shutil.rmtree(tmp_d)
+
+
+if __name__ == "__main__":
+    main()
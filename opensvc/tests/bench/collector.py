@@ -0,0 +1,130 @@
+"""
+Compare the collector thread change detection and daemon status payload
+to the legacy full rescan and full push, on a 2000 objects, 8 nodes
+cluster with 10 instances changing between passes.
+
+    python -m tests.bench.collector
+"""
+from __future__ import print_function
+
+import json
+import logging
+
+from daemon.collector import Collector
+from tests.bench import bench, cluster_status, report
+
+N_OBJECTS = 2000
+N_CHANGES = 10
+
+
+def legacy_get_last_status(thr, data):
+    """
+    The change detection before the instances references and the parents
+    index.
+    """
+    last_status = {}
+    last_status_changed = set()
+
+    def add_parents(_path, done=None):
+        if done is None:
+            done = []
+        if _path in done:
+            return
+        for nodename, ndata in data["nodes"].items():
+            for path, sdata in ndata.get("services", {}).get("status", {}).items():
+                slaves = sdata.get("slaves", []) + sdata.get("scaler_slaves", [])
+                if _path not in slaves:
+                    continue
+                if path in last_status_changed:
+                    continue
+                last_status_changed.add(path)
+                add_parents(path, done=done+[_path])
+
+    for path, nodename in thr.last_status:
+        if path is None:
+            if data["nodes"].get(nodename) is None:
+                last_status_changed.add("@"+nodename)
+        else:
+            if data["nodes"].get(nodename, {}).get("services", {}).get("status", {}).get(path) is None:
+                last_status_changed |= set([path, path+"@"+nodename])
+
+    for nodename, ndata in data["nodes"].items():
+        node_frozen = ndata.get("frozen")
+        last_node_frozen = thr.last_status.get((None, nodename), {}).get("frozen")
+        if node_frozen != last_node_frozen:
+            last_status_changed.add("@"+nodename)
+        last_status[(None, nodename)] = {"frozen": node_frozen}
+        for path, sdata in ndata.get("services", {}).get("status", {}).items():
+            status_csum = sdata.get("csum", "") + \
+                str(sdata.get("monitor", {}).get("status_updated")) + \
+                str(sdata.get("monitor", {}).get("global_status_updated"))
+            prev_status_csum = thr.last_status.get((path, nodename))
+            if status_csum != prev_status_csum:
+                last_status_changed.add(path+"@"+nodename)
+                if path not in last_status_changed:
+                    last_status_changed.add(path)
+                    add_parents(path)
+            last_status[(path, nodename)] = status_csum
+    return last_status, last_status_changed
+
+
+def collector_data():
+    status = cluster_status(n_objects=N_OBJECTS, n_nodes=8, n_resources=2)["monitor"]
+    paths = sorted(status["services"])
+    for ndata in status["nodes"].values():
+        for i, path in enumerate(paths[:N_OBJECTS // 10]):
+            ndata["services"]["status"][path]["slaves"] = [paths[-i - 1]]
+    data = {"cluster_id": "id", "cluster_name": "bench", "nodes": status["nodes"], "services": status["services"]}
+    return data, paths
+
+
+def change(data, paths, state):
+    """
+    Replace <N_CHANGES> instances status structures, like the daemon
+    status data does on change.
+    """
+    state["i"] += 1
+    for j in range(N_CHANGES):
+        path = paths[(state["i"] * N_CHANGES + j) % len(paths)]
+        ndata = data["nodes"]["node1"]["services"]["status"]
+        ndata[path] = dict(ndata[path], csum="%032x" % state["i"])
+
+
+def main():
+    data, paths = collector_data()
+    legacy = Collector()
+    legacy.reset()
+    thr = Collector()
+    thr.log = logging.getLogger("collector")
+    thr.reset()
+    legacy.last_status, _ = legacy_get_last_status(legacy, data)
+    thr.last_status, _ = thr.get_last_status(data)
+    state = {"i": 0}
+
+    def legacy_pass():
+        change(data, paths, state)
+        legacy.last_status, changed = legacy_get_last_status(legacy, data)
+        return changed
+
+    def new_pass():
+        change(data, paths, state)
+        thr.last_status, changed = thr.get_last_status(data)
+        return changed
+
+    change(data, paths, state)
+    legacy.last_status, expected = legacy_get_last_status(legacy, data)
+    thr.last_status, changed = thr.get_last_status(data)
+    assert changed == expected, (changed, expected)
+
+    full = len(json.dumps(data))
+    delta = len(json.dumps(thr.get_delta(data, changed)))
+    rows = [
+        ("change detection", bench(legacy_pass, duration=3), bench(new_pass, duration=3)),
+        ("payload build+dump", bench(lambda: json.dumps(data)), bench(lambda: json.dumps(thr.get_delta(data, changed)))),
+    ]
+    report("collector, %d objects, 8 nodes, %d changed instances" % (N_OBJECTS, N_CHANGES), rows)
+    print("payload size: %d bytes full, %d bytes delta" % (full, delta))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+"""
+Compare the dns backend lookups with the incrementally maintained records
+index to the legacy per-kind records cache, replaying a synthetic
+PowerDNS query mix on a 500 objects, 4 nodes cluster, with an instance
+status change every 50 queries.
+
+    python -m tests.bench.dns
+"""
+from __future__ import print_function
+
+import logging
+import random
+import re
+import socket
+
+import daemon.shared as shared
+from daemon.dns import PTR_SUFFIX, Dns, RecordsIndex
+from tests.bench import bench, cluster_status, nodenames, report
+from utilities.lazy import set_lazy
+from utilities.naming import split_path
+from utilities.net.ipaddress import ip_address
+
+N_OBJECTS = 500
+N_NODES = 4
+CHANGE_EVERY = 50
+
+
+class Node(object):
+    dns = ["10.0.0.1", "10.0.0.2"]
+
+
+class LegacyDns(Dns):
+    """
+    The records lookups before the records index.
+    """
+    def lookup_pattern(self, suffix):
+        data = []
+        for qname, contents in self.a_records().items():
+            if not qname.endswith(suffix):
+                continue
+            for content in contents:
+                data.append({
+                    "qtype": "A",
+                    "qname": qname,
+                    "content": content,
+                    "ttl": 60
+                })
+        return data
+
+    def _action_list(self, suffix):
+        """
+        Empty suffix is what "dns dump" uses.
+        """
+        data = []
+        if suffix:
+            data += self.soa_record({"qname": suffix})
+            if len(data) == 0:
+                return data
+            # don't include NS record in dump, as those depend on suffix
+            data += self.zone_ns_records(suffix)
+        else:
+            data += self.zone_ns_records(self.zone)
+        for qname, contents in self.a_records().items():
+            if suffix and not qname.endswith(suffix):
+                continue
+            for content in contents:
+                qtype = "AAAA" if ":" in content else "A"
+                data.append({
+                    "qtype": qtype,
+                    "qname": qname,
+                    "content": content,
+                    "ttl": 60
+                })
+        for qname, contents in self.srv_records().items():
+            if suffix and not qname.endswith(suffix):
+                continue
+            for content in contents:
+                data.append({
+                    "qtype": "SRV",
+                    "qname": qname,
+                    "content": content,
+                    "ttl": 60
+                })
+        for qname, contents in self.ptr_records().items():
+            if suffix and not qname.endswith(suffix):
+                continue
+            for content in contents:
+                qtype = "PTR6" if ":" in qname else "PTR"
+                data.append({
+                    "qtype": "PTR",
+                    "qname": qname,
+                    "content": content,
+                    "ttl": 60
+                })
+        return data
+
+    def soa_records_rev(self):
+        addrs = set([PTR_SUFFIX[1:]])
+        for addr in set(self.svc_ips()):
+            z1 = ".".join(reversed(addr.split(".")[:-1]))+PTR_SUFFIX
+            z2 = ".".join(reversed(addr.split(".")[:-2]))+PTR_SUFFIX
+            z3 = ".".join(reversed(addr.split(".")[:-3]))+PTR_SUFFIX
+            addrs.add(z1)
+            addrs.add(z2)
+            addrs.add(z3)
+        return addrs
+
+    def srv_record(self, parameters):
+        qname = parameters.get("qname").lower()
+        if not qname.endswith(self.suffix):
+            return []
+        return [{
+            "qtype": "SRV",
+            "qname": qname,
+            "content": content,
+            "ttl": 60
+        } for content in self.srv_records().get(qname, [])]
+
+    def ptr_record(self, parameters):
+        qname = parameters.get("qname").lower()
+        return [{
+            "qtype": "PTR",
+            "qname": qname,
+            "content": name,
+            "ttl": 60
+        } for name in self.ptr_records().get(qname, []) if "." in name]
+
+    def ptr6_record(self, parameters):
+        qname = parameters.get("qname").lower()
+        return [{
+            "qtype": "PTR6",
+            "qname": qname,
+            "content": name,
+            "ttl": 60
+        } for name in self.ptr_records().get(qname, []) if ":" in name]
+
+    def a_record(self, parameters):
+        qname = parameters.get("qname").lower()
+        if not qname.endswith(self.suffix):
+            return []
+        return [{
+            "qtype": "A",
+            "qname": qname,
+            "content": addr,
+            "ttl": 60
+        } for addr in self.a_records().get(qname, []) if "." in addr]
+
+    def aaaa_record(self, parameters):
+        qname = parameters.get("qname").lower()
+        if not qname.endswith(self.suffix):
+            return []
+        return [{
+            "qtype": "AAAA",
+            "qname": qname,
+            "content": addr,
+            "ttl": 60
+        } for addr in self.a_records().get(qname, []) if ":" in addr]
+
+    def ptr_records(self):
+        data = self.get_cache("ptr")
+        if data is not None:
+            return data
+        names = {}
+        key = self.cache_key()
+        for path, nodename, status in self.iter_services_instances():
+            name, namespace, kind = split_path(path)
+            if kind != "svc":
+                continue
+            if not namespace:
+                namespace = "root"
+            for rid, resource in status.get("resources", {}).items():
+                addr = resource.get("info", {}).get("ipaddr")
+                if addr is None:
+                    continue
+                qname = ip_address(addr).reverse_pointer
+                if qname not in names:
+                    names[qname] = []
+                try:
+                    hostname = resource.get("info", {}).get("hostname").split(".")[0].lower()
+                except Exception:
+                    hostname = None
+                gen_name = "%s.%s.%s.%s." % (name, namespace, kind, self.cluster_name)
+                gen_name = gen_name.lower()
+                if hostname and hostname != name:
+                    target = "%s.%s" % (hostname, gen_name)
+                else:
+                    target = "%s" % gen_name
+                if target in names[qname]:
+                    continue
+                names[qname].append(target)
+        self.set_cache(key, "ptr", names)
+        return names
+
+    def set_cache(self, key, kind, data):
+        if key not in self.cache:
+            self.cache = {}
+        self.cache[key] = {kind: data}
+
+    def get_cache(self, kind):
+        key = self.cache_key()
+        if key not in self.cache:
+            self.cache = {}
+            return
+        if kind not in self.cache[key]:
+            return
+        return self.cache[key].get(kind)
+
+    def a_records(self):
+        data = self.get_cache("a")
+        if data is not None:
+            return data
+        names = {}
+        key = self.cache_key()
+        for path, nodename, status in self.iter_services_instances():
+            name, namespace, kind = split_path(path)
+            if kind != "svc":
+                continue
+            if namespace:
+                namespace = namespace.lower()
+            else:
+                namespace = "root"
+            scaler_slave = status.get("scaler_slave")
+            if scaler_slave:
+                _name = name[name.index(".")+1:]
+            else:
+                _name = name
+
+            zone = "%s.%s.%s." % (namespace, kind, self.cluster_name)
+            qname = "%s.%s" % (_name, zone)
+            if qname not in names:
+                names[qname] = set()
+
+            local_zone = "%s.%s.%s.node.%s." % (namespace, kind, nodename, self.cluster_name)
+            local_qname = "%s.%s" % (_name, local_zone)
+            if local_qname not in names:
+                names[local_qname] = set()
+
+            for rid, resource in status.get("resources", {}).items():
+                addr = resource.get("info", {}).get("ipaddr")
+                if addr is None:
+                    continue
+                hostname = resource.get("info", {}).get("hostname")
+                names[qname].add(addr)
+                names[local_qname].add(addr)
+                rname = self.unique_name(addr) + "." + qname
+                if rname not in names:
+                    names[rname] = set()
+                names[rname].add(addr)
+                if hostname:
+                    name = hostname.split(".")[0] + "." + qname
+                    if name not in names:
+                        names[name] = set()
+                    names[name].add(addr)
+        names.update(self.dns_a_records())
+        self.set_cache(key, "a", names)
+        return names
+
+    def srv_records(self):
+        data = self.get_cache("srv")
+        if data is not None:
+            return data
+        names = {}
+        key = self.cache_key()
+        for path, nodename, status in self.iter_services_instances():
+            weight = self.daemon_status_data.get(["monitor", "nodes", nodename, "stats", "score"], default=10)
+            name, namespace, kind = split_path(path)
+            if kind != "svc":
+                continue
+            if namespace:
+                namespace = namespace.lower()
+            else:
+                namespace = "root"
+            scaler_slave = status.get("scaler_slave")
+            if scaler_slave:
+                _name = name[name.index(".")+1:]
+            else:
+                _name = name
+            for rid, resource in status.get("resources", {}).items():
+                addr = resource.get("info", {}).get("ipaddr")
+                if addr is None:
+                    continue
+                for expose in resource.get("info", {}).get("expose", []):
+                    if "#" in expose:
+                        # expose data by reference
+                        expose_data = status.get("resources", {}).get(expose, {}).get("info")
+
+                        try:
+                            port = expose_data["port"]
+                            proto = expose_data["protocol"]
+                        except (KeyError, TypeError):
+                            continue
+                    else:
+                        # expose data inline
+                        try:
+                            port, proto = re.split("[/-]", expose.split(":")[0])
+                            port = int(port)
+                        except Exception:
+                            continue
+                    qnames = set()
+                    qnames.add("_%s._%s.%s.%s.%s.%s." % (str(port), proto, _name, namespace, kind, self.cluster_name))
+                    try:
+                        serv = socket.getservbyport(port)
+                        qnames.add("_%s._%s.%s.%s.%s.%s." % (serv, proto, _name, namespace, kind, self.cluster_name))
+                    except (socket.error, OSError):
+                        # port/proto not found
+                        pass
+                    except Exception as exc:
+                        self.log.warning("port %d resolution failed: %s", port, exc)
+                    target = "%s.%s.%s.%s.%s." % (self.unique_name(addr), _name, namespace, kind, self.cluster_name)
+                    content = "%(prio)d %(weight)d %(port)d %(target)s" % {
+                        "prio": 0,
+                        "weight": weight,
+                        "port": port,
+                        "target": target,
+                    }
+                    for qname in qnames:
+                        if qname not in names:
+                            names[qname] = set()
+                        uend = " %d %s" % (port, target)
+                        if any([True for c in names[qname] if c.endswith(uend)]):
+                            # avoid multiple SRV entries pointing to the same ip:port
+                            continue
+                        names[qname].add(content)
+        self.set_cache(key, "srv", names)
+        return names
+
+    def svc_ips(self):
+        addrs = []
+        for path, nodename, status in self.iter_services_instances():
+            for rid, resource in status.get("resources", {}).items():
+                addr = resource.get("info", {}).get("ipaddr")
+                if addr is None:
+                    continue
+                addrs.append(addr)
+        return addrs
+
+
+def setup(cls, nodes):
+    thr = cls()
+    thr.log = logging.getLogger("dns")
+    set_lazy(thr, "cluster_name", "bench")
+    set_lazy(thr, "cluster_nodes", nodes)
+    thr.zone = "bench."
+    thr.suffix = ".bench."
+    thr.suffix_len = len(thr.suffix)
+    thr.soa_content = "soa"
+    thr.cache = {}
+    thr.index = RecordsIndex()
+    thr.index_key = None
+    return thr
+
+
+def add_addrs(data, nodes):
+    for n, nodename in enumerate(nodes):
+        instances = data["monitor"]["nodes"][nodename]["services"]["status"]
+        for i, (path, status) in enumerate(sorted(instances.items())):
+            status["resources"]["ip#1"] = {
+                "status": "up",
+                "info": {
+                    "ipaddr": "10.%d.%d.%d" % (n + 1, i // 250, i % 250 + 1),
+                    "expose": ["80/tcp", "443/tcp"],
+                },
+            }
+
+
+def queries(paths, nodes, n_queries=5000):
+    """
+    A query mix of SOA, A, SRV, PTR and ANY lookups, and zone lists.
+    """
+    rnd = random.Random(0)
+    data = []
+    for i in range(n_queries):
+        namespace, _, name = paths[rnd.randrange(len(paths))].split("/")
+        qname = "%s.%s.svc.bench." % (name, namespace)
+        n = rnd.randrange(len(nodes)) + 1
+        j = rnd.randrange(len(paths) // len(nodes))
+        draw = rnd.random()
+        if draw < 0.3:
+            data.append(("lookup", {"qtype": "SOA", "qname": "bench."}))
+        elif draw < 0.7:
+            data.append(("lookup", {"qtype": "A", "qname": qname}))
+        elif draw < 0.8:
+            data.append(("lookup", {"qtype": "SRV", "qname": "_80._tcp." + qname}))
+        elif draw < 0.9:
+            data.append(("lookup", {"qtype": "PTR", "qname": "%d.%d.%d.10.in-addr.arpa" % (j % 250 + 1, j // 250, n)}))
+        elif draw < 0.999:
+            data.append(("lookup", {"qtype": "ANY", "qname": qname}))
+        else:
+            data.append(("list", {"zonename": "bench."}))
+    return data
+
+
+def replay(thr, data, paths, nodes):
+    results = []
+    for i, (method, parameters) in enumerate(data):
+        if i % CHANGE_EVERY == 0:
+            change(paths, nodes, i)
+        results.append(thr.router({"method": method, "parameters": parameters}))
+    return results
+
+
+def change(paths, nodes, i):
+    nodename = nodes[i % len(nodes)]
+    path = paths[i % len(paths)]
+    status = shared.DAEMON_STATUS.get(["monitor", "nodes", nodename, "services", "status", path])
+    shared.DAEMON_STATUS.set(["monitor", "nodes", nodename, "services", "status", path], dict(status, updated=i))
+    shared.REMOTE_GEN[nodename] += 1
+
+
+def main():
+    nodes = nodenames(N_NODES)
+    data = cluster_status(n_objects=N_OBJECTS, n_nodes=N_NODES, n_resources=2)
+    add_addrs(data, nodes)
+    shared.DAEMON_STATUS.set([], data)
+    shared.NODE = Node()
+    shared.REMOTE_GEN = dict((nodename, 1) for nodename in nodes)
+    paths = sorted(data["monitor"]["services"])
+    legacy = setup(LegacyDns, nodes)
+    thr = setup(Dns, nodes)
+
+    def normalize(results):
+        return [sorted(result["result"], key=lambda rec: sorted(rec.items())) if isinstance(result, dict) else result for result in results]
+
+    mix = queries(paths, nodes)
+    results = {}
+
+    def mix_replay(thr):
+        results[thr] = replay(thr, mix, paths, nodes)
+
+    mix_rows = [("query mix, per query", bench(lambda: mix_replay(legacy), number=1) / len(mix), bench(lambda: mix_replay(thr), number=1) / len(mix))]
+    assert normalize(results[legacy]) == normalize(results[thr])
+
+    a = [("lookup", {"qtype": "A", "qname": parameters["qname"]}) for method, parameters in mix if parameters.get("qtype") == "A"]
+    rows = mix_rows + [
+        ("A lookup, no change", bench(lambda: [legacy.router({"method": m, "parameters": p}) for m, p in a]) / len(a), bench(lambda: [thr.router({"method": m, "parameters": p}) for m, p in a]) / len(a)),
+        ("zone list", bench(lambda: legacy._action_list("bench.")), bench(lambda: thr._action_list("bench."))),
+    ]
+    report("dns lookups, %d objects, %d nodes, 1 change every %d queries" % (N_OBJECTS, N_NODES, CHANGE_EVERY), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Compare the container resources status reads of a 20 containers object
+using the docker commands to the same reads using the engine api, and
+using the daemon containers states.
+
+The engine is a stand-in serving the api on a temporary unix socket, and
+the docker command is a shell script printing the same data, so the
+baseline only accounts for the fork and exec costs, not the docker
+client startup. The daemon containers states handler is called
+in-process, without the listener request cost.
+
+    python -m tests.bench.docker
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from foreign.six.moves import BaseHTTPServer, socketserver
+
+import daemon.shared as shared
+import utilities.subsystems.docker as dockerlib
+from core.objects.svc import Svc
+from daemon.handlers.container.states.get import Handler as GetContainerStates
+from env import Env
+from tests.bench import bench, report
+from utilities.drivers import driver_import
+from utilities.lazy import set_lazy
+from utilities.subsystems.docker_api import ContainerStates, EngineClient
+
+N_CONTAINERS = 20
+
+SCRIPT = """#!/bin/sh
+case $1 in
+--version) echo "Docker version 20.10.5, build 55c4c88";;
+ps) cat %(d)s/ps;;
+inspect) cat %(d)s/inspect;;
+info) cat %(d)s/info;;
+images) cat %(d)s/images;;
+esac
+"""
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        containers = self.server.containers
+        if path == "/containers/json":
+            data = [{"Id": cid, "Names": [c["Name"]], "State": "running", "Labels": c["Config"]["Labels"]}
+                    for cid, c in containers.items()]
+        elif path == "/info":
+            data = self.server.info
+        else:
+            data = containers[path.split("/")[2]]
+        buff = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(buff)))
+        self.end_headers()
+        self.wfile.write(buff)
+
+
+class Engine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = socketserver.UnixStreamServer.get_request(self)
+        return request, ("local", 0)
+
+
+class Tier(object):
+    def request(self, method, action, options):
+        result = GetContainerStates().action(Env.nodename, options=options)
+        if result["status"] == 404:
+            raise KeyError(options.get("sock"))
+        return result
+
+
+def setup_paths(tmp_d):
+    Env.paths.pathetc = os.path.join(tmp_d, "etc")
+    Env.paths.pathetcns = os.path.join(tmp_d, "etc", "namespaces")
+    Env.paths.pathvar = os.path.join(tmp_d, "var")
+    Env.paths.pathlog = os.path.join(tmp_d, "log")
+    Env.paths.pathtmpv = os.path.join(tmp_d, "tmp")
+    Env.paths.pathlock = os.path.join(tmp_d, "lock")
+    Env.paths.nodeconf = os.path.join(tmp_d, "etc", "node.conf")
+    Env.paths.clusterconf = os.path.join(tmp_d, "etc", "cluster.conf")
+    Env.paths.capabilities = os.path.join(tmp_d, "var", "capabilities.json")
+    for path in (Env.paths.pathetc, Env.paths.pathvar, Env.paths.pathlog, Env.paths.pathtmpv):
+        os.makedirs(path)
+
+
+def setup(tmp_d):
+    setup_paths(os.path.join(tmp_d, "osvc"))
+    svc = Svc("bench")
+    ContainerDocker = driver_import("res", "container.docker").ContainerDocker
+    containers = {}
+    for i in range(N_CONTAINERS):
+        rid = "container#%d" % i
+        svc += ContainerDocker(rid=rid, image="busybox")
+        cid = "%064x" % i
+        containers[cid] = {
+            "Id": cid,
+            "Name": "/bench.container.%d" % i,
+            "Config": {"Image": "busybox", "Labels": {"com.opensvc.id": "%s.%s" % (svc.id, rid)}},
+            "State": {"Status": "running", "Running": True},
+        }
+    info = {"DockerRootDir": "/var/lib/docker", "Driver": "overlay2"}
+
+    # the docker command stand-in
+    with open(os.path.join(tmp_d, "ps"), "w") as ofile:
+        for cid, data in containers.items():
+            labels = ",".join("%s=%s" % kv for kv in data["Config"]["Labels"].items())
+            ofile.write(json.dumps({"ID": cid, "Names": data["Name"][1:], "Labels": labels, "Status": "Up 1 hour"}) + "\n")
+    with open(os.path.join(tmp_d, "inspect"), "w") as ofile:
+        json.dump(list(containers.values()), ofile)
+    with open(os.path.join(tmp_d, "info"), "w") as ofile:
+        json.dump(info, ofile)
+    docker = os.path.join(tmp_d, "docker")
+    with open(docker, "w") as ofile:
+        ofile.write(SCRIPT % {"d": tmp_d})
+    os.chmod(docker, 0o755)
+
+    # the engine api stand-in
+    engine = Engine(os.path.join(tmp_d, "docker.sock"), Handler)
+    engine.containers = containers
+    engine.info = info
+    thr = threading.Thread(target=engine.serve_forever)
+    thr.daemon = True
+    thr.start()
+    return svc, docker, engine
+
+
+def lib(svc, docker, sock):
+    dockerlib.default_sock = lambda: sock
+    obj = dockerlib.DockerLib(svc)
+    set_lazy(obj, "docker_exe", docker)
+    obj.docker_cmd = [docker]
+    return obj
+
+
+def status_pass(svc, obj):
+    """
+    The container resources status reads, with the caches of a new
+    session.
+    """
+    obj.clear_daemon_caches()
+    obj.daemon_states_done = set()
+    svc.dockerlib = obj
+    for resource in svc.get_resources("container"):
+        resource.unset_lazy("container_id")
+    obj.docker_info
+    running = obj.get_running_instance_ids()
+    for resource in svc.get_resources("container"):
+        assert resource.container_id in running
+        assert obj.docker_inspect(resource.container_id)["State"]["Running"]
+
+
+def main():
+    tmp_d = tempfile.mkdtemp()
+    engine = None
+    try:
+        svc, docker, engine = setup(tmp_d)
+        legacy_lib = lib(svc, docker, os.path.join(tmp_d, "nonexistent.sock"))
+        api_lib = lib(svc, docker, engine.server_address)
+        legacy = bench(lambda: status_pass(svc, legacy_lib))
+        api = bench(lambda: status_pass(svc, api_lib))
+
+        states = ContainerStates(EngineClient(engine.server_address))
+        states.load()
+        shared.CONTAINER_STATES[engine.server_address] = states
+        dockerlib.daemon_tier = lambda: Tier()
+        cached = bench(lambda: status_pass(svc, api_lib))
+        rows = [
+            ("status reads, engine api", legacy, api),
+            ("status reads, daemon states", legacy, cached),
+        ]
+        report("container resources status reads, %d containers" % N_CONTAINERS, rows)
+    finally:
+        if engine:
+            engine.shutdown()
+            engine.server_close()
+        shutil.rmtree(tmp_d)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Measure the disk heartbeat rx io per interval, with 16 nodes sharing a
+file standing in for the heartbeat disk, and compare to the legacy rx
+reading, parsing and decrypting every peer slot every interval.
+
+    python -m tests.bench.hb_disk
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import tempfile
+
+import daemon.shared as shared
+from daemon.hb.disk import HbDiskRx, HbDiskTx
+from env import Env
+from tests.bench import bench, report
+from tests.daemon.hb.test_disk import NODES, dev_file, setup_thread
+
+
+class Rx(HbDiskRx):
+    decrypts = 0
+
+    def decrypt(self, msg):
+        self.decrypts += 1
+        return "cluster1", json.loads(msg)["from"], {}
+
+    def queue_rx_data(self, data, nodename):
+        pass
+
+
+class LegacyRx(Rx):
+    """
+    Emulate the legacy rx: no slot headers, and the device opened, synced
+    and closed every interval.
+    """
+    def read_headers(self, slots, fo=None):
+        return {}
+
+    def do(self):
+        Rx.do(self)
+        self.dev_sync(fo=self.fo)
+        self.close_dev()
+
+
+def setup_paths(tmp_d):
+    Env.paths.pathetc = os.path.join(tmp_d, "etc")
+    Env.paths.pathetcns = os.path.join(tmp_d, "etc", "namespaces")
+    Env.paths.pathvar = os.path.join(tmp_d, "var")
+    Env.paths.pathlog = os.path.join(tmp_d, "log")
+    Env.paths.pathtmpv = os.path.join(tmp_d, "tmp")
+    Env.paths.pathlock = os.path.join(tmp_d, "lock")
+    Env.paths.nodeconf = os.path.join(tmp_d, "etc", "node.conf")
+    Env.paths.clusterconf = os.path.join(tmp_d, "etc", "cluster.conf")
+    for path in (Env.paths.pathetc, Env.paths.pathvar, Env.paths.pathlog, Env.paths.pathtmpv):
+        os.makedirs(path)
+
+
+def main():
+    from core.node import Node
+    tmpdir = tempfile.mkdtemp()
+    try:
+        setup_paths(os.path.join(tmpdir, "osvc"))
+        shared.NODE = Node()
+        dev = dev_file(tmpdir, len(NODES))
+        txs = []
+        for nodename in NODES[1:]:
+            Env.nodename = nodename
+            tx = HbDiskTx("hb#1")
+            tx.nodename = nodename
+            setup_thread(tx, dev)
+            tx.get_message = lambda nodename=nodename: ('{"kind": "patch", "from": "%s", "data": "%s"}' % (nodename, "x" * 2000), 2000)
+            tx.allocate_slot()
+            tx.do()
+            txs.append(tx)
+        Env.nodename = NODES[0]
+        rows = []
+        for label, changed in (("interval, no change", 0), ("interval, 1 peer changed", 1)):
+            stats = []
+            timings = []
+            for cls in (LegacyRx, Rx):
+                rx = cls("hb#1")
+                setup_thread(rx, dev)
+                with rx.hb_fo() as fo:
+                    rx.load_peer_config(fo=fo, verbose=False)
+                rx.do()
+                state = {"i": 0}
+
+                def interval():
+                    for tx in txs[:changed]:
+                        Env.nodename = tx.nodename
+                        tx.do()
+                    Env.nodename = NODES[0]
+                    rx.do()
+                    state["i"] += 1
+                reads, decrypts = rx.stats.reads, rx.decrypts
+                timings.append(bench(interval, number=200))
+                stats.append(((rx.stats.reads - reads) / state["i"], (rx.decrypts - decrypts) / state["i"]))
+            rows.append((label, timings[0], timings[1]))
+            print("%s: legacy %d reads, %d decrypts, now %d reads, %d decrypts per interval" % (
+                label, stats[0][0], stats[0][1], stats[1][0], stats[1][1]))
+        print()
+        report("disk heartbeat rx, %d nodes" % len(NODES), rows)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
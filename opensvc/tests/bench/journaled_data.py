@@ -0,0 +1,87 @@
+"""
+Compare the set, diff and snapshot costs of the copy-on-write
+JournaledData to the legacy deepcopy-based implementation, on a synthetic
+500 objects, 16 nodes daemon status dataset.
+
+    python -m tests.bench.journaled_data
+"""
+from __future__ import print_function
+
+import copy
+
+from tests.bench import bench, cluster_status, instance_status, report
+from utilities.journaled_data import JournaledData
+
+
+class LegacyJournaledData(JournaledData):
+    """
+    The deepcopy-based behaviour: values deep copied on set, diffs deep
+    copied on journaling and emission, in-place modifications and deep
+    copied snapshots.
+    """
+    def get_snapshot(self, path=None):
+        with self.lock:
+            return copy.deepcopy(self.get_ref(path or [], self.data))
+
+    def _set_lk(self, path=None, value=None):
+        return super(LegacyJournaledData, self)._set_lk(path=path, value=copy.deepcopy(value))
+
+    def _set(self, path, value):
+        if path:
+            cursor = self.get_ref(path[:-1], self.data)
+            cursor[path[-1]] = value
+        else:
+            self.data = value
+
+    def _unset(self, path):
+        data = self.get_ref(path[:-1], self.data)
+        del data[path[-1]]
+
+    def push_diff_lk(self, diff):
+        self.diff += copy.deepcopy(diff)
+
+
+def scenario(cls, data):
+    jd = cls(journal_head=["monitor", "nodes", "node1"])
+    jd.set([], copy.deepcopy(data))
+    path = "ns1/svc/svc1"
+    instance = instance_status(path)
+    down = instance_status(path, avail="down")
+    state = {"n": 0}
+
+    def set_instance():
+        state["n"] += 1
+        jd.set(["monitor", "nodes", "node1", "services", "status", path], down if state["n"] % 2 else instance)
+
+    def set_leaf():
+        state["n"] += 1
+        jd.set(["monitor", "nodes", "node1", "services", "status", path, "monitor", "status"], str(state["n"]))
+        jd.pop_diff()
+
+    def set_node():
+        state["n"] += 1
+        ndata = copy.deepcopy(data["monitor"]["nodes"]["node2"])
+        ndata["services"]["status"][path] = down if state["n"] % 2 else instance
+        jd.set(["monitor", "nodes", "node2"], ndata)
+
+    def snapshot():
+        jd.get_snapshot()
+
+    return [
+        ("set leaf + pop diff", bench(set_leaf)),
+        ("set instance", bench(set_instance)),
+        ("set node (diff 500 instances)", bench(set_node, duration=3)),
+        ("snapshot", bench(snapshot, duration=3)),
+    ]
+
+
+def main():
+    data = cluster_status(n_objects=500, n_nodes=16)
+    before = scenario(LegacyJournaledData, data)
+    after = scenario(JournaledData, data)
+    rows = [(label, b, a) for (label, b), (_, a) in zip(before, after)]
+    report("JournaledData, 500 objects, 16 nodes", rows)
+
+
+if __name__ == "__main__":
+    main()
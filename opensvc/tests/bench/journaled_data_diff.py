@@ -0,0 +1,53 @@
+"""
+Compare the lockstep JournaledData._diff to the legacy get_ref() based
+diff, on daemon status payloads of a 500 objects, 16 nodes cluster.
+
+    python -m tests.bench.journaled_data_diff
+"""
+from __future__ import print_function
+
+import copy
+
+from tests.bench import bench, cluster_status, instance_status, report
+from tests.utilities.test_journaled_data import legacy_diff
+from utilities.journaled_data import JournaledData
+
+
+def main():
+    data = cluster_status(n_objects=500, n_nodes=16)
+    node = data["monitor"]["nodes"]["node1"]
+    paths = list(node["services"]["status"])
+
+    one_changed = copy.deepcopy(node)
+    one_changed["services"]["status"][paths[0]] = instance_status(paths[0], avail="down")
+
+    all_changed = copy.deepcopy(node)
+    for path in paths:
+        all_changed["services"]["status"][path] = instance_status(path, avail="down")
+
+    half_removed = copy.deepcopy(node)
+    for path in paths[::2]:
+        del half_removed["services"]["status"][path]
+        del half_removed["services"]["config"][path]
+
+    shared = dict(node)
+    shared["updated"] += 1
+
+    cases = [
+        ("node, 1 instance changed", node, one_changed),
+        ("node, all instances changed", node, all_changed),
+        ("node, 250 instances removed", node, half_removed),
+        ("node, shared subtrees", node, shared),
+        ("cluster, 1 instance changed", data, dict(data, monitor=dict(data["monitor"], nodes=dict(data["monitor"]["nodes"], node1=one_changed)))),
+    ]
+    rows = []
+    for label, src, dst in cases:
+        assert JournaledData._diff(src, dst) == legacy_diff(src, dst)
+        before = bench(lambda: legacy_diff(src, dst), duration=2)
+        after = bench(lambda: JournaledData._diff(src, dst), duration=2)
+        rows.append((label, before, after))
+    report("JournaledData._diff, 500 objects, 16 nodes", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare the object build to the keyword index, on the "app=app3"
+selector resolution of the om cli without daemon, over 200 objects.
+
+    python -m tests.bench.keyword_index
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import uuid
+
+import core.objects.builder
+from core.node import Node
+from env import Env
+from tests.bench import bench, object_paths, report
+from utilities.naming import list_services, svc_pathcf
+from utilities.selector import selector_config_match
+
+N_OBJECTS = 200
+
+
+def setup(tmp_d):
+    Env.paths.pathetc = os.path.join(tmp_d, "etc")
+    Env.paths.pathetcns = os.path.join(tmp_d, "etc", "namespaces")
+    Env.paths.pathvar = os.path.join(tmp_d, "var")
+    Env.paths.pathlog = os.path.join(tmp_d, "log")
+    Env.paths.pathtmpv = os.path.join(tmp_d, "tmp")
+    Env.paths.pathlock = os.path.join(tmp_d, "lock")
+    Env.paths.nodeconf = os.path.join(tmp_d, "etc", "node.conf")
+    Env.paths.clusterconf = os.path.join(tmp_d, "etc", "cluster.conf")
+    for path in (Env.paths.pathvar, Env.paths.pathlog, Env.paths.pathtmpv):
+        os.makedirs(path)
+    os.makedirs(Env.paths.pathetc)
+    with open(Env.paths.clusterconf, "w") as ofile:
+        ofile.write("[cluster]\nnodes = %s\nsecret = %s\n" % (Env.nodename, "a" * 32))
+    for i, path in enumerate(object_paths(N_OBJECTS)):
+        cf = svc_pathcf(path)
+        if not os.path.exists(os.path.dirname(cf)):
+            os.makedirs(os.path.dirname(cf))
+        with open(cf, "w") as ofile:
+            ofile.write("[DEFAULT]\nid = %s\napp = app%d\nnodes = *\n\n" % (uuid.uuid4(), i % 10))
+            ofile.write("[fs#1]\ntype = flag\n\n[app#1]\ntype = simple\nstart = /bin/true\n")
+
+
+def legacy():
+    node = Node()
+    svcs, _ = core.objects.builder.build_services(paths=sorted(list_services()), node=node)
+    return [svc.path for svc in svcs if selector_config_match(svc, "app", "=", "app3")]
+
+
+def indexed():
+    node = Node()
+    return node.config_selector(sorted(list_services()), "app", "=", "app3")
+
+
+def main():
+    tmp_d = tempfile.mkdtemp()
+    try:
+        setup(tmp_d)
+        expected = legacy()
+        # the first resolution builds the objects and fills the index
+        assert indexed() == expected
+        assert len(expected) == N_OBJECTS // 10
+        rows = [
+            ("app=app3, %d objects" % N_OBJECTS, bench(legacy, number=3), bench(indexed, number=20)),
+        ]
+        report("config keyword selector, object build vs keyword index", rows)
+    finally:
+        shutil.rmtree(tmp_d)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Load the listener with concurrent h2 events subscribers, and report the
+events delivery latency percentiles.
+
+The daemon stand-in is the listener thread serving only the unix sockets
+of a temporary var directory. The subscribers are h2 connections to the
+h2 unix socket, each streaming the events as text/event-stream, or raw
+connections to the raw unix socket. They are all driven by a single
+thread of a child process, so the client side does not compete with the
+listener for the interpreter lock.
+
+    python -m tests.bench.listener [h2|raw [<subscribers> [<events>]]]
+"""
+from __future__ import print_function
+
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
+
+import daemon.shared as shared
+from core.node import Node
+from daemon.listener import Listener
+from env import Env
+from utilities.lazy import set_lazy
+
+N_SUBSCRIBERS = 200
+N_EVENTS = 50
+EVENTS_INTERVAL = 0.05
+
+
+class CertFs(object):
+    def stop(self):
+        pass
+
+
+class StandIn(Listener):
+    """
+    The listener serving only the unix sockets.
+    """
+    events_grace_period = False
+
+    def setup_socks(self):
+        self.setup_sockux()
+        self.setup_sockux_h2()
+
+
+class Subscriber(object):
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.buff = b""
+        self.latencies = []
+
+    def parse(self, now, sep):
+        msgs = self.buff.split(sep)
+        self.buff = msgs.pop()
+        for msg in msgs:
+            if b'"kind": "event"' not in msg:
+                # skip the decoding of the daemon status patches
+                continue
+            for line in msg.decode().splitlines():
+                if line.startswith("data: "):
+                    line = line[6:]
+                elif line.startswith("id: "):
+                    continue
+                event = json.loads(line)
+                if event.get("kind") == "event":
+                    self.latencies.append(now - event["ts"])
+
+
+class RawSubscriber(Subscriber):
+    def __init__(self):
+        Subscriber.__init__(self, Env.paths.lsnruxsock)
+        self.sock.sendall(json.dumps({"action": "events", "options": {}}).encode() + b"\0")
+
+    def received(self, now):
+        data = self.sock.recv(65535)
+        if not data:
+            return False
+        self.buff += data
+        self.parse(now, b"\0")
+        return True
+
+
+class H2Subscriber(Subscriber):
+    def __init__(self):
+        from foreign.h2.config import H2Configuration
+        from foreign.h2.connection import H2Connection
+        Subscriber.__init__(self, Env.paths.lsnruxh2sock)
+        self.h2conn = H2Connection(config=H2Configuration(client_side=True))
+        self.h2conn.initiate_connection()
+        self.stream_id = self.h2conn.get_next_available_stream_id()
+        self.h2conn.send_headers(self.stream_id, [
+            (":method", "GET"),
+            (":scheme", "http"),
+            (":authority", "localhost"),
+            (":path", "/events"),
+            ("accept", "text/event-stream"),
+        ], end_stream=True)
+        self.sock.sendall(self.h2conn.data_to_send())
+
+    def received(self, now):
+        from foreign.h2.events import DataReceived
+        data = self.sock.recv(65535)
+        if not data:
+            return False
+        for event in self.h2conn.receive_data(data):
+            if not isinstance(event, DataReceived):
+                continue
+            self.h2conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            self.buff += event.data
+        self.parse(now, b"\n\n")
+        data = self.h2conn.data_to_send()
+        if data:
+            self.sock.sendall(data)
+        return True
+
+
+def receive(subscribers, n_events, timeout):
+    """
+    Read the subscribers connections until all the events are delivered
+    or <timeout> seconds passed.
+    """
+    selector = selectors.DefaultSelector()
+    for sub in subscribers:
+        selector.register(sub.sock, selectors.EVENT_READ, sub)
+    expected = len(subscribers) * n_events
+    limit = time.time() + timeout
+    while time.time() < limit:
+        for key, _ in selector.select(0.5):
+            if not key.data.received(time.time()):
+                selector.unregister(key.fileobj)
+        if sum(len(sub.latencies) for sub in subscribers) >= expected:
+            break
+    selector.close()
+
+
+def client(mode, n_subscribers, n_events, pipe):
+    """
+    The child process opening the subscribers connections, and sending
+    back the delivery latencies.
+    """
+    subscribers = [SUBSCRIBERS[mode]() for _ in range(n_subscribers)]
+    pipe.send(len(subscribers))
+    receive(subscribers, n_events, timeout=n_events * EVENTS_INTERVAL + 30)
+    pipe.send([latency for sub in subscribers for latency in sub.latencies])
+    for sub in subscribers:
+        sub.sock.close()
+
+
+def produce(n_events):
+    for i in range(n_events):
+        shared.EVENT_Q.put({"kind": "event", "ts": time.time(), "data": {"id": "bench", "seq": i}})
+        time.sleep(EVENTS_INTERVAL)
+
+
+SUBSCRIBERS = {
+    "h2": H2Subscriber,
+    "raw": RawSubscriber,
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def setup(tmp_d):
+    Env.paths.pathvar = os.path.join(tmp_d, "var")
+    Env.paths.pathlog = os.path.join(tmp_d, "log")
+    Env.paths.pathtmpv = os.path.join(tmp_d, "tmp")
+    Env.paths.pathetc = os.path.join(tmp_d, "etc")
+    Env.paths.nodeconf = os.path.join(tmp_d, "etc", "node.conf")
+    Env.paths.clusterconf = os.path.join(tmp_d, "etc", "cluster.conf")
+    Env.paths.lsnruxsockd = os.path.join(tmp_d, "var", "lsnr")
+    Env.paths.lsnruxsock = os.path.join(tmp_d, "var", "lsnr", "lsnr.sock")
+    Env.paths.lsnruxh2sock = os.path.join(tmp_d, "var", "lsnr", "h2.sock")
+    for path in (Env.paths.pathvar, Env.paths.pathlog, Env.paths.pathtmpv, Env.paths.pathetc):
+        os.makedirs(path)
+    shared.NODE = Node()
+
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "h2"
+    n_subscribers = int(sys.argv[2]) if len(sys.argv) > 2 else N_SUBSCRIBERS
+    n_events = int(sys.argv[3]) if len(sys.argv) > 3 else N_EVENTS
+    tmp_d = tempfile.mkdtemp()
+    thr = None
+    try:
+        setup(tmp_d)
+        thr = StandIn()
+        set_lazy(thr, "certfs", CertFs())
+        thr.daemon = True
+        thr.start()
+        while not os.path.exists(Env.paths.lsnruxh2sock):
+            time.sleep(0.1)
+
+        pipe, child_pipe = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=client, args=(mode, n_subscribers, n_events, child_pipe))
+        proc.start()
+        pipe.recv()
+        limit = time.time() + 30
+        while time.time() < limit and len(thr.events_clients) < n_subscribers:
+            time.sleep(0.1)
+        threads = len(threading.enumerate())
+
+        produce(n_events)
+        latencies = pipe.recv()
+        proc.join()
+
+        title = "events delivery, %d %s subscribers, %d events" % (n_subscribers, mode, n_events)
+        print(title)
+        print("-" * len(title))
+        print("%-32s %14d" % ("subscribed", len(thr.events_clients)))
+        print("%-32s %14d" % ("process threads", threads))
+        print("%-32s %14d" % ("delivered", len(latencies)))
+        print("%-32s %14d" % ("expected", n_subscribers * n_events))
+        for pct in (50, 90, 99, 100):
+            print("%-32s %12.3fms" % ("latency p%d" % pct, percentile(latencies, pct) * 1000))
+        print()
+    finally:
+        if thr:
+            thr.stop()
+            thr.join(5)
+        shutil.rmtree(tmp_d)
+
+
+if __name__ == "__main__":
+    main()
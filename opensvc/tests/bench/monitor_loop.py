@@ -0,0 +1,81 @@
+"""
+Compare the monitor loop time with the aggregation and orchestration of
+all the objects to the loop time with only the changed objects refresh, on
+a 3000 objects, 8 nodes cluster receiving one peer instance status change
+per second.
+
+    python -m tests.bench.monitor_loop
+"""
+from __future__ import print_function
+
+import shutil
+import tempfile
+import time
+
+from tests.bench import bench, report
+from tests.bench.orchestrator import monitor, setup
+
+N_OBJECTS = 3000
+
+
+class Changes(object):
+    """
+    Apply to the dataset a peer instance status change, like a merged
+    heartbeat patch.
+    """
+    def __init__(self, thr, nodename):
+        self.thr = thr
+        self.nodename = nodename
+        self.paths = sorted(thr.daemon_status_data.index.instances)
+        self.count = 0
+
+    def apply(self):
+        path = self.paths[self.count % len(self.paths)]
+        self.count += 1
+        avail = "down" if self.count % 2 else "up"
+        self.thr.nodes_data.patch([self.nodename, "services", "status", path], [
+            [["avail"], avail],
+            [["updated"], time.time()],
+        ])
+
+
+def main():
+    tmp_d = tempfile.mkdtemp()
+    try:
+        nodes = setup(tmp_d, n_objects=N_OBJECTS)
+        thr = monitor(nodes)
+        changes = Changes(thr, nodes[1])
+        thr.update_agg_services(thr.changed_paths())
+        thr.orchestrator()
+
+        def full_loop():
+            changes.apply()
+            thr.update_agg_services()
+            thr.orchestrate_paths = None
+            thr.orchestrator()
+
+        def changed_loop():
+            changes.apply()
+            thr.update_agg_services(thr.changed_paths())
+            thr.orchestrator()
+
+        def sweep():
+            thr.last_sweep = 0
+            changed_loop()
+
+        full = bench(full_loop, number=3)
+        changed = bench(changed_loop, number=100)
+        swept = bench(sweep, number=3)
+        # one change per second, and a full sweep every sweep_period
+        amortized = changed + (swept - changed) / thr.sweep_period
+        rows = [
+            ("loop with one change", full, changed),
+            ("loop, amortized sweep", full, amortized),
+        ]
+        report("monitor loop, %d objects, %d nodes, 1 change/s" % (N_OBJECTS, len(nodes)), rows)
+    finally:
+        shutil.rmtree(tmp_d)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compare the /proc/self/mountinfo mount table to the legacy mount command
+parser, on the "print status --refresh" of a 30 fs resources object.
+
+The fs are tmpfs mounted in a temporary directory when run as root.
+
+    python -m tests.bench.mounts
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+
+import drivers.resource.fs.linux
+from core.objects.svc import Svc
+from env import Env
+from tests.bench import bench, report
+from utilities.mounts.linux import Mounts
+from utilities.mounts.mounts import Mount
+from utilities.proc import justcall
+
+N_FS = 30
+
+
+class LegacyMounts(Mounts):
+    """
+    The mount command output parser.
+    """
+    def parse_mounts(self):
+        out, err, ret = justcall([Env.syspaths.mount])
+        out = out.replace(" (deleted)", "")
+        mounts = []
+        for l in out.split('\n'):
+            if len(l.split()) != 6:
+                break
+            dev, null, mnt, null, type, mnt_opt = l.split()
+            m = Mount(dev, mnt, type, mnt_opt.strip('()'))
+            mounts.append(m)
+        return mounts
+
+
+def setup(tmp_d):
+    Env.paths.pathetc = os.path.join(tmp_d, "etc")
+    Env.paths.pathetcns = os.path.join(tmp_d, "etc", "namespaces")
+    Env.paths.pathvar = os.path.join(tmp_d, "var")
+    Env.paths.pathlog = os.path.join(tmp_d, "log")
+    Env.paths.pathtmpv = os.path.join(tmp_d, "tmp")
+    Env.paths.pathlock = os.path.join(tmp_d, "lock")
+    Env.paths.nodeconf = os.path.join(tmp_d, "etc", "node.conf")
+    Env.paths.clusterconf = os.path.join(tmp_d, "etc", "cluster.conf")
+    for path in (Env.paths.pathetc, Env.paths.pathvar, Env.paths.pathlog, Env.paths.pathtmpv):
+        os.makedirs(path)
+
+
+def mount_all(base_d):
+    mounted = []
+    if os.getuid() != 0:
+        return mounted
+    for i in range(N_FS):
+        mnt = os.path.join(base_d, str(i))
+        os.makedirs(mnt)
+        if justcall(["mount", "-t", "tmpfs", "tmpfs", mnt])[2] == 0:
+            mounted.append(mnt)
+    return mounted
+
+
+def main():
+    tmp_d = tempfile.mkdtemp()
+    base_d = tempfile.mkdtemp()
+    mounted = mount_all(base_d)
+    try:
+        setup(tmp_d)
+        cd = {"DEFAULT": {"nodes": Env.nodename}}
+        for i in range(N_FS):
+            cd["fs#%d" % i] = {"type": "tmpfs", "dev": "tmpfs", "mnt": os.path.join(base_d, str(i))}
+        svc = Svc("bench", volatile=True, cd=cd)
+
+        def status(mounts_class):
+            drivers.resource.fs.linux.Mounts = mounts_class
+            data = svc.print_status_data_eval(refresh=True, write_data=False)
+            assert data["avail"] == ("up" if mounted else "down"), data["avail"]
+
+        rows = [
+            ("print status --refresh", bench(lambda: status(LegacyMounts), number=5), bench(lambda: status(Mounts), number=5)),
+        ]
+        report("mount table, %d fs resources, %d mounted" % (N_FS, len(mounted)), rows)
+    finally:
+        drivers.resource.fs.linux.Mounts = Mounts
+        for mnt in mounted:
+            justcall(["umount", mnt])
+        shutil.rmtree(base_d)
+        shutil.rmtree(tmp_d)
+
+
+if __name__ == "__main__":
+    main()
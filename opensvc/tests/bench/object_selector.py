@@ -0,0 +1,50 @@
+"""
+Compare the compiled and cached object selector to the legacy
+implementation, on a 5000 objects, 50 namespaces, 4 nodes cluster.
+
+    python -m tests.bench.object_selector
+"""
+from __future__ import print_function
+
+import daemon.shared as shared
+from tests.bench import bench, cluster_status, nodenames, report
+from tests.daemon.test_selector import legacy_object_selector
+from utilities.lazy import set_lazy
+
+
+def uncached(thr, selector, namespaces):
+    shared.SELECTOR_CACHE.selections.clear()
+    return thr.object_selector(selector, namespaces=set(namespaces))
+
+
+def main():
+    n_nodes = 4
+    data = cluster_status(n_objects=5000, n_nodes=n_nodes, n_namespaces=50, n_resources=1)
+    shared.DAEMON_STATUS.set([], data)
+    thr = shared.OsvcThread()
+    set_lazy(thr, "cluster_nodes", nodenames(n_nodes))
+    namespaces = set("ns%d" % i for i in range(50)) | set(["root"])
+    cases = [
+        ("**", "**", None),
+        ("ns7/**", "ns7/**", None),
+        ("ns7/svc/svc1*", "ns7/svc/svc1*", None),
+        ("**/svc12*", "**/svc12*", None),
+        ("ns1/**,ns2/**+!*/svc/svc1*", "ns1/**,ns2/**+!*/svc/svc1*", None),
+        ("match 1 path, ns7/**", "ns7/**", ["ns7/svc/svc7"]),
+        ("match 1 path, **/svc12*", "**/svc12*", ["ns2/svc/svc12"]),
+    ]
+    rows = []
+    for label, selector, paths in cases:
+        expected = legacy_object_selector(thr, selector, namespaces=set(namespaces), paths=paths)
+        assert sorted(thr.object_selector(selector, namespaces=set(namespaces), paths=paths)) == sorted(expected)
+        before = bench(lambda: legacy_object_selector(thr, selector, namespaces=set(namespaces), paths=paths), duration=2)
+        after = bench(lambda: thr.object_selector(selector, namespaces=set(namespaces), paths=paths), duration=2)
+        rows.append((label, before, after))
+        if paths is None:
+            after = bench(lambda: uncached(thr, selector, namespaces), duration=2)
+            rows.append((label + ", uncached", before, after))
+    report("object_selector, 5000 objects, 50 namespaces, 4 nodes", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Compare one full Monitor.orchestrator() pass with the instances index to
+the legacy per-call scan of all the nodes instances, on a 2000 objects,
+8 nodes cluster with all the instances up and idle.
+
+    python -m tests.bench.orchestrator
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+
+import daemon.shared as shared
+from core.node import Node
+from daemon.monitor import Monitor
+from env import Env
+from tests.bench import bench, cluster_status, nodenames, report
+from utilities.lazy import set_lazy
+from utilities.naming import factory, split_path
+from utilities.storage import Storage
+
+N_OBJECTS = 2000
+N_NODES = 8
+
+
+def legacy_iter_service_instances(self, path, nodenames=None):
+    for _, nodename, data in self.iter_services_instances(paths=[path], nodenames=nodenames):
+        yield (nodename, data)
+
+
+def legacy_iter_services_instances(self, paths=None, nodenames=None):
+    nodenames = nodenames or self.cluster_nodes
+    for nodename in nodenames:
+        for path in self.daemon_status_data.keys_safe(["monitor", "nodes", nodename, "services", "status"]):
+            if paths and path not in paths:
+                continue
+            try:
+                yield (path, nodename, Storage(self.daemon_status_data.get(["monitor", "nodes", nodename, "services", "status", path])))
+            except KeyError:
+                continue
+
+
+def legacy_get_service_instance(self, path, nodename):
+    data = self.daemon_status_data.get(["monitor", "nodes", nodename, "services", "status", path], None)
+    if data is None:
+        return
+    return Storage(data)
+
+
+def legacy_get_service_nodes(self, path):
+    return [n for (n, _) in self.iter_service_instances(path)]
+
+
+def legacy_transition_count(self):
+    count = 0
+    for path, smon in self.iter_local_services_monitors():
+        if smon.status and smon.status != "scaling" and smon.status.endswith("ing"):
+            count += 1
+    return count
+
+
+LEGACY = {
+    "iter_service_instances": legacy_iter_service_instances,
+    "iter_services_instances": legacy_iter_services_instances,
+    "get_service_instance": legacy_get_service_instance,
+    "get_service_nodes": legacy_get_service_nodes,
+    "transition_count": legacy_transition_count,
+}
+
+
+def setup(tmp_d, n_objects=N_OBJECTS):
+    Env.paths.pathetc = os.path.join(tmp_d, "etc")
+    Env.paths.pathetcns = os.path.join(tmp_d, "etc", "namespaces")
+    Env.paths.pathvar = os.path.join(tmp_d, "var")
+    Env.paths.pathlog = os.path.join(tmp_d, "log")
+    Env.paths.pathtmpv = os.path.join(tmp_d, "tmp")
+    Env.paths.pathlock = os.path.join(tmp_d, "lock")
+    Env.paths.nodeconf = os.path.join(tmp_d, "etc", "node.conf")
+    Env.paths.clusterconf = os.path.join(tmp_d, "etc", "cluster.conf")
+    for path in (Env.paths.pathetc, Env.paths.pathvar, Env.paths.pathlog, Env.paths.pathtmpv):
+        os.makedirs(path)
+    nodes = [Env.nodename] + nodenames(N_NODES)[1:]
+    with open(Env.paths.clusterconf, "w") as ofile:
+        ofile.write("[cluster]\nnodes = %s\nsecret = %s\n" % (" ".join(nodes), "a" * 32))
+    with open(Env.paths.nodeconf, "w") as ofile:
+        ofile.write("[node]\nmax_parallel = 10\n")
+    shared.NODE = Node()
+
+    data = cluster_status(n_objects=n_objects, n_nodes=N_NODES, n_resources=2)
+    data["monitor"]["nodes"][Env.nodename] = data["monitor"]["nodes"].pop("node1")
+    for ndata in data["monitor"]["nodes"].values():
+        for sdata in ndata["services"]["status"].values():
+            sdata["flex_target"] = N_NODES
+        for cdata in ndata["services"]["config"].values():
+            cdata["scope"] = nodes
+    shared.DAEMON_STATUS.set([], data)
+
+    for path in data["monitor"]["services"]:
+        name, namespace, kind = split_path(path)
+        cd = {"DEFAULT": {"nodes": "*", "topology": "flex", "orchestrate": "ha", "flex_target": N_NODES}}
+        shared.SERVICES[path] = factory(kind)(name, namespace, node=shared.NODE, cd=cd, volatile=True)
+    return nodes
+
+
+def monitor(nodes):
+    thr = Monitor()
+    set_lazy(thr, "cluster_nodes", nodes)
+    thr.log = Storage({"info": print, "warning": print, "error": print, "debug": lambda *args: None})
+    thr.service_command = lambda *args, **kwargs: None
+    # the state set by Monitor.init(), past the rejoin grace period
+    thr.startup = time.time() - 3600
+    thr.rejoin_grace_period_expired = True
+    thr.shortloops = 0
+    thr.unfreeze_when_all_nodes_joined = False
+    thr.node_frozen = False
+    return thr
+
+
+def main():
+    tmp_d = tempfile.mkdtemp()
+    try:
+        nodes = setup(tmp_d)
+        thr = monitor(nodes)
+
+        def orchestrator():
+            # a pass over all the objects
+            thr.orchestrate_paths = None
+            thr.orchestrator()
+
+        orchestrator()
+        indexed = bench(orchestrator, number=3)
+        for name, fn in LEGACY.items():
+            setattr(thr, name, fn.__get__(thr, Monitor))
+        orchestrator()
+        legacy = bench(orchestrator, number=1)
+        rows = [
+            ("orchestrator pass", legacy, indexed),
+        ]
+        report("monitor orchestrator, %d objects, %d nodes" % (N_OBJECTS, N_NODES), rows)
+    finally:
+        shutil.rmtree(tmp_d)
+
+
+if __name__ == "__main__":
+    main()
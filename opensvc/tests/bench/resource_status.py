@@ -0,0 +1,115 @@
+"""
+Compare the per-object resource status store to the legacy per-resource
+status.last and status.history files, on a 50 resources object.
+
+    python -m tests.bench.resource_status
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from core.resourcestatus import MAX_STATUS_HISTORY, ResourceStatusStore
+from tests.bench import bench, report
+
+N_RESOURCES = 50
+
+
+def rids():
+    return ["fs#%d" % i for i in range(N_RESOURCES)]
+
+
+def status_data(rid, status):
+    return {"status": status, "label": "flag %s" % rid, "log": [], "info": {}, "duration": 0.001}
+
+
+def legacy_write(var_d, rid, status):
+    """
+    The legacy Resource.write_status_last and write_status_history.
+    """
+    dpath = os.path.join(var_d, rid)
+    if not os.path.exists(dpath):
+        os.makedirs(dpath, 0o0755)
+    with open(os.path.join(dpath, "status.last"), "w") as ofile:
+        json.dump(status_data(rid, status), ofile)
+        ofile.flush()
+    fpath = os.path.join(dpath, "status.history")
+    try:
+        with open(fpath, "r") as ofile:
+            data = json.load(ofile)
+    except Exception:
+        data = []
+    if data and data[-1]["status"] == status:
+        return
+    trim = len(data) - MAX_STATUS_HISTORY - 1
+    if trim > 0:
+        data = data[trim:]
+    data.append({"ts": time.time(), "status": status})
+    with open(fpath + ".tmp", "w") as ofile:
+        json.dump(data, ofile)
+    shutil.move(fpath + ".tmp", fpath)
+
+
+def legacy_read(var_d, rid):
+    try:
+        with open(os.path.join(var_d, rid, "status.last"), "r") as ofile:
+            return json.load(ofile)
+    except (ValueError, IOError, OSError):
+        return
+
+
+def legacy_eval(var_d, status):
+    for rid in rids():
+        legacy_write(var_d, rid, status)
+
+
+def store_eval(var_d, status):
+    store = ResourceStatusStore(var_d)
+    with store.batch():
+        for rid in rids():
+            store.set(rid, status_data(rid, status))
+            store.append_history(rid, status)
+
+
+def legacy_cold_print(var_d):
+    return [legacy_read(var_d, rid) for rid in rids()]
+
+
+def store_cold_print(var_d):
+    store = ResourceStatusStore(var_d)
+    return [store.get(rid) for rid in rids()]
+
+
+def flapping(fn, var_d):
+    state = {"i": 0}
+
+    def _fn():
+        state["i"] += 1
+        fn(var_d, "up" if state["i"] % 2 else "down")
+    return _fn
+
+
+def main():
+    legacy_d = tempfile.mkdtemp()
+    store_d = tempfile.mkdtemp()
+    try:
+        for status in ("down", "up"):
+            legacy_eval(legacy_d, status)
+            store_eval(store_d, status)
+        assert legacy_cold_print(legacy_d) == store_cold_print(store_d)
+        rows = [
+            ("cold print status", bench(lambda: legacy_cold_print(legacy_d)), bench(lambda: store_cold_print(store_d))),
+            ("status eval, unchanged", bench(lambda: legacy_eval(legacy_d, "up")), bench(lambda: store_eval(store_d, "up"))),
+            ("status eval, all changed", bench(flapping(legacy_eval, legacy_d)), bench(flapping(store_eval, store_d))),
+        ]
+        report("resource status cache, %d resources" % N_RESOURCES, rows)
+    finally:
+        shutil.rmtree(legacy_d)
+        shutil.rmtree(store_d)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Compare the daemon scheduler pass with plans cached per object to the
+legacy full rescan, on a 1000 objects, 10 scheduled actions per object,
+4 nodes cluster.
+
+    python -m tests.bench.scheduler
+"""
+from __future__ import print_function
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import daemon.shared as shared
+from daemon.scheduler import ACTIONS_SKIP_ON_UNPROV, Scheduler
+from env import Env
+from tests.bench import bench, cluster_status, nodenames, report
+from tests.daemon.test_daemon_scheduler import Node, Sched
+from utilities.storage import Storage
+
+N_OBJECTS = 1000
+ACTIONS = ["status", "sync_all", "compliance_auto", "resource_monitor", "push_resinfo"]
+SECTIONS = ["DEFAULT", "fs#1"]
+
+
+class Svc(object):
+    def __init__(self, path, peers):
+        self.path = path
+        self.peers = peers
+        self.options = Storage()
+        self.sched = Sched(dict((action, SECTIONS) for action in ACTIONS))
+
+    def get_resource(self, rid):
+        return Resource()
+
+
+class Resource(object):
+    def check_requires(self, action, cluster_data=None):
+        pass
+
+
+def legacy_run_scheduler(thr, now):
+    """
+    The objects loop of the scheduler pass before the cached plans.
+    """
+    for path in list(shared.SERVICES):
+        svc = shared.SERVICES[path]
+        svc.options.cron = True
+        svc.sched.configure()
+        # the legacy pass lookups, their results are not needed to
+        # select the actions
+        thr.node_data.get(["services", "config", path, "csum"], None)
+        agg = thr.get_service_agg(path)
+        if not agg:
+            continue
+        thr.get_lasts(svc)
+        for action, parms in svc.sched.actions.items():
+            if agg.provisioned in ("mixed", False) and action in ACTIONS_SKIP_ON_UNPROV:
+                continue
+            for p in parms:
+                rid = p.section if p.section != "DEFAULT" else None
+                sig = (action, path, rid)
+                if sig in thr.delayed:
+                    continue
+                if sig in thr.blacklist:
+                    continue
+                if sig in thr.running:
+                    continue
+                thr.local_last(sig, p.fname, svc)
+
+
+def setup(tmp_d):
+    Env.paths.pathetc = os.path.join(tmp_d, "etc")
+    Env.paths.pathetcns = os.path.join(tmp_d, "etc", "namespaces")
+    Env.paths.pathvar = os.path.join(tmp_d, "var")
+    Env.paths.pathlog = os.path.join(tmp_d, "log")
+    Env.paths.pathtmpv = os.path.join(tmp_d, "tmp")
+    Env.paths.pathlock = os.path.join(tmp_d, "lock")
+    Env.paths.nodeconf = os.path.join(tmp_d, "etc", "node.conf")
+    Env.paths.clusterconf = os.path.join(tmp_d, "etc", "cluster.conf")
+    for path in (Env.paths.pathetc, Env.paths.pathvar, Env.paths.pathlog, Env.paths.pathtmpv):
+        os.makedirs(path)
+
+
+def main():
+    tmp_d = tempfile.mkdtemp()
+    try:
+        setup(tmp_d)
+        run()
+    finally:
+        shutil.rmtree(tmp_d)
+
+
+def run():
+    nodes = nodenames(4)
+    data = cluster_status(n_objects=N_OBJECTS, n_nodes=4, n_resources=2)
+    local = dict(data["monitor"]["nodes"][nodes[0]])
+    local["config"] = {"csum": "ncsum"}
+    local["services"] = dict(local["services"])
+    local["services"]["config"] = dict(local["services"]["config"], cluster={"csum": "ccsum"})
+    data["monitor"]["nodes"][Env.nodename] = local
+    peers = nodes + [Env.nodename]
+    shared.DAEMON_STATUS.set([], data)
+    shared.NODE = Node()
+    for path in data["monitor"]["services"]:
+        shared.SERVICES[path] = Svc(path, peers)
+
+    thr = Scheduler()
+    thr.log = logging.getLogger("scheduler")
+    now = time.time()
+    thr.run_scheduler(now)
+    assert len(thr.delayed) == N_OBJECTS * len(ACTIONS) * len(SECTIONS) + 1
+
+    paths = sorted(shared.SERVICES)
+    state = {"i": 0}
+
+    def churn():
+        # one object per pass completed an action
+        path = paths[state["i"] % len(paths)]
+        state["i"] += 1
+        sig = ("status", path, None)
+        thr.delete_queued([sig])
+        thr.run_scheduler(now)
+
+    rows = [
+        ("scheduler pass, no change", bench(lambda: legacy_run_scheduler(thr, now)), bench(lambda: thr.run_scheduler(now))),
+        ("scheduler pass, 1 action done", bench(lambda: legacy_run_scheduler(thr, now)), bench(churn)),
+        ("next expire", bench(lambda: min([t["expire"] for t in thr.delayed.values()])), bench(lambda: thr.next_expire(now))),
+    ]
+    report("scheduler, %d objects, %d actions per object" % (N_OBJECTS, len(ACTIONS) * len(SECTIONS)), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare the daemon sampler and the ring files to the df subprocess and
+the json lines files, for the filesystems usage collection and the
+pushstats read of a day of samples.
+
+The sar subprocesses forked by the legacy pushstats for the other
+metrics are not available on all test nodes, so they are not measured.
+
+    python -m tests.bench.stats
+"""
+from __future__ import print_function
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from env import Env
+from tests.bench import bench, report
+from utilities.proc import justcall
+from utilities.stats.provider.linux import StatsProvider
+from utilities.stats.sampler.linux import Sampler
+
+SAMPLES_PER_DAY = 1440
+
+
+def legacy_fs_u(now):
+    """
+    The df based filesystems usage collection.
+    """
+    out, _, _ = justcall(["df", "-lP"])
+    vals = []
+    for line in out.split("\n")[1:]:
+        l = line.split()
+        if len(l) != 6:
+            continue
+        vals.append([str(now), Env.nodename, l[5], l[1], l[4].replace("%", "")])
+    return vals
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    Env.paths.pathvar = tmp
+    try:
+        now = datetime.datetime.now().replace(second=0, microsecond=0)
+        begin = time.mktime(now.timetuple()) - SAMPLES_PER_DAY * 60
+        sampler = Sampler(interval=60)
+        os.makedirs(os.path.join(tmp, "stats"))
+        fs_u_file = os.path.join(tmp, "stats", "fs_u.%d" % now.day)
+        vals = legacy_fs_u(now)
+        with open(fs_u_file, "w") as ofile:
+            for i in range(SAMPLES_PER_DAY):
+                ts = begin + i * 60 + 0.5
+                for val in vals:
+                    val[0] = str(datetime.datetime.fromtimestamp(ts))
+                ofile.write(json.dumps(vals) + "\n")
+                sampler.sample(ts)
+        sampler.sample(time.time())
+        provider = StatsProvider(interval=SAMPLES_PER_DAY - 1)
+        legacy = StatsProvider(interval=SAMPLES_PER_DAY - 1)
+        legacy.get = lambda stat: legacy._stat_transformer(getattr(legacy, stat))
+        assert len(provider.get("fs_u")[1]) >= len(legacy.get("fs_u")[1]) - len(vals)
+
+        rows = [
+            ("fs_u read, 1 day", bench(lambda: legacy.get("fs_u"), duration=3), bench(lambda: provider.get("fs_u"), duration=3)),
+        ]
+        cpu_read = bench(lambda: provider.get("cpu"))
+        sampler.close()
+
+        # sample in a scratch store, not to grow the day of samples read above
+        sampler = Sampler(interval=60, path=os.path.join(tmp, "scratch"))
+        rows.append(("fs_u collection", bench(lambda: legacy_fs_u(datetime.datetime.now())), bench(lambda: sampler.store_fs(time.time()))))
+        report("node stats, %d filesystems" % len(vals), rows)
+        print("all metrics sample: %.3fms" % (bench(lambda: sampler.sample(time.time())) * 1000))
+        print("cpu read, 1 day: %.3fms" % (cpu_read * 1000))
+        sampler.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the "om mon --watch" frame rendering with the render cache and
+the changed lines terminal update to the full matrix rendering and
+redraw, on a 2000 objects, 8 nodes cluster with one instance status
+patch per frame.
+
+    python -m tests.bench.svcmon
+"""
+from __future__ import print_function
+
+import random
+
+import utilities.render.color
+from commands.svcmon import CLEAREOLNEW, CLEAREOS, CURSORHOME, CLEAREOL, format_screen, screen_lines
+from tests.bench import bench, cluster_status, nodenames, report
+from utilities.journaled_data import JournaledData
+from utilities.render.cluster import RenderCache, format_cluster
+
+N_OBJECTS = 2000
+N_NODES = 8
+HEIGHT = 60
+
+
+def dataset():
+    data = cluster_status(n_objects=N_OBJECTS, n_nodes=N_NODES, n_resources=2)
+    for ndata in data["monitor"]["nodes"].values():
+        for sdata in ndata["services"]["status"].values():
+            sdata["flex_target"] = N_NODES
+    jdata = JournaledData()
+    jdata.set([], data)
+    return jdata, sorted(data["monitor"]["services"])
+
+
+def main():
+    utilities.render.color.use_color = "always"
+    nodes = nodenames(N_NODES)
+    jdata, paths = dataset()
+    rnd = random.Random(0)
+    state = {"cache": RenderCache(), "screen": None, "bytes": {}}
+
+    def patch():
+        path = rnd.choice(paths)
+        nodename = rnd.choice(nodes)
+        avail = rnd.choice(["up", "down", "warn"])
+        jdata.patch([], [[["monitor", "nodes", nodename, "services", "status", path, "avail"], avail]])
+        return jdata.get()
+
+    def full_frame():
+        data = patch()
+        outs = format_cluster(paths=paths, node=nodes, data=data)
+        buff = CURSORHOME + "preamble" + CLEAREOLNEW + CLEAREOL + "\n" + CLEAREOLNEW.join(outs.split("\n")) + CLEAREOS
+        state["bytes"]["full"] = len(buff)
+
+    def incremental_frame(height=None):
+        data = patch()
+        outs = format_cluster(paths=paths, node=nodes, data=data, cache=state["cache"])
+        lines = screen_lines("preamble", outs, height=height)
+        buff = format_screen(lines, state["screen"])
+        state["screen"] = lines
+        state["bytes"]["incremental"] = len(buff)
+
+    def reset():
+        state["cache"] = RenderCache()
+        state["screen"] = None
+
+    incremental_frame()
+    full = bench(full_frame, duration=5)
+    incremental = bench(incremental_frame, duration=5)
+    incremental_bytes = state["bytes"]["incremental"]
+    reset()
+    incremental_frame(HEIGHT)
+    clipped = bench(lambda: incremental_frame(HEIGHT), duration=5)
+    rows = [
+        ("frame", full, incremental),
+        ("frame, %d lines terminal" % HEIGHT, full, clipped),
+    ]
+    report("om mon --watch, %d objects, %d nodes, 1 patch per frame" % (N_OBJECTS, N_NODES), rows)
+    print("frames per second: %.1f full, %.1f incremental" % (1 / full, 1 / incremental))
+    print("terminal output per frame: %d bytes full, %d bytes incremental" % (state["bytes"]["full"], incremental_bytes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compare the sysreport collection using the files index and the commands
+pool to the legacy full reads, copies and sequential commands, on a 2000
+files tree with 20 changed files between runs and 4 commands.
+
+    python -m tests.bench.sysreport
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+from subprocess import PIPE, STDOUT, Popen
+
+from core.sysreport.sysreport import BaseSysReport
+from env import Env
+from tests.bench import bench, report
+
+N_FILES = 2000
+N_CHANGES = 20
+FILE_SIZE = 8192
+CMDS = ["/bin/sleep 0.2"] * 2 + ["/bin/sleep 0.3", "/bin/uname -a"]
+
+
+class LegacySysReport(BaseSysReport):
+    """
+    The collection before the files index and the commands pool.
+    """
+    def load_index(self):
+        pass
+
+    def write_index(self):
+        pass
+
+    def timings_report(self):
+        pass
+
+    def collect_cmds(self, cmds):
+        for cmd in cmds:
+            l = self.cmd_argv(cmd)
+            if l is None:
+                continue
+            cmd_d = os.path.join(self.collect_cmd_d, self.cmdlist2fname(l))
+            p = Popen(l, stdout=PIPE, stderr=STDOUT)
+            out, _ = p.communicate()
+            self.write(cmd_d, out.decode("utf-8"))
+
+    def collect_file(self, fpath):
+        if not os.path.exists(fpath):
+            return
+        if os.path.islink(fpath):
+            return
+        dst_d = self.dst_d(self.collect_file_d, fpath)
+        dst_f = os.path.join(dst_d, os.path.basename(fpath))
+        if not os.path.exists(dst_d):
+            os.makedirs(dst_d)
+        self.push_stat(fpath)
+        try:
+            with open(fpath, 'r') as f:
+                buff = f.read()
+            with open(dst_f, 'r') as f:
+                pbuff = f.read()
+            if buff != pbuff:
+                self.changed.append(dst_f)
+        except IOError:
+            self.changed.append(dst_f)
+        shutil.copy2(fpath, dst_f)
+        self.full.append(dst_f)
+
+
+def tree(src_d):
+    for i in range(N_FILES):
+        d = os.path.join(src_d, "d%d" % (i // 100))
+        if not os.path.exists(d):
+            os.makedirs(d)
+        with open(os.path.join(d, "f%d" % i), "w") as f:
+            f.write(("line %d\n" % i) * (FILE_SIZE // 10))
+
+
+def change(src_d, state):
+    state["i"] += 1
+    for j in range(N_CHANGES):
+        i = (state["i"] * N_CHANGES + j) % N_FILES
+        with open(os.path.join(src_d, "d%d" % (i // 100), "f%d" % i), "a") as f:
+            f.write("change %d\n" % state["i"])
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    Env.paths.pathetc = os.path.join(tmp, "etc")
+    devnull = open(os.devnull, "w")
+    try:
+        src_d = os.path.join(tmp, "src")
+        tree(src_d)
+        state = {"i": 0}
+
+        def run(cls, name, cmds=CMDS):
+            sr = cls(collect_d=os.path.join(tmp, name))
+            sr.todo = [("INC", src_d)] + [("CMD", cmd) for cmd in cmds]
+            change(src_d, state)
+            stdout = sys.stdout
+            sys.stdout = devnull
+            try:
+                sr.collect()
+            finally:
+                sys.stdout = stdout
+            return sr
+
+        run(LegacySysReport, "legacy")
+        run(BaseSysReport, "new")
+        report("sysreport, %d files, %d changed, %d commands" % (N_FILES, N_CHANGES, len(CMDS)), [
+            ("files", bench(lambda: run(LegacySysReport, "legacy", []), number=5), bench(lambda: run(BaseSysReport, "new", []), number=5)),
+            ("files and commands", bench(lambda: run(LegacySysReport, "legacy"), number=5), bench(lambda: run(BaseSysReport, "new"), number=5)),
+        ])
+    finally:
+        devnull.close()
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
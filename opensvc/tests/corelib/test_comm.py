@@ -5,7 +5,7 @@
 
 import pytest
 
-from core.comm import Crypt, PAUSE, SOCK_TMO_REQUEST
+from core.comm import BINARY_FRAME_MAGIC, Crypt, PAUSE, SOCK_TMO_REQUEST
 from core.node import Node
 from env import Env
 
@@ -200,3 +200,40 @@ class TestClusterNodes:
     def test_is_array_with_nodename(mocker):
         mocker.patch.object(Crypt, 'get_node', return_value=Node())
         assert Crypt().cluster_nodes == [Env.nodename]
+
+
+@pytest.fixture()
+def cluster_crypt(mocker):
+    mocker.patch.object(Crypt, 'cluster_name', 'demo')
+    mocker.patch.object(Crypt, 'cluster_names', set(['demo']))
+    mocker.patch.object(Crypt, 'cluster_drpnodes', [])
+    mocker.patch.object(Crypt, 'cluster_key', Crypt.prepare_key('0123456789abcdef0123456789abcdef'))
+    crypt = Crypt()
+    crypt.log = mocker.Mock(name='log')
+    return crypt
+
+
+@pytest.mark.ci
+class TestCryptBinaryFrame:
+    @staticmethod
+    def test_decrypt_binary_frame(cluster_crypt):
+        frame = cluster_crypt.encrypt_binary({"kind": "patch", "gen": {"n1": 2}})
+        assert frame.startswith(BINARY_FRAME_MAGIC)
+        assert Crypt.binary_frame_len(frame) == len(frame)
+        assert cluster_crypt.decrypt(frame) == ("demo", Env.nodename, {"kind": "patch", "gen": {"n1": 2}})
+
+    @staticmethod
+    def test_binary_frame_is_smaller_than_json_envelope(cluster_crypt):
+        data = {"data": ["x" * 16 for _ in range(1000)]}
+        assert len(cluster_crypt.encrypt_binary(data)) < len(cluster_crypt.encrypt(data, encode=False))
+
+    @staticmethod
+    def test_decrypt_json_envelope(cluster_crypt):
+        message = cluster_crypt.encrypt({"kind": "ping"})
+        assert cluster_crypt.decrypt(message) == ("demo", Env.nodename, {"kind": "ping"})
+
+    @staticmethod
+    def test_decrypt_truncated_binary_frame(cluster_crypt):
+        frame = cluster_crypt.encrypt_binary({"kind": "ping"})
+        assert cluster_crypt.decrypt(frame[:20]) == (None, None, None)
+        assert cluster_crypt.log.error.call_count == 1
@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+import core.compliance
+from core.compliance import Compliance
+from utilities.storage import Storage
+
+
+def module(comp_d, name, script):
+    fpath = os.path.join(comp_d, name)
+    with open(fpath, "w") as f:
+        f.write("#!/bin/sh\n" + script)
+    os.chmod(fpath, 0o755)
+
+
+@pytest.fixture(scope='function')
+def comp_d(tmpdir, mocker):
+    if os.getuid() != 0:
+        pytest.skip("compliance modules must be owned by root")
+    comp_d = os.path.join(str(tmpdir), "compliance")
+    os.makedirs(comp_d)
+    mocker.patch.object(core.compliance, "comp_dir", comp_d)
+    return comp_d
+
+
+def compliance(mocker, modules, max_parallel=4, parallel_fix=False):
+    node = mocker.Mock(spec=["options", "oget", "collector"])
+    node.options = Storage(moduleset="", module="", force=False)
+    keywords = {"max_parallel": max_parallel, "parallel_fix": parallel_fix}
+    node.oget.side_effect = lambda section, keyword: keywords[keyword]
+    comp = Compliance(node)
+    comp.data = {
+        "modulesets": {"ms1": [[name, False] for name in modules]},
+        "rulesets": {},
+        "modset_rset_relations": {},
+    }
+    return comp
+
+
+@pytest.mark.ci
+class TestCompliance(object):
+    @staticmethod
+    def test_check_runs_the_modules_of_a_group_in_parallel(mocker, comp_d, capsys):
+        flag = os.path.join(comp_d, "flag")
+        for name in ("a", "b", "c"):
+            module(comp_d, "10-" + name, "sleep 0.5; echo %s output; touch %s.%s\n" % (name, flag, name))
+        module(comp_d, "20-d", "test -f %s.a -a -f %s.b -a -f %s.c\n" % (flag, flag, flag))
+        comp = compliance(mocker, ["a", "b", "c", "d"])
+        begin = time.time()
+        assert comp.do_run("check") == 0
+        assert time.time() - begin < 1.4
+        out = capsys.readouterr().out
+        for name in ("a", "b", "c"):
+            # the module output is grouped with its banner
+            assert out.index(" %s " % name) < out.index("%s output" % name) < out.index("STATUS", out.index(" %s " % name))
+        assert [vals[1] for vals in comp.action_log_vals] == ["a", "b", "c", "d"]
+        assert "cumulated modules duration" in out
+        comp.node.collector.call.assert_called_once_with("comp_log_actions", comp.action_log_vars, comp.action_log_vals)
+
+    @staticmethod
+    @pytest.mark.parametrize("parallel_fix, expected", [(False, 1), (True, 4)])
+    def test_fix_is_sequential_unless_allowed(mocker, comp_d, parallel_fix, expected):
+        module(comp_d, "10-a", "exit 0\n")
+        comp = compliance(mocker, ["a"], parallel_fix=parallel_fix)
+        assert comp.max_parallel([("a", "fix"), ("b", "check")]) == expected
+        assert comp.max_parallel([("a", "check"), ("b", "check")]) == 4
+        assert comp.max_parallel([("a", "env")]) == 1
+
+    @staticmethod
+    def test_module_env_does_not_change_the_process_env(mocker, comp_d):
+        out = os.path.join(comp_d, "out")
+        module(comp_d, "10-a", "echo $OSVC_COMP_FOO > %s\n" % out)
+        comp = compliance(mocker, ["a"])
+        comp.data["rulesets"] = {"rset1": {"name": "rset1", "filter": "", "vars": [["foo", "bar"]]}}
+        comp.do_run("check")
+        with open(out) as f:
+            assert f.read() == "bar\n"
+        assert "OSVC_COMP_FOO" not in os.environ
@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+import core.objects.builder
+from commands.svc import Mgr
+from core.node import Node
+from core.objects.keywordindex import KeywordIndex
+from env import Env
+from utilities.files import makedirs
+from utilities.naming import svc_pathcf
+
+
+def create(path, *kws):
+    argv = ["-s", path, "create"]
+    for kw in kws:
+        argv += ["--kw", kw]
+    assert Mgr()(argv=argv) == 0
+
+
+@pytest.fixture(scope="function")
+def objects(mocker):
+    mocker.patch.dict(os.environ, {"OSVC_DETACHED": "1"})
+    # a cluster config change invalidates the whole index, so avoid the
+    # cluster config initialization on first create
+    makedirs(Env.paths.pathetc)
+    with open(Env.paths.clusterconf, "w") as ofile:
+        ofile.write("[cluster]\nnodes = %s\nsecret = %s\n" % (Env.nodename, "a" * 32))
+    create("s1", "app=foo", "nodes=*")
+    create("s2", "app=bar", "tags=t1 t2")
+    create("s3")
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+@pytest.mark.usefixtures("has_euid_0")
+class TestKeywordIndex:
+    @staticmethod
+    def test_create_updates_the_index(objects):
+        index = KeywordIndex()
+        assert index.match("s1", "app", "=", "foo") is True
+        assert index.match("s2", "DEFAULT.app", "=", "foo") is False
+        assert index.match("s2", "tags", "~=", "t2") is True
+        with pytest.raises(KeyError):
+            index.match("s1", "fs#1.mnt", "=", "/srv")
+
+    @staticmethod
+    def test_changed_config_invalidates_the_entry(objects):
+        index = KeywordIndex()
+        assert index.match("s1", "app", "=", "foo") is True
+        cf = svc_pathcf("s1")
+        mtime = os.stat(cf).st_mtime + 10
+        os.utime(cf, (time.time(), mtime))
+        with pytest.raises(KeyError):
+            index.match("s1", "app", "=", "foo")
+
+    @staticmethod
+    def test_selector_does_not_build_indexed_objects(objects, mocker):
+        build = mocker.spy(core.objects.builder, "build_services")
+        node = Node()
+        assert node.svcs_selector("app=foo", local=True) == ["s1"]
+        # the cluster config was not installed by a commit
+        assert build.call_count == 1
+        assert build.call_args[1]["paths"] == ["cluster"]
+        assert node.svcs_selector("!app=foo", local=True) == ["cluster", "s2", "s3"]
+        assert node.svcs_selector("app=foo,app=bar", local=True) == ["s1", "s2"]
+        assert build.call_count == 1
+
+    @staticmethod
+    def test_selector_builds_and_indexes_stale_objects(objects, mocker):
+        cf = svc_pathcf("s2")
+        with open(cf, "a") as ofile:
+            ofile.write("\n[fs#1]\ntype = flag\n")
+        os.utime(cf, (time.time(), os.stat(cf).st_mtime + 10))
+        build = mocker.spy(core.objects.builder, "build_services")
+        node = Node()
+        assert node.svcs_selector("app=bar", local=True) == ["s2"]
+        assert build.call_count == 1
+        assert build.call_args[1]["paths"] == ["cluster", "s2"]
+        assert KeywordIndex().match("s2", "app", "=", "bar") is True
+
+    @staticmethod
+    def test_selector_does_not_alter_the_node_objects(objects):
+        os.utime(svc_pathcf("s2"), (time.time(), time.time() + 10))
+        node = Node()
+        assert node.config_selector(["s1", "s2", "s3"], "app", "=", "bar") == ["s2"]
+        assert node.svcs is None
+        node.build_services()
+        assert sorted(svc.path for svc in node.svcs) == ["cluster", "s1", "s2", "s3"]
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from core.sysreport.sysreport import BaseSysReport
+
+
+def write(fpath, buff):
+    with open(fpath, "w") as f:
+        f.write(buff)
+
+
+@pytest.fixture(scope='function')
+def src(tmpdir):
+    src_d = os.path.join(str(tmpdir), "src")
+    os.makedirs(src_d)
+    for i in range(3):
+        write(os.path.join(src_d, "f%d" % i), "content %d\n" % i)
+    return src_d
+
+
+def sysreport(tmpdir, mocker, src_d, cmds=None):
+    mocker.patch.object(BaseSysReport, "init_collect_d_ownership")
+    sr = BaseSysReport(collect_d=os.path.join(str(tmpdir), "collect"))
+    sr.todo = [("INC", src_d)] + [("CMD", cmd) for cmd in cmds or []]
+    return sr
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+class TestSysReport(object):
+    @staticmethod
+    def test_unchanged_files_are_not_read(tmpdir, mocker, src):
+        sysreport(tmpdir, mocker, src).collect()
+        sr = sysreport(tmpdir, mocker, src)
+        hash_file = mocker.spy(sr, "hash_file")
+        sr.collect()
+        assert hash_file.call_count == 0
+        assert sr.changed == []
+        assert len(sr.full) == 3
+
+    @staticmethod
+    def test_changed_files_are_copied(tmpdir, mocker, src):
+        sysreport(tmpdir, mocker, src).collect()
+        write(os.path.join(src, "f1"), "new content\n")
+        # same content, new mtime
+        os.utime(os.path.join(src, "f2"), (1, 1))
+        sr = sysreport(tmpdir, mocker, src)
+        sr.collect()
+        dst_f = sr.collect_file_d + os.path.join(src, "f1")
+        assert sr.changed == [dst_f]
+        with open(dst_f) as f:
+            assert f.read() == "new content\n"
+
+    @staticmethod
+    def test_files_collected_before_the_index_are_compared(tmpdir, mocker, src):
+        sr = sysreport(tmpdir, mocker, src)
+        sr.collect()
+        os.unlink(sr.collect_index)
+        sr = sysreport(tmpdir, mocker, src)
+        sr.collect()
+        assert sr.changed == []
+        assert os.path.exists(sr.collect_index)
+
+    @staticmethod
+    def test_commands_timeout(tmpdir, mocker, src, capsys):
+        sr = sysreport(tmpdir, mocker, src, cmds=["/bin/sleep 10", "/bin/echo foo"])
+        sr.cmd_timeout = 0.5
+        sr.collect()
+        cmd_f = os.path.join(sr.collect_cmd_d, "(slash)bin(slash)echo(space)foo")
+        assert sr.changed[-1] == cmd_f
+        assert not os.path.exists(os.path.join(sr.collect_cmd_d, "(slash)bin(slash)sleep(space)10"))
+        assert [t[3] for t in sr.timings if t[0] == "cmd"] == ["changed", "timeout"]
+        assert "timeout" in capsys.readouterr().err
@@ -0,0 +1,73 @@
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+import daemon.shared as shared
+from daemon.handlers.cache.clear.post import Handler as PostCacheClear
+from daemon.handlers.cache.get import Handler as GetCache
+from daemon.handlers.cache.post import Handler as PostCache
+from env import Env
+from utilities.cache.tier import DaemonTier, ResultCache, TierUnavailable
+
+HANDLERS = {
+    ("GET", "cache"): GetCache(),
+    ("POST", "cache"): PostCache(),
+    ("POST", "cache_clear"): PostCacheClear(),
+}
+
+
+def serve(sock):
+    """
+    Serve the raw unix socket requests like the listener does.
+    """
+    while True:
+        try:
+            conn, _ = sock.accept()
+        except socket.error:
+            return
+        buff = b""
+        while not buff.endswith(b"\0"):
+            buff += conn.recv(65536)
+        data = json.loads(buff.rstrip(b"\0").decode())
+        handler = HANDLERS[(data["method"], data["action"])]
+        result = handler.action(Env.nodename, options=data["options"])
+        conn.sendall((json.dumps(result) + "\0").encode())
+        conn.close()
+
+
+@pytest.fixture(scope="function")
+def tier(mocker, tmpdir):
+    mocker.patch.object(shared, "CMD_CACHE", ResultCache())
+    path = os.path.join(str(tmpdir), "lsnr.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(8)
+    thr = threading.Thread(target=serve, args=(sock,))
+    thr.daemon = True
+    thr.start()
+    yield DaemonTier(path=path)
+    sock.shutdown(socket.SHUT_RDWR)
+    sock.close()
+
+
+@pytest.mark.ci
+class TestCacheHandlers:
+    @staticmethod
+    def test_put_get_clear(tier):
+        with pytest.raises(KeyError):
+            tier.get("lvs.attr")
+        tier.put("lvs.attr", {"vg1": ["lv1"]}, ttl=60)
+        assert tier.get("lvs.attr") == {"vg1": ["lv1"]}
+        tier.clear(["lvs.attr"])
+        with pytest.raises(KeyError):
+            tier.get("lvs.attr")
+        assert shared.CMD_CACHE.stats()["invalidations"] == 1
+
+    @staticmethod
+    def test_disabled(tier):
+        shared.CMD_CACHE.resize(0)
+        with pytest.raises(TierUnavailable):
+            tier.get("lvs.attr")
@@ -0,0 +1,169 @@
+import json
+import mmap
+import os
+import time
+
+import pytest
+
+from daemon.hb.disk import HbDiskRx, HbDiskTx
+from env import Env
+from utilities.lazy import set_lazy
+
+NODES = ["node%d" % i for i in range(1, 17)]
+
+
+def dev_file(tmpdir, n_slots):
+    """
+    A sparse file standing in for the shared disk.
+    """
+    path = os.path.join(str(tmpdir), "hb.disk")
+    with open(path, "wb") as ofile:
+        ofile.truncate(HbDiskTx.METASIZE + n_slots * HbDiskTx.SLOTSIZE)
+    return path
+
+
+def setup_thread(thr, dev):
+    thr.dev = dev
+    thr.flags = os.O_RDWR
+    thr.timeout = 15
+    thr.interval = 5
+    thr.hb_nodes = list(NODES)
+    thr.peer_config = dict((nodename, {"slot": -1}) for nodename in NODES)
+    thr.reload_config = lambda: None
+    thr.init_buffers()
+    set_lazy(thr, "cluster_name", "cluster1")
+
+
+@pytest.fixture(scope='function')
+def dev(tmpdir):
+    return dev_file(tmpdir, len(NODES))
+
+
+@pytest.fixture(scope='function')
+def tx(mocker, dev):
+    """
+    Return a function writing the slot of a peer node.
+    """
+    txs = {}
+
+    def write(nodename, header=True):
+        if nodename not in txs:
+            thr = HbDiskTx("hb#1")
+            setup_thread(thr, dev)
+            mocker.patch.object(thr, "get_message", return_value=(nodename, len(nodename)))
+            txs[nodename] = thr
+            mocker.patch.object(Env, "nodename", nodename)
+            thr.allocate_slot()
+        thr = txs[nodename]
+        mocker.patch.object(Env, "nodename", nodename)
+        if header:
+            thr.do()
+        else:
+            # a tx unaware of the slot headers
+            data = (json.dumps({"msg": nodename, "updated": time.time()}) + "\0").encode()
+            with thr.hb_fo() as fo:
+                thr.write_slot(thr.peer_config[nodename]["slot"], data, fo=fo)
+        mocker.patch.object(Env, "nodename", "node1")
+    return write
+
+
+@pytest.fixture(scope='function')
+def rx(mocker, dev):
+    thr = HbDiskRx("hb#1")
+    setup_thread(thr, dev)
+    mocker.patch.object(thr, "decrypt", side_effect=lambda msg: ("cluster1", msg, {"from": msg}))
+    mocker.patch.object(thr, "queue_rx_data")
+    return thr
+
+
+def discover(rx):
+    with rx.hb_fo() as fo:
+        rx.load_peer_config(fo=fo, verbose=False)
+
+
+def rx_pass(rx):
+    reads = rx.stats.reads
+    decrypts = rx.decrypt.call_count
+    rx.do()
+    return rx.stats.reads - reads, rx.decrypt.call_count - decrypts
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+@pytest.mark.usefixtures('shared_data')
+class TestHbDisk(object):
+    @staticmethod
+    def test_unchanged_slots_are_not_read(mocker, tx, rx):
+        mocker.patch.object(Env, "nodename", "node1")
+        for nodename in NODES[1:]:
+            tx(nodename)
+        discover(rx)
+        assert rx_pass(rx) == (1 + 15, 15)
+        assert rx_pass(rx) == (1, 0)
+        tx("node5")
+        assert rx_pass(rx) == (2, 1)
+        rx.queue_rx_data.assert_called_with({"from": "node5"}, "node5")
+
+    @staticmethod
+    def test_only_the_data_pages_are_read(mocker, tx, rx):
+        mocker.patch.object(Env, "nodename", "node1")
+        tx("node2")
+        discover(rx)
+        read = mocker.spy(rx, "dev_read")
+        rx.do()
+        sizes = [len(call[0][1]) for call in read.call_args_list]
+        # one header page, one data page
+        assert sizes == [mmap.PAGESIZE, mmap.PAGESIZE]
+
+    @staticmethod
+    def test_partial_slot_write_and_read(mocker, rx):
+        data = b"x" * (mmap.PAGESIZE + 10)
+        write = mocker.spy(rx, "dev_write")
+        read = mocker.spy(rx, "dev_read")
+        with rx.hb_fo() as fo:
+            rx.write_slot(3, data, fo=fo)
+            assert rx.read_slot(3, fo=fo, length=len(data)) == data.decode()
+        assert len(write.call_args[0][1]) == 2 * mmap.PAGESIZE
+        assert len(read.call_args[0][1]) == 2 * mmap.PAGESIZE
+
+    @staticmethod
+    def test_peers_without_header_are_read_every_pass(mocker, tx, rx):
+        mocker.patch.object(Env, "nodename", "node1")
+        tx("node2")
+        tx("node3", header=False)
+        discover(rx)
+        assert rx_pass(rx) == (3, 2)
+        assert rx_pass(rx) == (2, 0)
+        tx("node3", header=False)
+        assert rx_pass(rx) == (2, 1)
+
+    @staticmethod
+    def test_stale_header_falls_back_to_full_read(mocker, tx, rx):
+        mocker.patch.object(Env, "nodename", "node1")
+        tx("node2")
+        discover(rx)
+        rx.do()
+        # node2 downgraded to a tx unaware of the slot headers
+        mocker.patch.object(time, "time", return_value=time.time() + 60)
+        tx("node2", header=False)
+        assert rx_pass(rx) == (2, 1)
+
+    @staticmethod
+    def test_the_device_is_opened_once(mocker, tx, rx):
+        mocker.patch.object(Env, "nodename", "node1")
+        tx("node2")
+        open_dev = mocker.spy(rx, "open_dev")
+        discover(rx)
+        for _ in range(3):
+            rx.do()
+        assert open_dev.call_count == 1
+
+    @staticmethod
+    def test_header_does_not_change_the_meta_slot_nodename(mocker, tx, rx):
+        mocker.patch.object(Env, "nodename", "node1")
+        tx("node3")
+        tx("node2")
+        tx("node3")
+        discover(rx)
+        assert rx.peer_config["node3"]["slot"] == 0
+        assert rx.peer_config["node2"]["slot"] == 1
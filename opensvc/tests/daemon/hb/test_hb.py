@@ -0,0 +1,47 @@
+import pytest
+
+import daemon.shared as shared
+from daemon.hb.hb import Hb
+
+
+@pytest.fixture(scope='function')
+def hb(mocker):
+    thr = Hb("hb#1", role="tx")
+    thr.log = mocker.MagicMock()
+    mocker.patch.object(shared, 'HB_MSG_CACHE', {})
+    mocker.patch.object(shared, 'GEN', 3)
+    mocker.patch.object(shared, 'LOCAL_GEN', {"node2": 1})
+    mocker.patch.object(shared, 'REMOTE_GEN', {"node2": 5})
+    mocker.patch.object(shared, 'GEN_DIFF', {2: [[["a"], 1]], 3: [[["b"], 2]]})
+    mocker.patch.object(thr, 'encrypt', side_effect=lambda data, encode=False: "json:%s" % sorted(data["deltas"]))
+    mocker.patch.object(thr, 'encrypt_binary', side_effect=lambda data: b"binary")
+    return thr
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+@pytest.mark.usefixtures('shared_data')
+class TestHbGetMessage(object):
+    @staticmethod
+    def test_patch_message_is_encrypted_once_per_format(hb):
+        assert hb.get_message() == ("json:[2, 3]", 11)
+        assert hb.get_message() == ("json:[2, 3]", 11)
+        assert hb.get_message(binary=True) == (b"binary", 6)
+        assert hb.get_message(binary=True) == (b"binary", 6)
+        assert hb.encrypt.call_count == 1
+        assert hb.encrypt_binary.call_count == 1
+
+    @staticmethod
+    def test_patch_message_is_reencrypted_on_gen_change(hb, mocker):
+        hb.get_message()
+        mocker.patch.object(shared, 'REMOTE_GEN', {"node2": 6})
+        hb.get_message()
+        assert hb.encrypt.call_count == 2
+
+    @staticmethod
+    def test_peer_supports_binary(hb):
+        shared.DAEMON_STATUS.set(["monitor", "nodes", "node2"], {"compat": shared.HB_BINARY_COMPAT})
+        shared.DAEMON_STATUS.set(["monitor", "nodes", "node3"], {"compat": 10})
+        assert hb.peer_supports_binary("node2") is True
+        assert hb.peer_supports_binary("node3") is False
+        assert hb.peer_supports_binary("node4") is False
@@ -0,0 +1,165 @@
+import socket
+import time
+
+import pytest
+
+from core.comm import BINARY_FRAME_HEADER, BINARY_FRAME_MAGIC
+from daemon.hb.ucast import HbUcastRx, HbUcastTx
+
+
+def listener():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(5)
+    sock.settimeout(2)
+    return sock
+
+
+def recv_until(conn, expected):
+    data = b""
+    conn.settimeout(2)
+    while len(data) < len(expected):
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+@pytest.fixture(scope='function')
+def tx(mocker):
+    thr = HbUcastTx("hb#1")
+    thr.log = mocker.MagicMock()
+    thr.timeout = 15
+    thr.interval = 5
+    mocker.patch.object(thr, "event")
+    mocker.patch.object(thr, "reload_config")
+    mocker.patch.object(thr, "forget_peer_data")
+    mocker.patch.object(thr, "get_message", return_value=("msg", 3))
+    yield thr
+    thr.close_conns()
+
+
+@pytest.fixture(scope='function')
+def rx(mocker):
+    thr = HbUcastRx("hb#1")
+    thr.log = mocker.MagicMock()
+    thr.timeout = 15
+    thr.max_handlers = 4
+    thr.sock_accept_tmo = 0.1
+    thr.sock = listener()
+    thr.sock.setblocking(0)
+    mocker.patch.object(thr, "event")
+    mocker.patch.object(thr, "reload_config")
+    mocker.patch.object(thr, "_handle_message")
+    yield thr
+    thr.close_conns()
+    thr.sock.close()
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+@pytest.mark.usefixtures('shared_data')
+class TestHbUcastTx(object):
+    @staticmethod
+    def test_reuse_the_peer_connection_across_beats(tx):
+        server = listener()
+        tx.peer_config = {"node2": {"addr": "127.0.0.1", "port": server.getsockname()[1]}}
+        tx.do()
+        conn, _ = server.accept()
+        tx.do()
+        assert recv_until(conn, b"msg\0msg\0") == b"msg\0msg\0"
+        stats = tx.status()["stats"]
+        assert stats["beats"] == 2
+        assert stats["peers"]["node2"]["connects"] == 1
+        assert stats["peers"]["node2"]["latency"] is not None
+        conn.close()
+        server.close()
+
+    @staticmethod
+    def test_reconnect_when_the_peer_closed_the_connection(tx):
+        server = listener()
+        tx.peer_config = {"node2": {"addr": "127.0.0.1", "port": server.getsockname()[1]}}
+        tx.do()
+        conn, _ = server.accept()
+        assert recv_until(conn, b"msg\0") == b"msg\0"
+        conn.close()
+        time.sleep(0.1)
+        tx.do()
+        conn, _ = server.accept()
+        assert recv_until(conn, b"msg\0") == b"msg\0"
+        assert tx.status()["stats"]["peers"]["node2"]["connects"] == 2
+        conn.close()
+        server.close()
+
+    @staticmethod
+    def test_backoff_after_consecutive_failures(tx):
+        server = listener()
+        port = server.getsockname()[1]
+        server.close()
+        tx.peer_config = {"node2": {"addr": "127.0.0.1", "port": port}}
+        for _ in range(tx.retries_before_backoff):
+            tx.do()
+        stats = tx.status()["stats"]
+        assert stats["errors"] == tx.retries_before_backoff
+        assert stats["peers"]["node2"]["backoff_until"] > time.time()
+        tx.do()
+        assert tx.status()["stats"]["errors"] == tx.retries_before_backoff
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+@pytest.mark.usefixtures('shared_data')
+class TestHbUcastRx(object):
+    @staticmethod
+    def test_handle_many_messages_per_connection(rx):
+        client = socket.create_connection(rx.sock.getsockname())
+        client.sendall(b"m1\0m2\0m")
+        for _ in range(3):
+            rx.do()
+        client.sendall(b"3\0")
+        for _ in range(3):
+            rx.do()
+        messages = [call[0][0] for call in rx._handle_message.call_args_list]
+        assert messages == [b"m1", b"m2", b"m3"]
+        assert len(rx.conns) == 1
+        client.close()
+
+    @staticmethod
+    def test_handle_unterminated_message_on_close(rx):
+        client = socket.create_connection(rx.sock.getsockname())
+        client.sendall(b"m1")
+        client.close()
+        for _ in range(3):
+            rx.do()
+        messages = [call[0][0] for call in rx._handle_message.call_args_list]
+        assert messages == [b"m1"]
+        assert len(rx.conns) == 0
+
+    @staticmethod
+    def test_handle_binary_frames_and_json_envelopes_on_same_connection(rx):
+        frame1 = BINARY_FRAME_HEADER.pack(BINARY_FRAME_MAGIC, 5) + b"\x00bin1"
+        frame2 = BINARY_FRAME_HEADER.pack(BINARY_FRAME_MAGIC, 4) + b"bin2"
+        client = socket.create_connection(rx.sock.getsockname())
+        stream = b"j1\0" + frame1 + b"j2\0" + frame2
+        for i in range(0, len(stream), 3):
+            client.sendall(stream[i:i+3])
+            time.sleep(0.01)
+            rx.do()
+        for _ in range(3):
+            rx.do()
+        messages = [call[0][0] for call in rx._handle_message.call_args_list]
+        assert messages == [b"j1", frame1, b"j2", frame2]
+        client.close()
+
+
+@pytest.mark.ci
+class TestHbUcastRxSplitMessages(object):
+    @staticmethod
+    def test_split_incomplete_binary_frame():
+        frame = BINARY_FRAME_HEADER.pack(BINARY_FRAME_MAGIC, 4) + b"data"
+        assert HbUcastRx.split_messages(frame[:2]) == ([], frame[:2], len(BINARY_FRAME_MAGIC))
+        assert HbUcastRx.split_messages(frame[:6]) == ([], frame[:6], BINARY_FRAME_HEADER.size)
+        assert HbUcastRx.split_messages(frame[:10]) == ([], frame[:10], len(frame))
+        assert HbUcastRx.split_messages(frame + b"j1") == ([frame], b"j1", None)
+        assert HbUcastRx.split_messages(b"j1\0\0j2\0") == ([b"j1", b"j2"], b"", 1)
@@ -715,3 +715,21 @@ def test_monitor_respect_priority_and_max_parallel(
                 ])
                 monitor_test.create_service_status(svc, status="up", overall="up")
             assert monitor_test.service_command.call_count == count
+
+    @staticmethod
+    def test_monitor_retries_the_paths_delayed_by_max_parallel(
+            mocker,
+    ):
+        monitor_test = MonitorTest(mocker=mocker, cluster_nodes=[env.Env.nodename])
+        monitor_test.service_command_factory()
+        monitor_test.prepare_monitor_idle()
+        services = ["s9-prio-1", "s8-prio-2", "ha1"]
+        for svc in services:
+            monitor_test.create_svc_config(svc)
+            monitor_test.create_service_status(svc, status="down", overall="down")
+        monitor_test.do()
+
+        mocker.patch.object(Monitor, "transitions_maxed", side_effect=[False, True])
+        monitor_test.monitor.orchestrate_paths = set(services)
+        monitor_test.monitor.orchestrator()
+        assert monitor_test.monitor.orchestrate_paths == set(["s8-prio-2", "ha1"])
@@ -0,0 +1,171 @@
+import logging
+
+import pytest
+
+import daemon.shared as shared
+from daemon.collector import Collector
+
+
+def instance(csum="a", slaves=None):
+    data = {"csum": csum, "monitor": {"status_updated": 1, "global_status_updated": 1}}
+    if slaves:
+        data["slaves"] = slaves
+    return data
+
+
+def collector_data(instances, frozen=0):
+    """
+    <instances> is a dict of instance status indexed by (path, nodename).
+    """
+    data = {"cluster_id": "id", "cluster_name": "c", "nodes": {}, "services": {}}
+    for (path, nodename), sdata in instances.items():
+        ndata = data["nodes"].setdefault(nodename, {"frozen": frozen, "services": {"config": {}, "status": {}}})
+        ndata["services"]["status"][path] = sdata
+        ndata["services"]["config"][path] = {"csum": "c"}
+        data["services"][path] = {"avail": "up"}
+    return data
+
+
+@pytest.fixture(scope='function')
+def thr():
+    thr = Collector()
+    thr.log = logging.getLogger("collector")
+    thr.reset()
+    return thr
+
+
+def get_last_status(thr, data):
+    last_status, changed = thr.get_last_status(data)
+    thr.last_status = last_status
+    return changed
+
+
+@pytest.mark.ci
+class TestGetLastStatus:
+    @staticmethod
+    def test_unchanged_instances_are_not_reported(thr):
+        instances = {
+            ("p1", "n1"): instance(),
+            ("p2", "n1"): instance(),
+            ("p1", "n2"): instance(),
+        }
+        assert get_last_status(thr, collector_data(instances)) == set(["p1", "p2", "p1@n1", "p2@n1", "p1@n2", "@n1", "@n2"])
+        assert get_last_status(thr, collector_data(instances)) == set()
+        instances[("p2", "n1")] = instance(csum="b")
+        assert get_last_status(thr, collector_data(instances)) == set(["p2", "p2@n1"])
+
+    @staticmethod
+    def test_same_instance_structure_is_not_evaluated(thr, mocker):
+        sdata = mocker.MagicMock(wraps=instance())
+        instances = {("p1", "n1"): sdata}
+        get_last_status(thr, collector_data(instances))
+        calls = sdata.get.call_count
+        assert get_last_status(thr, collector_data(instances)) == set()
+        assert sdata.get.call_count == calls
+
+    @staticmethod
+    def test_changes_propagate_to_parents(thr):
+        instances = {
+            ("slave", "n1"): instance(),
+            ("parent", "n1"): instance(slaves=["slave"]),
+            ("grandparent", "n2"): instance(slaves=["parent"]),
+            ("other", "n1"): instance(),
+        }
+        get_last_status(thr, collector_data(instances))
+        instances[("slave", "n1")] = instance(csum="b")
+        assert get_last_status(thr, collector_data(instances)) == set(["slave", "slave@n1", "parent", "grandparent"])
+
+    @staticmethod
+    def test_parents_index_follows_slaves_changes(thr):
+        instances = {
+            ("slave", "n1"): instance(),
+            ("parent", "n1"): instance(slaves=["slave"]),
+        }
+        get_last_status(thr, collector_data(instances))
+        assert thr.parents == {"slave": {"parent": set(["n1"])}}
+        instances[("parent", "n1")] = instance(csum="b")
+        get_last_status(thr, collector_data(instances))
+        assert thr.parents == {}
+        del instances[("parent", "n1")]
+        instances[("slave", "n1")] = instance(csum="b")
+        assert get_last_status(thr, collector_data(instances)) == set(["slave", "slave@n1", "parent", "parent@n1"])
+
+    @staticmethod
+    def test_disappeared_instances_and_nodes(thr):
+        instances = {
+            ("p1", "n1"): instance(),
+            ("p1", "n2"): instance(),
+        }
+        get_last_status(thr, collector_data(instances))
+        del instances[("p1", "n2")]
+        assert get_last_status(thr, collector_data(instances)) == set(["p1", "p1@n2", "@n2"])
+
+
+@pytest.mark.ci
+class TestSendDaemonStatus:
+    @staticmethod
+    def test_get_delta(thr):
+        instances = {
+            ("p1", "n1"): instance(),
+            ("p2", "n1"): instance(),
+            ("p1", "n2"): instance(),
+        }
+        data = collector_data(instances)
+        delta = thr.get_delta(data, set(["p2", "p2@n1", "p3", "p3@n1", "@n2", "p1@n3"]))
+        assert delta == {
+            "cluster_id": "id",
+            "cluster_name": "c",
+            "nodes": {
+                "n1": {"frozen": 0, "services": {"status": {"p2": instances[("p2", "n1")]}, "config": {"p2": {"csum": "c"}}}},
+                "n2": {"frozen": 0, "services": {"status": {}, "config": {}}},
+            },
+            "services": {"p2": {"avail": "up"}},
+        }
+
+    @staticmethod
+    @pytest.mark.parametrize("methods, last_comm, resync, expected", [
+        (["push_daemon_status", "push_daemon_status_delta"], 1, False, "push_daemon_status_delta"),
+        (["push_daemon_status", "push_daemon_status_delta"], 1, True, "push_daemon_status"),
+        (["push_daemon_status", "push_daemon_status_delta"], None, False, "push_daemon_status"),
+        (["push_daemon_status"], 1, False, "push_daemon_status"),
+    ])
+    def test_delta_is_sent_if_supported(thr, mocker, methods, last_comm, resync, expected):
+        node = mocker.patch.object(shared, "NODE")
+        node.collector.proxy_methods = methods
+        data = collector_data({("p1", "n1"): instance(), ("p2", "n1"): instance()})
+        thr.last_comm = last_comm
+        thr.last_status_changed = set(["p1", "p1@n1"])
+        thr.send_daemon_status(data, resync=resync)
+        fn, sent, changes = node.collector.call.call_args[0]
+        assert fn == expected
+        assert sorted(changes) == ["p1", "p1@n1"]
+        if expected == "push_daemon_status_delta":
+            assert list(sent["services"]) == ["p1"]
+        else:
+            assert sent is data
+
+    @staticmethod
+    def test_failed_send_is_followed_by_a_full_send(thr, mocker):
+        node = mocker.patch.object(shared, "NODE")
+        node.collector.proxy_methods = ["push_daemon_status", "push_daemon_status_delta"]
+        instances = {("p1", "n1"): instance(), ("p2", "n1"): instance()}
+        mocker.patch.object(thr, "speaker", return_value=True)
+        mocker.patch.object(thr, "get_last_config", return_value={})
+        mocker.patch.object(thr, "get_data", side_effect=lambda: collector_data(instances))
+        thr.run_collector()
+        thr.last_comm = 1
+
+        instances[("p1", "n1")] = instance(csum="b")
+        node.collector.call.side_effect = Exception("unreachable")
+        thr.run_collector()
+        assert node.collector.call.call_args[0][0] == "push_daemon_status_delta"
+        assert thr.last_status_changed == set(["p1", "p1@n1"])
+
+        thr.last_comm = 1
+        node.collector.call.side_effect = None
+        thr.run_collector()
+        fn, _, changes = node.collector.call.call_args[0]
+        assert fn == "push_daemon_status"
+        assert sorted(changes) == ["p1", "p1@n1"]
+        assert thr.last_status_changed == set()
+        assert not thr.resync_needed
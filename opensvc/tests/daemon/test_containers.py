@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+
+import pytest
+
+import daemon.containers
+import daemon.shared as shared
+from daemon.containers import Containers
+
+
+class States(object):
+    def __init__(self, client):
+        self.client = client
+        self.closed = False
+        self.ready = False
+        self.data = {}
+        self.events = 0
+        self.updated = 0
+        self.stop = threading.Event()
+
+    def watch(self):
+        self.ready = True
+        self.stop.wait(5)
+        self.ready = False
+
+    def close(self):
+        self.closed = True
+        self.stop.set()
+
+
+class Client(object):
+    def __init__(self, path):
+        self.path = path
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(scope='function')
+def thr(mocker):
+    mocker.patch.object(shared, "NODE")
+    mocker.patch.object(shared, "CONTAINER_STATES", {})
+    mocker.patch.object(daemon.containers, "ContainerStates", States)
+    mocker.patch.object(daemon.containers, "EngineClient", Client)
+    thr = Containers()
+    thr.log = logging.getLogger("containers")
+    thr.enabled = None
+    thr.watchers = {}
+    return thr
+
+
+@pytest.mark.ci
+class TestContainers(object):
+    @staticmethod
+    def test_watchers_publish_the_engine_states(thr):
+        shared.NODE.oget.return_value = True
+        thr.reconfigure()
+        thr.watch("/run/engine.sock")
+        states, watcher = thr.watchers["/run/engine.sock"]
+        assert shared.CONTAINER_STATES["/run/engine.sock"] is states
+        thr.watch("/run/engine.sock")
+        assert thr.watchers["/run/engine.sock"] == (states, watcher)
+        limit = time.time() + 5
+        while not states.ready and time.time() < limit:
+            time.sleep(0.01)
+        assert thr.status()["engines"]["/run/engine.sock"]["ready"]
+
+        shared.NODE.oget.return_value = False
+        thr.reconfigure()
+        watcher.join(5)
+        assert states.closed
+        assert thr.watchers == {}
+        assert shared.CONTAINER_STATES == {}
@@ -0,0 +1,191 @@
+import datetime
+import logging
+
+import pytest
+
+import daemon.shared as shared
+from daemon.scheduler import Scheduler
+from env import Env
+from utilities.storage import Storage
+
+INTERVAL = 60
+
+
+class Schedule(object):
+    def get_next(self, now, last):
+        return datetime.datetime.fromtimestamp((last or now) + INTERVAL), INTERVAL
+
+
+class Sched(object):
+    def __init__(self, actions):
+        self.configured = 0
+        self.actions = dict((action, [Storage(
+            section=section,
+            fname="last_%s_%s" % (action, section),
+            schedule_option="%s_schedule" % action,
+            req_collector=False,
+        ) for section in sections]) for action, sections in actions.items())
+
+    def configure(self):
+        self.configured += 1
+
+    @staticmethod
+    def get_schedule(section, option):
+        return Schedule()
+
+    @staticmethod
+    def get_last(fname):
+        return
+
+
+class Svc(object):
+    def __init__(self, path):
+        self.path = path
+        self.peers = [Env.nodename]
+        self.options = Storage()
+        self.sched = Sched({"status": ["DEFAULT"], "sync_all": ["DEFAULT"]})
+
+
+class Node(object):
+    def __init__(self):
+        self.options = Storage()
+        self.sched = Sched({"pushasset": ["DEFAULT"]})
+        self.collector_env = Storage(dbopensvc=None)
+
+
+def set_status(paths, csums=None, provisioned=True):
+    csums = csums or {}
+    config = dict((path, {"csum": csums.get(path, "csum")}) for path in paths)
+    config["cluster"] = {"csum": "ccsum"}
+    shared.DAEMON_STATUS.set(["monitor"], {
+        "nodes": {
+            Env.nodename: {
+                "config": {"csum": "ncsum"},
+                "services": {
+                    "config": config,
+                    "status": dict((path, {"resources": {}}) for path in paths),
+                },
+            },
+        },
+        "services": dict((path, {"provisioned": provisioned}) for path in paths),
+    })
+
+
+@pytest.fixture(scope='function')
+def thr(mocker, shared_data):
+    mocker.patch.object(shared, "NODE", Node())
+    for path in ("ns1/svc/s1", "ns1/svc/s2"):
+        shared.SERVICES[path] = Svc(path)
+    set_status(list(shared.SERVICES))
+    thr = Scheduler()
+    thr.log = logging.getLogger("scheduler")
+    thr.delayed = {}
+    thr.delayed_heap = []
+    thr.plans = {}
+    thr.dirty = set()
+    thr.blacklist = {}
+    thr.lasts = {}
+    thr.running = set()
+    mocker.patch.object(thr, "max_tasks", return_value=10)
+    mocker.patch.object(thr, "exec_action")
+    return thr
+
+
+def configured():
+    return dict((path, svc.sched.configured) for path, svc in shared.SERVICES.items())
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestSchedulerPlans:
+    @staticmethod
+    def test_unchanged_objects_are_not_evaluated_again(thr):
+        thr.run_scheduler(1000)
+        assert sorted(thr.delayed) == [
+            ("pushasset", None, None),
+            ("status", "ns1/svc/s1", None),
+            ("status", "ns1/svc/s2", None),
+            ("sync_all", "ns1/svc/s1", None),
+            ("sync_all", "ns1/svc/s2", None),
+        ]
+        thr.run_scheduler(1010)
+        assert configured() == {"ns1/svc/s1": 1, "ns1/svc/s2": 1}
+        assert thr.delayed[("status", "ns1/svc/s1", None)]["queued"] == 1000
+
+    @staticmethod
+    def test_config_change_requeues_the_object_actions(thr):
+        thr.run_scheduler(1000)
+        set_status(list(shared.SERVICES), csums={"ns1/svc/s1": "csum2"})
+        thr.run_scheduler(1010)
+        assert configured() == {"ns1/svc/s1": 2, "ns1/svc/s2": 1}
+        assert thr.delayed[("status", "ns1/svc/s1", None)]["csum"] == "csum2"
+        assert thr.delayed[("status", "ns1/svc/s1", None)]["queued"] == 1010
+        assert thr.delayed[("status", "ns1/svc/s2", None)]["queued"] == 1000
+
+    @staticmethod
+    def test_provisioned_change_reevaluates_the_object(thr):
+        set_status(list(shared.SERVICES), provisioned=False)
+        thr.run_scheduler(1000)
+        assert ("sync_all", "ns1/svc/s1", None) not in thr.delayed
+        set_status(list(shared.SERVICES), provisioned=True)
+        thr.run_scheduler(1010)
+        assert ("sync_all", "ns1/svc/s1", None) in thr.delayed
+
+    @staticmethod
+    def test_dequeued_actions_are_requeued(thr):
+        thr.run_scheduler(1000)
+        sig = ("status", "ns1/svc/s1", None)
+        thr.delayed[sig]["expire"] = 1000
+        thr.delayed_heap = []
+        for _sig, task in thr.delayed.items():
+            thr.push_delayed(task["expire"], _sig)
+        thr.dequeue_actions(1001)
+        assert thr.exec_action.call_count == 1
+        assert sig not in thr.delayed
+        assert thr.dirty == set(["ns1/svc/s1"])
+        thr.lasts[sig] = 1001
+        thr.run_scheduler(1010)
+        assert configured() == {"ns1/svc/s1": 2, "ns1/svc/s2": 1}
+        assert thr.delayed[sig]["expire"] == 1001 + INTERVAL
+
+    @staticmethod
+    def test_deleted_object_actions_are_dropped(thr):
+        thr.run_scheduler(1000)
+        del shared.SERVICES["ns1/svc/s2"]
+        thr.run_scheduler(1010)
+        assert "ns1/svc/s2" not in thr.plans
+        assert [sig for sig in thr.delayed if sig[1] == "ns1/svc/s2"] == []
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestSchedulerQueue:
+    @staticmethod
+    def test_next_expire_skips_stale_entries(thr):
+        thr.queue_action("a", delay=30, path="p1", now=1000)
+        thr.queue_action("b", delay=10, path=None, now=1000)
+        assert thr.next_expire(1000) == 1010
+        thr.delete_queued([("b", None, None)])
+        assert thr.next_expire(1000) == 1030
+        thr.queue_action("a", delay=0, path="p1", now=1005)
+        assert thr.next_expire(1005) == 1005
+        thr.delete_queued([("a", "p1", None)])
+        assert thr.next_expire(1005) == 1005 + 5
+        assert thr.delayed_heap == []
+
+    @staticmethod
+    def test_due_sigs(thr):
+        for i in range(5):
+            thr.queue_action("a", delay=i * 10, path="p%d" % i, now=1000)
+        assert thr.due_sigs(1025) == [("a", "p0", None), ("a", "p1", None), ("a", "p2", None)]
+        assert thr.due_sigs(1025) == [("a", "p0", None), ("a", "p1", None), ("a", "p2", None)]
+        assert len(thr.delayed) == 5
+
+    @staticmethod
+    def test_status_exposes_the_queue(thr):
+        thr.run_scheduler(1000)
+        data = thr.status()
+        assert len(data["queue"]) == 5
+        assert [entry["expire"] for entry in data["queue"]] == sorted(entry["expire"] for entry in data["queue"])
+        assert data["planned"] == 3
+        assert data["dirty"] == 0
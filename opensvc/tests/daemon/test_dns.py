@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+import socket
+import threading
+
+import pytest
+
+import daemon.shared as shared
+from daemon.dns import Conn, Dns, RecordsIndex
+from env import Env
+from utilities.lazy import set_lazy
+
+
+class Node(object):
+    dns = ["10.0.0.1"]
+
+
+def instance(*addrs, **kwargs):
+    resources = {}
+    for i, addr in enumerate(addrs):
+        resources["ip#%d" % i] = {"info": {"ipaddr": addr, "expose": kwargs.get("expose", [])}}
+    return {"resources": resources}
+
+
+def set_instance(path, nodename, status):
+    shared.DAEMON_STATUS.set(["monitor", "nodes", nodename, "services", "status", path], status)
+    shared.GEN += 1
+
+
+def lookup(thr, qtype, qname):
+    return sorted([rec["content"] for rec in thr.action_lookup({"qtype": qtype, "qname": qname})])
+
+
+@pytest.fixture(scope='function')
+def thr(mocker, shared_data):
+    mocker.patch.object(shared, "NODE", Node())
+    mocker.patch.object(shared, "GEN", 1)
+    shared.DAEMON_STATUS.set(["monitor", "nodes"], {
+        Env.nodename: {"stats": {"score": 50}, "services": {"status": {}}},
+        "n2": {"stats": {"score": 20}, "services": {"status": {}}},
+    })
+    thr = Dns()
+    thr.log = logging.getLogger("dns")
+    set_lazy(thr, "cluster_name", "c1")
+    set_lazy(thr, "cluster_nodes", [Env.nodename, "n2"])
+    thr.zone = "c1."
+    thr.suffix = ".c1."
+    thr.suffix_len = len(thr.suffix)
+    thr.soa_content = "soa"
+    thr.index = RecordsIndex()
+    thr.index_key = None
+    thr.setup_pool()
+    return thr
+
+
+def listener(tmpdir):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(os.path.join(str(tmpdir), "dns.sock"))
+    sock.listen(128)
+    return sock
+
+
+def request(qtype, qname):
+    return json.dumps({"method": "lookup", "parameters": {"qtype": qtype, "qname": qname}}).encode() + b"\n"
+
+
+def replies(sock, count):
+    buff = b""
+    while buff.count(b"\n") < count:
+        buff += sock.recv(65536)
+    return [json.loads(line) for line in buff.splitlines()]
+
+
+@pytest.mark.ci
+class TestRecordsIndex:
+    @staticmethod
+    def test_records_are_merged_and_withdrawn():
+        index = RecordsIndex()
+        index.set_instance("i1", None, {"a": {"a.c1.": set(["1.1.1.1"])}, "ptr": {"1.1.1.1.in-addr.arpa": ["a.c1."]}})
+        index.set_instance("i2", None, {"a": {"a.c1.": set(["1.1.1.2"])}, "ptr": {"1.1.1.1.in-addr.arpa": ["a.c1.", "b.c1."]}})
+        assert index.get("a", "a.c1.") == set(["1.1.1.1", "1.1.1.2"])
+        assert index.get("ptr", "1.1.1.1.in-addr.arpa") == ["a.c1.", "b.c1."]
+        index.del_instance("i1")
+        assert index.get("a", "a.c1.") == set(["1.1.1.2"])
+        index.del_instance("i2")
+        assert index.get("a", "a.c1.") == []
+        assert index.tree == {}
+        assert index.names == {}
+
+    @staticmethod
+    @pytest.mark.parametrize("suffix", ["", "c1.", "ns1.svc.c1.", "s1.svc.c1.", ".svc.c1.", "svc.c1", "x.c1."])
+    def test_match_is_a_string_suffix_match(suffix):
+        qnames = ["svc1.ns1.svc.c1.", "svc2.ns1.svc.c1.", "svc1.xns1.svc.c1.", "ns1.svc.c1.", "ns0.c1.", "a.c2."]
+        index = RecordsIndex()
+        for i, qname in enumerate(qnames):
+            index.set_instance(i, None, {"a": {qname: set()}})
+        assert sorted(index.match(suffix)) == sorted([qname for qname in qnames if qname.endswith(suffix)])
+
+    @staticmethod
+    def test_srv_records_are_deduplicated_on_target():
+        index = RecordsIndex()
+        index.set_instance("i1", None, {"srv": {"_80._tcp.a.c1.": [(" 80 t1", "0 10 80 t1")]}})
+        index.set_instance("i2", None, {"srv": {"_80._tcp.a.c1.": [(" 80 t1", "0 20 80 t1"), (" 80 t2", "0 20 80 t2")]}})
+        assert len(index.get("srv", "_80._tcp.a.c1.")) == 2
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+class TestDnsLookups:
+    @staticmethod
+    def test_lookups(thr):
+        set_instance("ns1/svc/web", Env.nodename, instance("10.1.0.1", expose=["80/tcp"]))
+        set_instance("ns1/svc/web", "n2", instance("10.1.0.2", expose=["80/tcp"]))
+        assert lookup(thr, "A", "web.ns1.svc.c1.") == ["10.1.0.1", "10.1.0.2"]
+        assert lookup(thr, "A", "web.ns1.svc.n2.node.c1.") == ["10.1.0.2"]
+        assert lookup(thr, "A", "10-1-0-1.web.ns1.svc.c1.") == ["10.1.0.1"]
+        assert lookup(thr, "A", "ns0.c1.") == ["10.0.0.1"]
+        assert lookup(thr, "SRV", "_80._tcp.web.ns1.svc.c1.") == [
+            "0 20 80 10-1-0-2.web.ns1.svc.c1.",
+            "0 50 80 10-1-0-1.web.ns1.svc.c1.",
+        ]
+        assert lookup(thr, "PTR", "1.0.1.10.in-addr.arpa") == ["web.ns1.svc.c1."]
+        assert "0.1.10.in-addr.arpa." in thr.soa_records_rev()
+
+    @staticmethod
+    def test_only_replaced_instances_are_reindexed(thr, mocker):
+        set_instance("ns1/svc/web", Env.nodename, instance("10.1.0.1"))
+        set_instance("ns1/svc/db", Env.nodename, instance("10.1.0.3"))
+        assert lookup(thr, "A", "web.ns1.svc.c1.") == ["10.1.0.1"]
+        records = mocker.spy(thr, "instance_records")
+        set_instance("ns1/svc/web", Env.nodename, instance("10.1.0.4"))
+        assert lookup(thr, "A", "web.ns1.svc.c1.") == ["10.1.0.4"]
+        assert lookup(thr, "A", "db.ns1.svc.c1.") == ["10.1.0.3"]
+        assert [call[0][0] for call in records.call_args_list] == ["ns1/svc/web"]
+
+    @staticmethod
+    def test_removed_instances_are_withdrawn(thr):
+        set_instance("ns1/svc/web", Env.nodename, instance("10.1.0.1"))
+        assert lookup(thr, "A", "web.ns1.svc.c1.") == ["10.1.0.1"]
+        shared.DAEMON_STATUS.unset_safe(["monitor", "nodes", Env.nodename, "services", "status", "ns1/svc/web"])
+        shared.GEN += 1
+        assert lookup(thr, "A", "web.ns1.svc.c1.") == []
+        assert thr.action_list({"zonename": "c1."}) == thr._action_list("c1.")
+        assert [rec["qname"] for rec in thr.action_list({"zonename": "c1."}) if rec["qtype"] == "A"] == ["ns0.c1."]
+
+    @staticmethod
+    def test_score_change_updates_srv_weight(thr):
+        set_instance("ns1/svc/web", "n2", instance("10.1.0.2", expose=["80/tcp"]))
+        assert lookup(thr, "SRV", "_80._tcp.web.ns1.svc.c1.") == ["0 20 80 10-1-0-2.web.ns1.svc.c1."]
+        shared.DAEMON_STATUS.set(["monitor", "nodes", "n2", "stats", "score"], 30)
+        shared.GEN += 1
+        assert lookup(thr, "SRV", "_80._tcp.web.ns1.svc.c1.") == ["0 30 80 10-1-0-2.web.ns1.svc.c1."]
+
+    @staticmethod
+    def test_zone_list(thr):
+        set_instance("ns1/svc/web", Env.nodename, instance("10.1.0.1", expose=["80/tcp"]))
+        set_instance("ns2/svc/web", Env.nodename, instance("10.2.0.1"))
+        data = thr.action_list({"zonename": "ns1.svc.c1."})
+        assert data == []
+        data = thr.action_list({"zonename": "c1."})
+        qnames = set([rec["qname"] for rec in data if rec["qtype"] in ("A", "SRV")])
+        assert "web.ns1.svc.c1." in qnames
+        assert "web.ns2.svc.c1." in qnames
+        assert "_80._tcp.web.ns1.svc.c1." in qnames
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+class TestDnsServer:
+    @staticmethod
+    def test_pipelined_requests_are_replied_in_order(thr):
+        set_instance("ns1/svc/web", Env.nodename, instance("10.1.0.1"))
+        client, server = socket.socketpair()
+        conn = Conn(server)
+        client.sendall(request("A", "web.ns1.svc.c1.") + request("A", "ns0.c1.") + request("A", "web")[:10])
+        assert thr.handle_conn(conn) is True
+        assert [data["result"][0]["content"] for data in replies(client, 2)] == ["10.1.0.1", "10.0.0.1"]
+        client.sendall(request("A", "web")[10:])
+        assert thr.handle_conn(conn) is True
+        assert replies(client, 1) == [False]
+        client.close()
+        assert thr.handle_conn(conn) is False
+
+    @staticmethod
+    def test_latency_histograms(thr):
+        client, server = socket.socketpair()
+        client.sendall(request("A", "a.c1.") + request("a", "b.c1.") + request("SOA", "c1.") + b'{"method": "initialize"}\n')
+        thr.handle_conn(Conn(server))
+        status = thr.status()
+        assert sorted(status["stats"]["requests"]) == ["A", "SOA", "initialize"]
+        assert status["stats"]["requests"]["A"]["count"] == 2
+        assert sum(status["stats"]["requests"]["A"]["buckets"].values()) == 2
+        assert status["workers"] == {"size": thr.max_workers, "busy": 0, "queued": 0}
+
+    @staticmethod
+    def test_no_accept_while_workers_have_a_backlog(thr, mocker, tmpdir):
+        thr.sock = listener(tmpdir)
+        thr.sock_tmo = 0.01
+        mocker.patch.object(thr, "start_workers")
+        thr.do()
+        assert thr.accepting
+        for _ in range(thr.max_workers):
+            thr.work_q.put(Conn(socket.socketpair()[0]))
+        thr.do()
+        assert not thr.accepting
+        thr.close_conns()
+        thr.do()
+        assert thr.accepting
+
+    @staticmethod
+    def test_no_accept_over_max_conns(thr, mocker, tmpdir):
+        thr.sock = listener(tmpdir)
+        thr.sock_tmo = 0.01
+        mocker.patch.object(thr, "start_workers")
+        mocker.patch.object(thr, "max_conns", 4)
+        clients = []
+        for _ in range(thr.max_conns):
+            server, client = socket.socketpair()
+            clients.append(client)
+            thr.watch_conn(Conn(server))
+        thr.do()
+        assert not thr.accepting
+        thr.close_conns()
+        thr.do()
+        assert thr.accepting
+
+    @staticmethod
+    def test_close_conns_closes_the_queued_connections(thr, mocker):
+        idle, queued, returned = [Conn(socket.socketpair()[0]) for _ in range(3)]
+        closes = [mocker.spy(conn, "close") for conn in (idle, queued, returned)]
+        thr.watch_conn(idle)
+        thr.work_q.put(queued)
+        thr.returned_q.put(returned)
+        thr.close_conns()
+        assert thr.conns == {}
+        assert thr.work_q.empty() and thr.returned_q.empty()
+        assert [close.call_count for close in closes] == [1, 1, 1]
+
+    @staticmethod
+    def test_persistent_connections(thr, tmpdir):
+        set_instance("ns1/svc/web", Env.nodename, instance("10.1.0.1"))
+        path = os.path.join(str(tmpdir), "dns.sock")
+        thr.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        thr.sock.bind(path)
+        thr.sock.listen(128)
+        thr.sock.settimeout(thr.sock_tmo)
+        thr.sock_tmo = 0.1
+
+        def loop():
+            while not thr.stopped():
+                thr.do()
+        main = threading.Thread(target=loop)
+        main.start()
+        try:
+            clients = []
+            for _ in range(thr.max_workers * 2):
+                client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                client.connect(path)
+                client.settimeout(5)
+                clients.append(client)
+            for _ in range(3):
+                for client in clients:
+                    client.sendall(request("A", "web.ns1.svc.c1.") * 2)
+                for client in clients:
+                    assert [data["result"][0]["content"] for data in replies(client, 2)] == ["10.1.0.1"] * 2
+            assert thr.stats.sessions.accepted == len(clients)
+            for client in clients:
+                client.close()
+        finally:
+            thr.stop()
+            main.join()
+            for worker in thr.threads:
+                worker.join()
+            thr.sock.close()
@@ -0,0 +1,357 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import daemon.listener
+import daemon.shared as shared
+from daemon.eventloop import EventLoop
+from daemon.handler import BaseHandler
+from daemon.listener import ClientHandler, EventMessage, EventsFilter, Listener
+from env import Env
+from foreign.six.moves import queue
+from utilities.lazy import set_lazy
+from utilities.storage import Storage
+
+
+class Subscriber(object):
+    def __init__(self, sid, selector=None, namespaces=None):
+        self.sid = sid
+        self.selector = selector
+        self.addr = ["local"]
+        self.h2conn = None
+        self.events_stream_ids = []
+        self.events_stats = None
+        self.event_queue = queue.Queue()
+        self.stopped_flag = False
+        if namespaces is None:
+            self.usr = False
+            self.usr_grants = {"root": None}
+        else:
+            self.usr = None
+            self.usr_grants = {"guest": set(namespaces)}
+
+    def get_namespaces(self):
+        return self.usr_grants["guest"]
+
+    def stop(self):
+        self.stopped_flag = True
+
+    def stopped(self):
+        return self.stopped_flag
+
+    def messages(self):
+        msgs = []
+        while not self.event_queue.empty():
+            msgs.append(self.event_queue.get())
+        return msgs
+
+
+def node_data(paths):
+    return {
+        "services": {
+            "config": dict((path, {"csum": "abc"}) for path in paths),
+            "status": dict((path, {"avail": "up"}) for path in paths),
+        },
+    }
+
+
+def set_paths(paths):
+    shared.DAEMON_STATUS.set(["monitor", "nodes", Env.nodename], node_data(paths))
+
+
+def patch_event(path):
+    return {
+        "kind": "patch",
+        "id": 1,
+        "ts": 0,
+        "data": [
+            [["monitor", "nodes", Env.nodename, "services", "status", path, "avail"], "down"],
+            [["monitor", "nodes", Env.nodename, "updated"], 1],
+        ],
+    }
+
+
+@pytest.fixture(scope='function')
+def thr(mocker, shared_data):
+    set_paths(["svc1", "ns1/svc/svc2", "ns2/svc/svc3"])
+    thr = Listener()
+    set_lazy(thr, "cluster_nodes", [Env.nodename])
+    thr.events_grace_period = False
+    thr.events_clients = []
+    thr.events_filters = {}
+    thr.events_paths = set()
+    thr.events_paths_gen = None
+    thr.stats = Storage({"events": Storage({"dispatched": 0, "filters": 0, "subscribers": Storage()})})
+    mocker.patch.object(shared, "EVENT_Q", queue.Queue())
+    yield thr
+
+
+def subscribe(thr, *subscribers):
+    for sub in subscribers:
+        thr.threads.append(sub)
+        thr.events_clients.append(sub)
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestEventsFilter:
+    @staticmethod
+    @pytest.mark.parametrize("selector, expected", [
+        ("**", True),
+        ("ns1/svc/*,ns2/**", True),
+        ("!ns1/*+*/svc/*", True),
+        ("avail=up", False),
+        ("ns1/**+avail=up", False),
+        ("", True),
+    ])
+    def test_is_static(selector, expected):
+        assert EventsFilter.is_static(selector) is expected
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestJanitorEvents:
+    @staticmethod
+    def test_unfiltered_subscribers_share_one_message(thr):
+        subs = [Subscriber("sid%d" % i) for i in range(3)]
+        subscribe(thr, *subs)
+        event = patch_event("ns1/svc/svc2")
+        shared.EVENT_Q.put(event)
+        thr.janitor_events()
+        msgs = [sub.messages() for sub in subs]
+        assert all(len(m) == 1 for m in msgs)
+        assert all(m[0] is msgs[0][0] for m in msgs)
+        assert msgs[0][0].data is event
+        assert json.loads(msgs[0][0].dumps()) == event
+
+    @staticmethod
+    def test_same_selector_subscribers_share_one_message(thr):
+        subs = [Subscriber("sid%d" % i, selector="ns2/**", namespaces=["ns2"]) for i in range(2)]
+        other = Subscriber("other", selector="ns1/**")
+        subscribe(thr, other, *subs)
+        event = patch_event("ns2/svc/svc3")
+        shared.EVENT_Q.put(event)
+        thr.janitor_events()
+        msg1, = subs[0].messages()
+        msg2, = subs[1].messages()
+        msg3, = other.messages()
+        assert msg1 is msg2
+        assert len(msg1.data["data"]) == 2
+        assert msg3.data["data"] == [event["data"][1]]
+        assert len(event["data"]) == 2, "the event must not be modified"
+        assert len(thr.events_filters) == 2
+
+    @staticmethod
+    def test_grants_restrict_the_selector(thr):
+        sub = Subscriber("sid", selector="**", namespaces=["ns1"])
+        subscribe(thr, sub)
+        shared.EVENT_Q.put(patch_event("ns2/svc/svc3"))
+        shared.EVENT_Q.put(patch_event("ns1/svc/svc2"))
+        thr.janitor_events()
+        msg1, msg2 = sub.messages()
+        assert len(msg1.data["data"]) == 1
+        assert len(msg2.data["data"]) == 2
+
+    @staticmethod
+    def test_filters_follow_the_cluster_paths(thr):
+        sub = Subscriber("sid", selector="ns3/**")
+        subscribe(thr, sub)
+        shared.EVENT_Q.put(patch_event("ns3/svc/svc4"))
+        thr.janitor_events()
+        assert len(sub.messages()[0].data["data"]) == 1
+
+        set_paths(["svc1", "ns3/svc/svc4"])
+        shared.EVENT_Q.put(patch_event("ns3/svc/svc4"))
+        thr.janitor_events()
+        assert thr.events_paths == set(["svc1", "ns3/svc/svc4"])
+        assert len(sub.messages()[0].data["data"]) == 2
+
+        set_paths(["svc1"])
+        shared.EVENT_Q.put(patch_event("ns3/svc/svc4"))
+        thr.janitor_events()
+        assert len(sub.messages()[0].data["data"]) == 1
+
+    @staticmethod
+    def test_event_kind_events_are_filtered_by_path(thr):
+        sub = Subscriber("sid", selector="ns1/**")
+        subscribe(thr, sub)
+        shared.EVENT_Q.put({"kind": "event", "ts": 0, "data": {"id": "x", "path": "ns1/svc/svc2"}})
+        shared.EVENT_Q.put({"kind": "event", "ts": 0, "data": {"id": "x", "path": "ns2/svc/svc3"}})
+        shared.EVENT_Q.put({"kind": "event", "ts": 0, "data": {"id": "y"}})
+        thr.janitor_events()
+        assert [msg.data["data"]["id"] for msg in sub.messages()] == ["x", "y"]
+
+    @staticmethod
+    def test_gone_subscribers_are_purged(thr):
+        sub1 = Subscriber("sid1")
+        sub2 = Subscriber("sid2")
+        subscribe(thr, sub1, sub2)
+        thr.threads.remove(sub1)
+        shared.EVENT_Q.put(patch_event("svc1"))
+        thr.janitor_events()
+        assert thr.events_clients == [sub2]
+        assert list(thr.stats.events.subscribers) == ["sid2"]
+        assert sub1.event_queue.empty()
+
+    @staticmethod
+    def test_notified_subscribers_are_returned(thr):
+        sub1 = Subscriber("sid1", selector="ns1/**")
+        sub2 = Subscriber("sid2", selector="ns2/**")
+        subscribe(thr, sub1, sub2)
+        shared.EVENT_Q.put({"kind": "event", "ts": 0, "data": {"id": "x", "path": "ns1/svc/svc2"}})
+        assert thr.janitor_events() == set([sub1])
+        assert thr.janitor_events() == set()
+
+    @staticmethod
+    def test_overflowing_subscriber_is_disconnected(thr, mocker):
+        mocker.patch.object(daemon.listener, "EVENTS_QUEUE_MAX", 2)
+        thr.log = mocker.Mock()
+        sub = Subscriber("sid")
+        subscribe(thr, sub)
+        for _ in range(3):
+            shared.EVENT_Q.put(patch_event("svc1"))
+        thr.janitor_events()
+        assert len(sub.messages()) == 2
+        assert sub.stopped()
+
+    @staticmethod
+    def test_stats_account_queue_depth_and_latency(thr):
+        sub = Subscriber("sid")
+        subscribe(thr, sub)
+        for _ in range(3):
+            shared.EVENT_Q.put(patch_event("svc1"))
+        thr.janitor_events()
+        thr.janitor_events()
+        stats = thr.stats.events.subscribers["sid"]
+        assert stats.queued == 3
+        assert stats.queued_max == 3
+        assert thr.stats.events.dispatched == 3
+
+        for msg in sub.messages():
+            ClientHandler.events_delivered(sub, msg)
+        assert stats.sent == 3
+        assert stats.latency_max > 0
+        assert stats.latency_avg > 0
+
+
+@pytest.mark.ci
+class TestEventMessage:
+    @staticmethod
+    def test_serialized_once(mocker):
+        msg = EventMessage({"kind": "patch", "data": []})
+        dumps = mocker.spy(json, "dumps")
+        assert msg.encoded() == msg.encoded() == (msg.dumps() + "\0").encode()
+        assert dumps.call_count == 1
+
+    @staticmethod
+    def test_encrypted_once(mocker):
+        crypt = mocker.Mock()
+        crypt.encrypt.return_value = b"encrypted"
+        msg = EventMessage({"kind": "patch", "data": []})
+        assert msg.encrypted(crypt) == b"encrypted"
+        assert msg.encrypted(crypt) == b"encrypted"
+        crypt.encrypt.assert_called_once_with(msg.data)
+
+
+@pytest.mark.ci
+class TestEventLoop:
+    @staticmethod
+    def test_poll_returns_the_readable_sockets_data():
+        loop = EventLoop()
+        rsock, wsock = socket.socketpair()
+        try:
+            loop.register(rsock, "data")
+            assert loop.poll(0) == []
+            wsock.send(b"x")
+            assert loop.poll(1) == ["data"]
+            loop.unregister(rsock)
+            loop.unregister(rsock)
+            assert loop.poll(0) == []
+        finally:
+            loop.close()
+            rsock.close()
+            wsock.close()
+
+    @staticmethod
+    def test_call_soon_wakes_the_poll():
+        loop = EventLoop()
+        calls = []
+        try:
+            thr = threading.Timer(0.1, loop.call_soon, args=(calls.append, "called"))
+            thr.start()
+            assert loop.poll(10) == []
+            thr.join()
+            assert calls == ["called"]
+        finally:
+            loop.close()
+
+
+class BlockingHandler(BaseHandler):
+    routes = (
+        (None, "block"),
+    )
+    blocking = True
+    multiplex = "never"
+    access = {}
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def action(self, nodename, thr=None, **kwargs):
+        assert self.release.wait(5)
+        return {"status": 0}
+
+
+def wait_for(fn, timeout=5):
+    limit = time.time() + timeout
+    while time.time() < limit:
+        if fn():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.ci
+class TestBlockingRequests:
+    @staticmethod
+    def test_raw_blocking_request_is_detached_from_the_worker(mocker):
+        mocker.patch.object(shared, "NODE")
+        handler = BlockingHandler()
+        parent = Storage({
+            "name": "listener",
+            "loop": mocker.Mock(),
+            "handlers": {(None, "block"): handler},
+            "stats": Storage({"sessions": Storage({
+                "auth_validated": 0,
+                "tx": 0,
+                "rx": 0,
+                "alive": Storage(),
+                "detached": 0,
+                "clients": Storage({"local": Storage({"auth_validated": 0, "tx": 0, "rx": 0})}),
+            })}),
+        })
+        conn, client = socket.socketpair()
+        try:
+            session = ClientHandler(parent, conn, ["local"], False, "raw", False, None)
+            client.sendall(json.dumps({"action": "block"}).encode() + b"\0")
+            session.readable = True
+
+            # the worker step returns while the handler blocks, and the
+            # session is neither parked nor closed
+            session.run()
+            assert wait_for(lambda: parent.stats.sessions.detached == 1)
+            assert not session.closed
+            parent.loop.call_soon.assert_not_called()
+
+            handler.release.set()
+            client.settimeout(5)
+            assert json.loads(client.recv(4096).decode().rstrip("\0")) == {"status": 0}
+            assert wait_for(lambda: session.closed)
+            assert wait_for(lambda: parent.stats.sessions.detached == 0)
+        finally:
+            handler.release.set()
+            conn.close()
+            client.close()
@@ -0,0 +1,165 @@
+import json
+import socket
+import time
+
+import pytest
+
+import daemon.peers
+from daemon.peers import PeerPool
+from utilities.storage import Storage
+
+
+class Response(object):
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return json.dumps(self.data).encode()
+
+
+class Sock(object):
+    can_read = False
+
+
+class Conn(object):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.timeout = False
+        self.requests = []
+        self.closed = False
+        self._sock = Sock()
+
+    def request(self, method, path, headers=None, body=None):
+        if self.fail:
+            raise socket.error(111, "connection refused")
+        self.requests.append((method, path))
+        return len(self.requests)
+
+    def get_response(self, stream_id):
+        if self.timeout:
+            raise socket.timeout("timed out")
+        return Response({"status": 0, "stream_id": stream_id})
+
+    def close(self):
+        self.closed = True
+
+
+class Crypt(object):
+    def __init__(self, conns):
+        self.conns = list(conns)
+        self.created = []
+        self.raw_requests = []
+
+    def socket_parms(self, server):
+        return Storage({"server": server, "af": socket.AF_INET})
+
+    def h2c(self, sp=None, timeout=None):
+        conn = self.conns.pop(0)
+        self.created.append(conn)
+        return conn
+
+    def get_secret(self, sp, secret):
+        return None
+
+    @staticmethod
+    def h2_path_from_data(data):
+        return "/" + data["action"]
+
+    def h2_headers(self, **kwargs):
+        return {}
+
+    @staticmethod
+    def h2_body_from_data(data):
+        return b"{}"
+
+    def daemon_request(self, data, server=None, **kwargs):
+        self.raw_requests.append(server)
+        return {"status": 0, "raw": True}
+
+
+@pytest.fixture(scope="function")
+def h2(mocker):
+    mocker.patch.object(daemon.peers, "has_ssl", True)
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("h2")
+class TestPeerPool:
+    @staticmethod
+    def test_requests_reuse_the_peer_connection():
+        crypt = Crypt([Conn()])
+        pool = PeerPool(crypt)
+        assert pool.request("n2", {"action": "node_status"}) == {"status": 0, "stream_id": 1}
+        assert pool.request("n2", {"action": "node_status"}) == {"status": 0, "stream_id": 2}
+        assert len(crypt.created) == 1
+        assert pool.stats["n2"].requests == 2
+        assert pool.stats["n2"].latency_max >= pool.stats["n2"].latency_avg > 0
+
+    @staticmethod
+    def test_unhealthy_connection_is_replaced():
+        crypt = Crypt([Conn(), Conn()])
+        pool = PeerPool(crypt)
+        pool.request("n2", {"action": "node_status"})
+        crypt.created[0]._sock.can_read = True
+        assert pool.request("n2", {"action": "node_status"})["stream_id"] == 1
+        assert len(crypt.created) == 2
+        assert crypt.created[0].closed
+
+    @staticmethod
+    def test_reused_connection_failure_is_retried():
+        crypt = Crypt([Conn(), Conn()])
+        pool = PeerPool(crypt)
+        pool.request("n2", {"action": "node_status"})
+        crypt.created[0].fail = True
+        assert pool.request("n2", {"action": "node_status"}) == {"status": 0, "stream_id": 1}
+        assert len(crypt.created) == 2
+
+    @staticmethod
+    def test_sent_request_is_not_retried():
+        crypt = Crypt([Conn(), Conn()])
+        pool = PeerPool(crypt)
+        pool.request("n2", {"action": "node_status"})
+        crypt.created[0].timeout = True
+        assert pool.request("n2", {"action": "object_action"}, method="POST") == {"status": 1, "error": "timed out"}
+        assert crypt.created[0].requests == [("GET", "/node_status"), ("POST", "/object_action")]
+        assert len(crypt.created) == 1
+        assert crypt.raw_requests == []
+        assert pool.conns == {}
+
+    @staticmethod
+    def test_unreachable_tls_listener_falls_back_to_raw():
+        crypt = Crypt([Conn(fail=True)])
+        pool = PeerPool(crypt)
+        assert pool.request("n2", {"action": "node_status"}) == {"status": 0, "raw": True}
+        assert pool.request("n2", {"action": "node_status"}) == {"status": 0, "raw": True}
+        assert crypt.raw_requests == ["n2", "n2"]
+        assert len(crypt.created) == 1
+
+    @staticmethod
+    def test_janitor_evicts_idle_connections(mocker):
+        crypt = Crypt([Conn()])
+        pool = PeerPool(crypt)
+        pool.request("n2", {"action": "node_status"})
+        pool.janitor()
+        assert "n2" in pool.conns
+        mocker.patch.object(daemon.peers, "PEER_IDLE_TIMEOUT", 0)
+        pool.janitor()
+        assert pool.conns == {}
+        assert crypt.created[0].closed
+
+    @staticmethod
+    def test_wait_returns_partial_results_on_deadline():
+        pool = PeerPool(Crypt([]), timeout=0.2)
+
+        def fn(nodename):
+            if nodename == "n3":
+                time.sleep(1)
+            return {"status": 0, "node": nodename}
+
+        begin = time.time()
+        results, timed_out = pool.wait(pool.submit(fn, ["n1", "n2", "n3"]))
+        assert time.time() - begin < 0.9
+        assert results == {"n1": {"status": 0, "node": "n1"}, "n2": {"status": 0, "node": "n2"}}
+        assert timed_out == ["n3"]
+        assert pool.stats["n3"].timeouts == 1
+        pool.close()
@@ -0,0 +1,48 @@
+import logging
+
+import pytest
+
+import daemon.shared as shared
+from daemon.sampler import Sampler
+
+
+@pytest.fixture(scope='function')
+def thr(mocker):
+    mocker.patch.object(shared, "NODE")
+    thr = Sampler()
+    thr.log = logging.getLogger("sampler")
+    thr.sampler = None
+    thr.interval = None
+    thr.samples = 0
+    thr.last = None
+    mocker.patch.object(thr, "_stop_event")
+    mocker.patch.object(thr, "update_status")
+    return thr
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+class TestSampler(object):
+    @staticmethod
+    def test_samples_are_aligned_on_the_interval(thr, mocker):
+        shared.NODE.oget.return_value = 10
+        thr.reconfigure()
+        sample = mocker.patch.object(thr.sampler, "sample")
+        mocker.patch("time.time", return_value=1003.0)
+        thr.do()
+        sample.assert_called_once_with(1003.0)
+        assert thr.next == 1010
+        thr.do()
+        assert sample.call_count == 1
+        thr._stop_event.wait.assert_called_with(7.0)
+
+    @staticmethod
+    def test_interval_zero_disables_the_sampler(thr):
+        shared.NODE.oget.return_value = 10
+        thr.reconfigure()
+        assert thr.sampler is not None
+        shared.NODE.oget.return_value = 0
+        thr.reconfigure()
+        assert thr.sampler is None
+        thr.do()
+        assert thr.samples == 0
@@ -0,0 +1,285 @@
+import pytest
+
+import daemon.shared as shared
+from daemon.selector import CompiledSelector, PathsIndex, SelectorCache
+from env import Env
+from foreign.jsonpath_ng.ext import parse
+from utilities.lazy import set_lazy
+from utilities.naming import object_path_glob, paths_data
+from utilities.selector import (selector_config_match, selector_parse_fragment,
+                                selector_parse_op_fragment, selector_value_match)
+
+PATHS = [
+    "svc1",
+    "svc2",
+    "cluster",
+    "vol/v1",
+    "ns1/svc/web1",
+    "ns1/svc/web2",
+    "ns1/vol/web1",
+    "ns1/nscfg/namespace",
+    "ns2/svc/db1",
+    "ns2/svc/web1",
+    "ns2/cfg/db1",
+    "ns10/svc/web1",
+]
+
+SELECTORS = [
+    "**",
+    "*",
+    "svc1",
+    "ns1/svc/web1",
+    "ns9/svc/unknown",
+    "web*",
+    "ns1/**",
+    "ns1/",
+    "ns1/svc/",
+    "**/web1",
+    "*/svc/*",
+    "ns1*/svc/web*",
+    "vol/*",
+    "svc/web*",
+    "!ns1/**",
+    "!web*",
+    "ns1/**,ns2/**",
+    "ns1/**+*/svc/*",
+    "**/web1+!ns1/**",
+    "ns2/svc/web1,ns1/**,ns2/**",
+    "avail=down",
+    "ns1/**+.avail=down",
+    "!.avail=up",
+    "$.avail~do",
+    ".frozen>0",
+    ",",
+    "",
+]
+
+
+def legacy_object_selector(thr, selector=None, namespace=None, namespaces=None, kind=None, paths=None):
+    """
+    The object selector implementation before the compiled selectors.
+    """
+    if not selector:
+        return []
+    if namespace:
+        if namespaces is not None and namespace not in namespaces:
+            return []
+        namespaces = set([namespace])
+    if "root" in namespaces:
+        namespaces.add(None)
+
+    def list_cluster_paths():
+        return set(path for path, _, _ in thr.iter_services_configs())
+
+    if paths is None:
+        paths = list_cluster_paths()
+    pds = paths_data(paths)
+    pds = [pd for pd in pds if pd["namespace"] in namespaces]
+    if kind:
+        pds = [pd for pd in pds if pd["kind"] == kind]
+    if selector == "**":
+        return [pd["display"] for pd in pds]
+    if selector == "*":
+        kind = kind or "svc"
+        return [pd["display"] for pd in pds if pd["kind"] == kind]
+
+    def or_fragment_selector(s):
+        expanded = []
+        for _selector in s.split(","):
+            for p in and_fragment_selector(_selector):
+                if p in expanded:
+                    continue
+                expanded.append(p)
+        return expanded
+
+    def and_fragment_selector(s):
+        expanded = None
+        for _selector in s.split("+"):
+            _expanded = fragment_selector(_selector)
+            if expanded is None:
+                expanded = _expanded
+            else:
+                expanded = [p for p in expanded if p in _expanded]
+        return expanded
+
+    def fragment_selector(s):
+        if not s:
+            return []
+        if s in list_cluster_paths():
+            if s not in paths:
+                return []
+            return [s]
+        negate, s, elts = selector_parse_fragment(s)
+        if len(elts) == 1:
+            return object_path_glob(s, pds=pds, namespace=namespace, kind=kind, negate=negate)
+        try:
+            param, op, value = selector_parse_op_fragment(elts)
+        except ValueError:
+            return []
+        if param.startswith("."):
+            param = "$" + param
+        jsonpath_expr = parse(param) if param.startswith("$.") else None
+        expanded = []
+        for path in paths:
+            if jsonpath_expr:
+                ret = False
+                for match in jsonpath_expr.find(thr.object_data(path)):
+                    if selector_value_match(match.value, op, value):
+                        ret = True
+            else:
+                try:
+                    ret = selector_config_match(shared.SERVICES[path], param, op, value)
+                except KeyError:
+                    ret = False
+            if ret ^ negate:
+                expanded.append(path)
+        return expanded
+
+    return or_fragment_selector(selector)
+
+
+def set_paths(paths):
+    status = {
+        "monitor": {
+            "nodes": {
+                Env.nodename: {
+                    "services": {
+                        "config": dict((path, {"csum": "abc"}) for path in paths),
+                        "status": dict((path, {"avail": "up"}) for path in paths),
+                    },
+                },
+            },
+            "services": dict((path, {"avail": "down" if "web" in path else "up", "frozen": 0}) for path in paths),
+        },
+    }
+    shared.DAEMON_STATUS.set([], status)
+
+
+@pytest.fixture(scope='function')
+def thr(mocker, shared_data):
+    mocker.patch.object(shared, "PATHS_INDEX", PathsIndex())
+    mocker.patch.object(shared, "SELECTOR_CACHE", SelectorCache())
+    set_paths(PATHS)
+    thr = shared.OsvcThread()
+    set_lazy(thr, "cluster_nodes", [Env.nodename])
+    return thr
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestObjectSelector:
+    @staticmethod
+    @pytest.mark.parametrize("selector", SELECTORS)
+    @pytest.mark.parametrize("namespace, namespaces", [
+        (None, ["root", "ns1", "ns2", "ns10"]),
+        (None, ["ns1"]),
+        ("ns1", None),
+        ("ns2", ["ns1"]),
+    ])
+    @pytest.mark.parametrize("kind", [None, "svc"])
+    def test_same_selection_as_legacy(thr, selector, namespace, namespaces, kind):
+        expected = legacy_object_selector(thr, selector, namespace=namespace, namespaces=set(namespaces or []), kind=kind)
+        for _ in range(2):
+            # the second pass uses the cached selection
+            selected = thr.object_selector(selector, namespace=namespace, namespaces=set(namespaces or []), kind=kind)
+            assert sorted(selected) == sorted(expected)
+            assert len(selected) == len(set(selected))
+
+    @staticmethod
+    @pytest.mark.parametrize("selector", SELECTORS)
+    def test_same_selection_as_legacy_on_paths_subset(thr, selector):
+        paths = ["svc1", "ns1/svc/web1", "ns2/svc/web1", "ns3/svc/unknown"]
+        expected = legacy_object_selector(thr, selector, namespaces=set(["root", "ns1", "ns2", "ns3"]), paths=paths)
+        selected = thr.object_selector(selector, namespaces=set(["root", "ns1", "ns2", "ns3"]), paths=paths)
+        assert sorted(selected) == sorted(expected)
+
+    @staticmethod
+    def test_match_object_selector(thr):
+        assert thr.match_object_selector("ns1/**", namespaces=set(["ns1"]), path="ns1/svc/web1")
+        assert not thr.match_object_selector("ns1/**", namespaces=set(["ns1"]), path="ns2/svc/web1")
+
+    @staticmethod
+    def test_cached_selection_is_invalidated_on_path_set_change(thr):
+        assert sorted(thr.object_selector("ns2/**", namespaces=set(["ns2"]))) == ["ns2/cfg/db1", "ns2/svc/db1", "ns2/svc/web1"]
+        gen = shared.PATHS_INDEX.gen
+        set_paths(PATHS + ["ns2/svc/db2"])
+        assert sorted(thr.object_selector("ns2/**", namespaces=set(["ns2"]))) == ["ns2/cfg/db1", "ns2/svc/db1", "ns2/svc/db2", "ns2/svc/web1"]
+        assert shared.PATHS_INDEX.gen == gen + 1
+
+    @staticmethod
+    def test_returned_selection_can_be_modified(thr):
+        selected = thr.object_selector("ns1/**", namespaces=set(["ns1"]))
+        selected.append("foo")
+        assert "foo" not in thr.object_selector("ns1/**", namespaces=set(["ns1"]))
+
+    @staticmethod
+    def test_list_cluster_paths(thr):
+        assert thr.list_cluster_paths() == set(PATHS)
+
+
+@pytest.mark.ci
+class TestPathsIndex:
+    @staticmethod
+    def test_refresh_is_skipped_when_configs_are_unchanged():
+        index = PathsIndex()
+        nodes = {"n1": {"services": {"config": {"svc1": {}, "ns1/svc/s1": {}}}}}
+        assert index.refresh(nodes, ["n1"]) is True
+        assert index.refresh(nodes, ["n1"]) is False
+        assert index.gen == 1
+        assert index.namespaces == {"root": set(["svc1"]), "ns1": set(["ns1/svc/s1"])}
+        assert index.kinds == {"svc": set(["svc1", "ns1/svc/s1"])}
+
+    @staticmethod
+    def test_refresh_tracks_added_and_removed_paths():
+        index = PathsIndex()
+        index.refresh({"n1": {"services": {"config": {"svc1": {}}}}}, ["n1"])
+        index.refresh({
+            "n1": {"services": {"config": {"ns1/cfg/c1": {}}}},
+            "n2": {"services": {"config": {"ns1/cfg/c1": {}}}},
+        }, ["n1", "n2"])
+        assert index.paths == set(["ns1/cfg/c1"])
+        assert index.namespaces == {"ns1": set(["ns1/cfg/c1"])}
+        assert index.kinds == {"cfg": set(["ns1/cfg/c1"])}
+        assert index.gen == 2
+
+    @staticmethod
+    def test_refresh_ignores_non_cluster_nodes():
+        index = PathsIndex()
+        index.refresh({"n1": {"services": {"config": {"svc1": {}}}}, "n3": {"services": {"config": {"svc3": {}}}}}, ["n1", "n2"])
+        assert index.paths == set(["svc1"])
+
+
+@pytest.mark.ci
+class TestCompiledSelector:
+    @staticmethod
+    @pytest.mark.parametrize("selector, static", [
+        ("**", True),
+        ("ns1/**,web*", True),
+        ("ns1/**+!web*", True),
+        ("ns1/**+avail=up", False),
+        (".monitor.status=idle", False),
+    ])
+    def test_static(selector, static):
+        assert CompiledSelector(selector).static is static
+
+    @staticmethod
+    def test_jsonpath_parsed_once():
+        compiled = CompiledSelector(".monitor.status=idle")
+        fragment = compiled.terms[0][0]
+        assert fragment.jsonpath_expr is not None
+        assert fragment.op == "="
+        assert fragment.value == "idle"
+
+    @staticmethod
+    def test_cache_returns_the_same_compiled_selector():
+        cache = SelectorCache()
+        assert cache.compile("ns1/**") is cache.compile("ns1/**")
+
+    @staticmethod
+    def test_cache_selection_expires_with_generation():
+        cache = SelectorCache()
+        cache.set_selection(1, "key", ["a"])
+        assert cache.get_selection(1, "key") == ["a"]
+        assert cache.get_selection(2, "key") is None
+        cache.set_selection(2, "other", ["b"])
+        assert cache.get_selection(2, "key") is None
@@ -119,3 +119,105 @@ def test_call_suicide(
                             return_value=["arb" + str(i) for i in range(0, arbitrator_votes)])
         thr.split_handler()
         assert suicide.call_count == split_action_count
+
+
+@pytest.mark.ci
+class TestInstancesIndex:
+    @staticmethod
+    def nodes_status(instances):
+        return dict((nodename, {"services": {"config": {}, "status": dict((path, {"avail": "up"}) for path in paths)}})
+                    for nodename, paths in instances.items())
+
+    @staticmethod
+    def test_follows_the_node_data_set_and_unset():
+        data = shared.OsvcJournaledData()
+        data.set([], {"monitor": {"nodes": TestInstancesIndex.nodes_status({"n1": ["s1", "s2"], "n2": ["s1"]})}})
+        assert sorted(data.index.get("s1")) == ["n1", "n2"]
+        assert list(data.index.get("s2")) == ["n1"]
+        data.set(["monitor", "nodes", "n2"], TestInstancesIndex.nodes_status({"n2": ["s2"]})["n2"])
+        assert list(data.index.get("s1")) == ["n1"]
+        assert sorted(data.index.get("s2")) == ["n1", "n2"]
+        data.unset(["monitor", "nodes", "n1"])
+        assert data.index.get("s1") == {}
+        assert data.index.paths == {"n2": frozenset(["s2"])}
+
+    @staticmethod
+    def test_references_the_current_instance_data():
+        data = shared.OsvcJournaledData()
+        data.set([], {"monitor": {"nodes": TestInstancesIndex.nodes_status({"n1": ["s1"]})}})
+        data.set(["monitor", "nodes", "n1", "services", "status", "s1", "avail"], "down")
+        assert data.index.get("s1")["n1"]["avail"] == "down"
+        data.patch(["monitor", "nodes", "n1"], [
+            [["services", "status", "s2"], {"avail": "up"}],
+            [["services", "status", "s1"]],
+        ])
+        assert data.index.get("s1") == {}
+        assert data.index.get("s2")["n1"] is data.get(["monitor", "nodes", "n1", "services", "status", "s2"])
+        data.set(["monitor", "nodes", "n1", "services"], {})
+        assert data.index.get("s2") == {}
+        assert data.index.paths == {}
+
+    @staticmethod
+    def test_counts_the_transitioning_instances():
+        data = shared.OsvcJournaledData()
+        data.set([], {"monitor": {"nodes": TestInstancesIndex.nodes_status({"n1": ["s1", "s2", "s3"]})}})
+        assert data.index.transition_count("n1") == 0
+        data.set(["monitor", "nodes", "n1", "services", "status", "s1", "monitor"], {"status": "starting"})
+        data.set(["monitor", "nodes", "n1", "services", "status", "s2", "monitor"], {"status": "scaling"})
+        data.set(["monitor", "nodes", "n1", "services", "status", "s3", "monitor"], {"status": "stopping"})
+        assert data.index.transition_count("n1") == 2
+        data.set(["monitor", "nodes", "n1", "services", "status", "s1", "monitor", "status"], "idle")
+        data.unset(["monitor", "nodes", "n1", "services", "status", "s3"])
+        assert data.index.transition_count("n1") == 0
+
+    @staticmethod
+    def test_tracks_the_active_instances():
+        data = shared.OsvcJournaledData()
+        data.set([], {"monitor": {"nodes": TestInstancesIndex.nodes_status({"n1": ["s1", "s2", "s3"]})}})
+        assert data.index.active_paths("n1") == set()
+        data.set(["monitor", "nodes", "n1", "services", "status", "s1", "monitor"], {"status": "ready"})
+        data.set(["monitor", "nodes", "n1", "services", "status", "s2", "monitor"], {"status": "idle", "global_expect": "frozen"})
+        data.set(["monitor", "nodes", "n1", "services", "status", "s3", "monitor"], {"status": "idle"})
+        assert data.index.active_paths("n1") == set(["s1", "s2"])
+        data.unset(["monitor", "nodes", "n1", "services", "status", "s1"])
+        assert data.index.active_paths("n1") == set(["s2"])
+
+
+@pytest.mark.ci
+class TestChangedPaths:
+    @staticmethod
+    def test_records_the_instances_status_and_config_changes():
+        data = shared.OsvcJournaledData()
+        data.set([], {"monitor": {"nodes": TestInstancesIndex.nodes_status({"n1": ["s1", "s2"], "n2": ["s1"]})}})
+        assert data.pop_changed() is None
+        assert data.pop_changed() == set()
+        data.set(["monitor", "nodes", "n1", "services", "status", "s1", "avail"], "down")
+        data.patch(["monitor", "nodes", "n2"], [
+            [["services", "config", "s3"], {"csum": "abc"}],
+            [["services", "status", "s1"]],
+        ])
+        assert data.pop_changed() == set(["s1", "s3"])
+
+    @staticmethod
+    def test_ignores_the_unchanged_values_and_the_node_stats():
+        data = shared.OsvcJournaledData()
+        data.set([], {"monitor": {"nodes": TestInstancesIndex.nodes_status({"n1": ["s1"]}), "services": {}}})
+        data.pop_changed()
+        data.set(["monitor", "nodes", "n1", "services", "status", "s1", "avail"], "up")
+        data.set(["monitor", "nodes", "n1", "stats"], {"score": 10})
+        data.set(["monitor", "services", "s1"], {"avail": "up"})
+        assert data.pop_changed() == set()
+
+    @staticmethod
+    @pytest.mark.parametrize("path, value", [
+        (["monitor", "nodes", "n1", "frozen"], 1),
+        (["monitor", "nodes", "n1", "monitor"], {"status": "draining"}),
+        (["monitor", "nodes", "n2"], {}),
+        (["cluster"], {"nodes": ["n1", "n2"]}),
+    ])
+    def test_node_changes_affect_all_paths(path, value):
+        data = shared.OsvcJournaledData()
+        data.set([], {"monitor": {"nodes": TestInstancesIndex.nodes_status({"n1": ["s1"]})}})
+        data.pop_changed()
+        data.set(path, value)
+        assert data.pop_changed() is None
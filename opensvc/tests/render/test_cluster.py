@@ -1,7 +1,10 @@
 import pytest
 
+import utilities.render.cluster
 from env import Env
-from utilities.render.cluster import format_cluster
+from tests.bench import cluster_status
+from utilities.journaled_data import JournaledData
+from utilities.render.cluster import RenderCache, format_cluster
 
 
 @pytest.mark.ci
@@ -117,3 +120,42 @@ def test_show_monitor_show_hash_when_service_is_a_drp_node(mocker):
         assert output == """*/svc/flg1                  node1
  flg1      up ha    0/1   | X#   
 """
+
+
+def journaled_cluster_status():
+    data = cluster_status(n_objects=20, n_nodes=3, n_resources=1)
+    for ndata in data["monitor"]["nodes"].values():
+        for sdata in ndata["services"]["status"].values():
+            sdata["flex_target"] = 3
+    jdata = JournaledData()
+    jdata.set([], data)
+    return jdata
+
+
+@pytest.mark.ci
+class TestFormatClusterCache(object):
+    @staticmethod
+    def test_cached_output_is_the_uncached_output(mocker):
+        mocker.patch("utilities.render.color.use_color", "no")
+        jdata = journaled_cluster_status()
+        nodes = sorted(jdata.get(["monitor", "nodes"]))
+        paths = sorted(jdata.get(["monitor", "services"]))
+        cache = RenderCache()
+        format_cluster(paths=paths, node=nodes, data=jdata.get(), cache=cache)
+        for i, avail in enumerate(["down", "warn", "up"]):
+            jdata.patch([], [[["monitor", "nodes", nodes[i], "services", "status", paths[i], "avail"], avail]])
+            data = jdata.get()
+            assert format_cluster(paths=paths, node=nodes, data=data, cache=cache) == \
+                format_cluster(paths=paths, node=nodes, data=data)
+
+    @staticmethod
+    def test_only_changed_services_are_aggregated(mocker):
+        jdata = journaled_cluster_status()
+        nodes = sorted(jdata.get(["monitor", "nodes"]))
+        paths = sorted(jdata.get(["monitor", "services"]))
+        cache = RenderCache()
+        format_cluster(paths=paths, node=nodes, data=jdata.get(), cache=cache)
+        aggregate = mocker.spy(utilities.render.cluster, "aggregate_service")
+        jdata.patch([], [[["monitor", "nodes", nodes[1], "services", "status", paths[5], "avail"], "down"]])
+        format_cluster(paths=paths, node=nodes, data=jdata.get(), cache=cache)
+        assert [call[0][0] for call in aggregate.call_args_list] == [paths[5]]
@@ -1,4 +1,5 @@
 import os
+import threading
 
 import utilities.lock
 import pytest
@@ -45,6 +46,23 @@ def worker():
 
         assert status >> 8 == 66
 
+    @staticmethod
+    def test_lock_raise_lock_timeout_if_held_by_another_thread(tmp_file, timeout):
+        errors = []
+
+        def worker():
+            try:
+                utilities.lock.lock(lockfile=tmp_file, timeout=timeout, intent="test")
+            except utilities.lock.LockTimeout as exc:
+                errors.append(exc)
+
+        assert utilities.lock.lock(lockfile=tmp_file, timeout=timeout, intent="test") > 0
+        thr = threading.Thread(target=worker)
+        thr.start()
+        thr.join()
+        assert len(errors) == 1
+        assert errors[0].pid == os.getpid()
+
 
 @pytest.mark.ci
 class TestCmlockWhenNoLockDir:
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+
+import pytest
+
+import core.resourcestatus
+from core.resourcestatus import MAX_STATUS_HISTORY, ResourceStatusStore
+
+
+@pytest.fixture(scope='function')
+def var_d(tmpdir):
+    return str(tmpdir)
+
+
+def stored(var_d):
+    with open(os.path.join(var_d, "resources_status.json"), "r") as ofile:
+        return json.load(ofile)["resources"]
+
+
+def history_lines(store):
+    with open(store.fpath_history, "r") as ofile:
+        return [json.loads(line) for line in ofile]
+
+
+@pytest.mark.ci
+class TestResourceStatusStore:
+    @staticmethod
+    def test_get_unset_resource_returns_none(var_d):
+        assert ResourceStatusStore(var_d).get("fs#1") is None
+
+    @staticmethod
+    def test_set_is_visible_to_other_store_instances(var_d):
+        ResourceStatusStore(var_d).set("fs#1", {"status": "up"})
+        assert ResourceStatusStore(var_d).get("fs#1") == {"status": "up"}
+
+    @staticmethod
+    def test_unset_and_purge(var_d):
+        store = ResourceStatusStore(var_d)
+        store.set("fs#1", {"status": "up"})
+        store.set("fs#2", {"status": "down"})
+        store.unset("fs#1")
+        assert ResourceStatusStore(var_d).get("fs#1") is None
+        assert ResourceStatusStore(var_d).get("fs#2") == {"status": "down"}
+        store.purge()
+        assert ResourceStatusStore(var_d).get("fs#2") is None
+
+    @staticmethod
+    def test_batch_writes_the_store_once(var_d, mocker):
+        store = ResourceStatusStore(var_d)
+        write = mocker.spy(store, "write")
+        with store.batch():
+            with store.batch():
+                for i in range(50):
+                    store.set("fs#%d" % i, {"status": "up"})
+            assert write.call_count == 0
+            assert store.get("fs#1") == {"status": "up"}
+        assert write.call_count == 1
+        assert len(stored(var_d)) == 50
+
+    @staticmethod
+    def test_concurrent_stores_changes_are_merged(var_d):
+        store1 = ResourceStatusStore(var_d)
+        store2 = ResourceStatusStore(var_d)
+        store1.get("fs#1")
+        store2.get("fs#1")
+        with store1.batch():
+            store1.set("fs#1", {"status": "up"})
+            store2.set("fs#2", {"status": "down"})
+        assert stored(var_d) == {"fs#1": {"status": "up"}, "fs#2": {"status": "down"}}
+
+    @staticmethod
+    def test_unreadable_store_is_reset(var_d):
+        with open(os.path.join(var_d, "resources_status.json"), "w") as ofile:
+            ofile.write("{")
+        store = ResourceStatusStore(var_d)
+        assert store.get("fs#1") is None
+        store.set("fs#1", {"status": "up"})
+        assert ResourceStatusStore(var_d).get("fs#1") == {"status": "up"}
+
+
+@pytest.mark.ci
+class TestResourceStatusStoreHistory:
+    @staticmethod
+    def test_unchanged_status_is_not_logged(var_d):
+        store = ResourceStatusStore(var_d)
+        for status in ("up", "up", "down", "down", "up"):
+            store.append_history("fs#1", status)
+        assert [e["status"] for e in ResourceStatusStore(var_d).get_history("fs#1")] == ["up", "down", "up"]
+
+    @staticmethod
+    def test_history_is_capped_and_compacted(var_d):
+        store = ResourceStatusStore(var_d)
+        n = 2 * MAX_STATUS_HISTORY + 10
+        for i in range(n):
+            store.append_history("fs#1", "up" if i % 2 else "down", ts=i)
+        history = store.get_history("fs#1")
+        assert len(history) == MAX_STATUS_HISTORY
+        assert history[-1]["ts"] == n - 1
+        assert len(history_lines(store)) < n
+        assert ResourceStatusStore(var_d).get_history("fs#1") == history
+
+    @staticmethod
+    def test_forget(var_d):
+        store = ResourceStatusStore(var_d)
+        store.set("fs#1", {"status": "up"})
+        store.append_history("fs#1", "up")
+        store.append_history("fs#2", "down")
+        store.forget("fs#1")
+        other = ResourceStatusStore(var_d)
+        assert other.get("fs#1") is None
+        assert other.get_history("fs#1") == []
+        assert len(other.get_history("fs#2")) == 1
+
+    @staticmethod
+    def test_truncated_history_line_is_ignored(var_d):
+        store = ResourceStatusStore(var_d)
+        store.append_history("fs#1", "up", ts=1)
+        with open(store.fpath_history, "a") as ofile:
+            ofile.write('{"ts": 2, "sta')
+        assert ResourceStatusStore(var_d).get_history("fs#1") == [{"ts": 1, "status": "up"}]
+
+    @staticmethod
+    def test_history_append_waits_for_the_compaction(var_d):
+        store = ResourceStatusStore(var_d)
+        store.append_history("fs#1", "down", ts=1)
+        with ResourceStatusStore(var_d).flock():
+            thr = threading.Thread(target=store.append_history, args=("fs#1", "up"), kwargs={"ts": 2})
+            thr.start()
+            thr.join(0.2)
+            assert thr.is_alive()
+            assert len(history_lines(store)) == 1
+        thr.join()
+        assert [e["status"] for e in history_lines(store)] == ["down", "up"]
+
+    @staticmethod
+    def test_batch_appends_the_history_once(var_d, mocker):
+        store = ResourceStatusStore(var_d)
+        flush_history = mocker.spy(store, "flush_history")
+        with store.batch():
+            for i in range(50):
+                store.append_history("fs#%d" % i, "up")
+            assert store.get_history("fs#1")[0]["status"] == "up"
+        assert flush_history.call_count == 1
+        assert len(history_lines(store)) == 50
+
+
+@pytest.mark.ci
+class TestResourceStatusStoreMigration:
+    @staticmethod
+    def test_legacy_files_are_imported_and_removed(var_d):
+        legacy_d = os.path.join(var_d, "fs#1")
+        os.makedirs(legacy_d)
+        last = os.path.join(legacy_d, "status.last")
+        history = os.path.join(legacy_d, "status.history")
+        with open(last, "w") as ofile:
+            json.dump({"status": "up", "label": "/srv", "log": []}, ofile)
+        with open(history, "w") as ofile:
+            json.dump([{"ts": 1, "status": "down"}, {"ts": 2, "status": "up"}], ofile)
+
+        store = ResourceStatusStore(var_d)
+        assert store.get("fs#1") == {"status": "up", "label": "/srv", "log": []}
+        assert store.get_history("fs#1") == [{"ts": 1, "status": "down"}, {"ts": 2, "status": "up"}]
+        assert not os.path.exists(last)
+        assert not os.path.exists(history)
+        assert os.path.isdir(legacy_d)
+
+    @staticmethod
+    def test_migration_is_done_once(var_d, mocker):
+        ResourceStatusStore(var_d).set("fs#1", {"status": "up"})
+        os.makedirs(os.path.join(var_d, "fs#2"))
+        with open(os.path.join(var_d, "fs#2", "status.last"), "w") as ofile:
+            json.dump({"status": "down"}, ofile)
+        glob = mocker.spy(core.resourcestatus.glob, "glob")
+        assert ResourceStatusStore(var_d).get("fs#2") is None
+        assert glob.call_count == 0
+
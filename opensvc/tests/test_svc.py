@@ -1,6 +1,14 @@
+import os
+import threading
+import time
+
 import pytest
 
+import core.status
 from core.objects.svc import Svc
+from drivers.resource.fs.flag import BaseFsFlag
+from env import Env
+from utilities.lazy import set_lazy
 
 
 @pytest.fixture(scope='function', name='svc')
@@ -55,3 +63,137 @@ def test_has_fs_flag_resource(mock_sysname, svc):
         mock_sysname('Linux')
         flag_resource = svc.get_resource('fs#flag1')
         assert flag_resource.type == 'fs.flag'
+
+
+@pytest.fixture(scope='function')
+def has_service_with_fs_flags(osvc_path_tests):
+    pathetc = Env.paths.pathetc
+    os.mkdir(pathetc)
+    with open(os.path.join(pathetc, 'svc.conf'), mode='w+') as svc_file:
+        config_txt = """
+[DEFAULT]
+id = abcd
+
+[fs#1]
+type = flag
+subset = a
+
+[fs#2]
+type = flag
+subset = a
+
+[fs#3]
+type = flag
+subset = a
+
+[fs#4]
+type = flag
+subset = b
+
+[fs#5]
+type = flag
+subset = b
+"""
+        svc_file.write(config_txt)
+
+
+@pytest.fixture(scope='function')
+def slow_status(mocker):
+    calls = {}
+
+    def _status(self, verbose=False):
+        begin = time.time()
+        time.sleep(0.1)
+        calls[self.rid] = (begin, time.time(), threading.current_thread())
+        return core.status.UP
+
+    mocker.patch.object(BaseFsFlag, '_status', _status)
+    return calls
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('has_service_with_fs_flags')
+class TestSvcParallelStatus:
+    @staticmethod
+    def test_resources_of_a_set_are_evaluated_concurrently(mock_sysname, slow_status, svc):
+        mock_sysname('Linux')
+        set_lazy(svc, 'status_workers', 4)
+        begin = time.time()
+        status = svc.group_status(refresh=True)
+        assert time.time() - begin < 0.4
+        assert status["avail"].status == core.status.UP
+        assert len(set(thr for _, _, thr in slow_status.values())) > 1
+
+    @staticmethod
+    def test_resource_sets_are_barriers(mock_sysname, slow_status, svc):
+        mock_sysname('Linux')
+        set_lazy(svc, 'status_workers', 4)
+        svc.group_status(refresh=True)
+        a_end = max(slow_status[rid][1] for rid in ('fs#1', 'fs#2', 'fs#3'))
+        b_begin = min(slow_status[rid][0] for rid in ('fs#4', 'fs#5'))
+        assert b_begin >= a_end
+
+    @staticmethod
+    def test_non_thread_safe_drivers_are_evaluated_serially(mocker, mock_sysname, slow_status, svc):
+        mock_sysname('Linux')
+        set_lazy(svc, 'status_workers', 4)
+        mocker.patch.object(BaseFsFlag, 'status_thread_safe', False)
+        svc.group_status(refresh=True)
+        assert set(thr for _, _, thr in slow_status.values()) == set([threading.current_thread()])
+
+    @staticmethod
+    def test_one_worker_disables_the_pool(mock_sysname, slow_status, svc):
+        mock_sysname('Linux')
+        set_lazy(svc, 'status_workers', 1)
+        svc.group_status(refresh=True)
+        assert set(thr for _, _, thr in slow_status.values()) == set([threading.current_thread()])
+
+    @staticmethod
+    def test_status_duration_is_recorded(mock_sysname, slow_status, svc):
+        mock_sysname('Linux')
+        set_lazy(svc, 'status_workers', 4)
+        svc.get_node()
+        data = svc.print_status_data_eval(refresh=True, write_data=False)
+        for rid in ('fs#1', 'fs#4'):
+            assert data["resources"][rid]["status_duration"] >= 0.1
+
+    @staticmethod
+    def test_status_duration_is_loaded_from_the_status_cache(mock_sysname, slow_status, svc):
+        mock_sysname('Linux')
+        svc.group_status(refresh=True)
+        resource = svc.get_resource('fs#1')
+        resource.clear_status_cache()
+        assert resource.last_status_duration is None
+        resource.status()
+        assert resource.last_status_duration >= 0.1
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('has_service_with_fs_flags')
+class TestSvcResourceStatusStore:
+    @staticmethod
+    def test_status_eval_writes_the_store_once(mocker, mock_sysname, svc):
+        mock_sysname('Linux')
+        svc.get_node()
+        write = mocker.spy(svc.status_store, 'write')
+        svc.print_status_data_eval(refresh=True, write_data=False)
+        assert write.call_count == 1
+        assert sorted(svc.status_store.data) == ['fs#1', 'fs#2', 'fs#3', 'fs#4', 'fs#5']
+        assert not os.path.exists(os.path.join(svc.var_d, 'fs#1', 'status.last'))
+
+    @staticmethod
+    def test_cached_status_is_loaded_from_the_store(mock_sysname, svc):
+        mock_sysname('Linux')
+        svc.group_status(refresh=True)
+        other = Svc(name='svc')
+        resource = other.get_resource('fs#1')
+        assert resource.has_status_last()
+        assert resource.status() == core.status.DOWN
+        assert [e["status"] for e in resource.load_status_history()] == ['down']
+
+    @staticmethod
+    def test_purge_status_last(mock_sysname, svc):
+        mock_sysname('Linux')
+        svc.group_status(refresh=True)
+        svc.purge_status_last()
+        assert not Svc(name='svc').get_resource('fs#1').has_status_last()
@@ -7,7 +7,7 @@
 mod_d = os.path.realpath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, mod_d)
 
-from commands.svcmon import main
+from commands.svcmon import CURSORPOS, CLEAREOL, CLEAREOS, format_screen, main
 
 
 class TestSvcmon:
@@ -25,3 +25,11 @@ def test_012_svcmon_filter(self):
         ret = main(argv=["-s", "abdcef"])
         assert ret == 1
 
+
+    def test_013_format_screen(self):
+        """
+        svcmon --watch only rewrites the changed lines
+        """
+        assert format_screen(["a", "b", "c"], ["a", "x", "c", "d"]) == \
+            CURSORPOS % 2 + "b" + CLEAREOL + CURSORPOS % 4 + CLEAREOS + CURSORPOS % 3
+        assert format_screen(["a", "b"], ["a", "b"]) == CURSORPOS % 2
@@ -1,10 +1,13 @@
 # coding: utf-8
 import datetime
 import logging
+import threading
+import time
 
 import pytest
 
 from core.extconfig import read_cf, eval_expr
+import utilities.lock
 from utilities.chunker import chunker
 from utilities.files import *
 from utilities.naming import *
@@ -73,6 +76,30 @@ def foo(self, _, data=None):
         clear_cache("foo.bar")
         purge_cache()
 
+    @staticmethod
+    def test_cache_lock_is_released_on_error():
+        """
+        Session cache lock release when the cached function raises
+        """
+        class ObjTest(object):
+            @cache("foo.error")
+            def foo(self, fail):
+                if fail:
+                    raise ValueError
+                return 1
+        test_obj = ObjTest()
+        with pytest.raises(ValueError):
+            test_obj.foo(True)
+        lockfile = cache_fpath("foo.error") + ".lock"
+        lockfds = []
+        thr = threading.Thread(target=lambda: lockfds.append(utilities.lock.lock_nowait(lockfile)))
+        thr.start()
+        thr.join()
+        assert len(lockfds) == 1
+        utilities.lock.unlock(lockfds[0])
+        assert test_obj.foo(False) == 1
+        purge_cache()
+
     @staticmethod
     def test_lazy():
         """
@@ -94,6 +121,30 @@ def foo(self):
         unset_all_lazy(testobj)
         assert lazy_initialized(testobj, "foo") is False
 
+    @staticmethod
+    def test_lazy_is_initialized_once_by_concurrent_threads():
+        """
+        Lazy properties read by concurrent threads
+        """
+        class Test(object):
+            calls = []
+
+            @lazy
+            def foo(self):
+                self.calls.append(1)
+                time.sleep(0.05)
+                return object()
+        testobj = Test()
+        values = []
+        threads = [threading.Thread(target=lambda: values.append(testobj.foo)) for _ in range(8)]
+        for thr in threads:
+            thr.start()
+        for thr in threads:
+            thr.join()
+        assert len(Test.calls) == 1
+        assert len(values) == 8
+        assert all(value is values[0] for value in values)
+
     @staticmethod
     def test_fcache():
         """
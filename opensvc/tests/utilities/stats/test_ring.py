@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from utilities.stats.ring import Ring, RingStore
+
+
+@pytest.mark.ci
+class TestRing(object):
+    @staticmethod
+    def test_read_after_wrap_around(tmpdir):
+        ring = Ring(os.path.join(str(tmpdir), "r.ring"), 2, nslots=4, step=60)
+        for i in range(6):
+            ring.append(60.0 * i, [i, 10 * i])
+        assert ring.read() == [(60.0 * i, [i, 10 * i]) for i in range(2, 6)]
+        assert ring.read(start=150, end=240) == [(180.0, [3, 30]), (240.0, [4, 40])]
+        assert ring.read(start=400) == []
+        assert (ring.first(), ring.last()) == (120.0, 300.0)
+
+    @staticmethod
+    def test_reopen_keeps_samples_unless_the_format_changed(tmpdir):
+        path = os.path.join(str(tmpdir), "r.ring")
+        ring = Ring(path, 2, nslots=4, step=60)
+        ring.append(60.0, [1, 2])
+        ring.close()
+        ring = Ring(path, 2, nslots=4, step=60)
+        assert ring.read() == [(60.0, [1, 2])]
+        ring.close()
+        assert Ring(path, 2, readonly=True).read() == [(60.0, [1, 2])]
+        ring = Ring(path, 3, nslots=4, step=60)
+        assert ring.read() == []
+        with pytest.raises(ValueError):
+            Ring(path, 2, readonly=True)
+
+
+@pytest.mark.ci
+class TestRingStore(object):
+    @staticmethod
+    def test_read_merges_the_instances(tmpdir):
+        store = RingStore(str(tmpdir), nslots=10, step=60)
+        store.append("fs_u", "/", 60.0, [1, 2])
+        store.append("fs_u", "/var/lib", 60.0, [3, 4])
+        store.append("fs_u", "/", 120.0, [5, 6])
+        store.close()
+        assert RingStore(str(tmpdir)).keys("fs_u") == ["/", "/var/lib"]
+        samples, first = RingStore(str(tmpdir)).read("fs_u", 2, start=60, end=120)
+        assert samples == [
+            (60.0, "/", [1, 2]),
+            (60.0, "/var/lib", [3, 4]),
+            (120.0, "/", [5, 6]),
+        ]
+        assert first == 60.0
+        assert RingStore(str(tmpdir)).last("fs_u", 2) == 120.0
+        assert RingStore(str(tmpdir)).read("cpu", 10) == ([], None)
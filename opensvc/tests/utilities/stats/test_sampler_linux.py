@@ -0,0 +1,116 @@
+import datetime
+import os
+
+import pytest
+
+from utilities.stats.provider.linux import StatsProvider
+from utilities.stats.sampler.linux import Sampler
+
+MEMINFO = """MemTotal:        1000 kB
+MemFree:          200 kB
+MemAvailable:     500 kB
+Buffers:          100 kB
+Cached:           200 kB
+SwapCached:        10 kB
+Active:           300 kB
+Inactive:         100 kB
+SwapTotal:       1000 kB
+SwapFree:         900 kB
+Dirty:              5 kB
+Committed_AS:     400 kB
+"""
+
+NETDEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: {rx} 10 0 0 0 0 0 0 {rx} 10 0 0 0 0 0 0
+  eth0: {rx} {pkts} 1 0 0 0 0 0 {tx} {pkts} 0 0 0 0 0 0
+ veth1: {rx} 10 0 0 0 0 0 0 {tx} 10 0 0 0 0 0 0
+"""
+
+
+def write(path, buff):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as ofile:
+        ofile.write(buff)
+
+
+@pytest.fixture(scope='function')
+def sampler(tmpdir):
+    thr = Sampler(interval=60, path=os.path.join(str(tmpdir), "ring"))
+    thr.proc = os.path.join(str(tmpdir), "proc")
+    thr.sysfs = os.path.join(str(tmpdir), "sys")
+    os.makedirs(os.path.join(thr.sysfs, "block", "sda"))
+    write(os.path.join(thr.proc, "meminfo"), MEMINFO)
+    write(os.path.join(thr.proc, "loadavg"), "0.50 0.25 0.10 2/300 1234\n")
+    write(os.path.join(thr.proc, "self", "mounts"), "/dev/sda1 %s ext4 rw 0 0\nsrv:/x /mnt/x nfs rw 0 0\n" % str(tmpdir))
+    return thr
+
+
+def counters(sampler, i):
+    write(os.path.join(sampler.proc, "stat"), "cpu  %d 0 %d %d 0 0 0 0 0 0\ncpu0 %d 0 %d %d 0 0 0 0 0 0\nintr 1\n" % ((
+        100 + 30 * i, 100 + 10 * i, 100 + 60 * i) * 2))
+    write(os.path.join(sampler.proc, "diskstats"),
+          "   8       0 sda %d 0 %d 0 %d 0 %d 0 0 %d 0\n"
+          "   8       1 sda1 %d 0 %d 0 %d 0 %d 0 0 %d 0\n" % ((60 * i + 1, 600 * i, 120 * i, 1200 * i, 3000 * i) * 2))
+    write(os.path.join(sampler.proc, "net", "dev"), NETDEV.format(rx=61440 * i, tx=30720 * i, pkts=60 * i))
+
+
+@pytest.mark.ci
+class TestSampler(object):
+    @staticmethod
+    def test_rates(sampler):
+        counters(sampler, 0)
+        sampler.sample(60.0)
+        assert ("cpu", "all") not in sampler.store.rings
+        counters(sampler, 1)
+        sampler.sample(120.0)
+        assert sampler.store.ring("cpu", "all", 10).read() == [(120.0, [30.0, 0, 10.0, 0, 0, 0, 0, 0, 0, 60.0])]
+        assert sampler.store.ring("block", "all", 5).read() == [(120.0, [3.0, 1.0, 2.0, 10.0, 20.0])]
+        assert sorted(key for metric, key in sampler.store.rings if metric == "blockdev") == ["sda"]
+        assert sampler.store.ring("netdev", "eth0", 4).read() == [(120.0, [1.0, 1.0, 1.0, 0.5])]
+        assert sorted(key for metric, key in sampler.store.rings if metric == "netdev") == ["eth0"]
+        assert sampler.store.ring("proc", "all", 5).read()[-1] == (120.0, [2, 300, 0.5, 0.25, 0.1])
+        assert sampler.store.ring("mem_u", "all", 11).read()[-1][1][:4] == [200, 500, 500, 50.0]
+        assert sampler.store.ring("swap", "all", 5).read()[-1][1] == [900, 100, 10.0, 10, 10.0]
+        assert [metric for metric, key in sampler.store.rings if metric == "fs_u"] == ["fs_u"]
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('osvc_path_tests')
+class TestStatsProvider(object):
+    @staticmethod
+    def test_ring_stats(mocker):
+        now = datetime.datetime.now().replace(microsecond=0)
+        sampler = Sampler(interval=60)
+        ts = float(now.strftime("%s")) - 120
+        sampler.store.append("cpu", "all", ts, [1.5, 0, 2, 0, 0, 0, 0, 0, 0, 96.5])
+        sampler.store.append("fs_u", "/", ts, [1024, 50])
+        sampler.close()
+        sar = mocker.patch.object(StatsProvider, "cpu", return_value=([], []))
+        provider = StatsProvider(interval=2)
+        cols, lines = provider.get("cpu")
+        assert cols[:3] == ["date", "cpu", "usr"]
+        date = datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        assert lines == [[date, "all", "1.50", "0", "2", "0", "0", "0", "0", "0", "0", "96.50", provider.nodename]]
+        assert provider.get("fs_u")[1] == [[datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S.%f"), provider.nodename, "/", "1024", "50"]]
+        assert sar.call_count == 0
+
+    @staticmethod
+    def test_sar_data_older_than_the_ring_data():
+        now = datetime.datetime.now().replace(microsecond=0)
+        sampler = Sampler(interval=60)
+        ts = float(now.strftime("%s")) - 120
+        sampler.store.append("proc", "all", ts, [1, 100, 0.5, 0.5, 0.5])
+        sampler.close()
+        provider = StatsProvider(interval=60)
+        older = (now - datetime.timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")
+        sar_lines = [[older, "1", "100", "0.1", "0.1", "0.1", provider.nodename],
+                     [now.strftime("%Y-%m-%d %H:%M:%S"), "1", "100", "0.1", "0.1", "0.1", provider.nodename]]
+
+        def sar(d, day, start, end):
+            lines = [line for line in sar_lines if "%s %s" % (d, start) <= line[0] <= "%s %s" % (d, end)]
+            return ["date", "runq_sz", "plist_sz", "ldavg_1", "ldavg_5", "ldavg_15", "nodename"], lines
+        provider.proc = sar
+        cols, lines = provider.get("proc")
+        assert [line[0] for line in lines] == [older, datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")]
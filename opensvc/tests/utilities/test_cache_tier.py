@@ -0,0 +1,98 @@
+import pytest
+
+import utilities.cache
+from utilities.cache import cache, clear_cache, set_cache_tier
+from utilities.cache.tier import DaemonTier, ResultCache
+
+
+@pytest.fixture(scope="function")
+def tier(mocker):
+    mocker.patch.object(utilities.cache, "TIER", None)
+    mocker.patch.object(utilities.cache, "TIER_RESOLVED", False)
+    tier = ResultCache()
+    set_cache_tier(tier)
+    return tier
+
+
+class Obj(object):
+    def __init__(self):
+        self.calls = 0
+
+    @cache("tier.test.{args[1]}")
+    def get(self, key):
+        self.calls += 1
+        return [key, self.calls]
+
+
+@pytest.mark.ci
+class TestResultCache:
+    @staticmethod
+    def test_expire():
+        rcache = ResultCache()
+        rcache.put("a", [1], ttl=10, now=100)
+        assert rcache.get("a", now=105) == [1]
+        with pytest.raises(KeyError):
+            rcache.get("a", now=111)
+        assert rcache.stats()["entries"] == 0
+        assert rcache.stats()["size"] == 0
+        assert rcache.stats()["expired"] == 1
+
+    @staticmethod
+    def test_lru_eviction():
+        rcache = ResultCache(max_size=30)
+        rcache.put("a", "x" * 5)
+        rcache.put("b", "x" * 5)
+        rcache.put("c", "x" * 5)
+        rcache.get("a")
+        rcache.put("d", "x" * 5)
+        assert sorted(rcache.data) == ["a", "c", "d"]
+        assert rcache.stats()["evictions"] == 1
+        rcache.resize(0)
+        assert rcache.stats()["entries"] == 0
+
+    @staticmethod
+    def test_cached_values_are_copies():
+        rcache = ResultCache()
+        rcache.put("a", {"k": [1]})
+        rcache.get("a")["k"].append(2)
+        assert rcache.get("a") == {"k": [1]}
+
+    @staticmethod
+    def test_counters():
+        rcache = ResultCache()
+        with pytest.raises(KeyError):
+            rcache.get("a")
+        rcache.put("a", 1)
+        rcache.get("a")
+        rcache.clear(["a", "b"])
+        stats = rcache.stats()
+        assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 1, 1)
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestCacheTier:
+    @staticmethod
+    def test_results_are_shared_between_sessions(tier, mocker):
+        obj = Obj()
+        assert obj.get("x") == ["x", 1]
+        mocker.patch.dict("os.environ", {"OSVC_CACHE_UUID": "other-session"})
+        assert Obj().get("x") == ["x", 1]
+        assert tier.stats()["hits"] == 1
+
+    @staticmethod
+    def test_clear_cache_invalidates_the_tier(tier):
+        obj = Obj()
+        obj.get("x")
+        clear_cache("tier.test.x")
+        assert obj.get("x") == ["x", 2]
+        assert tier.stats()["invalidations"] == 1
+
+    @staticmethod
+    def test_fallback_to_the_session_cache(mocker, tmpdir):
+        mocker.patch.object(utilities.cache, "TIER_RESOLVED", True)
+        mocker.patch.object(utilities.cache, "TIER", DaemonTier(path=str(tmpdir.join("nosock"))))
+        obj = Obj()
+        assert obj.get("y") == ["y", 1]
+        assert utilities.cache.TIER is None
+        assert obj.get("y") == ["y", 1]
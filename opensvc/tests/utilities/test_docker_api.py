@@ -0,0 +1,263 @@
+import json
+import os
+import re
+import threading
+import time
+
+import pytest
+
+from foreign.six.moves import BaseHTTPServer, queue, socketserver
+
+import utilities.subsystems.docker as dockerlib
+from daemon.handlers.container.states.get import Handler as GetContainerStates
+import daemon.shared as shared
+from env import Env
+from utilities.subsystems.docker_api import (ContainerStates, EngineClient,
+                                             EngineNotFound, ps_entry)
+
+
+def inspect_data(cid, name, status="running"):
+    return {
+        "Id": cid,
+        "Name": "/" + name,
+        "Config": {"Image": "busybox", "Labels": {"com.opensvc.id": cid + ".container#1"}},
+        "State": {"Status": status, "Running": status == "running"},
+    }
+
+
+class FakeEngineHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        buff = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(buff)))
+        self.end_headers()
+        self.wfile.write(buff)
+
+    def do_GET(self):
+        engine = self.server
+        engine.requests.append(self.path)
+        path = self.path.split("?")[0]
+        if engine.close_after:
+            # close without notice, like an engine idle timeout
+            engine.close_after = False
+            self.close_connection = True
+        match = re.match(r"^/containers/([^/]+)/json$", path)
+        if path == "/_ping":
+            buff = b"OK"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(buff)))
+            self.end_headers()
+            self.wfile.write(buff)
+        elif path == "/containers/json":
+            self.send_json([{"Id": cid, "Names": ["/" + data["Name"].lstrip("/")], "State": data["State"]["Status"],
+                             "Labels": data["Config"]["Labels"]} for cid, data in engine.containers.items()])
+        elif match:
+            try:
+                self.send_json(engine.containers[match.group(1)])
+            except KeyError:
+                self.send_json({"message": "No such container: %s" % match.group(1)}, status=404)
+        elif path == "/info":
+            self.send_json({"DockerRootDir": "/var/lib/docker", "Driver": "overlay2"})
+        elif path == "/version":
+            self.send_json({"Version": "20.10.5"})
+        elif path == "/images/json":
+            self.send_json([{"Id": "sha256:abc", "RepoTags": ["busybox:latest"]}])
+        elif path == "/events":
+            self.send_events()
+        else:
+            self.send_json({"message": "page not found"}, status=404)
+
+    def send_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        self.server.subscribed.set()
+        while True:
+            event = self.server.events.get()
+            if event is None:
+                self.wfile.write(b"0\r\n\r\n")
+                self.close_connection = True
+                return
+            buff = json.dumps(event).encode() + b"\n"
+            self.wfile.write(("%x\r\n" % len(buff)).encode() + buff + b"\r\n")
+            self.wfile.flush()
+
+
+class FakeEngine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        socketserver.UnixStreamServer.__init__(self, path, FakeEngineHandler)
+        self.containers = {}
+        self.requests = []
+        self.connections = 0
+        self.close_after = False
+        self.events = queue.Queue()
+        self.subscribed = threading.Event()
+
+    def get_request(self):
+        request, _ = socketserver.UnixStreamServer.get_request(self)
+        # the handlers expect a client address tuple
+        return request, ("local", 0)
+
+
+@pytest.fixture(scope="function")
+def engine(tmp_path):
+    path = os.path.join(str(tmp_path), "docker.sock")
+    server = FakeEngine(path)
+    server.containers = {
+        "c1": inspect_data("c1", "svc1.container.1"),
+        "c2": inspect_data("c2", "svc1.container.2", status="exited"),
+    }
+    thr = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thr.daemon = True
+    thr.start()
+    yield server
+    server.events.put(None)
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(fn, timeout=5):
+    limit = time.time() + timeout
+    while time.time() < limit:
+        if fn():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.ci
+class TestEngineClient:
+    @staticmethod
+    def test_requests_reuse_the_connection(engine):
+        client = EngineClient(engine.server_address)
+        assert client.ping()
+        assert sorted(c["Id"] for c in client.containers()) == ["c1", "c2"]
+        data = client.inspect_many(["c1", "c3", "c2"])
+        assert [c["Id"] for c in data] == ["c1", "c2"]
+        assert client.info()["Driver"] == "overlay2"
+        assert client.requests == 6
+        assert client.connects == 1
+        assert engine.connections == 1
+        client.close()
+
+    @staticmethod
+    def test_not_found(engine):
+        client = EngineClient(engine.server_address)
+        with pytest.raises(EngineNotFound):
+            client.inspect("c3")
+
+    @staticmethod
+    def test_closed_idle_connection_is_reopened(engine):
+        client = EngineClient(engine.server_address)
+        engine.close_after = True
+        assert client.inspect("c1")["Id"] == "c1"
+        time.sleep(0.1)
+        assert client.inspect("c2")["Id"] == "c2"
+        assert client.connects == 2
+
+    @staticmethod
+    def test_ps_entry_formats():
+        labels = {"com.opensvc.id": "c1.container#1"}
+        summary = {"Id": "c1", "Names": ["/a"], "State": "running", "Labels": labels, "Image": "busybox"}
+        expected = {
+            "ID": "c1",
+            "Names": "a",
+            "Labels": labels,
+            "Image": "busybox",
+            "State": "running",
+        }
+        assert ps_entry(summary) == expected
+        assert ps_entry(inspect_data("c1", "a")) == expected
+
+
+@pytest.mark.ci
+class TestContainerStates:
+    @staticmethod
+    def test_events_refresh_the_states(engine):
+        states = ContainerStates(EngineClient(engine.server_address))
+        thr = threading.Thread(target=states.watch)
+        thr.daemon = True
+        thr.start()
+        assert wait_for(lambda: states.ready)
+        assert states.data["c2"]["State"]["Status"] == "exited"
+
+        engine.containers["c2"] = inspect_data("c2", "svc1.container.2")
+        engine.events.put({"Type": "container", "Action": "start", "Actor": {"ID": "c2"}})
+        assert wait_for(lambda: states.data["c2"]["State"]["Status"] == "running")
+
+        del engine.containers["c1"]
+        engine.events.put({"Type": "container", "Action": "destroy", "Actor": {"ID": "c1"}})
+        assert wait_for(lambda: "c1" not in states.data)
+        assert [c["ID"] for c in states.dump()["ps"]] == ["c2"]
+        assert states.dump(ids=["c1", "c2"])["inspect"] == [engine.containers["c2"]]
+
+        requests = len(engine.requests)
+        engine.events.put({"Type": "container", "Action": "exec_start: sh", "Actor": {"ID": "c2"}})
+        engine.events.put(None)
+        thr.join(5)
+        assert not thr.is_alive()
+        assert not states.ready
+        assert len(engine.requests) == requests
+
+
+class Tier(object):
+    """
+    The daemon tier, serving the container states handler in-process.
+    """
+    def request(self, method, action, options):
+        result = GetContainerStates().action(Env.nodename, options=options)
+        if result["status"] == 404:
+            raise KeyError(options.get("sock"))
+        return result
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestDockerLibEngine:
+    @staticmethod
+    def lib(engine, mocker):
+        from core.objects.svc import Svc
+        mocker.patch.object(dockerlib, "default_sock", return_value=engine.server_address)
+        mocker.patch.object(dockerlib, "justcall", side_effect=AssertionError("docker command executed"))
+        mocker.patch.object(dockerlib, "daemon_tier", return_value=None)
+        return dockerlib.DockerLib(Svc("svc1"))
+
+    @staticmethod
+    def test_reads_use_the_engine_api(engine, mocker):
+        lib = TestDockerLibEngine.lib(engine, mocker)
+        assert lib.container_data_dir == "/var/lib/docker"
+        assert lib.get_running_instance_ids() == ["c1"]
+        assert lib.container_by_name["svc1.container.2"][0]["ID"] == "c2"
+        assert lib.container_by_label["com.opensvc.id=c1.container#1"][0]["ID"] == "c1"
+        assert lib.get_image_id("busybox") == "abc"
+        assert lib.docker_version == "20.10.5"
+        assert lib._docker_working()
+        assert engine.connections == 2
+
+    @staticmethod
+    def test_first_load_uses_the_daemon_states(engine, mocker):
+        lib = TestDockerLibEngine.lib(engine, mocker)
+        mocker.patch.object(dockerlib, "daemon_tier", return_value=Tier())
+        states = ContainerStates(EngineClient(engine.server_address))
+        states.load()
+        mocker.patch.object(shared, "CONTAINER_STATES", {engine.server_address: states})
+        engine.containers["c2"] = inspect_data("c2", "svc1.container.2")
+        requests = len(engine.requests)
+        assert lib.get_running_instance_ids() == ["c1"]
+        assert len(engine.requests) == requests
+        assert sorted(lib.get_running_instance_ids(refresh=True)) == ["c1", "c2"]
+        assert len(engine.requests) == requests + 1
@@ -1,3 +1,4 @@
+import random
 import sys
 from copy import deepcopy
 
@@ -506,3 +507,169 @@ def test_get_full_return_relative_view_from_arg_path():
         data.set(path=["a"], value={"one": 1})
         view = JournaledDataView(data=data, path=["a"])
         assert view.get_full(path=["one"]) == 1
+
+
+@pytest.mark.ci
+class TestJournaledDataSnapshot(object):
+    @staticmethod
+    def test_snapshot_is_not_modified_by_set_unset_and_patch():
+        data = JournaledData(journal_head=[])
+        data.set(path=[], value={"a": {"b": 0, "c": [1, 2]}, "d": {"e": 1}})
+        snapshot = data.get_snapshot()
+        data.set(path=["a", "b"], value=1)
+        data.set(path=["a", "c", 2], value=3)
+        data.unset(path=["d", "e"])
+        data.patch(patchset=[[["f"], "F"], [["a", "c", 0]]])
+        assert snapshot == {"a": {"b": 0, "c": [1, 2]}, "d": {"e": 1}}
+        assert data.dump_data() == {"a": {"b": 1, "c": [2, 3]}, "d": {}, "f": "F"}
+
+    @staticmethod
+    def test_set_shares_unchanged_subtrees():
+        data = JournaledData()
+        data.set(path=[], value={"a": {"b": 0}, "d": {"e": 1}})
+        snapshot = data.get_snapshot()
+        data.set(path=["a", "b"], value=1)
+        assert data.get_snapshot() is not snapshot
+        assert data.get_snapshot(["d"]) is snapshot["d"]
+
+    @staticmethod
+    def test_set_value_is_not_modified_by_caller():
+        value = {"b": [0]}
+        data = JournaledData(journal_head=[])
+        data.set(path=["a"], value=value)
+        value["b"].append(1)
+        assert data.get(["a"]) == {"b": [0]}
+        assert data.dump_changes() == [[["a"], {"b": [0]}]]
+
+    @staticmethod
+    def test_get_copy_is_modifiable():
+        data = JournaledData()
+        data.set(path=[], value={"a": {"b": [0]}})
+        copied = data.get_copy()
+        copied["a"]["b"].append(1)
+        assert data.get(["a", "b"]) == [0]
+
+
+def legacy_diff(src, dst, prefix=None):
+    """
+    The reference get_ref() based diff implementation.
+    """
+    data = []
+    prefix = prefix or []
+    added = []
+
+    def recurse(d1, d2, path=None, changes=True):
+        try:
+            ref_v = JournaledData.get_ref(path, d2)
+        except (KeyError, IndexError, TypeError):
+            yield [path, d1]
+        else:
+            if ref_v is None and d1 is not None:
+                yield [path, d1]
+            elif isinstance(d1, dict):
+                for k, v in d1.items():
+                    for _ in recurse(v, d2, path=path+[k], changes=changes):
+                        yield _
+            elif isinstance(d1, list):
+                if prefix+path not in added:
+                    if changes:
+                        iterator = enumerate(d1)
+                    else:
+                        iterator = reversed(list(enumerate(d1)))
+                    for i, v in iterator:
+                        for _ in recurse(v, d2, path=path+[i], changes=changes):
+                            yield _
+            elif changes and ref_v != d1:
+                yield [path, d1]
+
+    for k, v in recurse(dst, src, [], changes=True):
+        data.append([prefix+k, v])
+        added.append(prefix+k)
+
+    for k, v in recurse(src, dst, [], changes=False):
+        data.append([prefix+k])
+
+    return data
+
+
+def random_scalar(rnd, with_none=False):
+    choices = [rnd.randint(0, 3), "s%d" % rnd.randint(0, 3), rnd.random() < 0.5]
+    if with_none:
+        choices.append(None)
+    return rnd.choice(choices)
+
+
+def random_tree(rnd, depth=3, with_none=False):
+    kind = rnd.choice(["dict", "list", "scalar"]) if depth else "scalar"
+    if kind == "dict":
+        return dict(("k%d" % i, random_tree(rnd, depth - 1, with_none)) for i in range(rnd.randint(0, 4)))
+    elif kind == "list":
+        return [random_tree(rnd, depth - 1, with_none) for _ in range(rnd.randint(0, 4))]
+    return random_scalar(rnd, with_none)
+
+
+def random_mutation(rnd, tree, depth=3):
+    """
+    Return a modified copy of <tree>, preserving the container types.
+    """
+    if isinstance(tree, dict):
+        tree = dict(tree)
+        for k in list(tree):
+            dice = rnd.random()
+            if dice < 0.2:
+                del tree[k]
+            elif dice < 0.7:
+                tree[k] = random_mutation(rnd, tree[k], depth - 1)
+        for i in range(rnd.randint(0, 2)):
+            tree["n%d" % i] = random_tree(rnd, depth - 1)
+        return tree
+    elif isinstance(tree, list):
+        tree = [random_mutation(rnd, v, depth - 1) if rnd.random() < 0.5 else v for v in tree]
+        if tree and rnd.random() < 0.3:
+            del tree[rnd.randint(0, len(tree) - 1):]
+        else:
+            for _ in range(rnd.randint(0, 2)):
+                tree.append(random_tree(rnd, depth - 1))
+        return tree
+    return random_scalar(rnd)
+
+
+def apply_diff(src, diff):
+    data = JournaledData()
+    data.set(path=["root"], value=src)
+    data.patch(path=["root"], patchset=deepcopy(diff))
+    return data.get(["root"])
+
+
+@pytest.mark.ci
+class TestJournaledDataDiff(object):
+    @staticmethod
+    def test_diff_is_equivalent_to_legacy_diff():
+        rnd = random.Random(0)
+        for _ in range(500):
+            src = random_tree(rnd, depth=4)
+            dst = random_mutation(rnd, src, depth=4)
+            if isinstance(src, dict) or isinstance(src, list):
+                assert JournaledData._diff(src, dst, prefix=["p"]) == legacy_diff(src, dst, prefix=["p"])
+            assert apply_diff(src, JournaledData._diff(src, dst)) == dst
+
+    @staticmethod
+    def test_diff_applies_on_type_changes_and_none_values():
+        rnd = random.Random(1)
+        for _ in range(500):
+            src = random_tree(rnd, depth=4, with_none=True)
+            dst = random_tree(rnd, depth=4, with_none=True)
+            assert apply_diff(src, JournaledData._diff(src, dst)) == dst
+
+    @staticmethod
+    def test_diff_of_shared_subtrees_is_empty():
+        subtree = {"a": [1, {"b": 2}]}
+        assert JournaledData._diff({"x": subtree}, {"x": subtree}) == []
+
+    @staticmethod
+    def test_diff_deletes_list_elements_from_tail():
+        assert JournaledData._diff({"l": [1, 2, 3, 4]}, {"l": [0, 2]}) == [
+            [["l", 0], 0],
+            [["l", 3]],
+            [["l", 2]],
+        ]
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from utilities.mounts.linux import MountTable, Mounts
+
+MOUNTINFO = """\
+22 1 0:21 / /proc rw,nosuid,nodev,noexec,relatime shared:13 - proc proc rw
+28 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw,errors=remount-ro
+40 28 7:0 / /srv/my\\040data rw,relatime shared:20 - ext4 /dev/loop0 rw
+41 28 8:1 /var/bind /mnt/bind rw,relatime - ext4 /dev/sda1 rw,errors=remount-ro
+"""
+
+
+@pytest.fixture(scope="function")
+def table(tmpdir):
+    path = os.path.join(str(tmpdir), "mountinfo")
+    with open(path, "w") as ofile:
+        ofile.write(MOUNTINFO)
+    loop_d = os.path.join(str(tmpdir), "sys", "block", "loop0", "loop")
+    os.makedirs(loop_d)
+    with open(os.path.join(loop_d, "backing_file"), "w") as ofile:
+        ofile.write("/srv/images/data.img\n")
+    table = MountTable(path=path, watch=False)
+    table.sysfs = os.path.join(str(tmpdir), "sys")
+    return table
+
+
+def mounts(mocker, table):
+    mocker.patch.object(Mounts, "table", table)
+    return Mounts()
+
+
+@pytest.mark.ci
+class TestMountTable:
+    @staticmethod
+    def test_parse(table):
+        snapshot = table.get()
+        assert [(m.dev, m.mnt, m.type) for m in snapshot.mounts] == [
+            ("proc", "/proc", "proc"),
+            ("/dev/sda1", "/", "ext4"),
+            ("/dev/loop0", "/srv/my data", "ext4"),
+            ("/dev/sda1", "/mnt/bind", "ext4"),
+        ]
+        assert snapshot.mounts[1].mnt_opt == "rw,relatime,errors=remount-ro"
+        assert [m.mnt for m in snapshot.by_dev["/dev/sda1"]] == ["/", "/mnt/bind"]
+        assert snapshot.loop_files == {"/dev/loop0": "/srv/images/data.img"}
+
+    @staticmethod
+    def test_reparse_only_on_content_change(table):
+        snapshot = table.get()
+        assert table.get() is snapshot
+        with open(table.path, "a") as ofile:
+            ofile.write("42 28 0:50 / /tmp rw - tmpfs tmpfs rw\n")
+        assert table.get() is not snapshot
+        assert "/tmp" in table.get().by_mnt
+        assert table.parses == 2
+
+    @staticmethod
+    def test_proc_mountinfo_is_watched():
+        table = MountTable()
+        snapshot = table.get()
+        assert snapshot.by_mnt["/proc"]
+        assert table.get() is snapshot
+        assert table.parses == 1
+
+
+@pytest.mark.ci
+class TestMounts:
+    @staticmethod
+    def test_has_mount(mocker, table):
+        m = mounts(mocker, table)
+        assert m.has_mount("/dev/sda1", "/") is True
+        assert m.has_mount("/dev/sda1", "/mnt/bind") is True
+        assert m.has_mount("/dev/sdb1", "/mnt/bind") is False
+        assert m.has_mount("/dev/sda1", "/srv/my data") is False
+
+    @staticmethod
+    def test_has_param(mocker, table):
+        m = mounts(mocker, table)
+        assert m.has_param("dev", "/dev/loop0").mnt == "/srv/my data"
+        assert m.has_param("dev", "/dev/sda1").mnt == "/"
+        m.sort(key="mnt", reverse=True)
+        assert m.has_param("dev", "/dev/sda1").mnt == "/mnt/bind"
+        assert m.has_param("mnt", "/proc").dev == "proc"
+        assert m.has_param("dev", "/dev/sdb1") is None
+        assert m.has_param("type", "ext4").mnt == "/srv/my data"
+
+    @staticmethod
+    def test_loop_mount_matches_its_backing_file(mocker, table):
+        m = mounts(mocker, table)
+        assert m.has_mount("/srv/images/data.img", "/srv/my data") is True
+        assert m.mount("/dev/loop0", "/srv/my data").dev == "/dev/loop0"
@@ -8,6 +8,49 @@
 import utilities.lock
 from env import Env
 from utilities.files import makedirs
+from .tier import TierUnavailable, daemon_tier, get_ttl
+
+# The shared cache tier: the daemon ResultCache in the daemon process, a
+# DaemonTier client in the other processes, or None if not available.
+TIER = None
+TIER_RESOLVED = False
+
+
+def set_cache_tier(tier):
+    global TIER, TIER_RESOLVED
+    TIER = tier
+    TIER_RESOLVED = True
+
+
+def get_cache_tier():
+    if not TIER_RESOLVED:
+        set_cache_tier(daemon_tier())
+    return TIER
+
+
+def tier_cached(tier, sig, ttl, fn, args, kwargs, log=None):
+    """
+    Return the <sig> result from the shared cache tier, or execute <fn> and
+    store its result in the tier. Disable the tier for the process on the
+    first error.
+    """
+    try:
+        data = tier.get(sig)
+        if log:
+            log.debug("shared cache GET: %s" % sig)
+        return data
+    except KeyError:
+        pass
+    data = fn(*args, **kwargs)
+    try:
+        tier.put(sig, data, ttl=ttl)
+        if log:
+            log.debug("shared cache PUT: %s" % sig)
+    except TierUnavailable as exc:
+        if log:
+            log.debug("shared cache disabled: %s" % exc)
+        set_cache_tier(None)
+    return data
 
 
 def cache_uuid():
@@ -32,6 +75,15 @@ def decorator(*args, **kwargs):
             else:
                 _sig = sig.format(args=args, kwargs=kwargs)
 
+            tier = get_cache_tier()
+            if tier is not None:
+                try:
+                    return tier_cached(tier, _sig, get_ttl(sig), fn, args, kwargs, log=log)
+                except TierUnavailable as exc:
+                    if log:
+                        log.debug("shared cache disabled: %s" % exc)
+                    set_cache_tier(None)
+
             fpath = cache_fpath(_sig)
 
             try:
@@ -47,7 +99,10 @@ def decorator(*args, **kwargs):
                     log.debug(str(e))
                 data = fn(*args, **kwargs)
                 cache_put(fpath, data, log=log)
-            utilities.lock.unlock(lfd)
+            finally:
+                # also release the lock when fn raises, as the other
+                # threads of this process would wait for it
+                utilities.lock.unlock(lfd)
             return data
 
         return decorator
@@ -93,6 +148,12 @@ def cache_get(fpath, log=None):
 def clear_cache(sig, o=None):
     if o and hasattr(o, "cache_sig_prefix"):
         sig = o.cache_sig_prefix + sig
+    tier = get_cache_tier()
+    if tier is not None:
+        try:
+            tier.clear([sig])
+        except TierUnavailable:
+            set_cache_tier(None)
     fpath = cache_fpath(sig)
     if not os.path.exists(fpath):
         return
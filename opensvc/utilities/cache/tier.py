@@ -0,0 +1,189 @@
+"""
+The command results cache tier shared by all the sessions of a node.
+
+The daemon holds a ResultCache, and the other processes access it through
+a DaemonTier, requesting the daemon over the raw unix socket. The results
+expire after a per-signature ttl, and the least recently used results are
+evicted when the cache size exceeds its limit.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from env import Env
+
+# The results ttl, indexed by the signature template passed to the cache
+# decorator. A result can also be invalidated by the clear_cache() calls
+# of the drivers changing the underlying state.
+DEFAULT_TTL = 10
+TTLS = {
+    "drbdadm.dump.xml": 60,
+    "pkg_info": 300,
+    "pkg_query": 300,
+    "raw.modprobe": 300,
+    "virsh.capabilities": 300,
+}
+
+DEFAULT_MAX_SIZE = 16 * 1024 * 1024
+SOCK_TMO = 2.0
+
+
+def get_ttl(sig):
+    return TTLS.get(sig, DEFAULT_TTL)
+
+
+class ResultCache(object):
+    """
+    A size-bounded LRU cache of expiring json-serializable results.
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.data = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def resize(self, max_size):
+        with self.lock:
+            self.max_size = max_size
+            self.evict()
+
+    def get(self, sig, now=None):
+        """
+        Return the cached result of <sig>, or raise KeyError if the cache
+        has no valid result.
+        """
+        now = now or time.time()
+        with self.lock:
+            try:
+                expire, buff = self.data.pop(sig)
+            except KeyError:
+                self.misses += 1
+                raise
+            if expire < now:
+                self.size -= len(sig) + len(buff)
+                self.expired += 1
+                self.misses += 1
+                raise KeyError(sig)
+            # move to the most recently used end
+            self.data[sig] = (expire, buff)
+            self.hits += 1
+        # the results are stored serialized, so the callers can't alter
+        # the cached value
+        return json.loads(buff)
+
+    def put(self, sig, data, ttl=None, now=None):
+        now = now or time.time()
+        if ttl is None:
+            ttl = DEFAULT_TTL
+        buff = json.dumps(data)
+        size = len(sig) + len(buff)
+        with self.lock:
+            self.discard(sig)
+            if size > self.max_size:
+                return
+            self.data[sig] = (now + ttl, buff)
+            self.size += size
+            self.evict()
+
+    def discard(self, sig):
+        try:
+            _, buff = self.data.pop(sig)
+        except KeyError:
+            return False
+        self.size -= len(sig) + len(buff)
+        return True
+
+    def evict(self):
+        while self.size > self.max_size and self.data:
+            sig, (_, buff) = self.data.popitem(last=False)
+            self.size -= len(sig) + len(buff)
+            self.evictions += 1
+
+    def clear(self, sigs):
+        with self.lock:
+            for sig in sigs:
+                if self.discard(sig):
+                    self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.data),
+                "size": self.size,
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class TierUnavailable(Exception):
+    pass
+
+
+class DaemonTier(object):
+    """
+    The client of the daemon ResultCache, using the raw unix socket.
+    """
+    def __init__(self, path=None):
+        self.path = path or Env.paths.lsnruxsock
+
+    def request(self, method, action, options):
+        message = json.dumps({"action": action, "method": method, "options": options}) + "\0"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(SOCK_TMO)
+            sock.connect(self.path)
+            sock.sendall(message.encode())
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if chunk.endswith(b"\0"):
+                    break
+        except (socket.error, socket.timeout) as exc:
+            raise TierUnavailable(str(exc))
+        finally:
+            sock.close()
+        try:
+            result = json.loads(b"".join(chunks).rstrip(b"\0").decode())
+        except ValueError as exc:
+            raise TierUnavailable(str(exc))
+        if result.get("status") == 0:
+            return result
+        if result.get("status") == 404:
+            raise KeyError(options.get("sig"))
+        raise TierUnavailable(result.get("error"))
+
+    def get(self, sig):
+        return self.request("GET", "cache", {"sig": sig})["data"]
+
+    def put(self, sig, data, ttl=None):
+        self.request("POST", "cache", {"sig": sig, "data": data, "ttl": ttl})
+
+    def clear(self, sigs):
+        self.request("POST", "cache_clear", {"sigs": sigs})
+
+
+def daemon_tier():
+    """
+    Return a DaemonTier if the local daemon unix socket is usable by this
+    process.
+    """
+    if os.name == "nt" or os.geteuid() != 0:
+        return
+    if not os.path.exists(Env.paths.lsnruxsock):
+        return
+    return DaemonTier()
@@ -1,13 +1,26 @@
+from utilities.lazy import init_lock
+
+
 def fcache(fn):
     """
-    A decorator for caching the result of a function
+    A decorator for caching the result of a function. The function is
+    called once, even if called by concurrent threads.
     """
     attr_name = '_fcache_' + fn.__name__
 
     def _fcache(self):
-        if not hasattr(self, attr_name):
-            setattr(self, attr_name, fn(self))
-        return getattr(self, attr_name)
+        try:
+            return getattr(self, attr_name)
+        except AttributeError:
+            pass
+        with init_lock(self, attr_name):
+            try:
+                return getattr(self, attr_name)
+            except AttributeError:
+                pass
+            value = fn(self)
+            setattr(self, attr_name, value)
+            return value
 
     return _fcache
 
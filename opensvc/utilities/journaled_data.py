@@ -39,6 +39,10 @@ def get_full(self, path=None):
         path = self.path + (path or [])
         return self.data.get_full(path=path)
 
+    def get_snapshot(self, path=None):
+        path = self.path + (path or [])
+        return self.data.get_snapshot(path=path)
+
     def merge(self, path=None, value=None):
         path = self.path + (path or [])
         return self.data.merge(path=path, value=value)
@@ -72,6 +76,38 @@ def patch(self, path=None, patchset=None):
         return self.data.patch(path=path, patchset=patchset)
 
 
+def copy_tree(value):
+    """
+    Return a copy of the <value> json-like tree.
+
+    Plain dicts and lists are copied recursively, which is much cheaper than
+    copy.deepcopy(). Other containers, like dict subclasses, fallback to
+    copy.deepcopy() to preserve their type.
+    """
+    _type = type(value)
+    if _type is dict:
+        return {k: copy_tree(v) for k, v in value.items()}
+    elif _type is list:
+        return [copy_tree(v) for v in value]
+    elif _type in (str, int, float, bool, type(None)):
+        return value
+    return copy.deepcopy(value)
+
+
+def container_type(value):
+    """
+    Return dict or list if <value> is a dict or a list, or one of their
+    subclasses. Return None for the other types.
+    """
+    _type = type(value)
+    if _type is dict or _type is list:
+        return _type
+    elif isinstance(value, dict):
+        return dict
+    elif isinstance(value, list):
+        return list
+
+
 def debug(m):
     def fn(*args, **kwargs):
         try:
@@ -85,6 +121,19 @@ def fn(*args, **kwargs):
 
 
 class JournaledData(object):
+    """
+    A json-like dataset with change journaling and events emission.
+
+    The dataset is a persistent tree: a stored value is never modified
+    in-place. Setting or unsetting a path replaces the containers on the
+    path from the root to the changed key by shallow copies, so the
+    unchanged subtrees are shared between the successive versions of the
+    tree.
+
+    This property allows get_snapshot() to return a consistent image of
+    the dataset in O(1) and without holding the lock. The returned data
+    must be considered read-only.
+    """
     def __init__(self, initial_data=None, journal_head=None,
                  journal_exclude=None, journal_condition=None,
                  event_q=None, emit_interval=0.3):
@@ -136,10 +185,23 @@ def get(self, path=None, default=Exception):
             return default
 
     def get_full(self, path=None):
+        """
+        Return a read-only snapshot of the data at <path> and reset the
+        change journal.
+        """
         path = path or []
         with self.lock:
             self.diff = []
-            return copy.deepcopy(self.get_ref(path, self.data))
+            return self.get_ref(path, self.data)
+
+    def get_snapshot(self, path=None):
+        """
+        Return a read-only image of the data at <path>.
+
+        The data shares its structure with the dataset, so the caller must
+        not modify it. Use get_copy() to get a modifiable image.
+        """
+        return self.get_ref(path or [], self.data)
 
     def exists(self, path=None):
         if not path:
@@ -151,10 +213,10 @@ def exists(self, path=None):
             return False
 
     def get_copy(self, path=None):
-        path = path or []
-        with self.lock:
-            data = self.get_ref(path, self.data)
-            return copy.deepcopy(data)
+        """
+        Return a modifiable image of the data at <path>.
+        """
+        return copy_tree(self.get_snapshot(path))
 
     @staticmethod
     def get_ref(path, data):
@@ -188,7 +250,7 @@ def _set_lk(self, path=None, value=None):
 
         The recorded diff is reparented to self.journal_head.
         """
-        value = copy.deepcopy(value)
+        value = copy_tree(value)
         path = path or []
 
         try:
@@ -212,10 +274,16 @@ def _set_lk(self, path=None, value=None):
     def _set(self, path, value):
         """
         Low-level set. No journaling, no messaging.
+
+        The containers on the path are replaced by modified shallow copies,
+        leaving the previous version of the tree untouched.
         """
-        if path:
-            cursor = self.get_ref(path[:-1], self.data)
-            key = path[-1]
+        if not path:
+            self.data = value
+            return
+
+        def set_key(cursor, key):
+            cursor = copy.copy(cursor)
             try:
                 cursor[key] = value
             except IndexError:
@@ -223,8 +291,24 @@ def _set(self, path, value):
                     cursor.append(value)
                 else:
                     raise
-        else:
-            self.data = value
+            return cursor
+
+        self.data = self._copy_spine(path, set_key)
+
+    def _copy_spine(self, path, fn):
+        """
+        Return a new root where the containers on <path> are shallow copies,
+        and the last container is the one returned by fn(container, key).
+        """
+        spine = [self.data]
+        for key in path[:-1]:
+            spine.append(spine[-1][key])
+        cursor = fn(spine[-1], path[-1])
+        for key, parent in zip(reversed(path[:-1]), reversed(spine[:-1])):
+            parent = copy.copy(parent)
+            parent[key] = cursor
+            cursor = parent
+        return cursor
 
     def _to_journal_diff(self, absolute_diff):
         if self.journal_condition() and self.journal_head is not None:
@@ -305,8 +389,12 @@ def _unset(self, path):
         """
         Low-level unset. No journaling, no messaging.
         """
-        data = self.get_ref(path[:-1], self.data)
-        del data[path[-1]]
+        def del_key(cursor, key):
+            cursor = copy.copy(cursor)
+            del cursor[key]
+            return cursor
+
+        self.data = self._copy_spine(path, del_key)
 
     def _unset_lk(self, path):
         """
@@ -337,8 +425,11 @@ def _inc(self, path=None, data=None):
     def push_diff_lk(self, diff):
         """
         Concat a diff list to the in-flight diff list.
+
+        The diff values are shared with the dataset, which never modifies
+        them in-place, so only the diff fragments are copied.
         """
-        self.diff += copy.deepcopy(diff)
+        self.diff += [list(fragment) for fragment in diff]
 
     def pop_diff(self):
         """
@@ -374,7 +465,7 @@ def emit(self, diff):
         if not diff:
             return
         now = time.time()
-        self.coalesce += copy.deepcopy(diff)
+        self.coalesce += [list(fragment) for fragment in diff]
         next_emit = self.emit_interval - (now - self.last_emit)
         if next_emit > 0:
             if not self.timer:
@@ -449,43 +540,75 @@ def excluded(p):
 
         return data
 
-    def _diff(self, src, dst, prefix=None):
-        data = []
-        prefix = prefix or []
-        added = []
-
-        def recurse(d1, d2, path=None, changes=True):
-            try:
-                ref_v = self.get_ref(path, d2)
-            except (KeyError, IndexError, TypeError):
-                yield [path, d1]
-            else:
-                if ref_v is None and d1 is not None:
-                    yield [path, d1]
-                elif isinstance(d1, dict):
-                    for k, v in d1.items():
-                        for _ in recurse(v, d2, path=path+[k], changes=changes):
-                            yield _
-                elif isinstance(d1, list):
-                    if prefix+path not in added:
-                        if changes:
-                            iterator = enumerate(d1)
-                        else:
-                            iterator = reversed(list(enumerate(d1)))
-                        for i, v in iterator:
-                            for _ in recurse(v, d2, path=path+[i], changes=changes):
-                                yield _
-                elif changes and ref_v != d1:
-                    yield [path, d1]
-
-        for k, v in recurse(dst, src, [], changes=True):
-            data.append([prefix+k, v])
-            added.append(prefix+k)
+    @staticmethod
+    def _diff(src, dst, prefix=None):
+        """
+        Return the json_delta formatted patch transforming <src> into <dst>,
+        with paths prefixed by <prefix>.
 
-        for k, v in recurse(src, dst, [], changes=False):
-            data.append([prefix+k])
+        The trees are walked once, in lockstep. Identical subtrees are
+        skipped without descending, which is frequent as the dataset
+        shares the unchanged subtrees between its versions.
 
-        return data
+        The patch lists the additions and changes first, in <dst> order,
+        then the deletions, in <src> order, with list elements deleted
+        from the tail so the indices remain valid while patching.
+        """
+        changes = []
+
+        def walk(d1, d2, path):
+            """
+            Append the additions and changes to <changes> and return the
+            list of deletions needed to transform <d1> into <d2>.
+            """
+            if d1 is d2:
+                return
+            t1 = container_type(d1)
+            t2 = container_type(d2)
+            if d1 is None or t1 is not t2:
+                changes.append([path, d2])
+                return
+            if t2 is dict:
+                nested = {}
+                for k, v in d2.items():
+                    try:
+                        ref_v = d1[k]
+                    except KeyError:
+                        changes.append([path + [k], v])
+                    else:
+                        _deletions = walk(ref_v, v, path + [k])
+                        if _deletions:
+                            nested[k] = _deletions
+                deletions = []
+                for k in d1:
+                    if k not in d2:
+                        deletions.append([path + [k]])
+                    elif k in nested:
+                        deletions += nested[k]
+                return deletions
+            if t2 is list:
+                n1 = len(d1)
+                n2 = len(d2)
+                nested = {}
+                for i, v in enumerate(d2):
+                    if i < n1:
+                        _deletions = walk(d1[i], v, path + [i])
+                        if _deletions:
+                            nested[i] = _deletions
+                    else:
+                        changes.append([path + [i], v])
+                deletions = []
+                for i in range(n1 - 1, -1, -1):
+                    if i >= n2:
+                        deletions.append([path + [i]])
+                    elif i in nested:
+                        deletions += nested[i]
+                return deletions
+            if d1 != d2:
+                changes.append([path, d2])
+
+        deletions = walk(src, dst, list(prefix or []))
+        return changes + (deletions or [])
 
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
-from threading import RLock
+from threading import Lock, RLock
 
 _missing = object()
+_locks_lock = Lock()
 
 class threadsafe_lazy(object):
     def __init__(self, func):
@@ -20,17 +21,38 @@ def __get__(self, obj, type=None):
                 obj.__dict__[self.__name__] = value
             return value
 
+def init_lock(obj, attr_name):
+    """
+    Return the lock serializing the <attr_name> cache initialization
+    of <obj>.
+    """
+    with _locks_lock:
+        locks = obj.__dict__.setdefault("_lazylocks", {})
+        return locks.setdefault(attr_name, RLock())
+
+
 def lazy(fn):
     """
-    A decorator for on-demand initialization of a property
+    A decorator for on-demand initialization of a property. The
+    initialization is done once, even if the property is read by
+    concurrent threads.
     """
     attr_name = '_lazy_' + fn.__name__
 
     @property
     def _lazyprop(self):
-        if not hasattr(self, attr_name):
-            setattr(self, attr_name, fn(self))
-        return getattr(self, attr_name)
+        try:
+            return getattr(self, attr_name)
+        except AttributeError:
+            pass
+        with init_lock(self, attr_name):
+            try:
+                return getattr(self, attr_name)
+            except AttributeError:
+                pass
+            value = fn(self)
+            setattr(self, attr_name, value)
+            return value
 
     return _lazyprop
 
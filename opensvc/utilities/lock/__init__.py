@@ -8,6 +8,7 @@
 import contextlib
 import json
 import os
+import threading
 import time
 
 import foreign.six as six
@@ -128,7 +129,7 @@ def lock_nowait(lockfile=None, intent=None):
     if lockfile is None:
         raise LockNoLockFile
 
-    data = {"pid": os.getpid(), "intent": intent}
+    data = {"pid": os.getpid(), "tid": threading.current_thread().ident, "intent": intent}
     lock_dir = os.path.dirname(lockfile)
 
     try:
@@ -141,8 +142,10 @@ def lock_nowait(lockfile=None, intent=None):
             raise LockCreateError("lockfile points to a directory")
         prev_data = {"pid": 0, "intent": ""}
 
-    # test if we already own the lock
-    if prev_data["pid"] == os.getpid():
+    # test if we already own the lock. The other threads of this process
+    # must not share it, so they go through the flock below, which fails
+    # as long as the owner holds the lock on its own file descriptor.
+    if prev_data["pid"] == data["pid"] and prev_data.get("tid") == data["tid"]:
         return
 
     flags = os.O_RDWR | os.O_CREAT
@@ -193,6 +196,7 @@ def lock_nowait(lockfile=None, intent=None):
         return lockfd
     except IOError:
         os.close(lockfd)
+        prev_data.pop("tid", None)
         raise LockAcquire(path=lockfile, **prev_data)
     except:
         os.close(lockfd)
@@ -1,13 +1,171 @@
 import os
+import select
+import threading
 
-import utilities.devices.linux
+import core.exceptions as ex
 from env import Env
-from utilities.proc import justcall
 from .mounts import BaseMounts, Mount
 
+MOUNTINFO = "/proc/self/mountinfo"
+DELETED = " (deleted)"
+
+
+def unescape(s):
+    """
+    Decode the octal escapes of the space, tab, newline and backslash
+    characters in the mountinfo fields.
+    """
+    if "\\" not in s:
+        return s
+    for escape, char in (("\\040", " "), ("\\011", "\t"), ("\\012", "\n"), ("\\134", "\\")):
+        s = s.replace(escape, char)
+    return s
+
+
+def strip_deleted(s):
+    if s.endswith(DELETED):
+        return s[:-len(DELETED)]
+    return s
+
+
+def merge_options(options, super_options):
+    """
+    Return the per-mount options followed by the superblock options they
+    don't already contain, like the mount command does.
+    """
+    options = options.split(",")
+    for option in super_options.split(","):
+        if option not in options:
+            options.append(option)
+    return ",".join(options)
+
+
+class MountTableSnapshot(object):
+    """
+    An immutable parsed mount table, with its mountpoint and device
+    indexes, and the loop devices backing files.
+    """
+    def __init__(self, mounts, loop_files):
+        self.mounts = mounts
+        self.loop_files = loop_files
+        self.by_mnt = {}
+        self.by_dev = {}
+        for mount in mounts:
+            self.by_mnt.setdefault(mount.mnt, []).append(mount)
+            self.by_dev.setdefault(mount.dev, []).append(mount)
+
+
+class MountTable(object):
+    """
+    The process-wide mount table, parsed from /proc/self/mountinfo.
+
+    The kernel flags the mountinfo file descriptor with POLLPRI when the
+    mount namespace changes, so the table is reparsed only after such a
+    notification. When <watch> is False, or poll is not available, the
+    file is read on each get() and reparsed only if its content differs.
+    """
+    sysfs = "/sys"
+
+    def __init__(self, path=MOUNTINFO, watch=True):
+        self.path = path
+        self.watch = watch and hasattr(select, "poll")
+        self.lock = threading.RLock()
+        self.fd = None
+        self.pid = None
+        self.poller = None
+        self.content = None
+        self.snapshot = None
+        self.parses = 0
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = None
+        self.poller = None
+
+    def open(self):
+        self.close()
+        self.fd = os.open(self.path, os.O_RDONLY)
+        self.pid = os.getpid()
+        if self.watch:
+            self.poller = select.poll()
+            self.poller.register(self.fd, select.POLLPRI | select.POLLERR)
+
+    def changed(self):
+        """
+        Return True if the kernel signaled a mount table change since the
+        last call.
+        """
+        for _, event in self.poller.poll(0):
+            if event & select.POLLPRI:
+                return True
+        return False
+
+    def read(self):
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(self.fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def get(self):
+        """
+        Return the current mount table snapshot.
+        """
+        with self.lock:
+            if self.fd is None or self.pid != os.getpid():
+                # the file descriptor is not shared with the forked children
+                self.open()
+            elif self.snapshot is not None and self.poller is not None and not self.changed():
+                return self.snapshot
+            content = self.read()
+            if content != self.content:
+                self.snapshot = self.parse(content.decode("utf-8", "replace"))
+                self.content = content
+                self.parses += 1
+            return self.snapshot
+
+    def loop_file(self, dev):
+        path = os.path.join(self.sysfs, "block", os.path.basename(dev), "loop", "backing_file")
+        try:
+            with open(path, "r") as ofile:
+                return strip_deleted(ofile.read().strip()) or None
+        except (IOError, OSError):
+            return None
+
+    def parse(self, content):
+        mounts = []
+        loop_files = {}
+        for line in content.splitlines():
+            # id parent major:minor root mountpoint options [optional...] - fstype source super_options
+            words = line.split()
+            try:
+                sep = words.index("-", 6)
+                mnt = strip_deleted(unescape(words[4]))
+                options = words[5]
+                fstype, dev, super_options = words[sep + 1:sep + 4]
+            except (ValueError, IndexError):
+                continue
+            dev = strip_deleted(unescape(dev))
+            mounts.append(Mount(dev, mnt, fstype, merge_options(options, super_options)))
+            if dev.startswith("/dev/loop") and dev not in loop_files:
+                loop_files[dev] = self.loop_file(dev)
+        return MountTableSnapshot(mounts, loop_files)
+
+
+MOUNT_TABLE = MountTable()
+
 
 class Mounts(BaseMounts):
     df_one_cmd = [Env.syspaths.df, '-l']
+    table = MOUNT_TABLE
+
+    def __init__(self):
+        self.snapshot = None
+        super(Mounts, self).__init__()
 
     def match_mount(self, i, dev, mnt):
         """Given a line of 'mount' output, returns True if (dev, mnt) matches
@@ -18,7 +176,7 @@ def match_mount(self, i, dev, mnt):
             return False
         if i.dev == dev:
             return True
-        if i.dev in utilities.devices.linux.file_to_loop(dev):
+        if self.snapshot and self.snapshot.loop_files.get(i.dev) == dev:
             return True
         if dev.startswith(os.sep) and os.path.isdir(dev):
             # zfs datasets <pool>/<ds> might match the isdir test because the
@@ -28,17 +186,39 @@ def match_mount(self, i, dev, mnt):
                 return True
         return False
 
+    def candidates(self, mnt):
+        if self.snapshot is None:
+            return self.mounts or []
+        return self.snapshot.by_mnt.get(mnt, [])
+
+    def mount(self, dev, mnt):
+        for i in self.candidates(mnt):
+            if self.match_mount(i, dev, mnt):
+                return i
+        return None
+
+    def has_mount(self, dev, mnt):
+        if self.mounts is None:
+            raise ex.Error("unable to parse mounts")
+        return self.mount(dev, mnt) is not None
+
+    def has_param(self, param, value):
+        if self.snapshot is None or self.mounts is None or param not in ("dev", "mnt"):
+            return super(Mounts, self).has_param(param, value)
+        if param == "dev":
+            candidates = self.snapshot.by_dev.get(value, [])
+        else:
+            candidates = self.snapshot.by_mnt.get(value, [])
+        if len(candidates) > 1:
+            # return the first match in the current sort order
+            return super(Mounts, self).has_param(param, value)
+        if candidates:
+            return candidates[0]
+        return None
+
     def parse_mounts(self):
-        out, err, ret = justcall([Env.syspaths.mount])
-        out = out.replace(" (deleted)", "")
-        mounts = []
-        for l in out.split('\n'):
-            if len(l.split()) != 6:
-                break
-            dev, null, mnt, null, type, mnt_opt = l.split()
-            m = Mount(dev, mnt, type, mnt_opt.strip('()'))
-            mounts.append(m)
-        return mounts
+        self.snapshot = self.table.get()
+        return list(self.snapshot.mounts)
 
 
 if __name__ == "__main__":
@@ -219,53 +219,270 @@ def fmt_tid(_data, stats_data):
         return "%d" % tid
     return ""
 
-def list_print(data, right=None):
+def list_print(data, right=None, cache=None):
+    """
+    Return the tabulated <data> lines. The <cache> dict, indexed by line
+    object id, holds the encoded cells and the padded output of lines
+    already printed, reused if the same line object is printed again.
+    """
     if right is None:
         right = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
-    outs = ""
     if len(data) == 0:
         return ""
+    if cache is None:
+        cache = {}
     widths = [0] * len(data[-1])
     _data = []
     for line in data:
-        _data.append(tuple(map(lambda x: x.encode("utf-8") if x is not None else "".encode("utf-8"), line)))
-    for line in _data:
-        for i, val in enumerate(line):
-            strlen = bare_len(val)
+        entry = cache.get(id(line))
+        if entry is None or entry[0] is not line:
+            cells = tuple(map(lambda x: x.encode("utf-8") if x is not None else "".encode("utf-8"), line))
+            entry = [line, cells, [bare_len(val) for val in cells], None, None]
+        _data.append(entry)
+        for i, strlen in enumerate(entry[2]):
             if strlen > widths[i]:
                 widths[i] = strlen
-    for line in _data:
+    outs = []
+    used = {}
+    for entry in _data:
+        used[id(entry[0])] = entry
+        if entry[3] == widths:
+            outs.append(entry[4])
+            continue
         _line = []
-        for i, val in enumerate(line):
+        for i, val in enumerate(entry[1]):
             if widths[i] == 0:
                 continue
             if i in right:
-                val = pad*(widths[i]-bare_len(val)) + val
+                val = pad*(widths[i]-entry[2][i]) + val
             else:
-                val = val + pad*(widths[i]-bare_len(val))
+                val = val + pad*(widths[i]-entry[2][i])
             _line.append(val)
         _line = pad.join(_line)
-        outs += print_bytes(_line)
-    return outs
-
-def print_section(data):
+        entry[3] = widths
+        entry[4] = print_bytes(_line)
+        outs.append(entry[4])
+    cache.clear()
+    cache.update(used)
+    return "".join(outs)
+
+def print_section(data, cache=None):
     if len(data) == 0:
         return ""
-    return list_print(data)
+    return list_print(data, cache=cache)
+
+
+class RenderCache(object):
+    """
+    The services aggregated status, the services rows and the tabulated
+    lines of the previous format_cluster call.
+
+    The status data is copy-on-write, so the services whose status
+    structures are the same objects as in the previous call reuse their
+    aggregated status, and the rows of these aggregates reuse their cells.
+    """
+    def __init__(self):
+        self.nodenames = None
+        self.containers = {}
+        self.services = {}
+        self.rows = {}
+        self.lines = {}
+
+
+def services_containers(data, avail_nodenames):
+    """
+    Return the status data dicts the services aggregated status are
+    computed from, indexed by a name.
+    """
+    containers = {"services": data["monitor"]["services"]}
+    for _node in avail_nodenames:
+        try:
+            node_svc = data["monitor"]["nodes"][_node]["services"]
+        except KeyError:
+            continue
+        containers[("status", _node)] = node_svc.get("status")
+        containers[("config", _node)] = node_svc.get("config")
+    return containers
+
+
+def changed_paths(containers, prev_containers):
+    """
+    Return the paths having a different structure in <containers> and
+    <prev_containers>.
+    """
+    changed = set()
+    for key in set(containers) | set(prev_containers):
+        container = containers.get(key)
+        prev = prev_containers.get(key)
+        if container is prev:
+            continue
+        if not isinstance(container, dict) or not isinstance(prev, dict):
+            changed |= set(container or []) | set(prev or [])
+            continue
+        for path, ref in container.items():
+            if prev.get(path) is not ref:
+                changed.add(path)
+        for path in prev:
+            if path not in container:
+                changed.add(path)
+    return changed
+
+
+def load_services_data(data, avail_nodenames, paths, cache):
+    """
+    Return the services aggregated status, indexed by path, and the
+    services parents, indexed by slave path.
+    """
+    services = {}
+    slave_parents = {}
+    if "monitor" not in data:
+        return services, slave_parents
+    containers = services_containers(data, avail_nodenames)
+    if cache.nodenames != avail_nodenames:
+        cache.services = {}
+        cache.nodenames = avail_nodenames
+    changed = changed_paths(containers, cache.containers)
+    cache.containers = containers
+    candidates = set(data["monitor"]["services"])
+    for _node in avail_nodenames:
+        try:
+            candidates |= set(data["monitor"]["nodes"][_node]["services"]["status"])
+        except KeyError:
+            continue
+    if paths is not None:
+        candidates &= set(paths)
+    cached_services = {}
+    for path in candidates:
+        _data = cache.services.get(path)
+        if _data is None or path in changed or _data.get("scale") is not None:
+            _data = aggregate_service(path, data, avail_nodenames)
+            if _data is None:
+                continue
+        cached_services[path] = _data
+        services[path] = _data
+        for child in _data.get("slaves", []):
+            if child not in slave_parents:
+                slave_parents[child] = set([path])
+            else:
+                slave_parents[child] |= set([path])
+    cache.services = cached_services
+    return services, slave_parents
+
+
+def aggregate_service(path, data, avail_nodenames):
+    """
+    Return the <path> status aggregated from its instances status, or None
+    if there is no status data for <path>.
+    """
+    service = None
+    for _node in avail_nodenames:
+        if _node not in data["monitor"]["nodes"]:
+            continue
+        try:
+            node_svc_status = data["monitor"]["nodes"][_node]["services"]["status"]
+        except KeyError:
+            continue
+        _data = node_svc_status.get(path)
+        if _data is not None:
+            if service is None:
+                service = Storage({
+                    "topology": _data.get("topology", ""),
+                    "orchestrate": _data.get("orchestrate", ""),
+                    "flex_target": _data.get("flex_target"),
+                    "scale": _data.get("scale"),
+                    "avail": "undef",
+                    "overall": "",
+                    "nodes": {},
+                    "slaves": set(),
+                    "n_up": 0,
+                    "resources": set(),
+                })
+            try:
+                service["resources"] |= set(_data["resources"].keys())
+            except KeyError:
+                pass
+            slaves = list(_data.get("slaves", []))
+            scale = _data.get("scale")
+            if scale:
+                name, _namespace, kind = split_path(path)
+                if _namespace:
+                    pattern = r"^%s/%s/[0-9]+\.%s$" % (_namespace, kind, name)
+                else:
+                    pattern = r"^[0-9]+\.%s$" % name
+                for child in data["monitor"]["services"]:
+                    if re.match(pattern, child) is None:
+                        continue
+                    slaves.append(child)
+                    if node_svc_status.get(child, {}).get("avail") == "up":
+                        service.n_up += 1
+            else:
+                if _data.get("avail") == "up":
+                    service.n_up += 1
+            global_expect = _data.get("monitor", {}).get("global_expect")
+            if global_expect and "@" in global_expect:
+                global_expect = global_expect[:global_expect.index("@")+1]
+            service.nodes[_node] = {
+                "avail": _data.get("avail", "undef"),
+                "preserved": _data.get("preserved"),
+                "overall": _data.get("overall", "undef"),
+                "frozen": _data.get("frozen", False),
+                "mon": _data.get("monitor", {}).get("status", ""),
+                "global_expect": global_expect,
+                "placement": _data.get("monitor", {}).get("placement", ""),
+                "provisioned": _data.get("provisioned"),
+                "drp": _data.get("drp"),
+            }
+            service.slaves |= set(slaves)
+            service["wrapper"] = (
+                service.resources == set() and
+                service.slaves != set() and
+                scale is None
+            )
+        if service is None:
+            continue
+        try:
+            # hint we have missing instances
+            cnf = data["monitor"]["nodes"][_node]["services"]["config"][path]
+            for __node in cnf.get("scope", []):
+                if __node not in service.nodes:
+                    service.nodes[__node] = None
+        except KeyError:
+            pass
+    _data = data["monitor"]["services"].get(path)
+    if _data is not None:
+        if service is None:
+            service = Storage({
+                "avail": "undef",
+                "overall": "",
+                "nodes": {}
+            })
+        service.avail = _data.get("avail", "n/a")
+        service.overall = _data.get("overall", "n/a")
+        service.placement = _data.get("placement", "n/a")
+        service.frozen = _data.get("frozen", "n/a")
+        service.provisioned = _data.get("provisioned", "n/a")
+    return service
 
 
 def format_cluster(paths=None, node=None, data=None, prev_stats_data=None,
                    stats_data=None, sections=None, selector=None,
-                   namespace=None):
+                   namespace=None, cache=None):
+    """
+    Return the cluster status matrix. A <cache> passed to consecutive calls
+    saves the rendering of the services whose data is unchanged.
+    """
     if not data or data.get("status", 0) != 0:
         return
     if sections is None:
         sections = DEFAULT_SECTIONS
+    if cache is None:
+        cache = RenderCache()
     out = []
     avail_nodenames = get_nodes(data)
     nodenames = sorted([n for n in avail_nodenames if n in node])
     show_nodenames = abbrev(nodenames)
-    services = {}
+    view = (tuple(nodenames), tuple(avail_nodenames), os.environ.get("OSVC_NAMESPACE"))
+    rows = {}
 
     def load_header(title=""):
         if isinstance(title, list):
@@ -296,6 +513,19 @@ def load_svc(path, prefix=""):
         data = services[path]
         if path in slave_parents and prefix == "":
             return
+        key = (path, prefix)
+        cached = cache.rows.get(key)
+        if cached and cached[0] is data and cached[1] is stats_data and cached[2] is prev_stats_data and cached[3] == view:
+            line = cached[4]
+        else:
+            line = render_svc(path, data, prefix)
+        rows[key] = (data, stats_data, prev_stats_data, view, line)
+        out.append(line)
+
+        for child in sorted(list(data.get("slaves", []))):
+            load_svc(child, prefix=prefix+" ")
+
+    def render_svc(path, data, prefix):
         try:
             topology = services[path].topology
         except KeyError:
@@ -475,10 +705,7 @@ def load_svc(path, prefix=""):
             val.append(global_expect)
             val = "".join(val)
             line.append(val)
-        out.append(line)
-
-        for child in sorted(list(data.get("slaves", []))):
-            load_svc(child, prefix=prefix+" ")
+        return line
 
     def load_hb(key, _data):
         state = _data.get("state", "")
@@ -932,103 +1159,7 @@ def load_metrics():
         load_free_total("swap")
 
     # init the services hash
-    slave_parents = {}
-    if "monitor" in data:
-        for _node in avail_nodenames:
-            if _node not in data["monitor"]["nodes"]:
-                continue
-            try:
-                node_svc_status = data["monitor"]["nodes"][_node]["services"]["status"]
-            except KeyError:
-                continue
-            for path, _data in node_svc_status.items():
-                if _data is None:
-                    continue
-                if paths is not None and path not in paths:
-                    continue
-                if path not in services:
-                    services[path] = Storage({
-                        "topology": _data.get("topology", ""),
-                        "orchestrate": _data.get("orchestrate", ""),
-                        "flex_target": _data.get("flex_target"),
-                        "scale": _data.get("scale"),
-                        "avail": "undef",
-                        "overall": "",
-                        "nodes": {},
-                        "slaves": set(),
-                        "n_up": 0,
-                        "resources": set(),
-                    })
-                try:
-                    services[path]["resources"] |= set(_data["resources"].keys())
-                except KeyError:
-                    pass
-                slaves = _data.get("slaves", [])
-                scale = _data.get("scale")
-                if scale:
-                    name, _namespace, kind = split_path(path)
-                    if _namespace:
-                        pattern = r"^%s/%s/[0-9]+\.%s$" % (_namespace, kind, name)
-                    else:
-                        pattern = r"^[0-9]+\.%s$" % name
-                    for child in data["monitor"]["services"]:
-                        if re.match(pattern, child) is None:
-                            continue
-                        slaves.append(child)
-                        if node_svc_status.get(child, {}).get("avail") == "up":
-                            services[path].n_up += 1
-                else:
-                    if node_svc_status.get(path, {}).get("avail") == "up":
-                        services[path].n_up += 1
-                for child in slaves:
-                    if child not in slave_parents:
-                        slave_parents[child] = set([path])
-                    else:
-                        slave_parents[child] |= set([path])
-                global_expect = _data.get("monitor", {}).get("global_expect")
-                if global_expect and "@" in global_expect:
-                    global_expect = global_expect[:global_expect.index("@")+1]
-                services[path].nodes[_node] = {
-                    "avail": _data.get("avail", "undef"),
-                    "preserved": _data.get("preserved"),
-                    "overall": _data.get("overall", "undef"),
-                    "frozen": _data.get("frozen", False),
-                    "mon": _data.get("monitor", {}).get("status", ""),
-                    "global_expect": global_expect,
-                    "placement": _data.get("monitor", {}).get("placement", ""),
-                    "provisioned": _data.get("provisioned"),
-                    "drp": _data.get("drp"),
-                }
-                services[path].slaves |= set(slaves)
-                services[path]["wrapper"] = (
-                    services[path].resources == set() and
-                    services[path].slaves != set() and
-                    scale is None
-                )
-            try:
-                # hint we have missing instances
-                for path, cnf in data["monitor"]["nodes"][_node]["services"]["config"].items():
-                    if path not in services:
-                        continue
-                    for __node in cnf.get("scope", []):
-                        if __node not in services[path].nodes:
-                            services[path].nodes[__node] = None
-            except KeyError:
-                pass
-        for path, _data in data["monitor"]["services"].items():
-            if paths is not None and path not in paths:
-                continue
-            if path not in services:
-                services[path] = Storage({
-                    "avail": "undef",
-                    "overall": "",
-                    "nodes": {}
-                })
-            services[path].avail = _data.get("avail", "n/a")
-            services[path].overall = _data.get("overall", "n/a")
-            services[path].placement = _data.get("placement", "n/a")
-            services[path].frozen = _data.get("frozen", "n/a")
-            services[path].provisioned = _data.get("provisioned", "n/a")
+    services, slave_parents = load_services_data(data, avail_nodenames, paths, cache)
 
     def load_services(selector, namespace=None):
         if "services" not in sections:
@@ -1065,8 +1196,9 @@ def load_services(selector, namespace=None):
     load_arbitrators()
     load_nodes()
     load_services(selector, namespace)
+    cache.rows = rows
 
     # print tabulated lists
-    return print_section(out)
+    return print_section(out, cache=cache.lines)
 
 
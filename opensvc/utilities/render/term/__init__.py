@@ -17,6 +17,21 @@ def term_width():
             return min_columns
 
 
+def term_height():
+    """
+    Return the terminal lines count, or None if not detected.
+    """
+    try:
+        # python 3.3+
+        return os.get_terminal_size().lines or None
+    except (AttributeError, OSError):
+        pass
+    try:
+        return int(os.environ["LINES"]) or None
+    except (KeyError, ValueError):
+        return None
+
+
 def _detect_term_width():
     try:
         # python 3.3+
@@ -18,6 +18,13 @@
 ]
 
 
+def sampler_running():
+    from utilities.stats.ring import RingStore
+    from utilities.stats.sampler.linux import METRICS, store_path
+    last = RingStore(store_path()).last("fs_u", len(METRICS["fs_u"][1]))
+    return last is not None and last > time.time() - 600
+
+
 def collect(node):
     now = str(datetime.datetime.now())
 
@@ -27,6 +34,9 @@ def blacklisted(mntpt):
                 return True
 
     def fs_u():
+        if sampler_running():
+            # the daemon sampler stores the filesystems usage
+            return
         cmd = ['df', '-lP']
         (out, err, ret) = justcall(cmd)
         if ret != 0:
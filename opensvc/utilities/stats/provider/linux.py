@@ -1,12 +1,85 @@
 import datetime
 import os
+import time
 
 from env import Env
 from utilities.proc import justcall
 from utilities.stats.provider import provider
+from utilities.stats.ring import RingStore
+from utilities.stats.sampler.linux import METRICS, store_path
+
+
+def fmt(value):
+    if value == int(value):
+        return "%d" % value
+    return "%.2f" % value
+
+
+class DateCache(object):
+    """
+    Format the timestamps of chronologically ordered samples, once per
+    distinct timestamp.
+    """
+    def __init__(self):
+        self.ts = None
+        self.date = None
+
+    def get(self, ts, date_fmt):
+        if ts != self.ts:
+            self.ts = ts
+            self.date = datetime.datetime.fromtimestamp(ts).strftime(date_fmt)
+        return self.date
 
 
 class StatsProvider(provider.BaseStatsProviderUx):
+    def get(self, stat_name):
+        """
+        Read the metrics from the daemon sampler ring files, completed with
+        the sar data older than the first sample stored in the rings.
+        """
+        if stat_name not in METRICS:
+            return super(StatsProvider, self).get(stat_name)
+        cols, lines, first = self.ring_stats(stat_name)
+        if first is None:
+            return super(StatsProvider, self).get(stat_name)
+        if first > time.mktime(self.stats_start.timetuple()) + 60:
+            _cols, _lines = super(StatsProvider, self).get(stat_name)
+            if _cols == cols:
+                first_date = datetime.datetime.fromtimestamp(first).strftime("%Y-%m-%d %H:%M:%S")
+                lines = [line for line in _lines if line[0] < first_date] + lines
+        return cols, lines
+
+    def ring_stats(self, stat_name):
+        """
+        Return the columns, the lines and the oldest sample timestamp of
+        the <stat_name> metric stored in the sampler ring files.
+        """
+        key_col, value_cols = METRICS[stat_name]
+        samples, first = RingStore(store_path()).read(
+            stat_name, len(value_cols),
+            start=time.mktime(self.stats_start.timetuple()),
+            end=time.mktime(self.stats_end.timetuple()),
+        )
+        lines = []
+        # the instances samples share the same timestamps
+        dates = DateCache()
+        if stat_name == "fs_u":
+            cols = ["date", "nodename", "mntpt", "size", "used"]
+            for ts, key, values in samples:
+                lines.append([dates.get(ts, "%Y-%m-%d %H:%M:%S.%f"), self.nodename, key, fmt(values[0]), fmt(values[1])])
+            return cols, lines, first
+        cols = ["date"]
+        if key_col:
+            cols.append(key_col)
+        cols += value_cols + ["nodename"]
+        for ts, key, values in samples:
+            line = [dates.get(ts, "%Y-%m-%d %H:%M:%S")]
+            if key_col:
+                line.append(key)
+            line += [fmt(value) for value in values] + [self.nodename]
+            lines.append(line)
+        return cols, lines, first
+
     def xentopfile(self, day):
         f = os.path.join(Env.paths.pathlog, 'xentop', 'xentop' + day)
         if os.path.exists(f):
@@ -0,0 +1,260 @@
+"""
+Fixed-size columnar ring files storing the sampled metrics.
+
+A ring file holds the samples of a metric instance, for example the cpu
+"all" counters or the "sda" block device counters:
+
+    header    magic, columns count, slots count, step, samples count
+    ts        <slots> doubles, the samples timestamps
+    column 0  <slots> doubles
+    ...
+    column n  <slots> doubles
+
+The sample <i> is stored in the slot <i % slots> of the timestamps and
+columns arrays. The samples count is updated last, so a reader never
+sees a partially written sample as the newest one.
+"""
+import mmap
+import os
+import struct
+
+from foreign.six.moves.urllib.parse import quote, unquote # pylint: disable=import-error
+
+MAGIC = b"OSVCRNG1"
+HEADER = struct.Struct("<8sIIdQ")
+VALUE = struct.Struct("<d")
+SUFFIX = ".ring"
+
+
+class Ring(object):
+    def __init__(self, path, ncols, nslots=None, step=None, readonly=False):
+        self.path = path
+        self.ncols = ncols
+        self.nslots = nslots
+        self.step = step
+        self.readonly = readonly
+        self.mm = None
+        self.open()
+
+    def size(self):
+        return HEADER.size + (self.ncols + 1) * self.nslots * VALUE.size
+
+    def open(self):
+        if self.readonly:
+            with open(self.path, "rb") as ofile:
+                self.mm = mmap.mmap(ofile.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, ncols, nslots, step, _ = HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC or ncols != self.ncols or len(self.mm) != HEADER.size + (ncols + 1) * nslots * VALUE.size:
+                self.close()
+                raise ValueError("%s: unexpected ring format" % self.path)
+            self.nslots = nslots
+            self.step = step
+            return
+        try:
+            with open(self.path, "rb") as ofile:
+                header = ofile.read(HEADER.size)
+            magic, ncols, nslots, _, _ = HEADER.unpack(header)
+            if magic != MAGIC or ncols != self.ncols or nslots != self.nslots or \
+               os.path.getsize(self.path) != self.size():
+                raise ValueError
+        except (IOError, OSError, ValueError, struct.error):
+            # create, or recreate on format change
+            with open(self.path, "wb") as ofile:
+                ofile.write(HEADER.pack(MAGIC, self.ncols, self.nslots, self.step, 0))
+                ofile.truncate(self.size())
+        with open(self.path, "r+b") as ofile:
+            self.mm = mmap.mmap(ofile.fileno(), 0)
+        HEADER.pack_into(self.mm, 0, MAGIC, self.ncols, self.nslots, self.step, self.count())
+
+    def close(self):
+        if self.mm is None:
+            return
+        self.mm.close()
+        self.mm = None
+
+    def count(self):
+        return HEADER.unpack_from(self.mm, 0)[4]
+
+    def offset(self, col, slot):
+        """
+        Return the offset of the value in the <slot> of the column <col>,
+        the timestamps column being the column -1.
+        """
+        return HEADER.size + ((col + 1) * self.nslots + slot) * VALUE.size
+
+    def ts(self, idx, count):
+        """
+        Return the timestamp of the sample at the <idx> position in the
+        chronologically ordered samples.
+        """
+        slot = (count - min(count, self.nslots) + idx) % self.nslots
+        return VALUE.unpack_from(self.mm, self.offset(-1, slot))[0]
+
+    def last(self):
+        """
+        Return the timestamp of the last sample, or None if the ring is
+        empty.
+        """
+        count = self.count()
+        if not count:
+            return
+        return self.ts(min(count, self.nslots) - 1, count)
+
+    def first(self):
+        """
+        Return the timestamp of the oldest sample, or None if the ring is
+        empty.
+        """
+        count = self.count()
+        if not count:
+            return
+        return self.ts(0, count)
+
+    def append(self, ts, values):
+        count = self.count()
+        slot = count % self.nslots
+        for col, value in enumerate(values):
+            VALUE.pack_into(self.mm, self.offset(col, slot), value)
+        VALUE.pack_into(self.mm, self.offset(-1, slot), ts)
+        HEADER.pack_into(self.mm, 0, MAGIC, self.ncols, self.nslots, self.step, count + 1)
+
+    def bisect(self, ts, count):
+        """
+        Return the position of the first sample not older than <ts>.
+        """
+        low = 0
+        high = min(count, self.nslots)
+        while low < high:
+            mid = (low + high) // 2
+            if self.ts(mid, count) < ts:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def read(self, start=None, end=None):
+        """
+        Return the list of (ts, values) samples with a timestamp in the
+        [<start>, <end>] range, in chronological order.
+        """
+        count = self.count()
+        n = min(count, self.nslots)
+        low = 0 if start is None else self.bisect(start, count)
+        high = n if end is None else self.bisect(end, count)
+        if high < n and end is not None and self.ts(high, count) == end:
+            high += 1
+        if low >= high:
+            return []
+        columns = []
+        for col in range(-1, self.ncols):
+            values = ()
+            # the range is at most 2 contiguous segments of the column
+            first = (count - n + low) % self.nslots
+            remaining = high - low
+            while remaining:
+                length = min(remaining, self.nslots - first)
+                values += struct.unpack_from("<%dd" % length, self.mm, self.offset(col, first))
+                remaining -= length
+                first = 0
+            columns.append(values)
+        return [(ts, list(values)) for ts, values in zip(columns[0], zip(*columns[1:]))]
+
+
+class RingStore(object):
+    """
+    The ring files of the metrics, stored as <path>/<metric>/<key>.ring
+    """
+    def __init__(self, path, nslots=None, step=None):
+        self.path = path
+        self.nslots = nslots
+        self.step = step
+        self.rings = {}
+
+    def metric_path(self, metric):
+        return os.path.join(self.path, metric)
+
+    def ring_path(self, metric, key):
+        return os.path.join(self.metric_path(metric), quote(str(key), safe="") + SUFFIX)
+
+    def ring(self, metric, key, ncols):
+        """
+        Return the writable ring of the <key> instance of <metric>.
+        """
+        try:
+            return self.rings[(metric, key)]
+        except KeyError:
+            pass
+        dpath = self.metric_path(metric)
+        if not os.path.exists(dpath):
+            os.makedirs(dpath)
+        ring = Ring(self.ring_path(metric, key), ncols, nslots=self.nslots, step=self.step)
+        self.rings[(metric, key)] = ring
+        return ring
+
+    def append(self, metric, key, ts, values):
+        self.ring(metric, key, len(values)).append(ts, values)
+
+    def keys(self, metric):
+        try:
+            names = os.listdir(self.metric_path(metric))
+        except OSError:
+            return []
+        return sorted([unquote(name[:-len(SUFFIX)]) for name in names if name.endswith(SUFFIX)])
+
+    def open_rings(self, metric, ncols):
+        """
+        Return the list of (key, ring) of <metric>, open read-only.
+        """
+        rings = []
+        for key in self.keys(metric):
+            try:
+                rings.append((key, Ring(self.ring_path(metric, key), ncols, readonly=True)))
+            except (IOError, OSError, ValueError):
+                continue
+        return rings
+
+    def read(self, metric, ncols, start=None, end=None):
+        """
+        Return the list of (ts, key, values) samples of all the <metric>
+        instances with a timestamp in the [<start>, <end>] range, and the
+        timestamp of the oldest sample in store.
+        """
+        samples = []
+        first = None
+        for key, ring in self.open_rings(metric, ncols):
+            try:
+                _first = ring.first()
+                if _first is not None and (first is None or _first < first):
+                    first = _first
+                samples += [(ts, key, values) for ts, values in ring.read(start, end)]
+            finally:
+                ring.close()
+        samples.sort(key=lambda x: (x[0], x[1]))
+        return samples, first
+
+    def last(self, metric, ncols):
+        """
+        Return the timestamp of the most recent sample of <metric>.
+        """
+        last = None
+        for _, ring in self.open_rings(metric, ncols):
+            try:
+                _last = ring.last()
+            finally:
+                ring.close()
+            if _last is not None and (last is None or _last > last):
+                last = _last
+        return last
+
+    def drop(self, metric, key):
+        """
+        Close the writable ring of the <key> instance of <metric>.
+        """
+        ring = self.rings.pop((metric, key), None)
+        if ring:
+            ring.close()
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
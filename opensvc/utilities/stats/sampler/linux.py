@@ -0,0 +1,291 @@
+"""
+Sample the node metrics from /proc and statvfs into ring files.
+
+The counters are converted to rates between two consecutive samples, so
+the first sample only stores the gauges.
+"""
+import os
+import re
+
+from env import Env
+from utilities.stats.collector.linux import mntpt_blacklist
+from utilities.stats.ring import RingStore
+
+RETENTION = 2 * 86400
+
+# metric: (instance key column, value columns)
+METRICS = {
+    "cpu": ("cpu", ["usr", "nice", "sys", "iowait", "steal", "irq", "soft", "guest", "gnice", "idle"]),
+    "mem_u": (None, ["kbmemfree", "kbavail", "kbmemused", "pct_memused", "kbbuffers", "kbcached",
+                     "kbcommit", "pct_commit", "kbactive", "kbinact", "kbdirty"]),
+    "proc": (None, ["runq_sz", "plist_sz", "ldavg_1", "ldavg_5", "ldavg_15"]),
+    "swap": (None, ["kbswpfree", "kbswpused", "pct_swpused", "kbswpcad", "pct_swpcad"]),
+    "block": (None, ["tps", "rtps", "wtps", "rbps", "wbps"]),
+    "blockdev": ("dev", ["tps", "rsecps", "wsecps", "avgrq_sz", "avgqu_sz", "await", "svctm", "pct_util"]),
+    "netdev": ("dev", ["rxpckps", "txpckps", "rxkBps", "txkBps"]),
+    "netdev_err": ("dev", ["rxerrps", "txerrps", "collps", "rxdropps", "txdropps"]),
+    "fs_u": ("mntpt", ["size", "used"]),
+}
+
+NETDEV_IGNORE = ("dummy", "vnet", "veth", "pan", "sit")
+REMOTE_FSTYPES = ("nfs", "nfs4", "cifs", "smbfs", "smb3", "ceph", "glusterfs", "gpfs", "9p", "afs", "lustre", "fuse.sshfs")
+BLACKLIST_RE = [re.compile(bl) for bl in mntpt_blacklist]
+
+
+def store_path():
+    return os.path.join(Env.paths.pathvar, "stats", "ring")
+
+
+def rate(cur, prev, idx, elapsed):
+    return max(cur[idx] - prev[idx], 0) / elapsed
+
+
+class Sampler(object):
+    proc = "/proc"
+    sysfs = "/sys"
+
+    def __init__(self, interval=60, path=None, retention=RETENTION):
+        self.interval = interval
+        if path is None:
+            path = store_path()
+        self.store = RingStore(path, nslots=max(int(retention // interval), 1), step=interval)
+        self.prev = None
+        self.disks = {}
+
+    def close(self):
+        self.store.close()
+
+    def read(self, name):
+        with open(os.path.join(self.proc, name), "r") as ofile:
+            return ofile.read()
+
+    def sample(self, now):
+        """
+        Store a sample of all metrics, timestamped <now>.
+        """
+        counters = {
+            "cpu": self.read_stat(),
+            "disk": self.read_diskstats(),
+            "net": self.read_netdev(),
+        }
+        meminfo = self.read_meminfo()
+        self.store_mem(now, meminfo)
+        self.store_swap(now, meminfo)
+        self.store_proc(now)
+        self.store_fs(now)
+        if self.prev is not None and now > self.prev[0]:
+            elapsed = now - self.prev[0]
+            self.store_cpu(now, counters["cpu"], self.prev[1]["cpu"])
+            self.store_disk(now, counters["disk"], self.prev[1]["disk"], elapsed)
+            self.store_net(now, counters["net"], self.prev[1]["net"], elapsed)
+        self.prev = (now, counters)
+
+    def append(self, metric, key, now, values):
+        self.store.append(metric, key, now, values)
+
+    def read_stat(self):
+        """
+        Return the cpu jiffies counters, indexed by cpu.
+        """
+        data = {}
+        for line in self.read("stat").splitlines():
+            if not line.startswith("cpu"):
+                continue
+            words = line.split()
+            key = "all" if words[0] == "cpu" else words[0][3:]
+            # user nice system idle iowait irq softirq steal guest guest_nice
+            data[key] = [int(word) for word in words[1:11]] + [0] * (11 - len(words))
+        return data
+
+    def read_meminfo(self):
+        data = {}
+        for line in self.read("meminfo").splitlines():
+            try:
+                key, value = line.split(":", 1)
+                data[key] = int(value.split()[0])
+            except (ValueError, IndexError):
+                continue
+        return data
+
+    def is_disk(self, name):
+        try:
+            return self.disks[name]
+        except KeyError:
+            pass
+        self.disks[name] = os.path.exists(os.path.join(self.sysfs, "block", name.replace("/", "!")))
+        return self.disks[name]
+
+    def read_diskstats(self):
+        """
+        Return the whole disks io counters, indexed by device name.
+        """
+        data = {}
+        for line in self.read("diskstats").splitlines():
+            words = line.split()
+            if len(words) < 14:
+                continue
+            name = words[2]
+            # reads rd_merges rd_sectors rd_ticks writes wr_merges wr_sectors
+            # wr_ticks in_flight io_ticks time_in_queue
+            values = [int(word) for word in words[3:14]]
+            if values[0] + values[4] == 0:
+                # never used, like the unattached loop devices
+                continue
+            if not self.is_disk(name):
+                continue
+            data[name] = values
+        return data
+
+    def read_netdev(self):
+        """
+        Return the network interfaces counters, indexed by interface name.
+        """
+        data = {}
+        for line in self.read("net/dev").splitlines()[2:]:
+            try:
+                name, values = line.split(":", 1)
+            except ValueError:
+                continue
+            name = name.strip()
+            if name == "lo" or any(pattern in name for pattern in NETDEV_IGNORE):
+                continue
+            data[name] = [int(word) for word in values.split()[:16]]
+        return data
+
+    def store_cpu(self, now, cur, prev):
+        for key, values in cur.items():
+            if key not in prev:
+                continue
+            deltas = [max(a - b, 0) for a, b in zip(values, prev[key])]
+            user, nice, system, idle, iowait, irq, soft, steal, guest, gnice = deltas[:10]
+            # the user and nice counters include the guest counters
+            total = user + nice + system + idle + iowait + irq + soft + steal
+            if total == 0:
+                continue
+            self.append("cpu", key, now, [100.0 * val / total for val in (
+                max(user - guest, 0), max(nice - gnice, 0), system, iowait, steal, irq, soft, guest, gnice, idle
+            )])
+
+    def store_mem(self, now, meminfo):
+        total = meminfo.get("MemTotal", 0)
+        if not total:
+            return
+        free = meminfo.get("MemFree", 0)
+        buffers = meminfo.get("Buffers", 0)
+        cached = meminfo.get("Cached", 0) + meminfo.get("SReclaimable", 0)
+        used = total - free - buffers - cached
+        commit = meminfo.get("Committed_AS", 0)
+        self.append("mem_u", "all", now, [
+            free,
+            meminfo.get("MemAvailable", free),
+            used,
+            100.0 * used / total,
+            buffers,
+            cached,
+            commit,
+            100.0 * commit / (total + meminfo.get("SwapTotal", 0)),
+            meminfo.get("Active", 0),
+            meminfo.get("Inactive", 0),
+            meminfo.get("Dirty", 0),
+        ])
+
+    def store_swap(self, now, meminfo):
+        total = meminfo.get("SwapTotal", 0)
+        free = meminfo.get("SwapFree", 0)
+        used = total - free
+        cad = meminfo.get("SwapCached", 0)
+        self.append("swap", "all", now, [
+            free,
+            used,
+            100.0 * used / total if total else 0,
+            cad,
+            100.0 * cad / used if used else 0,
+        ])
+
+    def store_proc(self, now):
+        words = self.read("loadavg").split()
+        running, total = words[3].split("/")
+        self.append("proc", "all", now, [int(running), int(total), float(words[0]), float(words[1]), float(words[2])])
+
+    def store_disk(self, now, cur, prev, elapsed):
+        totals = [0, 0, 0, 0]
+        for name, values in cur.items():
+            if name not in prev:
+                continue
+            _prev = prev[name]
+            reads = max(values[0] - _prev[0], 0)
+            writes = max(values[4] - _prev[4], 0)
+            rsect = max(values[2] - _prev[2], 0)
+            wsect = max(values[6] - _prev[6], 0)
+            ios = reads + writes
+            ticks = max(values[3] - _prev[3], 0) + max(values[7] - _prev[7], 0)
+            io_ticks = max(values[9] - _prev[9], 0)
+            totals = [totals[0] + reads, totals[1] + writes, totals[2] + rsect, totals[3] + wsect]
+            self.append("blockdev", name, now, [
+                ios / elapsed,
+                rsect / elapsed,
+                wsect / elapsed,
+                float(rsect + wsect) / ios if ios else 0,
+                rate(values, _prev, 10, elapsed) / 1000,
+                float(ticks) / ios if ios else 0,
+                float(io_ticks) / ios if ios else 0,
+                min(io_ticks / elapsed / 10, 100.0),
+            ])
+        self.append("block", "all", now, [
+            (totals[0] + totals[1]) / elapsed,
+            totals[0] / elapsed,
+            totals[1] / elapsed,
+            totals[2] / elapsed,
+            totals[3] / elapsed,
+        ])
+
+    def store_net(self, now, cur, prev, elapsed):
+        for name, values in cur.items():
+            if name not in prev:
+                continue
+            _prev = prev[name]
+            self.append("netdev", name, now, [
+                rate(values, _prev, 1, elapsed),
+                rate(values, _prev, 9, elapsed),
+                rate(values, _prev, 0, elapsed) / 1024,
+                rate(values, _prev, 8, elapsed) / 1024,
+            ])
+            self.append("netdev_err", name, now, [
+                rate(values, _prev, 2, elapsed),
+                rate(values, _prev, 10, elapsed),
+                rate(values, _prev, 13, elapsed),
+                rate(values, _prev, 3, elapsed),
+                rate(values, _prev, 11, elapsed),
+            ])
+
+    def mounts(self):
+        """
+        Return the local filesystems mount points, like df -l.
+        """
+        mntpts = []
+        for line in self.read("self/mounts").splitlines():
+            words = line.split()
+            if len(words) < 3:
+                continue
+            mntpt = words[1].replace("\\040", " ")
+            if words[2] in REMOTE_FSTYPES or mntpt in mntpts:
+                continue
+            if any(regex.match(mntpt) for regex in BLACKLIST_RE):
+                continue
+            mntpts.append(mntpt)
+        return mntpts
+
+    def store_fs(self, now):
+        for mntpt in self.mounts():
+            try:
+                st = os.statvfs(mntpt)
+            except OSError:
+                continue
+            if not st.f_blocks:
+                # pseudo filesystems
+                continue
+            used = st.f_blocks - st.f_bfree
+            avail = used + st.f_bavail
+            # df rounds the used percent up
+            pct = (100 * used + avail - 1) // avail if avail else 0
+            self.append("fs_u", mntpt, now, [st.f_blocks * st.f_frsize // 1024, pct])
@@ -15,8 +15,14 @@
 import core.exceptions as ex
 
 from env import Env
+from utilities.cache.tier import TierUnavailable, daemon_tier
 from utilities.lazy import threadsafe_lazy as lazy, unset_lazy, set_lazy
 from utilities.proc import justcall
+from utilities.subsystems.docker_api import (DEFAULT_SOCKS, EngineClient,
+                                             EngineError, default_sock,
+                                             images_entries, is_sock, ps_entry)
+
+DEFAULT_PODMAN_SOCK = DEFAULT_SOCKS[1]
 
 def has_docker(program_list):
     for exe in program_list:
@@ -42,10 +48,43 @@ def __init__(self, svc=None):
         self.svc = svc
         self.docker_info_done = False
         self.raw_container_data_dir = self.svc.oget("DEFAULT", "container_data_dir")
+        self.engine_sock = None
+        self.daemon_states_done = set()
 
     def client_config_args(self, path):
         return ["--config", os.path.dirname(path)]
 
+    @lazy
+    def engine(self):
+        """
+        The engine api client, or None if the engine api socket is not
+        available, in which case the docker commands are used.
+        """
+        if not is_sock(self.engine_sock):
+            return
+        return EngineClient(self.engine_sock)
+
+    def daemon_states(self, key, ids=None):
+        """
+        Return the <key> data of the containers states cached by the
+        daemon for our engine, or None if not available.
+
+        Only the first load of a <key> uses the daemon cache. The reloads,
+        after a container action, query the engine so they don't race with
+        the daemon events processing.
+        """
+        if self.engine is None or key in self.daemon_states_done:
+            return
+        self.daemon_states_done.add(key)
+        tier = daemon_tier()
+        if tier is None:
+            return
+        try:
+            result = tier.request("GET", "container_states", {"sock": self.engine_sock, "ids": ids})
+        except (KeyError, TierUnavailable):
+            return
+        return result["data"][key]
+
     @lazy
     def container_data_dir(self):
         if not self.raw_container_data_dir:
@@ -70,6 +109,17 @@ def container_ps(self):
         """
         The "docker ps -a --no-trunc" json loaded dicts assembled in a list.
         """
+        data = self.daemon_states("ps")
+        if data is not None:
+            return data
+        if self.engine is not None:
+            try:
+                return [ps_entry(container) for container in self.engine.containers(all=True)]
+            except EngineError:
+                pass
+        return self._container_ps()
+
+    def _container_ps(self):
         cmd = self.docker_cmd + ["ps", "-a", "--no-trunc"] + self.json_opt
         out, err, ret = justcall(cmd)
         if ret != 0:
@@ -167,6 +217,11 @@ def docker_info(self):
         """
         The output of "docker info".
         """
+        if self.engine is not None:
+            try:
+                return self.engine.info()
+            except EngineError:
+                pass
         try:
             self.docker_exe
         except ex.InitError:
@@ -183,6 +238,11 @@ def docker_version(self):
         """
         The docker version.
         """
+        if self.engine is not None:
+            try:
+                return self.engine.version()["Version"]
+            except (EngineError, KeyError, TypeError):
+                pass
         try:
             cmd = [self.docker_exe, "--version"]
         except ex.InitError:
@@ -219,7 +279,7 @@ def running_instance_ids(self):
         """
         The list of running docker instances id.
         """
-        if self.docker_cmd is None:
+        if self.docker_cmd is None and self.engine is None:
             return []
         data = []
         for ps in self.container_ps: # pylint: disable=not-an-iterable
@@ -324,6 +384,11 @@ def images(self):
         """
         The hash of docker images, indexed by image id.
         """
+        if self.engine is not None:
+            try:
+                return images_entries(self.engine.images())
+            except EngineError:
+                pass
         if self.docker_cmd is None:
             return {}
         cmd = self.docker_cmd + ["images", "--no-trunc"]
@@ -440,6 +505,14 @@ def containers_inspect(self):
             ids.append(resource.container_id)
         if not ids:
             return []
+        data = self.daemon_states("inspect", ids)
+        if data is not None and len(data) == len(ids):
+            return data
+        if self.engine is not None:
+            try:
+                return self.engine.inspect_many(ids)
+            except EngineError:
+                pass
         try:
             self.docker_exe
         except ex.InitError:
@@ -456,13 +529,20 @@ def docker_volume_inspect(self, vol_id):
         """
         Return the "docker volume inspect" data dict.
         """
+        if vol_id is None:
+            raise IndexError("vol id is None")
+        if self.engine is not None:
+            try:
+                if isinstance(vol_id, list):
+                    return [self.engine.volume_inspect(name) for name in vol_id]
+                return self.engine.volume_inspect(vol_id)
+            except EngineError:
+                pass
         try:
             self.docker_exe
         except ex.InitError:
             return {}
-        if vol_id is None:
-            raise IndexError("vol id is None")
-        elif isinstance(vol_id, list):
+        if isinstance(vol_id, list):
             cmd = self.docker_cmd + ["volume", "inspect"] + vol_id
             out = justcall(cmd)[0]
             data = json.loads(out)
@@ -512,6 +592,20 @@ def __init__(self, svc=None):
         if Env.sysname != "Linux":
             self.docker_daemon_private = False
 
+        if self.docker_daemon_private:
+            self.docker_socket = os.path.join(self.svc.var_d, "docker.sock")
+            self.compat_docker_socket = os.path.join(Env.paths.pathvar, self.svc.name, "docker.sock")
+        else:
+            self.docker_socket = None
+
+        if self.docker_socket:
+            if self.test_sock(self.docker_socket) or not self.test_sock(self.compat_docker_socket):
+                self.engine_sock = self.docker_socket
+            else:
+                self.engine_sock = self.compat_docker_socket
+        else:
+            self.engine_sock = default_sock()
+
         try:
             self.docker_exe_init = \
                 self.svc.conf_get("DEFAULT", "docker_exe")
@@ -534,12 +628,6 @@ def __init__(self, svc=None):
             if "--exec-opt" not in self.docker_daemon_args and self.docker_min_version("1.7"):
                 self.docker_daemon_args += ["--exec-opt", "native.cgroupdriver=cgroupfs"]
 
-        if self.docker_daemon_private:
-            self.docker_socket = os.path.join(self.svc.var_d, "docker.sock")
-            self.compat_docker_socket = os.path.join(Env.paths.pathvar, self.svc.name, "docker.sock")
-        else:
-            self.docker_socket = None
-
         if self.docker_daemon_private:
             self.docker_pid_file = os.path.join(self.svc.var_d, "docker.pid")
             self.compat_docker_pid_file = os.path.join(Env.paths.pathvar, self.svc.name, "docker.pid")
@@ -554,11 +642,7 @@ def __init__(self, svc=None):
         try:
             self.docker_cmd = [self.docker_exe]
             if self.docker_socket:
-                if self.test_sock(self.docker_socket) or not self.test_sock(self.compat_docker_socket):
-                    sock = self.docker_socket
-                else:
-                    sock = self.compat_docker_socket
-                self.docker_cmd += ["-H", "unix://"+sock]
+                self.docker_cmd += ["-H", "unix://"+self.engine_sock]
         except:
             self.docker_cmd = None
 
@@ -756,6 +840,7 @@ def docker_start(self, verbose=True):
             utilities.lock.unlock(lockfd)
 
     def clear_daemon_caches(self):
+        unset_lazy(self, "engine")
         unset_lazy(self, "container_ps")
         unset_lazy(self, "container_by_name")
         unset_lazy(self, "container_by_label")
@@ -824,6 +909,9 @@ def _docker_working(self):
         """
         Return True if the docker daemon responds to a simple 'info' request.
         """
+        unset_lazy(self, "engine")
+        if self.engine is not None:
+            return self.engine.ping()
         cmd = self.docker_cmd + ["info"]
         ret = justcall(cmd)[2]
         if ret != 0:
@@ -856,16 +944,15 @@ def __init__(self, svc=None):
             self.docker_daemon_private = False
 
         self.docker_cmd = [self.docker_exe] + self.docker_daemon_args
+        if not self.docker_daemon_private:
+            # the podman service docker api doesn't serve the private roots
+            self.engine_sock = DEFAULT_PODMAN_SOCK
 
     @lazy
     def docker_exe(self):
         return "/usr/bin/podman"
 
-    @lazy
-    def container_ps(self):
-        """
-        The "docker ps -a --no-trunc" json loaded dicts assembled in a list.
-        """
+    def _container_ps(self):
         cmd = self.docker_cmd + ["ps", "-a", "--no-trunc"] + self.json_opt
         out, err, ret = justcall(cmd)
         if ret != 0:
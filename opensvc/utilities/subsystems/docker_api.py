@@ -0,0 +1,389 @@
+"""
+The docker engine api client, also usable with the podman docker api.
+
+The requests are sent over a persistent http/1.1 connection to the engine
+unix socket, so the status evaluation of an object with many containers
+does not fork a docker command per query. The ContainerStates class keeps
+the containers inspect data fresh using the engine events stream.
+"""
+import json
+import os
+import socket
+import stat
+import threading
+import time
+
+from foreign.six.moves import http_client
+from foreign.six.moves.urllib.parse import quote, urlencode
+
+import core.exceptions as ex
+from utilities.string import bdecode
+
+# the shared engines api sockets, docker first
+DEFAULT_SOCKS = ["/var/run/docker.sock", "/run/podman/podman.sock"]
+SOCK_TMO = 5.0
+
+
+class EngineError(ex.Error):
+    pass
+
+
+class EngineNotFound(EngineError):
+    pass
+
+
+def default_sock():
+    """
+    Return the docker engine api socket path, from the DOCKER_HOST
+    environment variable if set to a unix socket url.
+    """
+    host = os.environ.get("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[7:]
+    return DEFAULT_SOCKS[0]
+
+
+def is_sock(path):
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except (OSError, TypeError):
+        return False
+
+
+def ps_entry(data):
+    """
+    Return a container data from the api containers list or inspect in the
+    format of the "docker ps --format {{json .}}" lines.
+    """
+    if "Config" in data:
+        # inspect data
+        names = [data.get("Name", "")]
+        labels = data["Config"].get("Labels") or {}
+        image = data["Config"].get("Image")
+        state = data.get("State", {}).get("Status")
+    else:
+        names = data.get("Names") or []
+        labels = data.get("Labels") or {}
+        image = data.get("Image")
+        state = data.get("State")
+    return {
+        "ID": data.get("Id", data.get("ID")),
+        "Names": ",".join(name.lstrip("/") for name in names),
+        "Labels": labels,
+        "Image": image,
+        "State": state,
+    }
+
+
+def images_entries(data):
+    """
+    Return the api images list as the {"name", "tag", "id"} dicts parsed
+    from the "docker images" output.
+    """
+    images = []
+    for image in data:
+        image_id = image.get("Id", "").replace("sha256:", "", 1)
+        for ref in image.get("RepoTags") or ["<none>:<none>"]:
+            name, tag = ref.rsplit(":", 1)
+            images.append({
+                "name": name,
+                "tag": tag,
+                "id": image_id,
+            })
+    return images
+
+
+class UnixHTTPConnection(http_client.HTTPConnection):
+    def __init__(self, path, timeout=SOCK_TMO):
+        http_client.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.sock_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.sock_path)
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class EventStream(object):
+    """
+    The engine events, iterated as dicts until the engine closes the
+    stream or close() is called from another thread.
+    """
+    def __init__(self, path, query):
+        self.conn = UnixHTTPConnection(path, timeout=None)
+        try:
+            self.conn.request("GET", "/events?" + urlencode(query))
+            self.resp = self.conn.getresponse()
+        except (socket.error, http_client.HTTPException) as exc:
+            self.conn.close()
+            raise EngineError("%s: %s" % (path, exc))
+        if self.resp.status != 200:
+            self.conn.close()
+            raise EngineError("%s: events: http status %d" % (path, self.resp.status))
+
+    def __iter__(self):
+        buff = b""
+        try:
+            for chunk in self.iter_chunks():
+                buff += chunk
+                lines = buff.split(b"\n")
+                buff = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(bdecode(line))
+        except (socket.error, http_client.HTTPException, ValueError):
+            # closed
+            return
+
+    def iter_chunks(self):
+        if hasattr(self.resp, "read1"):
+            while True:
+                data = self.resp.read1(65536)
+                if not data:
+                    return
+                yield data
+        # python 2 responses don't return the partial chunks
+        fp = self.resp.fp
+        while True:
+            line = fp.readline()
+            if not line:
+                return
+            if not self.resp.chunked:
+                yield line
+                continue
+            size = int(line.split(b";")[0].strip(), 16)
+            if size == 0:
+                return
+            data = fp.read(size)
+            fp.read(2)
+            yield data
+
+    def close(self):
+        try:
+            self.conn.sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        self.conn.close()
+
+
+class EngineClient(object):
+    """
+    The client of the engine api listening on the <path> unix socket.
+    Thread safe, the requests are serialized on a single keep-alive
+    connection.
+    """
+    def __init__(self, path, timeout=SOCK_TMO):
+        self.path = path
+        self.timeout = timeout
+        self.conn = None
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connects = 0
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _close(self):
+        if self.conn is None:
+            return
+        self.conn.close()
+        self.conn = None
+
+    def request(self, method, path, query=None, body=None):
+        """
+        Return the decoded json response of the <method> <path> request.
+        Raise EngineNotFound on 404 responses and EngineError on the other
+        errors.
+        """
+        if query:
+            path += "?" + urlencode(query)
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        with self.lock:
+            while True:
+                reused = self.conn is not None
+                if self.conn is None:
+                    self.conn = UnixHTTPConnection(self.path, timeout=self.timeout)
+                    self.connects += 1
+                try:
+                    self.conn.request(method, path, body=body, headers=headers)
+                    resp = self.conn.getresponse()
+                    buff = resp.read()
+                except (socket.error, http_client.HTTPException) as exc:
+                    self._close()
+                    if reused:
+                        # the engine closed the idle connection, retry on
+                        # a new connection
+                        continue
+                    raise EngineError("%s: %s" % (self.path, exc))
+                self.requests += 1
+                break
+        try:
+            data = json.loads(bdecode(buff)) if buff else None
+        except ValueError:
+            data = bdecode(buff)
+        if resp.status == 404:
+            raise EngineNotFound(self.error_message(data, resp.status))
+        if resp.status >= 400:
+            raise EngineError(self.error_message(data, resp.status))
+        return data
+
+    @staticmethod
+    def error_message(data, status):
+        if isinstance(data, dict) and data.get("message"):
+            return data["message"]
+        return "http status %d" % status
+
+    def ping(self):
+        try:
+            return self.request("GET", "/_ping") == "OK"
+        except EngineError:
+            return False
+
+    def version(self):
+        return self.request("GET", "/version")
+
+    def info(self):
+        return self.request("GET", "/info")
+
+    def containers(self, all=True):
+        return self.request("GET", "/containers/json", query={"all": 1 if all else 0})
+
+    def inspect(self, container_id):
+        return self.request("GET", "/containers/%s/json" % quote(container_id, safe=""))
+
+    def inspect_many(self, container_ids):
+        """
+        Return the list of inspect data of the existing <container_ids>,
+        like "docker inspect <container_ids>".
+        """
+        data = []
+        for container_id in container_ids:
+            try:
+                data.append(self.inspect(container_id))
+            except EngineNotFound:
+                continue
+        return data
+
+    def volume_inspect(self, name):
+        return self.request("GET", "/volumes/%s" % quote(name, safe=""))
+
+    def images(self):
+        return self.request("GET", "/images/json")
+
+    def events(self, since=None, filters=None):
+        """
+        Return an EventStream of the engine events, on a dedicated
+        connection.
+        """
+        query = {}
+        if since is not None:
+            query["since"] = "%d" % since
+        if filters:
+            query["filters"] = json.dumps(filters)
+        return EventStream(self.path, query)
+
+
+class ContainerStates(object):
+    """
+    The inspect data of an engine containers, loaded once and refreshed by
+    the engine container events.
+    """
+    # the container events not altering the inspect data
+    ignored_actions = ("exec_create", "exec_start", "exec_die", "attach", "detach",
+                       "resize", "top", "archive-path", "extract-to-dir", "export",
+                       "commit", "copy")
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.data = {}
+        self.ready = False
+        self.closed = False
+        self.stream = None
+        self.updated = 0
+        self.events = 0
+
+    def load(self):
+        data = {}
+        for container in self.client.containers(all=True):
+            container_id = container.get("Id", container.get("ID"))
+            try:
+                data[container_id] = self.client.inspect(container_id)
+            except EngineNotFound:
+                continue
+        with self.lock:
+            self.data = data
+            self.ready = True
+            self.updated = time.time()
+
+    def apply(self, event):
+        """
+        Update the containers data with the engine <event>.
+        """
+        if event.get("Type", "container") != "container":
+            return
+        container_id = event.get("id") or event.get("Actor", {}).get("ID")
+        action = event.get("Action", event.get("status", ""))
+        if not container_id or action.split(":")[0] in self.ignored_actions:
+            return
+        self.events += 1
+        if action == "destroy":
+            data = None
+        else:
+            try:
+                data = self.client.inspect(container_id)
+            except EngineNotFound:
+                data = None
+        with self.lock:
+            self.data = dict(self.data)
+            if data is None:
+                self.data.pop(container_id, None)
+            else:
+                self.data[container_id] = data
+            self.updated = time.time()
+
+    def watch(self):
+        """
+        Load the containers data and apply the engine events until the
+        stream is closed. The stream is opened before the load, so no
+        change is missed.
+        """
+        self.stream = self.client.events(filters={"type": ["container"]})
+        try:
+            if self.closed:
+                return
+            self.load()
+            for event in self.stream:
+                self.apply(event)
+        finally:
+            self.ready = False
+            self.stream.close()
+
+    def close(self):
+        self.closed = True
+        if self.stream is not None:
+            self.stream.close()
+
+    def dump(self, ids=None):
+        """
+        Return the containers data as the "docker ps" lines, and the
+        inspect data of <ids> or of all containers.
+        """
+        data = self.data
+        if ids is None:
+            inspect = list(data.values())
+        else:
+            inspect = [data[container_id] for container_id in ids if container_id in data]
+        return {
+            "ps": [ps_entry(container) for container in data.values()],
+            "inspect": inspect,
+        }